@@ -13,15 +13,18 @@ __license__   = """
     limitations under the License.
 """
 import ConfigParser,Queue
-import collections,datetime,math,multiprocessing,os,random,sys,traceback
+import cPickle,collections,datetime,logging,math,multiprocessing,os,random,shutil,sys,traceback
 import numpy,pandas
 import _fasttrips
 
-from .Error       import ConfigurationError
+from .Error       import ConfigurationError, UnexpectedError
+from .IdRegistry  import IdRegistry
 from .Logger      import FastTripsLogger, setupLogging
 from .Passenger   import Passenger
 from .PathSet     import PathSet
 from .Performance import Performance
+from .Route       import Route
+from .Stage       import Stage
 from .Stop        import Stop
 from .TAZ         import TAZ
 from .Transfer    import Transfer
@@ -63,6 +66,16 @@ class Assignment:
     #: Configuration: Pathfinding Type.  Should be one of `Deterministic`, `Stochastic` or `File`
     PATHFINDING_TYPE                = None
 
+    #: Deterministic engine: trip-based shortest path label-setting search.
+    DETERMINISTIC_ENGINE_LABELING   = 'labeling'
+    #: Deterministic engine: round-based search over route patterns, where round *k* finds the best path with *k* trips.
+    DETERMINISTIC_ENGINE_RAPTOR     = 'raptor'
+    #: The deterministic engines, in the order of the C++ extension's engine numbers.
+    DETERMINISTIC_ENGINE_OPTIONS    = [DETERMINISTIC_ENGINE_LABELING, DETERMINISTIC_ENGINE_RAPTOR]
+    #: Configuration: The search used when :py:attr:`Assignment.PATHFINDING_TYPE` is
+    #: :py:attr:`Assignment.PATHFINDING_TYPE_DETERMINISTIC`.  One of :py:attr:`Assignment.DETERMINISTIC_ENGINE_OPTIONS`.
+    DETERMINISTIC_ENGINE            = None
+
     #: Configuration: Do simulation? It should be True for iterative assignment. In a one shot
     #: assignment with simulation flag off, the passengers are assigned to
     #: paths but are not loaded to the network.  Boolean.
@@ -82,6 +95,11 @@ class Assignment:
     #: departure time will be checked.  A :py:class:`datetime.timedelta` instance.
     TIME_WINDOW                     = None
 
+    #: Route choice configuration: Find paths for the person trips in order of preferred time rather than
+    #: in trip list order, so consecutive searches (and the searches each worker pulls off the queue) use
+    #: the same part of the schedule.  Boolean.
+    TIME_SORTED_PATHFINDING         = None
+
     #: Configuration: Create skims flag. This is specific to the travel demand models
     #: (not working in this version). Boolean.
     CREATE_SKIMS                    = None
@@ -119,6 +137,31 @@ class Assignment:
     #: (not necessarily unique) to define a path choice set?  Int.
     STOCH_PATHSET_SIZE              = None
 
+    #: Route choice configuration: Stop drawing stochastic paths once this many draws in a row
+    #: haven't found a new path, even if :py:attr:`Assignment.STOCH_PATHSET_SIZE` hasn't been reached.
+    #: Use -1 to always draw :py:attr:`Assignment.STOCH_PATHSET_SIZE` paths.  Int.
+    STOCH_PATHSET_STOP_NO_NEW       = None
+
+    #: Route choice configuration: Stop drawing stochastic paths once the estimated probability
+    #: of drawing a path that hasn't been seen yet (the fraction of draws that were paths drawn only once)
+    #: falls below this tolerance.  Use 0 to always draw :py:attr:`Assignment.STOCH_PATHSET_SIZE` paths.  Float.
+    STOCH_PATHSET_UNSEEN_TOLERANCE  = None
+
+    #: Route choice configuration: In labeling, skip stops whose label plus a lower bound on the cost to the end
+    #: of the path (from the minimum times between stops, ignoring the schedule) is past the cutoff used to end labeling,
+    #: as well as stops that can't reach the end of the path at all.  Boolean.
+    LOWER_BOUND_PRUNING             = None
+
+    #: Route choice configuration: Remove drive access and egress links that are dominated by another link
+    #: for the same TAZ and supply mode before pathfinding.  See :py:meth:`TAZ.prune_dominated_drive_links`.  Boolean.
+    PRUNE_DOMINATED_ACCESS_LINKS    = None
+
+    #: Route choice configuration: A drive link only dominates another if it's at least this many minutes faster.  Float.
+    ACCESS_DOMINANCE_TIME_MARGIN    = None
+
+    #: Route choice configuration: A drive link only dominates another if it's at least this much shorter.  Float.
+    ACCESS_DOMINANCE_DIST_MARGIN    = None
+
     #: Route choice configuration: Use vehicle capacity constraints. Boolean.
     CAPACITY_CONSTRAINT             = None
 
@@ -144,6 +187,18 @@ class Assignment:
     #: Set to positive integer greater than 1 to set a fixed number of processes
     NUMBER_OF_PROCESSES             = None
 
+    #: Configuration: If positive, pathfinding results are converted to pathset dataframes and appended to the
+    #: pathfinding output files in chunks of this many person trips as they're found, rather than all at once
+    #: after pathfinding.  With multiple pathfinding processes, this overlaps with the pathfinding, and a crash
+    #: keeps the paths already written.  See :py:meth:`Assignment.stream_pathsets`.  Int.
+    PATHSET_STREAM_CHUNK_SIZE       = None
+
+    #: Configuration: Seed for the random numbers used to draw stochastic paths and to choose paths.  These come from
+    #: a counter-based generator keyed by this seed, the iteration and the trip list ID num (fasttrips::RandomStream in the
+    #: extension and :py:meth:`Util.philox_uniform`), so results don't depend on the number of processes or the order the
+    #: passenger trips are handled in.  Int.
+    RANDOM_SEED                     = None
+
     #: Extra time so passengers don't get bumped (?). A :py:class:`datetime.timedelta` instance.
     BUMP_BUFFER                     = None
 
@@ -152,6 +207,20 @@ class Assignment:
     bump_wait                       = {}
     bump_wait_df                    = None
 
+    #: The stop times last sent to the fasttrips extension in this process, as columns trip id num,
+    #: stop sequence, stop id num, arrival time min, departure time min, overcap.
+    #: Used by :py:meth:`Assignment.update_fasttrips_extension` to send only the changed stop times.
+    extension_stop_times_df         = None
+
+    #: Columns identifying a stop time for the fasttrips extension
+    EXTENSION_STOP_TIMES_INDEX_COLUMNS = [Trip.STOPTIMES_COLUMN_TRIP_ID_NUM,
+                                          Trip.STOPTIMES_COLUMN_STOP_SEQUENCE,
+                                          Trip.STOPTIMES_COLUMN_STOP_ID_NUM]
+    #: Stop time columns that may change between iterations; overcap is renamed to this
+    EXTENSION_STOP_TIMES_DATA_COLUMNS  = [Trip.STOPTIMES_COLUMN_ARRIVAL_TIME_MIN,
+                                          Trip.STOPTIMES_COLUMN_DEPARTURE_TIME_MIN,
+                                          Trip.SIM_COL_VEH_OVERCAP]
+
     #: Simulation: bump one stop at a time (slower, more accurate)
     #:
     #: When addressing capacity constraints in simulation, we look at all the (trip, stop)-pairs
@@ -166,6 +235,65 @@ class Assignment:
     #: loads, and iterate until we have no capacity issues.  Boolean.
     BUMP_ONE_AT_A_TIME              = None
 
+    #: Configuration: If true, the simulation dataframes (vehicle trips and pathset links) are kept in a
+    #: memory-compact form: repeated string columns are categoricals and numeric ID columns and counters
+    #: use the smallest safe integer types.  See :py:meth:`Assignment.compact_simulation_dataframes`.
+    #: Boolean.
+    COMPACT_DATAFRAMES              = None
+
+    #: Configuration: If positive, simulation is run out-of-core in partitions of this many passenger trips
+    #: (by :py:attr:`Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM`).  The pathsets are kept on disk in
+    #: :py:attr:`Assignment.SIMULATION_PARTITION_DIR` across iterations and only one partition is in memory at a time
+    #: for the passenger steps; only the vehicle board/alight counts are combined across partitions.
+    #: See :py:meth:`Assignment.simulate_partitioned`.  Int.
+    SIMULATION_PARTITION_SIZE       = None
+    #: Subdirectory of the output directory for the simulation partitions
+    SIMULATION_PARTITION_DIR        = "sim_partitions"
+    #: Simulation partition files for the pathset paths and links, by partition
+    SIMULATION_PARTITION_FILES      = ("pathset_paths_%04d.pkl", "pathset_links_%04d.pkl")
+    #: Simulation partition file for the vehicle trips of the current simulation iteration, for the simulation worker processes
+    SIMULATION_PARTITION_VEH_FILE   = "veh_trips.pkl"
+
+    #: Configuration: Number of processes to use for the per-passenger simulation steps.  If more than one,
+    #: simulation is partitioned (see :py:attr:`Assignment.SIMULATION_PARTITION_SIZE`; if that's not set,
+    #: there's one partition per process) and the partitions are simulated in parallel.  Int.
+    NUMBER_OF_SIMULATION_PROCESSES  = None
+
+    #: Configuration: If true, the assignment state is written to a checkpoint at the end of each iteration,
+    #: in :py:attr:`Assignment.CHECKPOINT_DIR`.  See :py:meth:`Assignment.write_checkpoint`.  Boolean.
+    WRITE_CHECKPOINTS               = None
+    #: Configuration: If positive, the assignment is resumed from the checkpoint written at the end of this
+    #: iteration, and continues with the next iteration.  See :py:meth:`Assignment.read_checkpoint`.  Int.
+    RESUME_ITERATION                = None
+    #: Configuration: If set, the assignment is warm-started from a checkpoint written by a previous run
+    #: (see :py:attr:`Assignment.WRITE_CHECKPOINTS`) in this output directory: its vehicle loads and bump
+    #: wait information seed iteration 1.  See :py:meth:`Assignment.read_warm_start`.  String.
+    WARM_START_DIR                  = None
+    #: Configuration: The iteration of the checkpoint in :py:attr:`Assignment.WARM_START_DIR` to warm-start from.
+    #: If not positive, the last checkpoint found is used.  Int.
+    WARM_START_ITERATION            = None
+    #: Configuration: If true, the pathsets from the warm start checkpoint are also used, and iteration 1 only
+    #: finds paths for person trips without a valid warm start pathset.  Boolean.
+    WARM_START_PATHSETS             = None
+    #: Subdirectory of the output directory for the checkpoints, by iteration
+    CHECKPOINT_DIR                  = "ft_checkpoint_iter%d"
+    #: Checkpoint file for the non-dataframe assignment state
+    CHECKPOINT_STATE_FILE           = "state.pkl"
+    #: Checkpoint dataframes: Name -> file
+    CHECKPOINT_DATAFRAMES           = collections.OrderedDict([
+                                        ("trip_list_df",     "trip_list.pkl"),
+                                        ("veh_trips_df",     "veh_trips.pkl"),
+                                        ("pathset_paths_df", "pathset_paths.pkl"),
+                                        ("pathset_links_df", "pathset_links.pkl"),
+                                        ("bump_wait_df",     "bump_wait.pkl")])
+
+    #: Partitioned simulation phase: simulation steps 1-3 and grouping for path choice.
+    #: See :py:meth:`Assignment.simulate_partition_costs`
+    SIMULATION_PHASE_COSTS          = "costs"
+    #: Partitioned simulation phase: path choice and counting boards and alights.
+    #: See :py:meth:`Assignment.simulate_partition_choices`
+    SIMULATION_PHASE_CHOICES        = "choices"
+
     #: MSA the results that affect the next iteration to avoid oscillation: boards, alights, overcap onboard at stops
     MSA_RESULTS                     = False
 
@@ -251,9 +379,23 @@ class Assignment:
                       'debug_num_trips'                 :-1,
                       'prepend_route_id_to_trip_id'     :'False',
                       'number_of_processes'             :0,
+                      'pathset_stream_chunk_size'       :0,
+                      'random_seed'                     :0,
                       'bump_buffer'                     :5,
                       'bump_one_at_a_time'              :'False',
+                      'compact_dataframes'              :'False',
+                      'simulation_partition_size'       :0,
+                      'number_of_simulation_processes'  :0,
+                      'write_checkpoints'               :'False',
+                      'resume_iteration'                :0,
+                      'warm_start_dir'                  :'',
+                      'warm_start_iteration'            :0,
+                      'warm_start_pathsets'             :'False',
                       # pathfinding
+                      'access_dominance_dist_margin'    :0.0,
+                      'access_dominance_time_margin'    :0.0,
+                      'deterministic_engine'            :Assignment.DETERMINISTIC_ENGINE_LABELING,
+                      'lower_bound_pruning'             :'False',
                       'max_num_paths'                   :-1,
                       'min_path_probability'            :0.005,
                       'min_transfer_penalty'            :1.0,
@@ -261,9 +403,13 @@ class Assignment:
                       'overlap_split_transit'           :'False',
                       'overlap_variable'                :'count',
                       'pathfinding_type'                :Assignment.PATHFINDING_TYPE_STOCHASTIC,
+                      'prune_dominated_access_links'    :'False',
                       'stochastic_dispersion'           :1.0,
                       'stochastic_max_stop_process_count':-1,
                       'stochastic_pathset_size'         :1000,
+                      'stochastic_pathset_stop_no_new'  :-1,
+                      'stochastic_pathset_unseen_tolerance':0.0,
+                      'time_sorted_pathfinding'         :'False',
                       'time_window'                     :30,
                       'user_class_function'             :'generic_user_class'
                      })
@@ -294,11 +440,25 @@ class Assignment:
         Assignment.DEBUG_NUM_TRIPS               = parser.getint    ('fasttrips','debug_num_trips')
         Assignment.PREPEND_ROUTE_ID_TO_TRIP_ID   = parser.getboolean('fasttrips','prepend_route_id_to_trip_id')
         Assignment.NUMBER_OF_PROCESSES           = parser.getint    ('fasttrips','number_of_processes')
+        Assignment.PATHSET_STREAM_CHUNK_SIZE     = parser.getint    ('fasttrips','pathset_stream_chunk_size')
+        Assignment.RANDOM_SEED                   = parser.getint    ('fasttrips','random_seed')
         Assignment.BUMP_BUFFER = datetime.timedelta(
                                          minutes = parser.getfloat  ('fasttrips','bump_buffer'))
         Assignment.BUMP_ONE_AT_A_TIME            = parser.getboolean('fasttrips','bump_one_at_a_time')
+        Assignment.COMPACT_DATAFRAMES            = parser.getboolean('fasttrips','compact_dataframes')
+        Assignment.SIMULATION_PARTITION_SIZE     = parser.getint    ('fasttrips','simulation_partition_size')
+        Assignment.NUMBER_OF_SIMULATION_PROCESSES= parser.getint    ('fasttrips','number_of_simulation_processes')
+        Assignment.WRITE_CHECKPOINTS             = parser.getboolean('fasttrips','write_checkpoints')
+        Assignment.RESUME_ITERATION              = parser.getint    ('fasttrips','resume_iteration')
+        Assignment.WARM_START_DIR                = parser.get       ('fasttrips','warm_start_dir')
+        Assignment.WARM_START_ITERATION          = parser.getint    ('fasttrips','warm_start_iteration')
+        Assignment.WARM_START_PATHSETS           = parser.getboolean('fasttrips','warm_start_pathsets')
 
         # pathfinding
+        Assignment.ACCESS_DOMINANCE_DIST_MARGIN  = parser.getfloat  ('pathfinding','access_dominance_dist_margin')
+        Assignment.ACCESS_DOMINANCE_TIME_MARGIN  = parser.getfloat  ('pathfinding','access_dominance_time_margin')
+        Assignment.DETERMINISTIC_ENGINE          = parser.get       ('pathfinding','deterministic_engine')
+        Assignment.LOWER_BOUND_PRUNING           = parser.getboolean('pathfinding','lower_bound_pruning')
         Assignment.MAX_NUM_PATHS                 = parser.getint    ('pathfinding','max_num_paths')
         Assignment.MIN_PATH_PROBABILITY          = parser.getfloat  ('pathfinding','min_path_probability')
         PathSet.MIN_TRANSFER_PENALTY             = parser.getfloat  ('pathfinding','min_transfer_penalty')
@@ -309,13 +469,22 @@ class Assignment:
         assert(Assignment.PATHFINDING_TYPE in [Assignment.PATHFINDING_TYPE_STOCHASTIC, \
                                                Assignment.PATHFINDING_TYPE_DETERMINISTIC, \
                                                Assignment.PATHFINDING_TYPE_READ_FILE])
+        Assignment.PRUNE_DOMINATED_ACCESS_LINKS  = parser.getboolean('pathfinding','prune_dominated_access_links')
         Assignment.STOCH_DISPERSION              = parser.getfloat  ('pathfinding','stochastic_dispersion')
         Assignment.STOCH_MAX_STOP_PROCESS_COUNT  = parser.getint    ('pathfinding','stochastic_max_stop_process_count')
         Assignment.STOCH_PATHSET_SIZE            = parser.getint    ('pathfinding','stochastic_pathset_size')
+        Assignment.STOCH_PATHSET_STOP_NO_NEW     = parser.getint    ('pathfinding','stochastic_pathset_stop_no_new')
+        Assignment.STOCH_PATHSET_UNSEEN_TOLERANCE= parser.getfloat  ('pathfinding','stochastic_pathset_unseen_tolerance')
+        Assignment.TIME_SORTED_PATHFINDING       = parser.getboolean('pathfinding','time_sorted_pathfinding')
         Assignment.TIME_WINDOW = datetime.timedelta(
                                          minutes = parser.getfloat  ('pathfinding','time_window'))
         PathSet.USER_CLASS_FUNCTION              = parser.get       ('pathfinding','user_class_function')
 
+        if Assignment.DETERMINISTIC_ENGINE not in Assignment.DETERMINISTIC_ENGINE_OPTIONS:
+            msg = "pathfinding.deterministic_engine [%s] not defined. Expected values: %s" % (Assignment.DETERMINISTIC_ENGINE, str(Assignment.DETERMINISTIC_ENGINE_OPTIONS))
+            FastTripsLogger.fatal(msg)
+            raise ConfigurationError(config_fullpath, msg)
+
         if PathSet.OVERLAP_VARIABLE not in PathSet.OVERLAP_VARIABLE_OPTIONS:
             msg = "pathfinding.overlap_variable [%s] not defined. Expected values: %s" % (PathSet.OVERLAP_VARIABLE, str(PathSet.OVERLAP_VARIABLE_OPTIONS))
             FastTripsLogger.fatal(msg)
@@ -358,11 +527,25 @@ class Assignment:
         parser.set('fasttrips','debug_num_trips',               '%d' % Assignment.DEBUG_NUM_TRIPS)
         parser.set('fasttrips','prepend_route_id_to_trip_id',   'True' if Assignment.PREPEND_ROUTE_ID_TO_TRIP_ID else 'False')
         parser.set('fasttrips','number_of_processes',           '%d' % Assignment.NUMBER_OF_PROCESSES)
+        parser.set('fasttrips','pathset_stream_chunk_size',     '%d' % Assignment.PATHSET_STREAM_CHUNK_SIZE)
+        parser.set('fasttrips','random_seed',                   '%d' % Assignment.RANDOM_SEED)
         parser.set('fasttrips','bump_buffer',                   '%f' % (Assignment.BUMP_BUFFER.total_seconds()/60.0))
         parser.set('fasttrips','bump_one_at_a_time',            'True' if Assignment.BUMP_ONE_AT_A_TIME else 'False')
+        parser.set('fasttrips','compact_dataframes',            'True' if Assignment.COMPACT_DATAFRAMES else 'False')
+        parser.set('fasttrips','simulation_partition_size',     '%d' % Assignment.SIMULATION_PARTITION_SIZE)
+        parser.set('fasttrips','number_of_simulation_processes','%d' % Assignment.NUMBER_OF_SIMULATION_PROCESSES)
+        parser.set('fasttrips','write_checkpoints',             'True' if Assignment.WRITE_CHECKPOINTS else 'False')
+        parser.set('fasttrips','resume_iteration',              '%d' % Assignment.RESUME_ITERATION)
+        parser.set('fasttrips','warm_start_dir',                Assignment.WARM_START_DIR)
+        parser.set('fasttrips','warm_start_iteration',          '%d' % Assignment.WARM_START_ITERATION)
+        parser.set('fasttrips','warm_start_pathsets',           'True' if Assignment.WARM_START_PATHSETS else 'False')
 
         #pathfinding
         parser.add_section('pathfinding')
+        parser.set('pathfinding','access_dominance_dist_margin','%f' % Assignment.ACCESS_DOMINANCE_DIST_MARGIN)
+        parser.set('pathfinding','access_dominance_time_margin','%f' % Assignment.ACCESS_DOMINANCE_TIME_MARGIN)
+        parser.set('pathfinding','deterministic_engine',        Assignment.DETERMINISTIC_ENGINE)
+        parser.set('pathfinding','lower_bound_pruning',         'True' if Assignment.LOWER_BOUND_PRUNING else 'False')
         parser.set('pathfinding','max_num_paths',               '%d' % Assignment.MAX_NUM_PATHS)
         parser.set('pathfinding','min_path_probability',        '%f' % Assignment.MIN_PATH_PROBABILITY)
         parser.set('pathfinding','min_transfer_penalty',        '%f' % PathSet.MIN_TRANSFER_PENALTY)
@@ -370,9 +553,13 @@ class Assignment:
         parser.set('pathfinding','overlap_split_transit',       'True' if PathSet.OVERLAP_SPLIT_TRANSIT else 'False')
         parser.set('pathfinding','overlap_variable',            '%s' % PathSet.OVERLAP_VARIABLE)
         parser.set('pathfinding','pathfinding_type',            Assignment.PATHFINDING_TYPE)
+        parser.set('pathfinding','prune_dominated_access_links','True' if Assignment.PRUNE_DOMINATED_ACCESS_LINKS else 'False')
         parser.set('pathfinding','stochastic_dispersion',       '%f' % Assignment.STOCH_DISPERSION)
         parser.set('pathfinding','stochastic_max_stop_process_count', '%d' % Assignment.STOCH_MAX_STOP_PROCESS_COUNT)
         parser.set('pathfinding','stochastic_pathset_size',     '%d' % Assignment.STOCH_PATHSET_SIZE)
+        parser.set('pathfinding','stochastic_pathset_stop_no_new', '%d' % Assignment.STOCH_PATHSET_STOP_NO_NEW)
+        parser.set('pathfinding','stochastic_pathset_unseen_tolerance', '%f' % Assignment.STOCH_PATHSET_UNSEEN_TOLERANCE)
+        parser.set('pathfinding','time_sorted_pathfinding',     'True' if Assignment.TIME_SORTED_PATHFINDING else 'False')
         parser.set('pathfinding','time_window',                 '%f' % (Assignment.TIME_WINDOW.total_seconds()/60.0))
         parser.set('pathfinding','user_class_function',         '%s' % PathSet.USER_CLASS_FUNCTION)
 
@@ -387,25 +574,22 @@ class Assignment:
         """
         FastTripsLogger.debug("Initializing fasttrips extension for process number %d" % process_number)
 
-        # this may not be set yet if it is iter1
-        overcap_col = Trip.SIM_COL_VEH_OVERCAP
-        if Assignment.MSA_RESULTS:
-            overcap_col = Trip.SIM_COL_VEH_MSA_OVERCAP
-
-        if overcap_col not in list(stop_times_df.columns.values):
-            stop_times_df[overcap_col] = 0
+        supply_df = Assignment.get_extension_stop_times(stop_times_df)
 
-        FastTripsLogger.debug("initialize_fasttrips_extension() overcap sum: %d" % stop_times_df[overcap_col].sum())
+        FastTripsLogger.debug("initialize_fasttrips_extension() overcap sum: %d" % supply_df[Trip.SIM_COL_VEH_OVERCAP].sum())
         FastTripsLogger.debug("initialize_fasttrips_extension() STOPTIMES_COLUMN_DEPARTURE_TIME_MIN len: %d mean: %f" % \
-                              (len(stop_times_df), stop_times_df[Trip.STOPTIMES_COLUMN_DEPARTURE_TIME_MIN].mean()))
+                              (len(supply_df), supply_df[Trip.STOPTIMES_COLUMN_DEPARTURE_TIME_MIN].mean()))
+
+        # pass the ID strings directly if we have them; otherwise the extension reads them from the intermediate files
+        for namespace in IdRegistry.EXTENSION_NAMESPACES:
+            if namespace not in IdRegistry.extension_tables: continue
+            (id_nums, id_strs) = IdRegistry.extension_tables[namespace]
+            _fasttrips.initialize_ids(namespace, id_nums, id_strs)
 
         _fasttrips.initialize_supply(output_dir, process_number,
-                                     stop_times_df[[Trip.STOPTIMES_COLUMN_TRIP_ID_NUM,
-                                                    Trip.STOPTIMES_COLUMN_STOP_SEQUENCE,
-                                                    Trip.STOPTIMES_COLUMN_STOP_ID_NUM]].as_matrix().astype('int32'),
-                                     stop_times_df[[Trip.STOPTIMES_COLUMN_ARRIVAL_TIME_MIN,
-                                                    Trip.STOPTIMES_COLUMN_DEPARTURE_TIME_MIN,
-                                                    overcap_col]].as_matrix().astype('float64'))
+                                     supply_df[Assignment.EXTENSION_STOP_TIMES_INDEX_COLUMNS].as_matrix().astype('int32'),
+                                     supply_df[Assignment.EXTENSION_STOP_TIMES_DATA_COLUMNS].as_matrix().astype('float64'))
+        Assignment.extension_stop_times_df = supply_df
 
         _fasttrips.initialize_parameters(Assignment.TIME_WINDOW.total_seconds()/60.0,
                                          Assignment.BUMP_BUFFER.total_seconds()/60.0,
@@ -413,7 +597,75 @@ class Assignment:
                                          Assignment.STOCH_DISPERSION,
                                          Assignment.STOCH_MAX_STOP_PROCESS_COUNT,
                                          Assignment.MAX_NUM_PATHS,
-                                         Assignment.MIN_PATH_PROBABILITY)
+                                         Assignment.MIN_PATH_PROBABILITY,
+                                         Assignment.STOCH_PATHSET_STOP_NO_NEW,
+                                         Assignment.STOCH_PATHSET_UNSEEN_TOLERANCE,
+                                         Assignment.DETERMINISTIC_ENGINE_OPTIONS.index(Assignment.DETERMINISTIC_ENGINE),
+                                         1 if Assignment.LOWER_BOUND_PRUNING else 0,
+                                         Assignment.RANDOM_SEED)
+
+    @staticmethod
+    def get_extension_stop_times(stop_times_df):
+        """
+        Returns the subset of the given stop times that the fasttrips extension uses, with columns
+        :py:attr:`Assignment.EXTENSION_STOP_TIMES_INDEX_COLUMNS` + :py:attr:`Assignment.EXTENSION_STOP_TIMES_DATA_COLUMNS`.
+        The overcap column is the MSA version if :py:attr:`Assignment.MSA_RESULTS`.
+        """
+        # this may not be set yet if it is iter1
+        overcap_col = Trip.SIM_COL_VEH_OVERCAP
+        if Assignment.MSA_RESULTS:
+            overcap_col = Trip.SIM_COL_VEH_MSA_OVERCAP
+
+        if overcap_col not in list(stop_times_df.columns.values):
+            stop_times_df[overcap_col] = 0
+
+        supply_df = stop_times_df[Assignment.EXTENSION_STOP_TIMES_INDEX_COLUMNS +
+                                  [Trip.STOPTIMES_COLUMN_ARRIVAL_TIME_MIN,
+                                   Trip.STOPTIMES_COLUMN_DEPARTURE_TIME_MIN,
+                                   overcap_col]].copy()
+        supply_df.columns = Assignment.EXTENSION_STOP_TIMES_INDEX_COLUMNS + Assignment.EXTENSION_STOP_TIMES_DATA_COLUMNS
+        return supply_df
+
+    @staticmethod
+    def update_fasttrips_extension(process_number, output_dir, stop_times_df):
+        """
+        Updates the network supply in the C++ fasttrips extension in this process by sending only
+        the stop times for which arrival time, departure time or overcap changed since the last time
+        the supply was sent.
+
+        If the extension hasn't been initialized in this process, or if the set of stop times has changed,
+        this falls back to :py:meth:`Assignment.initialize_fasttrips_extension`.
+        """
+        if type(Assignment.extension_stop_times_df) == type(None):
+            Assignment.initialize_fasttrips_extension(process_number, output_dir, stop_times_df)
+            return
+
+        supply_df = Assignment.get_extension_stop_times(stop_times_df)
+        diff_df   = pandas.merge(left     =supply_df,
+                                 right    =Assignment.extension_stop_times_df,
+                                 on       =Assignment.EXTENSION_STOP_TIMES_INDEX_COLUMNS,
+                                 how      ="outer",
+                                 suffixes =["","_prev"],
+                                 indicator=True)
+
+        # new or removed stop times -- start over
+        if (diff_df["_merge"] != "both").any():
+            FastTripsLogger.info("update_fasttrips_extension(): stop times changed; reinitializing extension")
+            Assignment.initialize_fasttrips_extension(process_number, output_dir, stop_times_df)
+            return
+
+        changed = numpy.zeros(len(diff_df), dtype=bool)
+        for col in Assignment.EXTENSION_STOP_TIMES_DATA_COLUMNS:
+            changed = changed | (diff_df[col] != diff_df["%s_prev" % col]).values
+        diff_df = diff_df.loc[changed]
+
+        num_updated = 0
+        if len(diff_df) > 0:
+            num_updated = _fasttrips.update_stop_times(
+                diff_df[Assignment.EXTENSION_STOP_TIMES_INDEX_COLUMNS].as_matrix().astype('int32'),
+                diff_df[Assignment.EXTENSION_STOP_TIMES_DATA_COLUMNS].as_matrix().astype('float64'))
+        FastTripsLogger.info("update_fasttrips_extension(): updated %d of %d stop times" % (num_updated, len(supply_df)))
+        Assignment.extension_stop_times_df = supply_df
 
     @staticmethod
     def set_fasttrips_bump_wait(bump_wait_df):
@@ -528,48 +780,109 @@ class Assignment:
     def assign_paths(output_dir, FT):
         """
         Finds the paths for the passengers.
-        """
-        Assignment.write_configuration(output_dir)
 
-        # write the initial load profile, iteration 0
-        veh_trips_df     = FT.trips.get_full_trips()
-        pathset_paths_df = None
-        pathset_links_df = None
+        The time and memory use of each stage are recorded with :py:class:`Stage` and written at the end of each iteration.
 
-        # write 0-iter vehicle trips
-        Assignment.write_vehicle_trips(output_dir, 0, veh_trips_df)
+        If the simulation is partitioned (see :py:meth:`Assignment.simulate_partitioned`), the pathsets are kept on disk
+        in partitions across iterations rather than in memory.
+        """
+        # if the simulation is partitioned, the pathsets are kept in these partitions
+        partitioned = Assignment.SIMULATION and (Assignment.SIMULATION_PARTITION_SIZE > 0 or Assignment.NUMBER_OF_SIMULATION_PROCESSES > 1)
+        partitions  = []
+        if partitioned and FT.trips.has_capacity_configured():
+            msg = "Partitioned simulation (simulation_partition_size, number_of_simulation_processes) doesn't support vehicle capacity; " + \
+                  "remove the capacity columns from %s or simulate without partitions" % Trip.INPUT_VEHICLES_FILE
+            FastTripsLogger.fatal(msg)
+            raise ConfigurationError(os.path.join(Assignment.INPUT_NETWORK_DIR, Assignment.CONFIGURATION_FILE), msg)
 
-        for iteration in range(1,Assignment.ITERATION_FLAG+1):
+        with Stage(Stage.STAGE_WRITE_INTERMEDIATES):
+            Assignment.write_configuration(output_dir)
+
+        if Assignment.RESUME_ITERATION > 0:
+            (pathset_paths_df, pathset_links_df, veh_trips_df) = Assignment.read_checkpoint(output_dir, Assignment.RESUME_ITERATION, FT)
+            FT.trips.stop_times_df = veh_trips_df
+        else:
+            # write the initial load profile, iteration 0
+            veh_trips_df     = FT.trips.get_full_trips()
+            pathset_paths_df = None
+            pathset_links_df = None
+            if Assignment.WARM_START_DIR:
+                (pathset_paths_df, pathset_links_df, veh_trips_df) = Assignment.read_warm_start(FT, veh_trips_df)
+                FT.trips.stop_times_df = veh_trips_df
+            (pathset_links_df, veh_trips_df) = Assignment.compact_simulation_dataframes(pathset_links_df, veh_trips_df)
+
+            # write 0-iter vehicle trips
+            with Stage(Stage.STAGE_WRITE_OUTPUT) as stage:
+                Assignment.write_vehicle_trips(output_dir, 0, veh_trips_df)
+                stage.rows = len(veh_trips_df)
+
+        for iteration in range(Assignment.RESUME_ITERATION+1,Assignment.ITERATION_FLAG+1):
             FastTripsLogger.info("***************************** ITERATION %d **************************************" % iteration)
 
             if (Assignment.PATHFINDING_TYPE == Assignment.PATHFINDING_TYPE_READ_FILE) and (iteration == 1):
                 FastTripsLogger.info("Reading paths from file")
-                (new_pathset_paths_df, new_pathset_links_df) = FT.passengers.read_passenger_pathsets(output_dir, include_asgn=False)
-                num_paths_found = Assignment.number_of_pathsets(new_pathset_paths_df)
+                with Stage(Stage.STAGE_PATHFINDING, iteration) as stage:
+                    (new_pathset_paths_df, new_pathset_links_df) = FT.passengers.read_passenger_pathsets(output_dir, include_asgn=False)
+                    num_paths_found = Assignment.number_of_pathsets(new_pathset_paths_df)
+                    stage.rows = num_paths_found
 
             else:
-                num_paths_found = Assignment.generate_pathsets(FT, pathset_paths_df, veh_trips_df, output_dir, iteration)
-                (new_pathset_paths_df, new_pathset_links_df) = FT.passengers.setup_passenger_pathsets(iteration, FT.stops,
-                                                                                                      FT.trips.trip_id_df, FT.trips.trips_df, FT.routes.modes_df,
-                                                                                                      FT.transfers, FT.tazs, Assignment.PREPEND_ROUTE_ID_TO_TRIP_ID)
-                # write pathfinding results to special PF results file
-                Passenger.write_paths(output_dir, 0, 0, new_pathset_paths_df, False, Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
-                Passenger.write_paths(output_dir, 0, 0, new_pathset_links_df, True,  Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+                # pathfinding only needs the chosen paths, so don't read all the partitioned pathsets
+                pathfinding_paths_df = pathset_paths_df
+                if len(partitions) > 0:
+                    (pathfinding_paths_df, unused) = Assignment.read_chosen_partitions(output_dir, partitions)
+
+                with Stage(Stage.STAGE_PATHFINDING, iteration) as stage:
+                    (num_paths_found, new_pathset_paths_df, new_pathset_links_df) = \
+                        Assignment.generate_pathsets(FT, pathfinding_paths_df, veh_trips_df, output_dir, iteration)
+                    pathfinding_paths_df = None
+                    stage.rows = num_paths_found
+
+                # if they weren't streamed, setup and write them now
+                if new_pathset_paths_df is None and len(FT.passengers.pathfind_trip_list_df) > 0:
+                    with Stage(Stage.STAGE_SETUP_PATHSETS, iteration) as stage:
+                        (new_pathset_paths_df, new_pathset_links_df) = FT.passengers.setup_passenger_pathsets(iteration, FT.stops,
+                                                                                                              FT.trips.trip_id_df, FT.trips.trips_df, FT.routes.modes_df,
+                                                                                                              FT.transfers, FT.tazs, Assignment.PREPEND_ROUTE_ID_TO_TRIP_ID)
+                        stage.rows = len(new_pathset_links_df)
+
+                    # write pathfinding results to special PF results file
+                    with Stage(Stage.STAGE_WRITE_PATHS, iteration) as stage:
+                        Passenger.write_paths(output_dir, 0, 0, new_pathset_paths_df, False, Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+                        Passenger.write_paths(output_dir, 0, 0, new_pathset_links_df, True,  Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+                        stage.rows = len(new_pathset_paths_df) + len(new_pathset_links_df)
 
                 # write performance info right away in case we crash, quit, etc
                 FT.performance.write(output_dir, iteration)
 
-            if Assignment.PATHFINDING_EVERYONE:
+            if partitioned:
+                (partitions, num_pathsets) = Assignment.merge_pathset_partitions(FT, output_dir, iteration, partitions,
+                                                                                 pathset_paths_df, pathset_links_df,
+                                                                                 new_pathset_paths_df, new_pathset_links_df)
+                if not Assignment.PATHFINDING_EVERYONE:
+                    num_paths_found = num_pathsets
+                # they're on disk now
+                pathset_paths_df     = None
+                pathset_links_df     = None
+                new_pathset_paths_df = None
+                new_pathset_links_df = None
+            elif Assignment.PATHFINDING_EVERYONE:
                 pathset_paths_df = new_pathset_paths_df
                 pathset_links_df = new_pathset_links_df
             else:
-                (pathset_paths_df, pathset_links_df) = Assignment.merge_pathsets(FT.passengers.pathfind_trip_list_df, pathset_paths_df, pathset_links_df, new_pathset_paths_df, new_pathset_links_df)
+                # no new pathsets if everyone arrived or had a warm start pathset
+                if type(new_pathset_paths_df) != type(None):
+                    (pathset_paths_df, pathset_links_df) = Assignment.merge_pathsets(FT.passengers.pathfind_trip_list_df, pathset_paths_df, pathset_links_df, new_pathset_paths_df, new_pathset_links_df)
                 num_paths_found = Assignment.number_of_pathsets(pathset_paths_df)
 
             if Assignment.SIMULATION:
                 FastTripsLogger.info("****************************** SIMULATING *****************************")
-                (num_passengers_arrived, pathset_paths_df, pathset_links_df, veh_trips_df) = \
-                    Assignment.simulate(FT, output_dir, iteration, pathset_paths_df, pathset_links_df, veh_trips_df)
+                if partitioned:
+                    (num_passengers_arrived, veh_trips_df) = \
+                        Assignment.simulate_partitioned(FT, output_dir, iteration, partitions, veh_trips_df)
+                else:
+                    (num_passengers_arrived, pathset_paths_df, pathset_links_df, veh_trips_df) = \
+                        Assignment.simulate(FT, output_dir, iteration, pathset_paths_df, pathset_links_df, veh_trips_df)
             else:
                 # if we're not simulating, we can still calculate costs and choose paths
                 FastTripsLogger.info("****************************** CHOOSING PATHS WITHOUT SIMULATING *****************************")
@@ -580,10 +893,17 @@ class Assignment:
             # Set new schedule
             FT.trips.stop_times_df = veh_trips_df
 
-            Assignment.write_vehicle_trips(output_dir, iteration, veh_trips_df)
+            with Stage(Stage.STAGE_WRITE_OUTPUT, iteration) as stage:
+                Assignment.write_vehicle_trips(output_dir, iteration, veh_trips_df)
+                stage.rows = len(veh_trips_df)
 
-            if Assignment.OUTPUT_PASSENGER_TRAJECTORIES:
-                PathSet.write_path_times(Passenger.get_chosen_links(pathset_links_df), output_dir)
+                if Assignment.OUTPUT_PASSENGER_TRAJECTORIES:
+                    if partitioned:
+                        (unused, chosen_links_df) = Assignment.read_chosen_partitions(output_dir, partitions)
+                    else:
+                        chosen_links_df = Passenger.get_chosen_links(pathset_links_df)
+                    PathSet.write_path_times(chosen_links_df, output_dir)
+                    del chosen_links_df
 
             # capacity gap stuff
             num_bumped_passengers = num_paths_found - num_passengers_arrived
@@ -598,11 +918,258 @@ class Assignment:
             FastTripsLogger.info("  MISSED PASSENGERS:         %10d" % num_bumped_passengers)
             FastTripsLogger.info("  CAPACITY GAP:              %10.5f" % capacity_gap)
 
+            if Assignment.WRITE_CHECKPOINTS:
+                with Stage(Stage.STAGE_WRITE_OUTPUT, iteration):
+                    Assignment.write_checkpoint(output_dir, iteration, FT, pathset_paths_df, pathset_links_df, veh_trips_df, partitions)
+
+            # write stage performance info right away too
+            Stage.write(output_dir)
+
             if False and capacity_gap < 0.001:
                 break
 
         # end for loop
 
+    @staticmethod
+    def write_checkpoint(output_dir, iteration, FT, pathset_paths_df, pathset_links_df, veh_trips_df, partitions):
+        """
+        Writes the assignment state at the end of the given iteration to :py:attr:`Assignment.CHECKPOINT_DIR`
+        so that the assignment can be resumed from there via :py:meth:`Assignment.read_checkpoint`.
+
+        The dataframes are pickled (a compact binary form that keeps dtypes, categoricals and indices, so the
+        resumed state is identical); the rest of the state that carries across iterations is pickled together
+        in :py:attr:`Assignment.CHECKPOINT_STATE_FILE`.  The path choice random numbers are a function of the
+        seed, iteration and passenger trip (see :py:meth:`Util.philox_uniform`), so they don't need saving.
+
+        If the simulation is partitioned, the pathsets are in the given simulation *partitions* instead of the
+        dataframes, and the partition files are copied as they are.
+        """
+        checkpoint_dir = os.path.join(output_dir, Assignment.CHECKPOINT_DIR % iteration)
+        state_filename = os.path.join(checkpoint_dir, Assignment.CHECKPOINT_STATE_FILE)
+        if not os.path.exists(checkpoint_dir):
+            os.mkdir(checkpoint_dir)
+        elif os.path.exists(state_filename):
+            os.remove(state_filename)
+
+        checkpoint_dfs = { "trip_list_df"    : FT.passengers.trip_list_df,
+                           "veh_trips_df"    : veh_trips_df,
+                           "pathset_paths_df": pathset_paths_df,
+                           "pathset_links_df": pathset_links_df,
+                           "bump_wait_df"    : Assignment.bump_wait_df }
+        written = []
+        for df_name,df_file in Assignment.CHECKPOINT_DATAFRAMES.iteritems():
+            if type(checkpoint_dfs[df_name]) == type(None): continue
+            checkpoint_dfs[df_name].to_pickle(os.path.join(checkpoint_dir, df_file))
+            written.append(df_name)
+
+        if len(partitions) > 0:
+            partition_dir = os.path.join(checkpoint_dir, Assignment.SIMULATION_PARTITION_DIR)
+            if not os.path.exists(partition_dir):
+                os.mkdir(partition_dir)
+            for partition in partitions:
+                for partition_file in Assignment.SIMULATION_PARTITION_FILES:
+                    shutil.copy(os.path.join(output_dir, Assignment.SIMULATION_PARTITION_DIR, partition_file % partition), partition_dir)
+
+        state = { "iteration"           : iteration,
+                  "dataframes"          : written,
+                  "partitions"          : [int(partition) for partition in partitions],
+                  "pathfinding_everyone": Assignment.PATHFINDING_EVERYONE,
+                  "bump_wait"           : Assignment.bump_wait }
+        # write this last so a checkpoint without it is incomplete
+        state_file = open(state_filename, 'wb')
+        cPickle.dump(state, state_file, cPickle.HIGHEST_PROTOCOL)
+        state_file.close()
+
+        FastTripsLogger.info("Wrote iteration %d checkpoint to %s" % (iteration, checkpoint_dir))
+
+    @staticmethod
+    def read_checkpoint(output_dir, iteration, FT):
+        """
+        Reads the assignment state written by :py:meth:`Assignment.write_checkpoint` at the end of the given
+        iteration, setting the state kept in :py:class:`Assignment` and :py:attr:`FT.passengers`.
+
+        Returns (pathset_paths_df, pathset_links_df, veh_trips_df)
+        """
+        (state, checkpoint_dfs) = Assignment.read_checkpoint_files(output_dir, iteration)
+
+        FT.passengers.trip_list_df      = checkpoint_dfs["trip_list_df"]
+        Assignment.bump_wait_df         = checkpoint_dfs["bump_wait_df"]
+        Assignment.bump_wait            = state["bump_wait"]
+        Assignment.PATHFINDING_EVERYONE = state["pathfinding_everyone"]
+
+        FastTripsLogger.info("Resuming after iteration %d from checkpoint in %s" % (iteration, output_dir))
+        return (checkpoint_dfs["pathset_paths_df"], checkpoint_dfs["pathset_links_df"], checkpoint_dfs["veh_trips_df"])
+
+    @staticmethod
+    def read_checkpoint_files(output_dir, iteration):
+        """
+        Reads the files written by :py:meth:`Assignment.write_checkpoint` at the end of the given iteration
+        in the given output directory.  If *iteration* isn't positive, reads the last checkpoint there.
+
+        Partitioned pathsets are read into the pathset dataframes, so the checkpoint can be used with or without partitions.
+
+        Returns (state dictionary, dictionary of dataframe name -> dataframe or None)
+        """
+        if iteration < 1:
+            checkpoint_prefix = Assignment.CHECKPOINT_DIR[:Assignment.CHECKPOINT_DIR.index("%")]
+            checkpoint_iters  = [int(filename[len(checkpoint_prefix):]) for filename in os.listdir(output_dir)
+                                 if filename.startswith(checkpoint_prefix) and filename[len(checkpoint_prefix):].isdigit()]
+            if len(checkpoint_iters) == 0:
+                raise ConfigurationError(output_dir, "No checkpoints found")
+            iteration = max(checkpoint_iters)
+
+        checkpoint_dir = os.path.join(output_dir, Assignment.CHECKPOINT_DIR % iteration)
+        state_filename = os.path.join(checkpoint_dir, Assignment.CHECKPOINT_STATE_FILE)
+        if not os.path.exists(state_filename):
+            raise ConfigurationError(state_filename, "Iteration %d checkpoint not found or incomplete" % iteration)
+
+        state_file = open(state_filename, 'rb')
+        state      = cPickle.load(state_file)
+        state_file.close()
+
+        checkpoint_dfs = {}
+        for df_name,df_file in Assignment.CHECKPOINT_DATAFRAMES.iteritems():
+            if df_name in state["dataframes"]:
+                checkpoint_dfs[df_name] = pandas.read_pickle(os.path.join(checkpoint_dir, df_file))
+            else:
+                checkpoint_dfs[df_name] = None
+
+        if len(state.get("partitions", [])) > 0:
+            partition_dfs = [Assignment.read_pathset_partition(checkpoint_dir, partition) for partition in state["partitions"]]
+            checkpoint_dfs["pathset_paths_df"] = pandas.concat([partition_df[0] for partition_df in partition_dfs], ignore_index=True)
+            checkpoint_dfs["pathset_links_df"] = pandas.concat([partition_df[1] for partition_df in partition_dfs], ignore_index=True)
+            del partition_dfs
+
+        FastTripsLogger.info("Read iteration %d checkpoint from %s" % (iteration, checkpoint_dir))
+        return (state, checkpoint_dfs)
+
+    @staticmethod
+    def read_warm_start(FT, veh_trips_df):
+        """
+        Reads the checkpoint from a previous run specified by :py:attr:`Assignment.WARM_START_DIR` and
+        :py:attr:`Assignment.WARM_START_ITERATION` and uses it to seed this run.  The previous run's network
+        may differ from this one (e.g. for a sensitivity test that changes a few routes), so everything is
+        matched by string IDs and renumbered:
+
+        * The vehicle loads are set for the stop times in *veh_trips_df* (trip ID, stop sequence, stop ID)
+          that were in the previous run; the others are empty.  Vehicle times are then updated for the loads.
+        * The bump wait information is kept for those same stop times and set in :py:attr:`Assignment.bump_wait_df`.
+        * If :py:attr:`Assignment.WARM_START_PATHSETS`, the pathsets are kept for the person trips in this
+          trip list for which every link is still valid, and are reset so they'll be chosen again.
+
+        Returns (pathset_paths_df, pathset_links_df, veh_trips_df), where the pathsets are None if not used.
+        """
+        (state, warm_dfs) = Assignment.read_checkpoint_files(Assignment.WARM_START_DIR, Assignment.WARM_START_ITERATION)
+        warm_veh_trips_df = warm_dfs["veh_trips_df"]
+
+        stop_time_cols = [Trip.STOPTIMES_COLUMN_TRIP_ID, Trip.STOPTIMES_COLUMN_STOP_SEQUENCE, Trip.STOPTIMES_COLUMN_STOP_ID]
+
+        # the vehicle load columns are those reset for empty vehicles
+        empty_df = pandas.DataFrame(index=[0])
+        Trip.reset_onboard(empty_df)
+        load_cols = [col for col in empty_df.columns.values if col in warm_veh_trips_df.columns.values]
+
+        load_dtypes  = veh_trips_df[load_cols].dtypes
+        veh_trips_df = pandas.merge(left =veh_trips_df.drop(load_cols, axis=1),
+                                    right=warm_veh_trips_df[stop_time_cols + load_cols],
+                                    how  ="left")
+        num_warm     = pandas.notnull(veh_trips_df[load_cols[0]]).sum()
+        veh_trips_df.fillna(value=empty_df[load_cols].iloc[0].to_dict(), inplace=True)
+        for col in load_cols:
+            veh_trips_df[col] = veh_trips_df[col].astype(load_dtypes[col])
+        veh_trips_df = Trip.update_trip_times(veh_trips_df, Assignment.MSA_RESULTS)
+        FastTripsLogger.info("Warm start: set vehicle loads for %d of %d stop times" % (num_warm, len(veh_trips_df)))
+
+        # bump wait: translate to string ids with the previous run's stop times, and back with this run's
+        warm_bump_wait_df = warm_dfs["bump_wait_df"]
+        if type(warm_bump_wait_df) != type(None):
+            num_cols        = [Trip.STOPTIMES_COLUMN_TRIP_ID_NUM, Trip.STOPTIMES_COLUMN_STOP_ID_NUM]
+            bump_wait_dtypes= warm_bump_wait_df.dtypes
+            warm_bump_wait_df = pandas.merge(left =warm_bump_wait_df,
+                                             right=warm_veh_trips_df[num_cols + stop_time_cols],
+                                             how  ="inner")
+            warm_bump_wait_df = pandas.merge(left =warm_bump_wait_df.drop(num_cols, axis=1),
+                                             right=veh_trips_df[num_cols + stop_time_cols],
+                                             how  ="inner")
+            warm_bump_wait_df = warm_bump_wait_df[list(bump_wait_dtypes.index)]
+            for col in num_cols:
+                warm_bump_wait_df[col] = warm_bump_wait_df[col].astype(bump_wait_dtypes[col])
+            Assignment.bump_wait_df = warm_bump_wait_df
+            FastTripsLogger.info("Warm start: kept %d bump wait stop times" % len(Assignment.bump_wait_df))
+
+        if not Assignment.WARM_START_PATHSETS or type(warm_dfs["pathset_paths_df"]) == type(None):
+            return (None, None, veh_trips_df)
+
+        (pathset_paths_df, pathset_links_df) = Assignment.renumber_warm_start_pathsets(FT, veh_trips_df, warm_dfs["pathset_paths_df"], warm_dfs["pathset_links_df"])
+        return (pathset_paths_df, pathset_links_df, veh_trips_df)
+
+    @staticmethod
+    def renumber_warm_start_pathsets(FT, veh_trips_df, pathset_paths_df, pathset_links_df):
+        """
+        Filters the given pathsets from a previous run to the person trips in this run's trip list with every link
+        still valid for this network (same stops, modes, and trip stop times), renumbers them for this run and clears the
+        simulation results so they're like pathsets that were just found.  See :py:meth:`Assignment.read_warm_start`.
+
+        Returns (pathset_paths_df, pathset_links_df)
+        """
+        trip_list_cols = [Passenger.TRIP_LIST_COLUMN_PERSON_ID, Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID]
+        num_warm_trips = Assignment.number_of_pathsets(pathset_paths_df)
+
+        # drop the simulation results, including the vehicle overcap attached by find_passenger_vehicle_times()
+        sim_cols = [getattr(Assignment, attr) for attr in dir(Assignment) if attr.startswith("SIM_COL_PAX_")] + \
+                   [Assignment.SIM_COL_MISSED_XFER, Trip.SIM_COL_VEH_OVERCAP]
+        pathset_paths_df = pathset_paths_df.drop([col for col in pathset_paths_df.columns.values if col in sim_cols], axis=1)
+        pathset_links_df = pathset_links_df.drop([col for col in pathset_links_df.columns.values if col in sim_cols], axis=1)
+
+        # renumber the person trips
+        pathset_paths_df = pandas.merge(left =pathset_paths_df.drop([Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM], axis=1),
+                                        right=FT.passengers.trip_list_df[trip_list_cols + [Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM]],
+                                        how  ="inner")
+        pathset_links_df = pandas.merge(left =pathset_links_df.drop([Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM], axis=1),
+                                        right=FT.passengers.trip_list_df[trip_list_cols + [Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM]],
+                                        how  ="inner")
+
+        # find invalid links: unknown stops or modes, or trip links that don't match this run's stop times
+        stop_index = pandas.Index(FT.stops.stop_id_df[Stop.STOPS_COLUMN_STOP_ID].values)
+        mode_index = pandas.Index(FT.routes.modes_df[Route.ROUTES_COLUMN_MODE].values)
+        invalid    = (stop_index.get_indexer(pathset_links_df["A_id"].values) < 0) | \
+                     (stop_index.get_indexer(pathset_links_df["B_id"].values) < 0) | \
+                     ((mode_index.get_indexer(pathset_links_df[Route.ROUTES_COLUMN_MODE].values) < 0) &
+                      pandas.notnull(pathset_links_df[Route.ROUTES_COLUMN_MODE]).values)
+
+        stop_times_index = pandas.MultiIndex.from_arrays([veh_trips_df[Trip.STOPTIMES_COLUMN_TRIP_ID].values,
+                                                          veh_trips_df[Trip.STOPTIMES_COLUMN_STOP_SEQUENCE].values,
+                                                          veh_trips_df[Trip.STOPTIMES_COLUMN_STOP_ID].values])
+        is_trip    = (pathset_links_df[Passenger.PF_COL_LINK_MODE] == PathSet.STATE_MODE_TRIP).values
+        for end in ["A","B"]:
+            end_index = pandas.MultiIndex.from_arrays([pathset_links_df[Passenger.PF_COL_TRIP_ID].values,
+                                                       pathset_links_df["%s_seq" % end].values,
+                                                       pathset_links_df["%s_id" % end].values])
+            invalid   = invalid | (is_trip & (stop_times_index.get_indexer(end_index) < 0))
+
+        invalid_ids = pathset_links_df.loc[invalid, Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM].unique()
+        pathset_paths_df = pathset_paths_df.loc[~pathset_paths_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM].isin(invalid_ids)]
+        pathset_links_df = pathset_links_df.loc[~pathset_links_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM].isin(invalid_ids)]
+
+        # renumber the stops, trips and modes
+        for end in ["A","B"]:
+            pathset_links_df = FT.stops.add_numeric_stop_id(pathset_links_df.drop(["%s_id_num" % end], axis=1), "%s_id" % end, "%s_id_num" % end)
+        pathset_links_df = FT.trips.add_numeric_trip_id(pathset_links_df.drop([Trip.TRIPS_COLUMN_TRIP_ID_NUM], axis=1),
+                                                        Trip.TRIPS_COLUMN_TRIP_ID, Trip.TRIPS_COLUMN_TRIP_ID_NUM)
+        pathset_links_df = FT.routes.add_numeric_mode_id(pathset_links_df.drop([Route.ROUTES_COLUMN_MODE_NUM], axis=1),
+                                                         Route.ROUTES_COLUMN_MODE, Route.ROUTES_COLUMN_MODE_NUM)
+
+        # they're like new pathsets now -- see merge_pathsets()
+        pathset_paths_df[Assignment.SIM_COL_PAX_CHOSEN ] = Assignment.CHOSEN_NOT_CHOSEN_YET
+        pathset_paths_df[Assignment.SIM_COL_MISSED_XFER] = 0
+        pathset_paths_df.sort_values(by=[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM, Passenger.PF_COL_PATH_NUM], inplace=True)
+        pathset_paths_df.reset_index(drop=True, inplace=True)
+        pathset_links_df.sort_values(by=[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM, Passenger.PF_COL_PATH_NUM, Passenger.PF_COL_LINK_NUM], inplace=True)
+        pathset_links_df.reset_index(drop=True, inplace=True)
+
+        FastTripsLogger.info("Warm start: kept pathsets for %d of %d person trips" % (Assignment.number_of_pathsets(pathset_paths_df), num_warm_trips))
+        return (pathset_paths_df, pathset_links_df)
+
     @staticmethod
     def filter_trip_list_to_not_arrived(trip_list_df, pathset_paths_df):
         """
@@ -626,6 +1193,37 @@ class Assignment:
         FastTripsLogger.debug("filter_trip_list_to_not_arrived(): trip_list_df_to_return len=%d head()=\n%s"  % (len(trip_list_df_to_return), trip_list_df_to_return.head().to_string()))
         return trip_list_df_to_return
 
+    @staticmethod
+    def sort_for_pathfinding(trip_list_df):
+        """
+        Returns the given trip list in the order its pathsets are found: as is, or by preferred time
+        (arrival time if that's the target, departure time otherwise) if :py:attr:`Assignment.TIME_SORTED_PATHFINDING`.
+        """
+        if not Assignment.TIME_SORTED_PATHFINDING:
+            return trip_list_df
+
+        pref_time_min = numpy.where(trip_list_df[Passenger.TRIP_LIST_COLUMN_TIME_TARGET] == 'arrival',
+                                    trip_list_df[Passenger.TRIP_LIST_COLUMN_ARRIVAL_TIME_MIN],
+                                    trip_list_df[Passenger.TRIP_LIST_COLUMN_DEPARTURE_TIME_MIN])
+        return trip_list_df.iloc[numpy.argsort(pref_time_min, kind='mergesort')]
+
+    @staticmethod
+    def create_pathsets(FT):
+        """
+        Creates a :py:class:`PathSet` for each person trip in :py:attr:`Passenger.trip_list_df`, in pathfinding order
+        (see :py:meth:`Assignment.sort_for_pathfinding`), and stores them with :py:meth:`Passenger.add_pathset`.
+
+        This is done for everyone in the first iteration -- including person trips that keep their warm start
+        pathsets, since they may need new ones later -- and in the first iteration after resuming from a checkpoint,
+        since the path objects aren't part of the checkpoint.  The order matters because :py:meth:`Passenger.setup_passenger_pathsets`
+        processes the pathsets in the order they were added.
+        """
+        trip_list_df = Assignment.sort_for_pathfinding(FT.passengers.trip_list_df)
+        path_cols    = list(trip_list_df.columns.values)
+        for path_tuple in trip_list_df.itertuples(index=False):
+            path_dict = dict(zip(path_cols, path_tuple))
+            FT.passengers.add_pathset(path_dict[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM], PathSet(path_dict))
+
     @staticmethod
     def generate_pathsets(FT, pathset_paths_df, veh_trips_df, output_dir, iteration):
         """
@@ -634,13 +1232,19 @@ class Assignment:
         Generates paths sets for those person trips using deterministic trip-based shortest path (TBSP) or
         stochastic trip-based hyperpath (TBHP).
 
-        Returns the number of pathsets found.
+        If :py:attr:`Assignment.PATHSET_STREAM_CHUNK_SIZE` is positive, the pathsets are streamed via
+        :py:meth:`Assignment.stream_pathsets` as they're found.
+
+        Returns (number of pathsets found, pathset_paths_df, pathset_links_df), where the dataframes are
+        the streamed pathsets (as described in :py:meth:`Passenger.setup_passenger_pathsets`), or None if not streaming.
         """
         FastTripsLogger.info("**************************** GENERATING PATHS ****************************")
         start_time          = datetime.datetime.now()
         process_dict        = {}  # workernum -> {"process":process, "alive":alive bool, "done":done bool, "working_on":(person_id, trip_list_num)}
         todo_queue          = None
         done_queue          = None
+        stream_trip_list_ids= []  # trip list ids with completed pathfinding that haven't been streamed yet
+        stream_dfs          = ([], [])  # streamed (pathset_paths_df list, pathset_links_df list)
 
         # We only need to do this once
         if iteration == 1:
@@ -663,15 +1267,26 @@ class Assignment:
             Assignment.PATHFINDING_EVERYONE = False
             FastTripsLogger.info("Finding paths for trips for those that haven't arrived yet")
             FT.passengers.pathfind_trip_list_df = Assignment.filter_trip_list_to_not_arrived(FT.passengers.trip_list_df, pathset_paths_df)
+        elif iteration == 1 and Assignment.WARM_START_DIR:
+            # keep the warm start vehicle loads
+            if type(pathset_paths_df) != type(None):
+                Assignment.PATHFINDING_EVERYONE = False
+                FastTripsLogger.info("Finding paths for trips without warm start pathsets")
+                FT.passengers.pathfind_trip_list_df = FT.passengers.trip_list_df.loc[
+                    ~FT.passengers.trip_list_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM].isin(pathset_paths_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM])]
         else:
             PATHFINDING_EVERYONE = True
             # we're starting over with empty vehicles
             Trip.reset_onboard(veh_trips_df)
 
+        # first iteration, or resuming from a checkpoint -- create path objects for everyone
+        if len(FT.passengers.id_to_pathset) == 0:
+            Assignment.create_pathsets(FT)
+
         est_paths_to_find   = len(FT.passengers.pathfind_trip_list_df)
         FastTripsLogger.info("Finding pathsets for %d trips" % est_paths_to_find)
         if est_paths_to_find == 0:
-            return 0
+            return (0, None, None)
 
         info_freq           = pow(10, int(math.log(est_paths_to_find+1,10)-2))
         if info_freq < 1: info_freq = 1
@@ -703,26 +1318,22 @@ class Assignment:
                     }
                     process_dict[process_idx]["process"].start()
             else:
-                Assignment.initialize_fasttrips_extension(0, output_dir, veh_trips_df)
+                # the extension lives in this process so after the first iteration, only send the changes
+                Assignment.update_fasttrips_extension(0, output_dir, veh_trips_df)
 
             # process tasks or send tasks to workers for processing
             num_paths_found_prev  = 0
             num_paths_found_now   = 0
-            path_cols             = list(FT.passengers.pathfind_trip_list_df.columns.values)
-            for path_tuple in FT.passengers.pathfind_trip_list_df.itertuples(index=False):
-                path_dict         = dict(zip(path_cols, path_tuple))
-                trip_list_id      = path_dict[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM]
-                person_id         = path_dict[Passenger.TRIP_LIST_COLUMN_PERSON_ID]
+            pathfind_trip_list_df = Assignment.sort_for_pathfinding(FT.passengers.pathfind_trip_list_df)
+            for path_tuple in pathfind_trip_list_df[[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM,
+                                                     Passenger.TRIP_LIST_COLUMN_PERSON_ID]].itertuples(index=False):
+                trip_list_id      = path_tuple[0]
+                person_id         = path_tuple[1]
                 trace_person      = person_id in Assignment.TRACE_PERSON_IDS
 
                 if Assignment.DEBUG_TRACE_ONLY and not trace_person: continue
 
-                # first iteration -- create path objects
-                if iteration==1:
-                    trip_pathset = PathSet(path_dict)
-                    FT.passengers.add_pathset(trip_list_id, trip_pathset)
-                else:
-                    trip_pathset = FT.passengers.get_pathset(trip_list_id)
+                trip_pathset = FT.passengers.get_pathset(trip_list_id)
 
                 if not trip_pathset.goes_somewhere(): continue
 
@@ -748,6 +1359,12 @@ class Assignment:
                     if trip_pathset.path_found():
                         num_paths_found_now += 1
 
+                    if Assignment.PATHSET_STREAM_CHUNK_SIZE > 0:
+                        stream_trip_list_ids.append(trip_list_id)
+                        if len(stream_trip_list_ids) >= Assignment.PATHSET_STREAM_CHUNK_SIZE:
+                            Assignment.stream_pathsets(FT, output_dir, iteration, stream_trip_list_ids, stream_dfs)
+                            stream_trip_list_ids = []
+
                     if num_paths_found_now % info_freq == 0:
                         time_elapsed = datetime.datetime.now() - start_time
                         FastTripsLogger.info(" %6d / %6d passenger paths found.  Time elapsed: %2dh:%2dm:%2ds" % (
@@ -763,7 +1380,9 @@ class Assignment:
                     todo_queue.put('DONE')
 
                 # get results
-                done_procs = 0  # where done means not alive
+                # a worker is finished when it sends DONE; if it quits without doing so, it's only counted once the queue
+                # is quiet, since whatever it sent before quitting may still be in the queue
+                done_procs = 0
                 while done_procs < len(process_dict):
 
                     try:
@@ -774,6 +1393,7 @@ class Assignment:
                         if result[1] == "DONE":
                             FastTripsLogger.debug("Received done from process %d" % worker_num)
                             process_dict[worker_num]["done"] = True
+                            done_procs += 1
                         elif result[1] == "STARTING":
                             process_dict[worker_num]["working_on"] = (result[2],result[3])
                         elif result[1] == "COMPLETED":
@@ -788,6 +1408,13 @@ class Assignment:
                             if pathset.path_found():
                                 num_paths_found_now += 1
 
+                            # the workers keep finding paths while we do this
+                            if Assignment.PATHSET_STREAM_CHUNK_SIZE > 0:
+                                stream_trip_list_ids.append(trip_list_id)
+                                if len(stream_trip_list_ids) >= Assignment.PATHSET_STREAM_CHUNK_SIZE:
+                                    Assignment.stream_pathsets(FT, output_dir, iteration, stream_trip_list_ids, stream_dfs)
+                                    stream_trip_list_ids = []
+
                             if num_paths_found_now % info_freq == 0:
                                 time_elapsed = datetime.datetime.now() - start_time
                                 FastTripsLogger.info(" %6d / %6d passenger paths found.  Time elapsed: %2dh:%2dm:%2ds" % (
@@ -801,19 +1428,17 @@ class Assignment:
                             print "Unexpected done queue contents: " + str(result)
 
                     except Queue.Empty:
-                        # This is normal
-                        pass
+                        # This is normal, unless a process quit without finishing
+                        for process_idx in process_dict.keys():
+                            if not process_dict[process_idx]["done"] and process_dict[process_idx]["alive"] and \
+                               not process_dict[process_idx]["process"].is_alive():
+                                FastTripsLogger.debug("Process %d is not alive" % process_idx)
+                                process_dict[process_idx]["alive"] = False
+                                done_procs += 1
                     except:
                         FastTripsLogger.error("Caught exception: %s" % str(sys.exc_info()))
                         pass
 
-                    # check if any processes are not alive
-                    for process_idx in process_dict.keys():
-                        if process_dict[process_idx]["alive"] and not process_dict[process_idx]["process"].is_alive():
-                            FastTripsLogger.debug("Process %d is not alive" % process_idx)
-                            process_dict[process_idx]["alive"] = False
-                            done_procs += 1
-
                 # join up my processes
                 for process_idx in process_dict.keys():
                     process_dict[process_idx]["process"].join()
@@ -851,7 +1476,55 @@ class Assignment:
                                  int( (time_elapsed.total_seconds() % 3600) / 60),
                                  time_elapsed.total_seconds() % 60))
 
-        return num_paths_found_now + num_paths_found_prev
+        if Assignment.PATHSET_STREAM_CHUNK_SIZE <= 0:
+            return (num_paths_found_now + num_paths_found_prev, None, None)
+
+        # stream the rest; always do this once so the files are written even if nothing was found
+        if len(stream_trip_list_ids) > 0 or len(stream_dfs[0]) == 0:
+            Assignment.stream_pathsets(FT, output_dir, iteration, stream_trip_list_ids, stream_dfs, last_chunk=True)
+
+        # chunks are in the order pathfinding completed; put them back in person trip order
+        pathset_paths_df = pandas.concat(stream_dfs[0], axis=0, ignore_index=True)
+        pathset_paths_df.sort_values(by=[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM, Passenger.PF_COL_PATH_NUM], inplace=True)
+        pathset_paths_df.reset_index(drop=True, inplace=True)
+        pathset_links_df = pandas.concat(stream_dfs[1], axis=0, ignore_index=True)
+        pathset_links_df.sort_values(by=[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM, Passenger.PF_COL_PATH_NUM, Passenger.PF_COL_LINK_NUM], inplace=True)
+        pathset_links_df.reset_index(drop=True, inplace=True)
+        FastTripsLogger.info("Streamed %d pathset paths and %d pathset links in %d chunks" % (len(pathset_paths_df), len(pathset_links_df), len(stream_dfs[0])))
+        return (num_paths_found_now + num_paths_found_prev, pathset_paths_df, pathset_links_df)
+
+    @staticmethod
+    def stream_pathsets(FT, output_dir, iteration, trip_list_ids, stream_dfs, last_chunk=False):
+        """
+        Converts the pathfinding results for the given person trips into pathset dataframes via
+        :py:meth:`Passenger.setup_passenger_pathsets` and appends them to the pathfinding output files
+        and to *stream_dfs*, a tuple of (pathset_paths_df list, pathset_links_df list).  The first chunk
+        overwrites the output files.
+
+        A chunk with no paths doesn't have the duration columns, so it's skipped unless it's the *last_chunk*
+        and nothing has been streamed; that way the output header always comes from a chunk with paths.
+
+        These stages are recorded within the pathfinding stage.
+        """
+        with Stage(Stage.STAGE_SETUP_PATHSETS, iteration) as stage:
+            (chunk_paths_df, chunk_links_df) = FT.passengers.setup_passenger_pathsets(iteration, FT.stops,
+                                                                                      FT.trips.trip_id_df, FT.trips.trips_df, FT.routes.modes_df,
+                                                                                      FT.transfers, FT.tazs, Assignment.PREPEND_ROUTE_ID_TO_TRIP_ID,
+                                                                                      trip_list_ids=trip_list_ids)
+            stage.rows = len(chunk_links_df)
+
+        first_chunk = (len(stream_dfs[0]) == 0)
+        if len(chunk_paths_df) == 0 and not (last_chunk and first_chunk):
+            FastTripsLogger.debug("stream_pathsets: no paths for %d trips" % len(trip_list_ids))
+            return
+
+        with Stage(Stage.STAGE_WRITE_PATHS, iteration) as stage:
+            Passenger.write_paths(output_dir, 0, 0, chunk_paths_df, False, Assignment.OUTPUT_PATHSET_PER_SIM_ITER, force_append=not first_chunk)
+            Passenger.write_paths(output_dir, 0, 0, chunk_links_df, True,  Assignment.OUTPUT_PATHSET_PER_SIM_ITER, force_append=not first_chunk)
+            stage.rows = len(chunk_paths_df) + len(chunk_links_df)
+        stream_dfs[0].append(chunk_paths_df)
+        stream_dfs[1].append(chunk_links_df)
+        FastTripsLogger.debug("stream_pathsets: streamed %d trips; %d paths and %d links" % (len(trip_list_ids), len(chunk_paths_df), len(chunk_links_df)))
 
 
     @staticmethod
@@ -889,7 +1562,8 @@ class Assignment:
         (ret_ints, ret_doubles, path_costs, process_num,
          label_iterations, num_labeled_stops, max_label_process_count,
          ms_labeling, ms_enumerating,
-         bytes_workingset, bytes_privateusage) = \
+         bytes_workingset, bytes_privateusage,
+         enumeration_draws, enumeration_stop_reason, perf_counters) = \
             _fasttrips.find_pathset(iteration, pathset.person_id_num, pathset.trip_list_id_num, hyperpath,
                                  pathset.user_class, pathset.purpose, pathset.access_mode, pathset.transit_mode, pathset.egress_mode,
                                  pathset.o_taz_num, pathset.d_taz_num,
@@ -962,8 +1636,12 @@ class Assignment:
             Performance.PERFORMANCE_COLUMN_TIME_ENUMERATING_MS   : ms_enumerating,
             Performance.PERFORMANCE_COLUMN_TRACED                : trace,
             Performance.PERFORMANCE_COLUMN_WORKING_SET_BYTES     : bytes_workingset,
-            Performance.PERFORMANCE_COLUMN_PRIVATE_USAGE_BYTES   : bytes_privateusage
+            Performance.PERFORMANCE_COLUMN_PRIVATE_USAGE_BYTES   : bytes_privateusage,
+            Performance.PERFORMANCE_COLUMN_ENUMERATION_DRAWS     : enumeration_draws,
+            Performance.PERFORMANCE_COLUMN_ENUMERATION_STOP      : enumeration_stop_reason
         }
+        # phase timers and search counters are already keyed by performance column
+        perf_dict.update(perf_counters)
         return (pathdict, perf_dict)
 
     @staticmethod
@@ -1053,14 +1731,19 @@ class Assignment:
           - :py:attr:`Trip.SIM_COL_VEH_ALIGHTS`
           - :py:attr:`Trip.SIM_COL_VEH_ONBOARD`
         """
-        # drop these -- we'll set them
-        if Trip.SIM_COL_VEH_BOARDS in list(veh_trips_df.columns.values):
-            veh_trips_df.drop([Trip.SIM_COL_VEH_BOARDS,
-                               Trip.SIM_COL_VEH_ALIGHTS,
-                               Trip.SIM_COL_VEH_ONBOARD], axis=1, inplace=True)
+        (passenger_trips_boards, passenger_trips_alights) = Assignment.count_passenger_boards_alights(pathset_links_df)
+        return Assignment.load_vehicles(iteration, bump_iter, passenger_trips_boards, passenger_trips_alights, veh_trips_df)
 
-        veh_trips_df_len = len(veh_trips_df)
+    @staticmethod
+    def count_passenger_boards_alights(pathset_links_df):
+        """
+        Counts the unbumped boards and alights for the chosen passenger trips in pathset_links_df.
 
+        Returns (passenger_trips_boards, passenger_trips_alights), each a :py:class:`pandas.DataFrame`
+        indexed by (:py:attr:`Trip.STOPTIMES_COLUMN_TRIP_ID_NUM`, :py:attr:`Trip.STOPTIMES_COLUMN_STOP_ID_NUM`,
+        :py:attr:`Trip.STOPTIMES_COLUMN_STOP_SEQUENCE`) with the count in column :py:attr:`Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM`.
+        Counts for disjoint sets of passengers can be summed.
+        """
         passengers_df = Passenger.get_chosen_links(pathset_links_df)
 
         # Group to boards by counting trip_list_id_nums for a (trip_id, A_id as stop_id)
@@ -1078,6 +1761,26 @@ class Assignment:
         passenger_trips_alights.index.names = [Trip.STOPTIMES_COLUMN_TRIP_ID_NUM,
                                                Trip.STOPTIMES_COLUMN_STOP_ID_NUM,
                                                Trip.STOPTIMES_COLUMN_STOP_SEQUENCE]
+        return (passenger_trips_boards, passenger_trips_alights)
+
+    @staticmethod
+    def load_vehicles(iteration, bump_iter, passenger_trips_boards, passenger_trips_alights, veh_trips_df):
+        """
+        Puts the boards and alights counted by :py:meth:`Assignment.count_passenger_boards_alights` onto the
+        transit vehicle trips specified by veh_trip_df.
+
+        Returns veh_trips_df but with updated columns
+          - :py:attr:`Trip.SIM_COL_VEH_BOARDS`
+          - :py:attr:`Trip.SIM_COL_VEH_ALIGHTS`
+          - :py:attr:`Trip.SIM_COL_VEH_ONBOARD`
+        """
+        # drop these -- we'll set them
+        if Trip.SIM_COL_VEH_BOARDS in list(veh_trips_df.columns.values):
+            veh_trips_df.drop([Trip.SIM_COL_VEH_BOARDS,
+                               Trip.SIM_COL_VEH_ALIGHTS,
+                               Trip.SIM_COL_VEH_ONBOARD], axis=1, inplace=True)
+
+        veh_trips_df_len = len(veh_trips_df)
 
         # Join them to the transit vehicle trips so we can put people on vehicles (boards)
         veh_loaded_df = pandas.merge(left        = veh_trips_df,
@@ -1099,7 +1802,8 @@ class Assignment:
                                     right_index  = True,
                                     how          ='left')
         veh_loaded_df.rename(columns={Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM:Trip.SIM_COL_VEH_ALIGHTS}, inplace=True)
-        veh_loaded_df.fillna(value=0, inplace=True)
+        # no boards or alights there; only fill these since the other columns may be categoricals (see compact_simulation_dataframes())
+        veh_loaded_df.fillna(value={Trip.SIM_COL_VEH_BOARDS:0, Trip.SIM_COL_VEH_ALIGHTS:0}, inplace=True)
         assert(len(veh_loaded_df)==veh_trips_df_len)
 
         # these are ints, not floats
@@ -1511,7 +2215,9 @@ class Assignment:
         FastTripsLogger.info("  Step 1. Find out board/alight times for all pathset links from vehicle times")
 
         # could do this just to chosen path links but let's do this to the whole pathset
-        pathset_links_df = Assignment.find_passenger_vehicle_times(pathset_links_df, veh_trips_df)
+        with Stage(Stage.STAGE_FIND_PASSENGER_VEHICLE_TIMES, iteration, simulation_iteration) as stage:
+            pathset_links_df = Assignment.find_passenger_vehicle_times(pathset_links_df, veh_trips_df)
+            stage.rows = len(pathset_links_df)
 
         # instead of flag_missed_transfers(), set these to pathfinding results
         pathset_links_df[Assignment.SIM_COL_PAX_ALIGHT_DELAY_MIN] = 0
@@ -1523,38 +2229,84 @@ class Assignment:
 
         ######################################################################################################
         FastTripsLogger.info("  Step 2. Calculate costs and probabilities for all pathset paths")
-        (pathset_paths_df, pathset_links_df) = PathSet.calculate_cost(
-            iteration, simulation_iteration, Assignment.STOCH_DISPERSION,
-            pathset_paths_df, pathset_links_df, FT.passengers.trip_list_df,
-            FT.transfers.transfers_df, FT.tazs.walk_df, FT.tazs.drive_df, veh_trips_df, FT.stops)
+        with Stage(Stage.STAGE_CALCULATE_COST, iteration, simulation_iteration) as stage:
+            (pathset_paths_df, pathset_links_df) = PathSet.calculate_cost(
+                iteration, simulation_iteration, Assignment.STOCH_DISPERSION,
+                pathset_paths_df, pathset_links_df, FT.passengers.trip_list_df,
+                FT.transfers.transfers_df, FT.tazs.walk_df, FT.tazs.drive_df, veh_trips_df, FT.stops)
+            stage.rows = len(pathset_links_df)
 
         ######################################################################################################
         FastTripsLogger.info("  Step 3. Choose a path for each passenger from their pathset")
 
         # Choose path for each passenger -- pathset_paths_df and pathset_links_df will now have
         # SIM_COL_PAX_CHOSEN >=0 for chosen paths/path links
-        (num_passengers_arrived, num_chosen, pathset_paths_df, pathset_links_df) = Passenger.choose_paths(
-            True,  # choose for everyone
-            iteration, simulation_iteration,
-            pathset_paths_df, pathset_links_df)
+        with Stage(Stage.STAGE_CHOOSE_PATHS, iteration, simulation_iteration) as stage:
+            (num_passengers_arrived, num_chosen, pathset_paths_df, pathset_links_df) = Passenger.choose_paths(
+                True,  # choose for everyone
+                iteration, simulation_iteration,
+                pathset_paths_df, pathset_links_df)
+            stage.rows = len(pathset_paths_df)
 
         # Write the pathsets
-        Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_paths_df, False, Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
-        Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_links_df, True,  Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+        with Stage(Stage.STAGE_WRITE_PATHS, iteration, simulation_iteration) as stage:
+            Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_paths_df, False, Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+            Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_links_df, True,  Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+            stage.rows = len(pathset_paths_df) + len(pathset_links_df)
 
-        # write the final chosen paths for this iteration
-        chosen_links_df = Passenger.get_chosen_links(pathset_links_df)
-        chosen_links_df["iteration"] = iteration
-        Util.write_dataframe(chosen_links_df, "chosen_links_df", os.path.join(output_dir, "chosenpaths_links.csv"), append=(iteration>1))
-        chosen_links_df.drop(["iteration"], axis=1, inplace=True)
+        with Stage(Stage.STAGE_WRITE_OUTPUT, iteration) as stage:
+            # write the final chosen paths for this iteration
+            chosen_links_df = Passenger.get_chosen_links(pathset_links_df)
+            chosen_links_df["iteration"] = iteration
+            Util.write_dataframe(chosen_links_df, "chosen_links_df", os.path.join(output_dir, "chosenpaths_links.csv"), append=(iteration>1))
+            chosen_links_df.drop(["iteration"], axis=1, inplace=True)
 
-        chosen_paths_df = Passenger.get_chosen_links(pathset_paths_df)
-        chosen_paths_df["iteration"] = iteration
-        Util.write_dataframe(chosen_paths_df, "chosen_paths_df", os.path.join(output_dir, "chosenpaths_paths.csv"), append=(iteration>1))
-        chosen_paths_df.drop(["iteration"], axis=1, inplace=True)
+            chosen_paths_df = Passenger.get_chosen_links(pathset_paths_df)
+            chosen_paths_df["iteration"] = iteration
+            Util.write_dataframe(chosen_paths_df, "chosen_paths_df", os.path.join(output_dir, "chosenpaths_paths.csv"), append=(iteration>1))
+            chosen_paths_df.drop(["iteration"], axis=1, inplace=True)
+            stage.rows = len(chosen_links_df) + len(chosen_paths_df)
 
         return (num_passengers_arrived, pathset_paths_df, pathset_links_df)
 
+    @staticmethod
+    def compact_simulation_dataframes(pathset_links_df, veh_trips_df):
+        """
+        If :py:attr:`Assignment.COMPACT_DATAFRAMES` is configured, converts the simulation dataframes to their memory-compact
+        forms using :py:meth:`Util.compact_dataframe` with :py:attr:`Passenger.PF_COMPACT_CATEGORY_COLUMNS` and
+        :py:attr:`Trip.SIM_COMPACT_CATEGORY_COLUMNS` (and the integer equivalents).
+        Many simulation steps replace columns via merges, so this is done at the start of each simulation step.
+
+        Time columns are left as they are; datetime64 and float minutes are both 8 bytes.
+
+        Returns (pathset_links_df, veh_trips_df)
+        """
+        if not Assignment.COMPACT_DATAFRAMES:
+            return (pathset_links_df, veh_trips_df)
+
+        if pathset_links_df is not None:
+            pathset_links_df = Util.compact_dataframe(pathset_links_df, Passenger.PF_COMPACT_CATEGORY_COLUMNS, Passenger.PF_COMPACT_INTEGER_COLUMNS)
+        if veh_trips_df is not None:
+            veh_trips_df     = Util.compact_dataframe(veh_trips_df, Trip.SIM_COMPACT_CATEGORY_COLUMNS, Trip.SIM_COMPACT_INTEGER_COLUMNS)
+        return (pathset_links_df, veh_trips_df)
+
+    @staticmethod
+    def log_simulation_memory(step_str, pathset_paths_df, pathset_links_df, veh_trips_df):
+        """
+        Logs the process peak memory use after the given simulation step.  If debug logging is on, also
+        logs the memory used by the simulation dataframes (this requires a pass over the string columns).
+        """
+        FastTripsLogger.info("          %s memory: process peak %s" % (step_str, Util.get_mem_use_str(Util.get_process_peak_mem_use())))
+
+        if FastTripsLogger.isEnabledFor(logging.DEBUG):
+            df_mem_strs = []
+            for (df_name, df) in [("pathset_paths_df", pathset_paths_df),
+                                  ("pathset_links_df", pathset_links_df),
+                                  ("veh_trips_df",     veh_trips_df)]:
+                if df is None: continue
+                df_mem_strs.append("%s %s" % (df_name, Util.get_mem_use_str(Util.get_dataframe_mem_use(df))))
+            FastTripsLogger.debug("%s memory: %s" % (step_str, ", ".join(df_mem_strs)))
+
     @staticmethod
     def simulate(FT, output_dir, iteration, pathset_paths_df, pathset_links_df, veh_trips_df):
         """
@@ -1575,32 +2327,50 @@ class Assignment:
                 FastTripsLogger.debug("Initial pathset_paths_df for %s\n%s" % \
                    (str(trace_pax), pathset_paths_df.loc[pathset_paths_df.person_id==trace_pax].to_string()))
 
+            (pathset_links_df, veh_trips_df) = Assignment.compact_simulation_dataframes(pathset_links_df, veh_trips_df)
+            Assignment.log_simulation_memory("Start", pathset_paths_df, pathset_links_df, veh_trips_df)
+
             ######################################################################################################
             FastTripsLogger.info("  Step 1. Find out board/alight times for all pathset links from vehicle times")
 
             # could do this just to chosen path links but let's do this to the whole pathset
-            pathset_links_df = Assignment.find_passenger_vehicle_times(pathset_links_df, veh_trips_df)
+            with Stage(Stage.STAGE_FIND_PASSENGER_VEHICLE_TIMES, iteration, simulation_iteration) as stage:
+                pathset_links_df = Assignment.find_passenger_vehicle_times(pathset_links_df, veh_trips_df)
+                (pathset_links_df, veh_trips_df) = Assignment.compact_simulation_dataframes(pathset_links_df, veh_trips_df)
+                stage.rows = len(pathset_links_df)
+            Assignment.log_simulation_memory("Step 1", pathset_paths_df, pathset_links_df, veh_trips_df)
 
             ######################################################################################################
             FastTripsLogger.info("  Step 2. Flag missed transfer links and paths in the pathsets")
-            (pathset_paths_df, pathset_links_df) = Assignment.flag_missed_transfers(pathset_paths_df, pathset_links_df)
+            with Stage(Stage.STAGE_FLAG_MISSED_TRANSFERS, iteration, simulation_iteration) as stage:
+                (pathset_paths_df, pathset_links_df) = Assignment.flag_missed_transfers(pathset_paths_df, pathset_links_df)
+                (pathset_links_df, veh_trips_df) = Assignment.compact_simulation_dataframes(pathset_links_df, veh_trips_df)
+                stage.rows = len(pathset_links_df)
+            Assignment.log_simulation_memory("Step 2", pathset_paths_df, pathset_links_df, veh_trips_df)
 
             ######################################################################################################
             FastTripsLogger.info("  Step 3. Calculate costs and probabilities for all pathset paths")
-            (pathset_paths_df, pathset_links_df) = PathSet.calculate_cost(
-                iteration, simulation_iteration, Assignment.STOCH_DISPERSION,
-                pathset_paths_df, pathset_links_df, FT.passengers.trip_list_df,
-                FT.transfers.transfers_df, FT.tazs.walk_df, FT.tazs.drive_df, veh_trips_df, FT.stops)
+            with Stage(Stage.STAGE_CALCULATE_COST, iteration, simulation_iteration) as stage:
+                (pathset_paths_df, pathset_links_df) = PathSet.calculate_cost(
+                    iteration, simulation_iteration, Assignment.STOCH_DISPERSION,
+                    pathset_paths_df, pathset_links_df, FT.passengers.trip_list_df,
+                    FT.transfers.transfers_df, FT.tazs.walk_df, FT.tazs.drive_df, veh_trips_df, FT.stops)
+                (pathset_links_df, veh_trips_df) = Assignment.compact_simulation_dataframes(pathset_links_df, veh_trips_df)
+                stage.rows = len(pathset_links_df)
+            Assignment.log_simulation_memory("Step 3", pathset_paths_df, pathset_links_df, veh_trips_df)
 
             ######################################################################################################
             FastTripsLogger.info("  Step 4. Choose a path for each passenger from their pathset")
 
             # Choose path for each passenger -- pathset_paths_df and pathset_links_df will now have
             # SIM_COL_PAX_CHOSEN >=0 for chosen paths/path links
-            (num_passengers_arrived, num_chosen, pathset_paths_df, pathset_links_df) = Passenger.choose_paths(
-                Assignment.PATHFINDING_EVERYONE and simulation_iteration==0,  # choose for everyone if we just re-found all paths
-                iteration, simulation_iteration,
-                pathset_paths_df, pathset_links_df)
+            with Stage(Stage.STAGE_CHOOSE_PATHS, iteration, simulation_iteration) as stage:
+                (num_passengers_arrived, num_chosen, pathset_paths_df, pathset_links_df) = Passenger.choose_paths(
+                    Assignment.PATHFINDING_EVERYONE and simulation_iteration==0,  # choose for everyone if we just re-found all paths
+                    iteration, simulation_iteration,
+                    pathset_paths_df, pathset_links_df)
+                stage.rows = len(pathset_paths_df)
+            Assignment.log_simulation_memory("Step 4", pathset_paths_df, pathset_links_df, veh_trips_df)
 
             ######################################################################################################
             FastTripsLogger.info("  Step 5. Put passenger paths on transit vehicles to get vehicle boards/alights/load")
@@ -1616,7 +2386,9 @@ class Assignment:
             while True: # loop for capacity constraint
 
                 # Put passengers on vehicles, updating the vehicle's boards, alights, onboard
-                veh_trips_df = Assignment.put_passengers_on_vehicles(iteration, bump_iter, pathset_paths_df, pathset_links_df, veh_trips_df)
+                with Stage(Stage.STAGE_PUT_PASSENGERS_ON_VEHICLES, iteration, simulation_iteration) as stage:
+                    veh_trips_df = Assignment.put_passengers_on_vehicles(iteration, bump_iter, pathset_paths_df, pathset_links_df, veh_trips_df)
+                    stage.rows = len(veh_trips_df)
 
                 if not FT.trips.has_capacity_configured():
                     # We can't do anything about capacity
@@ -1630,20 +2402,25 @@ class Assignment:
                         FastTripsLogger.info("          Bumping one at a time? %s" % ("true" if Assignment.BUMP_ONE_AT_A_TIME else "false"))
 
                     # This needs to run at this point because the arrival times for the passengers are accurate here
-                    (chosen_paths_bumped, pathset_paths_df, pathset_links_df, veh_trips_df) = \
-                        Assignment.flag_bump_overcap_passengers(iteration, simulation_iteration, bump_iter,
-                                                                pathset_paths_df, pathset_links_df, veh_trips_df)
-
+                    with Stage(Stage.STAGE_FLAG_BUMP_OVERCAP_PASSENGERS, iteration, simulation_iteration) as stage:
+                        (chosen_paths_bumped, pathset_paths_df, pathset_links_df, veh_trips_df) = \
+                            Assignment.flag_bump_overcap_passengers(iteration, simulation_iteration, bump_iter,
+                                                                    pathset_paths_df, pathset_links_df, veh_trips_df)
+                        stage.rows = len(pathset_links_df)
 
                     FastTripsLogger.info("        -> completed loop bump_iter %d and bumped %d chosen paths" % (bump_iter, chosen_paths_bumped))
 
                     if chosen_paths_bumped == 0:
                         # do one final update of overcap to passengers
-                        pathset_links_df = Assignment.find_passenger_vehicle_times(pathset_links_df, veh_trips_df)
+                        with Stage(Stage.STAGE_FIND_PASSENGER_VEHICLE_TIMES, iteration, simulation_iteration) as stage:
+                            pathset_links_df = Assignment.find_passenger_vehicle_times(pathset_links_df, veh_trips_df)
+                            stage.rows = len(pathset_links_df)
                         break
 
                     bump_iter += 1
 
+            (pathset_links_df, veh_trips_df) = Assignment.compact_simulation_dataframes(pathset_links_df, veh_trips_df)
+            Assignment.log_simulation_memory("Steps 5-6", pathset_paths_df, pathset_links_df, veh_trips_df)
 
             if type(Assignment.bump_wait_df) == pandas.DataFrame and len(Assignment.bump_wait_df) > 0:
                 Assignment.bump_wait_df[Passenger.PF_COL_PAX_A_TIME_MIN] = \
@@ -1656,13 +2433,19 @@ class Assignment:
             ######################################################################################################
             FastTripsLogger.info("  Step 7. Update dwell and travel times for transit vehicles")
             # update the trip times -- accel/decel rates + stops affect travel times, and boards/alights affect dwell times
-            veh_trips_df   = Trip.update_trip_times(veh_trips_df, Assignment.MSA_RESULTS)
+            with Stage(Stage.STAGE_UPDATE_TRIP_TIMES, iteration, simulation_iteration) as stage:
+                veh_trips_df   = Trip.update_trip_times(veh_trips_df, Assignment.MSA_RESULTS)
+                (pathset_links_df, veh_trips_df) = Assignment.compact_simulation_dataframes(pathset_links_df, veh_trips_df)
+                stage.rows = len(veh_trips_df)
+            Assignment.log_simulation_memory("Step 7", pathset_paths_df, pathset_links_df, veh_trips_df)
 
             ######################################################################################################
             if Assignment.OUTPUT_PATHSET_PER_SIM_ITER:
                 FastTripsLogger.info("  Step 8. Write pathsets (paths and links)")
-                Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_paths_df, False, Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
-                Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_links_df, True,  Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+                with Stage(Stage.STAGE_WRITE_PATHS, iteration, simulation_iteration) as stage:
+                    Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_paths_df, False, Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+                    Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_links_df, True,  Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+                    stage.rows = len(pathset_paths_df) + len(pathset_links_df)
 
             simulation_iteration += 1
 
@@ -1676,22 +2459,457 @@ class Assignment:
 
         # Write the pathsets (if we haven't been already)
         if Assignment.OUTPUT_PATHSET_PER_SIM_ITER == False:
-            Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_paths_df, False, Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
-            Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_links_df, True,  Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+            with Stage(Stage.STAGE_WRITE_PATHS, iteration, simulation_iteration) as stage:
+                Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_paths_df, False, Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+                Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_links_df, True,  Assignment.OUTPUT_PATHSET_PER_SIM_ITER)
+                stage.rows = len(pathset_paths_df) + len(pathset_links_df)
 
-        # write the final chosen paths for this iteration
-        chosen_links_df = Passenger.get_chosen_links(pathset_links_df)
-        chosen_links_df["iteration"] = iteration
-        Util.write_dataframe(chosen_links_df, "chosen_links_df", os.path.join(output_dir, "chosenpaths_links.csv"), append=(iteration>1))
-        chosen_links_df.drop(["iteration"], axis=1, inplace=True)
+        with Stage(Stage.STAGE_WRITE_OUTPUT, iteration) as stage:
+            # write the final chosen paths for this iteration
+            chosen_links_df = Passenger.get_chosen_links(pathset_links_df)
+            chosen_links_df["iteration"] = iteration
+            Util.write_dataframe(chosen_links_df, "chosen_links_df", os.path.join(output_dir, "chosenpaths_links.csv"), append=(iteration>1))
+            chosen_links_df.drop(["iteration"], axis=1, inplace=True)
 
-        chosen_paths_df = Passenger.get_chosen_links(pathset_paths_df)
-        chosen_paths_df["iteration"] = iteration
-        Util.write_dataframe(chosen_paths_df, "chosen_paths_df", os.path.join(output_dir, "chosenpaths_paths.csv"), append=(iteration>1))
-        chosen_paths_df.drop(["iteration"], axis=1, inplace=True)
+            chosen_paths_df = Passenger.get_chosen_links(pathset_paths_df)
+            chosen_paths_df["iteration"] = iteration
+            Util.write_dataframe(chosen_paths_df, "chosen_paths_df", os.path.join(output_dir, "chosenpaths_paths.csv"), append=(iteration>1))
+            chosen_paths_df.drop(["iteration"], axis=1, inplace=True)
+            stage.rows = len(chosen_links_df) + len(chosen_paths_df)
 
         return (num_passengers_arrived, pathset_paths_df, pathset_links_df, veh_trips_df)
 
+    @staticmethod
+    def write_pathset_partitions(output_dir, partition_size, pathset_paths_df, pathset_links_df):
+        """
+        Splits the pathsets into partitions of *partition_size* passenger trips
+        by :py:attr:`Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM` and writes each to :py:attr:`Assignment.SIMULATION_PARTITION_DIR`.
+
+        Returns a list of the partition numbers.
+        """
+        partition_dir = os.path.join(output_dir, Assignment.SIMULATION_PARTITION_DIR)
+        if not os.path.exists(partition_dir):
+            os.mkdir(partition_dir)
+
+        paths_partition = pathset_paths_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM] // partition_size
+        links_partition = pathset_links_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM] // partition_size
+
+        partitions = sorted(paths_partition.unique())
+        for partition in partitions:
+            Assignment.write_pathset_partition(output_dir, partition,
+                                               pathset_paths_df.loc[paths_partition==partition],
+                                               pathset_links_df.loc[links_partition==partition])
+
+        FastTripsLogger.info("Wrote %d pathsets in %d simulation partitions to %s" % (len(pathset_paths_df), len(partitions), partition_dir))
+        return partitions
+
+    @staticmethod
+    def write_pathset_partition(output_dir, partition, pathset_paths_df, pathset_links_df):
+        """
+        Writes the given pathset partition to :py:attr:`Assignment.SIMULATION_PARTITION_DIR`.
+        """
+        partition_dir = os.path.join(output_dir, Assignment.SIMULATION_PARTITION_DIR)
+        pathset_paths_df.to_pickle(os.path.join(partition_dir, Assignment.SIMULATION_PARTITION_FILES[0] % partition))
+        pathset_links_df.to_pickle(os.path.join(partition_dir, Assignment.SIMULATION_PARTITION_FILES[1] % partition))
+
+    @staticmethod
+    def read_pathset_partition(output_dir, partition):
+        """
+        Reads the given pathset partition written by :py:meth:`Assignment.write_pathset_partition`.
+
+        Returns (pathset_paths_df, pathset_links_df)
+        """
+        partition_dir = os.path.join(output_dir, Assignment.SIMULATION_PARTITION_DIR)
+        pathset_paths_df = pandas.read_pickle(os.path.join(partition_dir, Assignment.SIMULATION_PARTITION_FILES[0] % partition))
+        pathset_links_df = pandas.read_pickle(os.path.join(partition_dir, Assignment.SIMULATION_PARTITION_FILES[1] % partition))
+        return (pathset_paths_df, pathset_links_df)
+
+    @staticmethod
+    def simulation_partition_size(FT):
+        """
+        Returns the number of passenger trips in each simulation partition: :py:attr:`Assignment.SIMULATION_PARTITION_SIZE`
+        if it's set, or enough for one partition per simulation process if we're only partitioning to parallelize.
+        """
+        if Assignment.SIMULATION_PARTITION_SIZE > 0:
+            return Assignment.SIMULATION_PARTITION_SIZE
+        return int(math.ceil((FT.passengers.trip_list_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM].max() + 1.0)/Assignment.NUMBER_OF_SIMULATION_PROCESSES))
+
+    @staticmethod
+    def merge_pathset_partitions(FT, output_dir, iteration, partitions, pathset_paths_df, pathset_links_df, new_pathset_paths_df, new_pathset_links_df):
+        """
+        Partitioned version of :py:meth:`Assignment.merge_pathsets` for :py:meth:`Assignment.simulate_partitioned`.
+        The existing pathsets are in the given *partitions*, or in *pathset_paths_df* and *pathset_links_df* if they've
+        just been read from a checkpoint or warm start.  The new pathsets are split into partitions and merged into the
+        existing ones a partition at a time, or replace them if :py:attr:`Assignment.PATHFINDING_EVERYONE`.
+
+        Returns (list of the partition numbers, number of passenger trips with pathsets)
+        """
+        partition_size   = Assignment.simulation_partition_size(FT)
+        stale_partitions = []
+        num_pathsets     = None
+
+        with Stage(Stage.STAGE_WRITE_INTERMEDIATES, iteration) as stage:
+            stage.rows = 0
+            if Assignment.PATHFINDING_EVERYONE:
+                # the new pathsets replace the existing ones
+                (stale_partitions, partitions) = (partitions, [])
+                (pathset_paths_df, pathset_links_df) = (new_pathset_paths_df, new_pathset_links_df)
+                new_pathset_paths_df = None
+                new_pathset_links_df = None
+
+            if type(pathset_paths_df) != type(None):
+                partitions   = Assignment.write_pathset_partitions(output_dir, partition_size, pathset_paths_df, pathset_links_df)
+                num_pathsets = Assignment.number_of_pathsets(pathset_paths_df)
+                stage.rows  += len(pathset_paths_df) + len(pathset_links_df)
+                del pathset_paths_df, pathset_links_df
+
+            if type(new_pathset_paths_df) != type(None):
+                new_paths_partition = new_pathset_paths_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM] // partition_size
+                new_links_partition = new_pathset_links_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM] // partition_size
+
+                num_pathsets  = 0
+                old_partitions= partitions
+                partitions    = sorted(set(old_partitions) | set(new_paths_partition.unique()))
+                for partition in partitions:
+                    partition_paths_df = new_pathset_paths_df.loc[new_paths_partition==partition].copy()
+                    partition_links_df = new_pathset_links_df.loc[new_links_partition==partition].copy()
+                    if partition in old_partitions:
+                        (pathset_paths_df, pathset_links_df) = Assignment.read_pathset_partition(output_dir, partition)
+                        (partition_paths_df, partition_links_df) = Assignment.merge_pathsets(FT.passengers.pathfind_trip_list_df,
+                                                                                             pathset_paths_df, pathset_links_df,
+                                                                                             partition_paths_df, partition_links_df)
+                        del pathset_paths_df, pathset_links_df
+                    else:
+                        # TODO: error prone, make this cleaner with where it's initialized elsewhere
+                        partition_paths_df[Assignment.SIM_COL_PAX_CHOSEN ] = Assignment.CHOSEN_NOT_CHOSEN_YET
+                        partition_paths_df[Assignment.SIM_COL_MISSED_XFER] = 0
+                        partition_links_df.reset_index(drop=True, inplace=True)
+
+                    Assignment.write_pathset_partition(output_dir, partition, partition_paths_df, partition_links_df)
+                    num_pathsets += Assignment.number_of_pathsets(partition_paths_df)
+                    stage.rows   += len(partition_paths_df) + len(partition_links_df)
+                FastTripsLogger.info("Merged new pathsets into %d simulation partitions" % len(partitions))
+
+            # remove the partitions that no longer have pathsets
+            for partition in set(stale_partitions) - set(partitions):
+                for partition_file in Assignment.SIMULATION_PARTITION_FILES:
+                    os.remove(os.path.join(output_dir, Assignment.SIMULATION_PARTITION_DIR, partition_file % partition))
+
+        # nothing new, so count the existing pathsets
+        if num_pathsets == None:
+            num_pathsets = sum([Assignment.number_of_pathsets(Assignment.read_pathset_partition(output_dir, partition)[0]) for partition in partitions])
+
+        return (partitions, num_pathsets)
+
+    @staticmethod
+    def read_chosen_partitions(output_dir, partitions):
+        """
+        Reads the chosen paths and path links (see :py:meth:`Passenger.get_chosen_links`) from the given simulation partitions.
+        These are one path per passenger trip, so they're much smaller than the pathsets.
+
+        Returns (chosen_paths_df, chosen_links_df)
+        """
+        chosen_paths_list = []
+        chosen_links_list = []
+        for partition in partitions:
+            (pathset_paths_df, pathset_links_df) = Assignment.read_pathset_partition(output_dir, partition)
+            chosen_paths_list.append(Passenger.get_chosen_links(pathset_paths_df))
+            chosen_links_list.append(Passenger.get_chosen_links(pathset_links_df))
+            del pathset_paths_df, pathset_links_df
+
+        return (pandas.concat(chosen_paths_list, ignore_index=True), pandas.concat(chosen_links_list, ignore_index=True))
+
+    @staticmethod
+    def simulate_partition_costs(FT, output_dir, partition, iteration, simulation_iteration, veh_trips_df):
+        """
+        Runs simulation steps 1-3 and the first part of path choice (:py:meth:`Passenger.group_paths_for_choice`)
+        for the given pathset partition, writing the updated partition back.
+
+        Returns the passenger trips grouped for choice.
+        """
+        (pathset_paths_df, pathset_links_df) = Assignment.read_pathset_partition(output_dir, partition)
+        (pathset_links_df, unused)           = Assignment.compact_simulation_dataframes(pathset_links_df, None)
+
+        # Step 1. Find out board/alight times for all pathset links from vehicle times
+        pathset_links_df = Assignment.find_passenger_vehicle_times(pathset_links_df, veh_trips_df)
+
+        # Step 2. Flag missed transfer links and paths in the pathsets
+        (pathset_paths_df, pathset_links_df) = Assignment.flag_missed_transfers(pathset_paths_df, pathset_links_df)
+
+        # Step 3. Calculate costs and probabilities for all pathset paths
+        (pathset_paths_df, pathset_links_df) = PathSet.calculate_cost(
+            iteration, simulation_iteration, Assignment.STOCH_DISPERSION,
+            pathset_paths_df, pathset_links_df, FT.passengers.trip_list_df,
+            FT.transfers.transfers_df, FT.tazs.walk_df, FT.tazs.drive_df, veh_trips_df, FT.stops)
+
+        # Step 4a. Group the pathsets for choice
+        (pathset_paths_df, pathset_paths_df_grouped) = Passenger.group_paths_for_choice(
+            Assignment.PATHFINDING_EVERYONE and simulation_iteration==0,  # choose for everyone if we just re-found all paths
+            pathset_paths_df)
+
+        Assignment.write_pathset_partition(output_dir, partition, pathset_paths_df, pathset_links_df)
+        Assignment.log_simulation_memory("Partition %d steps 1-4a" % partition, pathset_paths_df, pathset_links_df, veh_trips_df)
+        return pathset_paths_df_grouped
+
+    @staticmethod
+    def simulate_partition_choices(output_dir, partition, iteration, simulation_iteration, pax_choose_df, update_links):
+        """
+        Runs the last part of path choice (:py:meth:`Passenger.choose_paths_with_random_numbers`) for the given pathset
+        partition and counts the boards and alights of the chosen paths (:py:meth:`Assignment.count_passenger_boards_alights`),
+        writing the updated partition back.
+
+        Returns (num passenger trips newly chosen, passenger_trips_boards, passenger_trips_alights)
+        """
+        (pathset_paths_df, pathset_links_df) = Assignment.read_pathset_partition(output_dir, partition)
+
+        # Step 4b. Choose a path for each passenger from their pathset
+        (num_chosen, pathset_paths_df, pathset_links_df) = Passenger.choose_paths_with_random_numbers(
+            iteration, simulation_iteration, pax_choose_df, update_links, pathset_paths_df, pathset_links_df)
+
+        # Step 5a. Count passenger boards/alights for transit vehicles; no one is bumped
+        pathset_links_df[Assignment.SIM_COL_PAX_OVERCAP_FRAC] = numpy.NaN
+        if simulation_iteration==0:
+            pathset_links_df.loc[pathset_links_df[Passenger.PF_COL_PF_ITERATION]==iteration, Assignment.SIM_COL_PAX_BUMP_ITER ] = -1
+
+        (passenger_trips_boards, passenger_trips_alights) = Assignment.count_passenger_boards_alights(pathset_links_df)
+
+        Assignment.write_pathset_partition(output_dir, partition, pathset_paths_df, pathset_links_df)
+        Assignment.log_simulation_memory("Partition %d steps 4b-5a" % partition, pathset_paths_df, pathset_links_df, None)
+        return (num_chosen, passenger_trips_boards, passenger_trips_alights)
+
+    @staticmethod
+    def start_simulation_workers(FT, output_dir, iteration, num_partitions):
+        """
+        If :py:attr:`Assignment.NUMBER_OF_SIMULATION_PROCESSES` is more than one, starts that many simulation worker
+        processes (but no more than *num_partitions*) for :py:meth:`Assignment.run_simulation_partitions`.  They're
+        started once and used for every phase of every simulation iteration.  The worker processes are forked from this one,
+        so they share the rest of the input tables read-only (copy-on-write) rather than receiving copies.  Where fork isn't
+        available (windows), no workers are started and the partitions are processed in this process.
+
+        Stop them with :py:meth:`Assignment.stop_simulation_workers`.
+
+        Returns (process dictionary, todo queue, done queue), or None if there are no worker processes.
+        """
+        num_processes = min(Assignment.NUMBER_OF_SIMULATION_PROCESSES, num_partitions)
+        if num_processes <= 1 or sys.platform == "win32":
+            return None
+
+        todo_queue   = multiprocessing.Queue()
+        done_queue   = multiprocessing.Queue()
+        process_dict = {}
+        for process_idx in range(1, 1+num_processes):
+            process_dict[process_idx] = multiprocessing.Process(target=simulate_partitions_process_worker,
+                args=(FT, output_dir, iteration, process_idx, todo_queue, done_queue))
+            process_dict[process_idx].start()
+        FastTripsLogger.info("Started %d simulation worker processes" % num_processes)
+        return (process_dict, todo_queue, done_queue)
+
+    @staticmethod
+    def stop_simulation_workers(simulation_workers, completed):
+        """
+        Stops the worker processes started by :py:meth:`Assignment.start_simulation_workers`.  If the simulation
+        *completed*, they're idle so they're told they're done; otherwise (e.g. one of them failed) they may still be
+        working on a partition, so they're terminated.
+        """
+        if simulation_workers == None:
+            return
+
+        (process_dict, todo_queue, done_queue) = simulation_workers
+        for process_idx in sorted(process_dict.keys()):
+            if completed:
+                todo_queue.put('DONE')
+            elif process_dict[process_idx].is_alive():
+                process_dict[process_idx].terminate()
+
+        for process_idx in sorted(process_dict.keys()):
+            process_dict[process_idx].join()
+
+    @staticmethod
+    def run_simulation_partitions(FT, output_dir, iteration, simulation_iteration, phase, partition_args, veh_trips_df, simulation_workers):
+        """
+        Runs the given simulation *phase* (:py:attr:`Assignment.SIMULATION_PHASE_COSTS` or :py:attr:`Assignment.SIMULATION_PHASE_CHOICES`)
+        for each partition in *partition_args*, a dictionary of partition number to the extra arguments for that phase.
+
+        The partitions are processed by the given *simulation_workers* (see :py:meth:`Assignment.start_simulation_workers`),
+        or in this process if that's None.  The vehicle trips change every simulation iteration, so for the costs phase they're
+        written to :py:attr:`Assignment.SIMULATION_PARTITION_VEH_FILE` for the workers.
+
+        Returns a dictionary of partition number to result.
+        """
+        results = {}
+
+        if simulation_workers == None:
+            for partition in sorted(partition_args.keys()):
+                results[partition] = simulate_partition_phase(FT, output_dir, iteration, simulation_iteration, phase,
+                                                              partition, partition_args[partition], veh_trips_df)
+            return results
+
+        if phase == Assignment.SIMULATION_PHASE_COSTS:
+            veh_trips_df.to_pickle(os.path.join(output_dir, Assignment.SIMULATION_PARTITION_DIR, Assignment.SIMULATION_PARTITION_VEH_FILE))
+
+        (process_dict, todo_queue, done_queue) = simulation_workers
+        for partition in sorted(partition_args.keys()):
+            todo_queue.put( (simulation_iteration, phase, partition, partition_args[partition]) )
+
+        while len(results) < len(partition_args):
+            try:
+                result = done_queue.get(True, 30)
+            except Queue.Empty:
+                # This is normal, unless everyone has quit
+                if len([process_idx for process_idx in process_dict.keys() if process_dict[process_idx].is_alive()]) == 0:
+                    try:
+                        result = done_queue.get(True, 1)
+                    except Queue.Empty:
+                        raise UnexpectedError("Simulation worker processes quit without finishing; see ft_debug_simworker*.log")
+                else:
+                    continue
+
+            if result[1] == "EXCEPTION":
+                raise UnexpectedError("Simulation worker process %d failed on partition %d: %s" % (result[0], result[2], result[3]))
+            results[result[2]] = result[3]
+
+        return results
+
+    @staticmethod
+    def simulate_partitioned(FT, output_dir, iteration, partitions, veh_trips_df):
+        """
+        Partitioned, out-of-core version of :py:meth:`Assignment.simulate`, optionally running the per-passenger
+        steps in parallel worker processes (see :py:meth:`Assignment.start_simulation_workers`).
+
+        The pathsets are in the given simulation *partitions* (see :py:meth:`Assignment.merge_pathset_partitions`) and stay there;
+        the passenger steps (vehicle times, missed transfers, cost and most of path choice) are independent for each
+        passenger trip, so they're run one partition at a time.
+        Working memory for these steps is therefore set by :py:attr:`Assignment.SIMULATION_PARTITION_SIZE` rather than the
+        demand size.  Two things couple the passengers:
+
+        * Whether any path will be chosen (which means the pathset links are updated for every passenger trip) depends on
+          all the passenger trips, so the passenger trips grouped for choice are gathered from the partitions and
+          :py:meth:`Passenger.draw_path_choice_random_numbers` is run on all of them.  The random numbers themselves only
+          depend on the passenger trip.
+        * For vehicle loading, the board and alight counts for each partition (:py:meth:`Assignment.count_passenger_boards_alights`)
+          are summed before loading the vehicles.
+
+        So the results are the same as :py:meth:`Assignment.simulate`.
+
+        Bumping passengers from over-capacity vehicles needs every passenger boarding at a stop, so this doesn't
+        support vehicle capacity; :py:meth:`Assignment.assign_paths` raises a :py:class:`ConfigurationError` for that.
+
+        Returns (valid_linked_trips, veh_loaded_df)
+        """
+        partition_size = Assignment.simulation_partition_size(FT)
+        if len(partitions) == 0:
+            FastTripsLogger.info("  No pathsets to simulate")
+            return (0, veh_trips_df)
+
+        simulation_iteration   = 0
+        num_passengers_arrived = 0 # will get returned from choose_paths
+
+        simulation_workers = Assignment.start_simulation_workers(FT, output_dir, iteration, len(partitions))
+        completed          = False
+        try:
+            while True:
+                FastTripsLogger.info("Simulation Iteration %d" % simulation_iteration)
+                (unused, veh_trips_df) = Assignment.compact_simulation_dataframes(None, veh_trips_df)
+
+                ######################################################################################################
+                FastTripsLogger.info("  Steps 1-4a. Find vehicle times, flag missed transfers, calculate costs and group pathsets for %d partitions" % len(partitions))
+                with Stage(Stage.STAGE_SIMULATE_PARTITION_COSTS, iteration, simulation_iteration) as stage:
+                    grouped_dict = Assignment.run_simulation_partitions(FT, output_dir, iteration, simulation_iteration,
+                                                                        Assignment.SIMULATION_PHASE_COSTS,
+                                                                        dict((partition, None) for partition in partitions),
+                                                                        veh_trips_df, simulation_workers)
+                    stage.rows = sum([len(grouped_dict[partition]) for partition in partitions])
+
+                ######################################################################################################
+                FastTripsLogger.info("  Step 4. Choose a path for each passenger from their pathset")
+                with Stage(Stage.STAGE_CHOOSE_PATHS, iteration, simulation_iteration) as stage:
+                    pathset_paths_df_grouped = pandas.concat([grouped_dict[partition] for partition in partitions], ignore_index=True)
+                    del grouped_dict
+
+                    (num_passengers_arrived, pax_choose_df, update_links) = \
+                        Passenger.draw_path_choice_random_numbers(iteration, simulation_iteration, pathset_paths_df_grouped)
+                    stage.rows = len(pathset_paths_df_grouped)
+
+                with Stage(Stage.STAGE_SIMULATE_PARTITION_CHOICES, iteration, simulation_iteration) as stage:
+                    pax_choose_partition = pax_choose_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM] // partition_size
+                    choices_dict = Assignment.run_simulation_partitions(FT, output_dir, iteration, simulation_iteration,
+                                                                        Assignment.SIMULATION_PHASE_CHOICES,
+                                                                        dict((partition, (pax_choose_df.loc[pax_choose_partition==partition], update_links)) for partition in partitions),
+                                                                        veh_trips_df, simulation_workers)
+                    stage.rows = len(pax_choose_df)
+                num_chosen = sum([choices_dict[partition][0] for partition in partitions])
+                num_passengers_arrived += num_chosen
+                FastTripsLogger.info("          Chose %d out of %d paths from the pathsets => total chosen %d" %
+                                     (num_chosen, len(pathset_paths_df_grouped), num_passengers_arrived))
+
+                ######################################################################################################
+                FastTripsLogger.info("  Step 5. Put passenger paths on transit vehicles to get vehicle boards/alights/load")
+                with Stage(Stage.STAGE_PUT_PASSENGERS_ON_VEHICLES, iteration, simulation_iteration) as stage:
+                    passenger_trips_boards  = pandas.concat([choices_dict[partition][1] for partition in partitions]).groupby(level=[0,1,2]).sum()
+                    passenger_trips_alights = pandas.concat([choices_dict[partition][2] for partition in partitions]).groupby(level=[0,1,2]).sum()
+                    del choices_dict
+                    veh_trips_df = Assignment.load_vehicles(iteration, 0, passenger_trips_boards, passenger_trips_alights, veh_trips_df)
+                    stage.rows = len(veh_trips_df)
+
+                ######################################################################################################
+                FastTripsLogger.info("  Step 7. Update dwell and travel times for transit vehicles")
+                with Stage(Stage.STAGE_UPDATE_TRIP_TIMES, iteration, simulation_iteration) as stage:
+                    veh_trips_df   = Trip.update_trip_times(veh_trips_df, Assignment.MSA_RESULTS)
+                    stage.rows = len(veh_trips_df)
+                Assignment.log_simulation_memory("Step 7", None, None, veh_trips_df)
+
+                ######################################################################################################
+                if Assignment.OUTPUT_PATHSET_PER_SIM_ITER:
+                    FastTripsLogger.info("  Step 8. Write pathsets (paths and links)")
+                    with Stage(Stage.STAGE_WRITE_PATHS, iteration, simulation_iteration) as stage:
+                        stage.rows = 0
+                        for partition in partitions:
+                            (pathset_paths_df, pathset_links_df) = Assignment.read_pathset_partition(output_dir, partition)
+                            Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_paths_df, False, Assignment.OUTPUT_PATHSET_PER_SIM_ITER, force_append=(partition!=partitions[0]))
+                            Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_links_df, True,  Assignment.OUTPUT_PATHSET_PER_SIM_ITER, force_append=(partition!=partitions[0]))
+                            stage.rows += len(pathset_paths_df) + len(pathset_links_df)
+                            del pathset_paths_df, pathset_links_df
+
+                simulation_iteration += 1
+
+                if num_chosen <= 0:
+                    FastTripsLogger.info("  No more path choices to make => Ending simulation loop")
+                    break
+
+                if simulation_iteration > Assignment.MAX_SIMULATION_ITERS:
+                    FastTripsLogger.info("  Maximum simulation iterations reached (%d) => Ending simulation loop" % Assignment.MAX_SIMULATION_ITERS)
+                    break
+
+            completed = True
+        finally:
+            # don't leave the workers running if we failed
+            Assignment.stop_simulation_workers(simulation_workers, completed)
+
+        # Write the pathsets (if we haven't been already) and the final chosen paths for this iteration
+        for partition in partitions:
+            (pathset_paths_df, pathset_links_df) = Assignment.read_pathset_partition(output_dir, partition)
+            append = (iteration>1) or (partition!=partitions[0])
+
+            if Assignment.OUTPUT_PATHSET_PER_SIM_ITER == False:
+                with Stage(Stage.STAGE_WRITE_PATHS, iteration, simulation_iteration) as stage:
+                    Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_paths_df, False, Assignment.OUTPUT_PATHSET_PER_SIM_ITER, force_append=(partition!=partitions[0]))
+                    Passenger.write_paths(output_dir, iteration, simulation_iteration, pathset_links_df, True,  Assignment.OUTPUT_PATHSET_PER_SIM_ITER, force_append=(partition!=partitions[0]))
+                    stage.rows = len(pathset_paths_df) + len(pathset_links_df)
+
+            with Stage(Stage.STAGE_WRITE_OUTPUT, iteration) as stage:
+                chosen_links_df = Passenger.get_chosen_links(pathset_links_df)
+                chosen_links_df["iteration"] = iteration
+                Util.write_dataframe(chosen_links_df, "chosen_links_df", os.path.join(output_dir, "chosenpaths_links.csv"), append=append)
+
+                chosen_paths_df = Passenger.get_chosen_links(pathset_paths_df)
+                chosen_paths_df["iteration"] = iteration
+                Util.write_dataframe(chosen_paths_df, "chosen_paths_df", os.path.join(output_dir, "chosenpaths_paths.csv"), append=append)
+                stage.rows = len(chosen_links_df) + len(chosen_paths_df)
+
+            del pathset_paths_df, pathset_links_df, chosen_paths_df, chosen_links_df
+
+        return (num_passengers_arrived, veh_trips_df)
+
 
 def find_trip_based_paths_process_worker(iteration, worker_num, input_network_dir, input_demand_dir,
                                          output_dir, todo_pathset_queue, done_queue, hyperpath, bump_wait_df, stop_times_df):
@@ -1751,3 +2969,56 @@ def find_trip_based_paths_process_worker(iteration, worker_num, input_network_di
             # call it a day
             done_queue.put( (worker_num, "EXCEPTION", str(sys.exc_info()) ) )
             return
+
+
+def simulate_partition_phase(FT, output_dir, iteration, simulation_iteration, phase, partition, partition_args, veh_trips_df):
+    """
+    Runs the given simulation phase for the given partition.  See :py:meth:`Assignment.run_simulation_partitions`.
+    """
+    if phase == Assignment.SIMULATION_PHASE_COSTS:
+        return Assignment.simulate_partition_costs(FT, output_dir, partition, iteration, simulation_iteration, veh_trips_df)
+
+    (pax_choose_df, update_links) = partition_args
+    return Assignment.simulate_partition_choices(output_dir, partition, iteration, simulation_iteration, pax_choose_df, update_links)
+
+def simulate_partitions_process_worker(FT, output_dir, iteration, worker_num, todo_partition_queue, done_queue):
+    """
+    Process worker function for simulation.  Processes the partitions in the queue, for every phase of every
+    simulation iteration, until it gets 'DONE'.  See :py:meth:`Assignment.start_simulation_workers`.
+
+    todo_partition_queue has (simulation iteration, phase, partition number, partition args)
+    """
+    worker_str = "_simworker%02d" % worker_num
+
+    from .FastTrips import FastTrips
+    setupLogging(infoLogFilename  = None,
+                 debugLogFilename = os.path.join(output_dir, FastTrips.DEBUG_LOG % worker_str),
+                 logToConsole     = False,
+                 append           = True)
+    FastTripsLogger.info("Iteration %d Worker %2d starting" % (iteration, worker_num))
+
+    # the vehicle trips for this simulation iteration
+    veh_trips_df       = None
+    veh_trips_sim_iter = None
+
+    while True:
+        # go through my queue -- check if we're done
+        todo = todo_partition_queue.get()
+        if todo == 'DONE':
+            FastTripsLogger.debug("Received DONE from the todo_partition_queue")
+            return
+
+        (simulation_iteration, phase, partition, partition_args) = todo
+        FastTripsLogger.info("Processing simulation iteration %d phase %s partition %d" % (simulation_iteration, phase, partition))
+        try:
+            if phase == Assignment.SIMULATION_PHASE_COSTS and veh_trips_sim_iter != simulation_iteration:
+                veh_trips_df       = pandas.read_pickle(os.path.join(output_dir, Assignment.SIMULATION_PARTITION_DIR, Assignment.SIMULATION_PARTITION_VEH_FILE))
+                veh_trips_sim_iter = simulation_iteration
+
+            result = simulate_partition_phase(FT, output_dir, iteration, simulation_iteration, phase, partition, partition_args, veh_trips_df)
+            done_queue.put( (worker_num, "COMPLETED", partition, result) )
+        except:
+            FastTripsLogger.exception("Exception")
+            # call it a day
+            done_queue.put( (worker_num, "EXCEPTION", partition, str(sys.exc_info()) ) )
+            return
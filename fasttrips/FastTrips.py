@@ -22,6 +22,7 @@ from .Logger      import FastTripsLogger, setupLogging
 from .Passenger   import Passenger
 from .Performance import Performance
 from .Route       import Route
+from .Stage       import Stage
 from .Stop        import Stop
 from .TAZ         import TAZ
 from .Transfer    import Transfer
@@ -98,6 +99,7 @@ class FastTrips:
         """
         Assignment.read_configuration()
 
+    @Stage.timed(Stage.STAGE_READ_INPUTS)
     def read_input_files(self):
         """
         Reads in the input network and demand files and initializes the relevant data structures.
@@ -135,7 +137,9 @@ class FastTrips:
 
         # read the TAZs into a TAZ instance
         self.tazs = TAZ(Assignment.INPUT_NETWORK_DIR, Assignment.OUTPUT_DIR, Util.SIMULATION_DAY,
-                        self.stops, self.transfers, self.routes)
+                        self.stops, self.transfers, self.routes, self.trips,
+                        Assignment.PRUNE_DOMINATED_ACCESS_LINKS,
+                        Assignment.ACCESS_DOMINANCE_TIME_MARGIN, Assignment.ACCESS_DOMINANCE_DIST_MARGIN)
 
         # Read the demand int passenger_id -> passenger instance
         self.passengers = Passenger(Assignment.INPUT_DEMAND_DIR, Assignment.OUTPUT_DIR, Util.SIMULATION_DAY, self.stops, self.routes, Assignment.CAPACITY_CONSTRAINT)
@@ -0,0 +1,148 @@
+__copyright__ = "Copyright 2016 Contributing Entities"
+__license__   = """
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+import pandas
+
+from .Logger import FastTripsLogger
+from .Util   import Util
+
+class IdRegistry:
+    """
+    IdRegistry class.
+
+    Keeps the correspondence between string IDs and the numeric IDs that fast-trips assigns them,
+    one per ID namespace, as a pair of unique :py:class:`pandas.Index` objects (one in each direction).
+    This way whole columns can be translated with :py:meth:`pandas.Index.get_indexer` rather than a
+    merge against the mapping table.
+
+    Each namespace remembers the mapping :py:class:`pandas.DataFrame` it was registered with; if a
+    different mapping is passed for the namespace (e.g. after DAPs and TAZs are added to the stops), it is
+    re-registered.  So this works in any process, including those that didn't do the original numbering.
+
+    The registry also keeps the numbered ID tables the C++ extension needs, so these can be passed
+    to it directly rather than it reading them from the intermediate text files.
+    """
+    #: Namespace for stop IDs (including drive access points and TAZs)
+    NAMESPACE_STOP                  = "stop"
+    #: Namespace for trip IDs
+    NAMESPACE_TRIP                  = "trip"
+    #: Namespace for route IDs
+    NAMESPACE_ROUTE                 = "route"
+    #: Namespace for supply modes
+    NAMESPACE_MODE                  = "mode"
+    #: Namespace for TAZ IDs.  These are numbered as part of the stops, so this is a subset of :py:attr:`IdRegistry.NAMESPACE_STOP`.
+    NAMESPACE_TAZ                   = "taz"
+    #: Namespace for person IDs
+    NAMESPACE_PERSON                = "person"
+
+    #: The namespaces with tables passed to the C++ extension
+    EXTENSION_NAMESPACES            = [NAMESPACE_TRIP, NAMESPACE_STOP]
+
+    #: Registered namespaces: namespace -> :py:class:`IdRegistry` instance
+    registry                        = {}
+
+    #: Tables for the C++ extension: namespace -> (numpy.ndarray of int32 numeric IDs, list of string IDs)
+    extension_tables                = {}
+
+    def __init__(self, namespace, mapping_df, id_colname, num_colname):
+        """
+        Constructor from the mapping :py:class:`pandas.DataFrame` *mapping_df*, which has string IDs
+        in *id_colname* and numeric IDs in *num_colname*.
+        """
+        #: The namespace
+        self.namespace   = namespace
+        #: The mapping dataframe this was built from
+        self.mapping_df  = mapping_df
+        #: String ID column name in :py:attr:`IdRegistry.mapping_df`
+        self.id_colname  = id_colname
+        #: Numeric ID column name in :py:attr:`IdRegistry.mapping_df`
+        self.num_colname = num_colname
+
+        #: String IDs
+        self.ids         = pandas.Index(mapping_df[id_colname].values)
+        #: Numeric IDs
+        self.nums        = pandas.Index(mapping_df[num_colname].values)
+
+        #: If the mapping isn't one-to-one, we can't use the indices so :py:meth:`Util.add_new_id` is used.
+        self.is_unique   = self.ids.is_unique and self.nums.is_unique
+        if not self.is_unique:
+            FastTripsLogger.warn("IdRegistry %s mapping is not one-to-one; falling back to merges" % namespace)
+
+    @staticmethod
+    def register(namespace, mapping_df, id_colname, num_colname):
+        """
+        Registers the given mapping for the given namespace, replacing any previous one, and returns it.
+        """
+        IdRegistry.registry[namespace] = IdRegistry(namespace, mapping_df, id_colname, num_colname)
+        FastTripsLogger.debug("IdRegistry registered %d %s ids" % (len(mapping_df), namespace))
+        return IdRegistry.registry[namespace]
+
+    @staticmethod
+    def get(namespace, mapping_df, id_colname, num_colname):
+        """
+        Returns the :py:class:`IdRegistry` for the given namespace, registering the given mapping
+        first if it isn't the registered one.
+        """
+        if namespace in IdRegistry.registry:
+            id_registry = IdRegistry.registry[namespace]
+            if id_registry.mapping_df is mapping_df and \
+               id_registry.id_colname == id_colname and id_registry.num_colname == num_colname:
+                return id_registry
+        return IdRegistry.register(namespace, mapping_df, id_colname, num_colname)
+
+    @staticmethod
+    def add_numeric_id(namespace, mapping_df, id_colname, num_colname,
+                       input_df, input_id_colname, newnum_colname, warn=False, warn_msg=None):
+        """
+        Passing a :py:class:`pandas.DataFrame` *input_df* with a string ID column called *input_id_colname*,
+        adds the numeric ID in the given namespace as a column named *newnum_colname* and returns it.
+
+        The namespace mapping is given as in :py:meth:`IdRegistry.get`.  See :py:meth:`Util.add_new_id`
+        for *warn* and *warn_msg*.
+        """
+        id_registry = IdRegistry.get(namespace, mapping_df, id_colname, num_colname)
+        if not id_registry.is_unique:
+            return Util.add_new_id(input_df, input_id_colname, newnum_colname,
+                                   mapping_df[[id_colname, num_colname]], id_colname, num_colname,
+                                   warn=warn, warn_msg=warn_msg)
+        return Util.add_mapped_column(input_df, input_id_colname, newnum_colname,
+                                      id_registry.ids, id_registry.nums.values, warn=warn, warn_msg=warn_msg)
+
+    @staticmethod
+    def add_string_id(namespace, mapping_df, id_colname, num_colname,
+                      input_df, input_num_colname, newid_colname, warn=False, warn_msg=None):
+        """
+        Passing a :py:class:`pandas.DataFrame` *input_df* with a numeric ID column called *input_num_colname*,
+        adds the string ID in the given namespace as a column named *newid_colname* and returns it.
+
+        The namespace mapping is given as in :py:meth:`IdRegistry.get`.  See :py:meth:`Util.add_new_id`
+        for *warn* and *warn_msg*.
+        """
+        id_registry = IdRegistry.get(namespace, mapping_df, id_colname, num_colname)
+        if not id_registry.is_unique:
+            return Util.add_new_id(input_df, input_num_colname, newid_colname,
+                                   mapping_df[[num_colname, id_colname]], num_colname, id_colname,
+                                   warn=warn, warn_msg=warn_msg)
+        return Util.add_mapped_column(input_df, input_num_colname, newid_colname,
+                                      id_registry.nums, id_registry.ids.values, warn=warn, warn_msg=warn_msg)
+
+    @staticmethod
+    def set_extension_table(namespace, mapping_df, id_colname, num_colname):
+        """
+        Sets the numbered ID table passed to the C++ extension for the given namespace.  This is
+        usually the registered mapping, but not always; e.g. trip IDs may have route IDs prepended for the extension.
+        """
+        IdRegistry.extension_tables[namespace] = (mapping_df[num_colname].values.astype('int32'),
+                                                  [str(id_str) for id_str in mapping_df[id_colname].values])
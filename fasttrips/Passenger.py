@@ -16,13 +16,14 @@ import collections,datetime,os,sys
 import numpy
 import pandas
 
-from .Error  import DemandInputErorr
-from .Logger import FastTripsLogger
-from .Route  import Route
-from .Stop   import Stop
-from .TAZ    import TAZ
-from .Trip   import Trip
-from .Util   import Util
+from .Error      import DemandInputErorr
+from .IdRegistry import IdRegistry
+from .Logger     import FastTripsLogger
+from .Route      import Route
+from .Stop       import Stop
+from .TAZ        import TAZ
+from .Trip       import Trip
+from .Util       import Util
 
 class Passenger:
     """
@@ -123,6 +124,25 @@ class Passenger:
     #: todo replace/rename ??
     PF_COL_PAX_A_TIME_MIN           = 'pf_A_time_min'
 
+    #: Pathset link string columns to keep as categoricals when :py:attr:`Assignment.COMPACT_DATAFRAMES` is set.
+    #: Person ID and person trip ID are not included since they're used as groupby keys during simulation.
+    PF_COMPACT_CATEGORY_COLUMNS     = [PF_COL_LINK_MODE,
+                                       PF_COL_MODE,
+                                       PF_COL_ROUTE_ID,
+                                       PF_COL_TRIP_ID,
+                                       'A_id', 'B_id']
+    #: Pathset link integer columns to downcast when :py:attr:`Assignment.COMPACT_DATAFRAMES` is set, with
+    #: the smallest safe integer type for each.
+    PF_COMPACT_INTEGER_COLUMNS      = {PF_COL_PF_ITERATION                    :numpy.int16,
+                                       PF_COL_PATH_NUM                        :numpy.int8,
+                                       PF_COL_LINK_NUM                        :numpy.int8,
+                                       TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM      :numpy.int8,
+                                       Trip.TRIPS_COLUMN_TRIP_ID_NUM          :numpy.int8,
+                                       Trip.TRIPS_COLUMN_ROUTE_ID_NUM         :numpy.int8,
+                                       Trip.TRIPS_COLUMN_MODE_NUM             :numpy.int8,
+                                       'A_id_num':numpy.int8, 'B_id_num':numpy.int8,
+                                       'A_seq'   :numpy.int8, 'B_seq'   :numpy.int8}
+
     #: pathfinding results
     PF_PATHS_CSV                    = r"pathsfound_paths.csv"
     PF_LINKS_CSV                    = r"pathsfound_links.csv"
@@ -185,8 +205,11 @@ class Passenger:
             self.persons_id_df  = Util.add_numeric_column(self.persons_df[[Passenger.PERSONS_COLUMN_PERSON_ID]],
                                                           id_colname=Passenger.PERSONS_COLUMN_PERSON_ID,
                                                           numeric_newcolname=Passenger.PERSONS_COLUMN_PERSON_ID_NUM)
-            self.persons_df     = pandas.merge(left=self.persons_df, right=self.persons_id_df,
-                                               how="left")
+            IdRegistry.register(IdRegistry.NAMESPACE_PERSON, self.persons_id_df,
+                                Passenger.PERSONS_COLUMN_PERSON_ID, Passenger.PERSONS_COLUMN_PERSON_ID_NUM)
+            self.persons_df     = IdRegistry.add_numeric_id(IdRegistry.NAMESPACE_PERSON, self.persons_id_df,
+                                                            Passenger.PERSONS_COLUMN_PERSON_ID, Passenger.PERSONS_COLUMN_PERSON_ID_NUM,
+                                                            self.persons_df, Passenger.PERSONS_COLUMN_PERSON_ID, Passenger.PERSONS_COLUMN_PERSON_ID_NUM)
             persons_cols        = list(self.persons_df.columns.values)
 
             FastTripsLogger.debug("=========== PERSONS ===========\n" + str(self.persons_df.head()))
@@ -449,14 +472,14 @@ class Passenger:
 
 
     def setup_passenger_pathsets(self, iteration, stops, trip_id_df, trips_df, modes_df, 
-                                 transfers, tazs, prepend_route_id_to_trip_id):
+                                 transfers, tazs, prepend_route_id_to_trip_id, trip_list_ids=None):
         """
         Converts pathfinding results (which is stored in each Passenger :py:class:`PathSet`) into two
         :py:class:`pandas.DataFrame` instances.
 
         Returns two :py:class:`pandas.DataFrame` instances: pathset_paths_df and pathset_links_df.
         These only include pathsets for person trips which have just been sought (e.g. those in
-        :py:attr:`Passenger.pathfind_trip_list_df`)
+        :py:attr:`Passenger.pathfind_trip_list_df`), or for the given *trip_list_ids* if passed.
 
         pathset_paths_df has path set information, where each row represents a passenger's path:
 
@@ -514,11 +537,13 @@ class Passenger:
         pathlist = []
         linklist = []
 
-        trip_list_id_nums = self.pathfind_trip_list_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM].tolist()
-
-        for trip_list_id,pathset in self.id_to_pathset.iteritems():
+        if trip_list_ids is None:
             # only process if we just did pathfinding for this person trip
-            if trip_list_id not in trip_list_id_nums: continue
+            pathfind_trip_list_ids = set(self.pathfind_trip_list_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM].tolist())
+            trip_list_ids = [trip_list_id for trip_list_id in self.id_to_pathset.keys() if trip_list_id in pathfind_trip_list_ids]
+
+        for trip_list_id in trip_list_ids:
+            pathset = self.id_to_pathset[trip_list_id]
 
             if not pathset.goes_somewhere():   continue
             if not pathset.path_found():       continue
@@ -668,17 +693,17 @@ class Passenger:
         FastTripsLogger.debug("setup_passenger_pathsets(): pathset_paths_df(%d) and pathset_links_df(%d) dataframes constructed" % (len(pathset_paths_df), len(pathset_links_df)))
 
         # get A_id and B_id and trip_id
-        pathset_links_df = Util.add_new_id(  input_df=pathset_links_df,          id_colname='A_id_num',                            newid_colname='A_id',
-                                           mapping_df=stops.stop_id_df,  mapping_id_colname=Stop.STOPS_COLUMN_STOP_ID_NUM, mapping_newid_colname=Stop.STOPS_COLUMN_STOP_ID)
-        pathset_links_df = Util.add_new_id(  input_df=pathset_links_df,          id_colname='B_id_num',                            newid_colname='B_id',
-                                           mapping_df=stops.stop_id_df,  mapping_id_colname=Stop.STOPS_COLUMN_STOP_ID_NUM, mapping_newid_colname=Stop.STOPS_COLUMN_STOP_ID)
+        pathset_links_df = IdRegistry.add_string_id(IdRegistry.NAMESPACE_STOP, stops.stop_id_df, Stop.STOPS_COLUMN_STOP_ID, Stop.STOPS_COLUMN_STOP_ID_NUM,
+                                                    pathset_links_df, 'A_id_num', 'A_id')
+        pathset_links_df = IdRegistry.add_string_id(IdRegistry.NAMESPACE_STOP, stops.stop_id_df, Stop.STOPS_COLUMN_STOP_ID, Stop.STOPS_COLUMN_STOP_ID_NUM,
+                                                    pathset_links_df, 'B_id_num', 'B_id')
         # get A_lat, A_lon, B_lat, B_lon
         pathset_links_df = stops.add_stop_lat_lon(pathset_links_df, id_colname="A_id", new_lat_colname="A_lat", new_lon_colname="A_lon")
         pathset_links_df = stops.add_stop_lat_lon(pathset_links_df, id_colname="B_id", new_lat_colname="B_lat", new_lon_colname="B_lon")
 
         # get trip_id
-        pathset_links_df = Util.add_new_id(  input_df=pathset_links_df,          id_colname=Trip.TRIPS_COLUMN_TRIP_ID_NUM,         newid_colname=Trip.TRIPS_COLUMN_TRIP_ID,
-                                           mapping_df=trip_id_df,        mapping_id_colname=Trip.TRIPS_COLUMN_TRIP_ID_NUM, mapping_newid_colname=Trip.TRIPS_COLUMN_TRIP_ID)
+        pathset_links_df = IdRegistry.add_string_id(IdRegistry.NAMESPACE_TRIP, trip_id_df, Trip.TRIPS_COLUMN_TRIP_ID, Trip.TRIPS_COLUMN_TRIP_ID_NUM,
+                                                    pathset_links_df, Trip.TRIPS_COLUMN_TRIP_ID_NUM, Trip.TRIPS_COLUMN_TRIP_ID)
 
         # get route id
         # mode_num will appear in left (for non-transit links) and right (for transit link) both, so we need to consolidate
@@ -734,16 +759,17 @@ class Passenger:
         return (pathset_paths_df, pathset_links_df)
 
     @staticmethod
-    def write_paths(output_dir, iteration, simulation_iteration, pathset_df, links, output_pathset_per_sim_iter):
+    def write_paths(output_dir, iteration, simulation_iteration, pathset_df, links, output_pathset_per_sim_iter, force_append=False):
         """
-        Write either pathset paths (if links=False) or pathset links (if links=True) as the case may be
+        Write either pathset paths (if links=False) or pathset links (if links=True) as the case may be.
+        If *force_append* is True, always appends (e.g. for writing a pathset in partitions).
         """
         # if iteration == 0, then this is the pathfinding result
         if iteration==0:
             Util.write_dataframe(df=pathset_df,
                                  name="pathset_links_df" if links else "pathset_paths_df",
                                  output_file=os.path.join(output_dir, Passenger.PF_LINKS_CSV if links else Passenger.PF_PATHS_CSV),
-                                 append=False,
+                                 append=force_append,
                                  keep_duration_columns=True)
             return
 
@@ -758,6 +784,7 @@ class Passenger:
             if (iteration == 1) and (simulation_iter == 0): do_append = False
         else:
             if iteration == 1: do_append = False
+        if force_append: do_append = True
 
         Util.write_dataframe(pathset_df,
                              "pathset_links_df" if links else "pathset_paths_df",
@@ -779,8 +806,39 @@ class Passenger:
         If *choose_for_everyone* is True, this will attempt to choose for every passenger trip.
         Otherwise, this will attempt to choose for just those passenger trips that still need it.
 
+        This is done in three parts so that the first and last can be run separately on partitions of the passenger trips
+        with the same results: :py:meth:`Passenger.group_paths_for_choice`, :py:meth:`Passenger.draw_path_choice_random_numbers`
+        and :py:meth:`Passenger.choose_paths_with_random_numbers`.
+
         Returns (TOTAL num passenger trips chosen, NEW num passenger trips chosen, updated pathset_paths_df, updated pathset_links_df)
         """
+        (pathset_paths_df, pathset_paths_df_grouped) = Passenger.group_paths_for_choice(choose_for_everyone, pathset_paths_df)
+
+        (num_chosen, pax_choose_df, update_links) = Passenger.draw_path_choice_random_numbers(iteration, simulation_iteration, pathset_paths_df_grouped)
+
+        # If we have nothing to do, return
+        if len(pax_choose_df) == 0:
+            return (num_chosen, 0, pathset_paths_df, pathset_links_df)
+
+        (num_new_chosen, pathset_paths_df, pathset_links_df) = Passenger.choose_paths_with_random_numbers(
+            iteration, simulation_iteration, pax_choose_df, update_links, pathset_paths_df, pathset_links_df)
+        num_chosen += num_new_chosen
+
+        FastTripsLogger.info("          Chose %d out of %d paths from the pathsets => total chosen %d" %
+                             (num_new_chosen, len(pathset_paths_df_grouped), num_chosen))
+
+        return (num_chosen, num_new_chosen, pathset_paths_df, pathset_links_df)
+
+    @staticmethod
+    def group_paths_for_choice(choose_for_everyone, pathset_paths_df):
+        """
+        First part of :py:meth:`Passenger.choose_paths`: resets or rejects path choices as appropriate and groups the paths
+        to passenger trips.  Each passenger trip is handled independently.
+
+        Returns (updated pathset_paths_df, pathset_paths_df_grouped).  The latter has one row per passenger trip,
+        sorted by person ID, person trip ID and trip list ID num, with the maximum :py:attr:`Assignment.SIM_COL_PAX_CHOSEN`
+        and the minimum cost of the paths that are not chosen yet (in column `choosable_cost`).
+        """
         from .Assignment import Assignment
         from .PathSet    import PathSet
 
@@ -802,12 +860,39 @@ class Passenger:
             #     # do the same to links
             #     rejected_paths.groupby([Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM, Passenger.PF_COL_PATH_NUM])
 
+        # this tells us if there's anything to choose from
+        pathset_paths_df["choosable_cost"] = PathSet.HUGE_COST
+        pathset_paths_df.loc[pathset_paths_df[Assignment.SIM_COL_PAX_CHOSEN]==Assignment.CHOSEN_NOT_CHOSEN_YET, "choosable_cost"] = \
+            pathset_paths_df[Assignment.SIM_COL_PAX_COST]
+
         # group to passenger trips
         pathset_paths_df_grouped = pathset_paths_df[[Passenger.TRIP_LIST_COLUMN_PERSON_ID,
                                                      Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID,
                                                      Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM,
-                                                     Assignment.SIM_COL_PAX_CHOSEN]].groupby([Passenger.TRIP_LIST_COLUMN_PERSON_ID,Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID,
-                                                                                              Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM]).aggregate("max").reset_index()
+                                                     Assignment.SIM_COL_PAX_CHOSEN,
+                                                     "choosable_cost"]].groupby([Passenger.TRIP_LIST_COLUMN_PERSON_ID,Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID,
+                                                                                 Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM]).aggregate(
+                                                                                {Assignment.SIM_COL_PAX_CHOSEN:"max", "choosable_cost":"min"}).reset_index()
+        pathset_paths_df.drop(["choosable_cost"], axis=1, inplace=True)
+
+        return (pathset_paths_df, pathset_paths_df_grouped)
+
+    @staticmethod
+    def draw_path_choice_random_numbers(iteration, simulation_iteration, pathset_paths_df_grouped):
+        """
+        Second part of :py:meth:`Passenger.choose_paths`: counts the choices and draws a random number for each passenger trip
+        needing a choice.  Each random number is a function of just the run seed (:py:attr:`Assignment.RANDOM_SEED`),
+        the iterations and the trip list ID num (see :py:meth:`Util.philox_uniform`), so it doesn't depend on the order of
+        the passenger trips or how they're partitioned.  The counts and update_links are for *all* the passenger trips
+        from :py:meth:`Passenger.group_paths_for_choice`, though, so if it was run on partitions, concatenate them first.
+
+        Returns (num passenger trips chosen, pax_choose_df, update_links) where pax_choose_df has the passenger trips needing
+        a choice with their random number, and update_links is True if :py:meth:`Passenger.choose_paths_with_random_numbers`
+        will choose any paths, and so should update the pathset links for *every* passenger trip.
+        """
+        from .Assignment import Assignment
+        from .PathSet    import PathSet
+
         # if there's no chosen AND one of the unchosen options is choosable then we can choose
         num_rejected = len(pathset_paths_df_grouped.loc[ pathset_paths_df_grouped[Assignment.SIM_COL_PAX_CHOSEN]==Assignment.CHOSEN_REJECTED       ])  # everything is rejected
         num_unchosen = len(pathset_paths_df_grouped.loc[ pathset_paths_df_grouped[Assignment.SIM_COL_PAX_CHOSEN]==Assignment.CHOSEN_NOT_CHOSEN_YET ])
@@ -819,19 +904,37 @@ class Passenger:
 
         FastTripsLogger.info("          Have %6d total passenger-trips, with %6d chosen paths, %6d fully rejected and %6d needing a choice" % (len(pathset_paths_df_grouped), num_chosen, num_rejected, num_unchosen))
 
-        # If we have nothing to do, return
         if len(pax_choose_df) == 0:
-            return (num_chosen, 0, pathset_paths_df, pathset_links_df)
+            return (num_chosen, pax_choose_df, False)
 
         # flag it
         pax_choose_df["to_choose"] = 1
 
         # Choose a random number for them now
-        # todo: do this differently?
-        numpy.random.seed(iteration*1000 + simulation_iteration)
-        pax_choose_df["rand"] = numpy.random.rand(len(pax_choose_df))
+        pax_choose_df["rand"] = Util.philox_uniform(Assignment.RANDOM_SEED, iteration,
+                                                    pax_choose_df[Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM].values,
+                                                    Util.RANDOM_STREAM_PATH_CHOICE + simulation_iteration)
         # FastTripsLogger.debug("\n%s" % pax_choose_df.head().to_string())
 
+        update_links = (pax_choose_df["choosable_cost"] < PathSet.HUGE_COST).any()
+        return (num_chosen, pax_choose_df, update_links)
+
+    @staticmethod
+    def choose_paths_with_random_numbers(iteration, simulation_iteration, pax_choose_df, update_links, pathset_paths_df, pathset_links_df):
+        """
+        Third part of :py:meth:`Passenger.choose_paths`: chooses paths for the passenger trips in *pax_choose_df*
+        using their random numbers from :py:meth:`Passenger.draw_path_choice_random_numbers`.  Each passenger trip
+        is handled independently; *pax_choose_df* may include passenger trips that aren't in these pathsets, or none.
+
+        Returns (NEW num passenger trips chosen, updated pathset_paths_df, updated pathset_links_df)
+        """
+        from .Assignment import Assignment
+        from .PathSet    import PathSet
+
+        if not update_links:
+            FastTripsLogger.info("          No choosable paths")
+            return (0, pathset_paths_df, pathset_links_df)
+
         # add to_choose flag and rand to pathset_paths_df
         pathset_paths_df = pandas.merge(left =pathset_paths_df,
                                         right=pax_choose_df[[Passenger.TRIP_LIST_COLUMN_PERSON_ID,Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID,Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM, "to_choose", "rand"]],
@@ -844,47 +947,43 @@ class Passenger:
                                                 (pathset_paths_df[Assignment.SIM_COL_PAX_CHOSEN] == Assignment.CHOSEN_NOT_CHOSEN_YET) ].copy()
         FastTripsLogger.debug("choose_paths() paths_choose_df=\n%s" % pathset_paths_df.loc[ (pathset_paths_df["to_choose"]==1) ].head(30).to_string())
 
-        if len(paths_choose_df) == 0:
-            FastTripsLogger.info("          No choosable paths")
-            pathset_paths_df.drop(["to_choose","rand"], axis=1, inplace=True)
-            return (num_chosen, 0, pathset_paths_df, pathset_links_df)
-
-        # Use updated probability -- create cumulative probability
-        paths_choose_df["prob_cum"] = paths_choose_df.groupby([Passenger.TRIP_LIST_COLUMN_PERSON_ID,
-                                                              Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID,
-                                                               Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM])[Assignment.SIM_COL_PAX_PROBABILITY].cumsum()
-        # verify cumsum is ok
-        # FastTripsLogger.debug("choose_path() paths_choose_df=\n%s\n" % paths_choose_df.head(100).to_string())
-
-        # use it to choose the path based on the cumulative probability
-        paths_choose_df["rand_less"] = False
-        paths_choose_df.loc[paths_choose_df["rand"] < paths_choose_df["prob_cum"], "rand_less"] = True
-        if num_unchosen < 10:
-            FastTripsLogger.debug("choose_path() paths_choose_df=\n%s\n" % paths_choose_df.to_string())
-        else:
-            FastTripsLogger.debug("choose_path() paths_choose_df=\n%s\n" % paths_choose_df.head(100).to_string())
-
-        # this will now be person id, trip list id num, index for chosen path
-        chosen_path_df = paths_choose_df[[Passenger.TRIP_LIST_COLUMN_PERSON_ID,
-                                          Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID,
-                                          Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM,
-                                          "rand_less"]].groupby([Passenger.TRIP_LIST_COLUMN_PERSON_ID,
-                                                                 Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID,
-                                                                 Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM]).idxmax(axis=0).reset_index()
-        chosen_path_df.rename(columns={"rand_less":"chosen_idx"}, inplace=True)
-        FastTripsLogger.debug("choose_path() chosen_path_df=\n%s\n" % chosen_path_df.head(30).to_string())
-        num_chosen += len(chosen_path_df)
-
-        # mark it as chosen
-        pathset_paths_df = pandas.merge(left=pathset_paths_df, right=chosen_path_df, how="left")
-        pathset_paths_df.loc[pathset_paths_df["chosen_idx"]==pathset_paths_df.index, Assignment.SIM_COL_PAX_CHOSEN] = iteration + (0.01*simulation_iteration)
-        FastTripsLogger.debug("choose_path() pathset_paths_df=\n%s\n" % pathset_paths_df.head(30).to_string())
-
-        FastTripsLogger.info("          Chose %d out of %d paths from the pathsets => total chosen %d" %
-                             (len(chosen_path_df), len(pathset_paths_df_grouped), num_chosen))
+        num_new_chosen = 0
+        # this may be empty if we're only doing some of the passenger trips
+        if len(paths_choose_df) > 0:
+            # Use updated probability -- create cumulative probability
+            paths_choose_df["prob_cum"] = paths_choose_df.groupby([Passenger.TRIP_LIST_COLUMN_PERSON_ID,
+                                                                  Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID,
+                                                                   Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM])[Assignment.SIM_COL_PAX_PROBABILITY].cumsum()
+            # verify cumsum is ok
+            # FastTripsLogger.debug("choose_path() paths_choose_df=\n%s\n" % paths_choose_df.head(100).to_string())
+
+            # use it to choose the path based on the cumulative probability
+            paths_choose_df["rand_less"] = False
+            paths_choose_df.loc[paths_choose_df["rand"] < paths_choose_df["prob_cum"], "rand_less"] = True
+            if len(pax_choose_df) < 10:
+                FastTripsLogger.debug("choose_path() paths_choose_df=\n%s\n" % paths_choose_df.to_string())
+            else:
+                FastTripsLogger.debug("choose_path() paths_choose_df=\n%s\n" % paths_choose_df.head(100).to_string())
+
+            # this will now be person id, trip list id num, index for chosen path
+            chosen_path_df = paths_choose_df[[Passenger.TRIP_LIST_COLUMN_PERSON_ID,
+                                              Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID,
+                                              Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM,
+                                              "rand_less"]].groupby([Passenger.TRIP_LIST_COLUMN_PERSON_ID,
+                                                                     Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID,
+                                                                     Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM]).idxmax(axis=0).reset_index()
+            chosen_path_df.rename(columns={"rand_less":"chosen_idx"}, inplace=True)
+            FastTripsLogger.debug("choose_path() chosen_path_df=\n%s\n" % chosen_path_df.head(30).to_string())
+            num_new_chosen = len(chosen_path_df)
+
+            # mark it as chosen
+            pathset_paths_df = pandas.merge(left=pathset_paths_df, right=chosen_path_df, how="left")
+            pathset_paths_df.loc[pathset_paths_df["chosen_idx"]==pathset_paths_df.index, Assignment.SIM_COL_PAX_CHOSEN] = iteration + (0.01*simulation_iteration)
+            FastTripsLogger.debug("choose_path() pathset_paths_df=\n%s\n" % pathset_paths_df.head(30).to_string())
+            pathset_paths_df.drop(["chosen_idx"], axis=1, inplace=True)
 
         # drop the intermediates
-        pathset_paths_df.drop(["to_choose","rand","chosen_idx"], axis=1, inplace=True)
+        pathset_paths_df.drop(["to_choose","rand"], axis=1, inplace=True)
         FastTripsLogger.debug("choose_path() pathset_paths_df=\n%s\n" % pathset_paths_df.head(30).to_string())
 
         # give the chosen index to pathset_links_df
@@ -899,7 +998,7 @@ class Passenger:
                                                                 Assignment.SIM_COL_PAX_CHOSEN]],
                                         how="left")
 
-        return (num_chosen, len(chosen_path_df), pathset_paths_df, pathset_links_df)
+        return (num_new_chosen, pathset_paths_df, pathset_links_df)
 
 
     @staticmethod
@@ -53,6 +53,51 @@ class Performance:
     PERFORMANCE_COLUMN_WORKING_SET_BYTES      = "working set bytes"
     #: Performance column: Private usage in memroy, in bytes
     PERFORMANCE_COLUMN_PRIVATE_USAGE_BYTES    = "private usage bytes"
+    #: Performance column: Number of paths drawn during stochastic path enumeration
+    PERFORMANCE_COLUMN_ENUMERATION_DRAWS      = "enumeration draws"
+    #: Performance column: Why stochastic path enumeration stopped; one of :py:attr:`Performance.ENUMERATION_STOP_REASONS`
+    PERFORMANCE_COLUMN_ENUMERATION_STOP       = "enumeration stop reason"
+
+    #: Performance column: Number of trips scanned from labeled stops
+    PERFORMANCE_COLUMN_TRIPS_SCANNED          = "trips scanned"
+    #: Performance column: Number of links added to stop hyperlinks
+    PERFORMANCE_COLUMN_LINKS_ADDED            = "links added"
+    #: Performance column: Number of links pruned (rejected) from stop hyperlinks
+    PERFORMANCE_COLUMN_LINKS_PRUNED           = "links pruned"
+    #: Performance column: Number of stops pushed onto the label stop queue
+    PERFORMANCE_COLUMN_QUEUE_PUSHES           = "queue pushes"
+    #: Performance column: Number of stops popped from the label stop queue
+    PERFORMANCE_COLUMN_QUEUE_POPS             = "queue pops"
+
+    #: Search phases timed by the C++ extension (fasttrips::SEARCH_PHASE_NAMES).  Each has a
+    #: performance column for calls (:py:attr:`Performance.PERFORMANCE_COLUMN_PHASE_CALLS_FMT`)
+    #: and one for nanoseconds spent (:py:attr:`Performance.PERFORMANCE_COLUMN_PHASE_NANOSECONDS_FMT`)
+    PERFORMANCE_PHASES                        = ["initializeStopStates",
+                                                 "updateStopStatesForTransfers",
+                                                 "updateStopStatesForTrips",
+                                                 "updateStopStatesForFinalLinks",
+                                                 "finalizeTazState",
+                                                 "hyperpathGeneratePath",
+                                                 "calculateCost"]
+    #: Performance column format: Number of calls to a search phase
+    PERFORMANCE_COLUMN_PHASE_CALLS_FMT        = "%s calls"
+    #: Performance column format: Nanoseconds spent in a search phase
+    PERFORMANCE_COLUMN_PHASE_NANOSECONDS_FMT  = "%s nanoseconds"
+
+    #: Performance columns for search counters, including the search phase columns
+    PERFORMANCE_COUNTER_COLUMNS               = [PERFORMANCE_COLUMN_TRIPS_SCANNED,
+                                                 PERFORMANCE_COLUMN_LINKS_ADDED,
+                                                 PERFORMANCE_COLUMN_LINKS_PRUNED,
+                                                 PERFORMANCE_COLUMN_QUEUE_PUSHES,
+                                                 PERFORMANCE_COLUMN_QUEUE_POPS] + \
+                                                [fmt % phase for phase in PERFORMANCE_PHASES
+                                                 for fmt in [PERFORMANCE_COLUMN_PHASE_CALLS_FMT,
+                                                             PERFORMANCE_COLUMN_PHASE_NANOSECONDS_FMT]]
+
+    #: Enumeration stop reason codes from the C++ extension (fasttrips::EnumerationStopReason) to strings
+    ENUMERATION_STOP_REASONS                  = { 0:"pathset size",
+                                                  1:"no new paths",
+                                                  2:"unseen mass" }
 
     #: File with to write performance results
     OUTPUT_PERFORMANCE_FILE                   = 'ft_output_performance.csv'
@@ -75,8 +120,12 @@ class Performance:
             Performance.PERFORMANCE_COLUMN_TIME_ENUMERATING         :[],
             Performance.PERFORMANCE_COLUMN_TIME_ENUMERATING_MS      :[],
             Performance.PERFORMANCE_COLUMN_WORKING_SET_BYTES        :[],
-            Performance.PERFORMANCE_COLUMN_PRIVATE_USAGE_BYTES      :[]
+            Performance.PERFORMANCE_COLUMN_PRIVATE_USAGE_BYTES      :[],
+            Performance.PERFORMANCE_COLUMN_ENUMERATION_DRAWS        :[],
+            Performance.PERFORMANCE_COLUMN_ENUMERATION_STOP         :[]
         }
+        for key in Performance.PERFORMANCE_COUNTER_COLUMNS:
+            self.performance_dict[key] = []
 
 
     def add_info(self, iteration, person_id, trip_list_id_num, perf_dict):
@@ -96,9 +145,14 @@ class Performance:
                     Performance.PERFORMANCE_COLUMN_TIME_LABELING_MS,
                     Performance.PERFORMANCE_COLUMN_TIME_ENUMERATING_MS,
                     Performance.PERFORMANCE_COLUMN_WORKING_SET_BYTES,
-                    Performance.PERFORMANCE_COLUMN_PRIVATE_USAGE_BYTES]:
+                    Performance.PERFORMANCE_COLUMN_PRIVATE_USAGE_BYTES,
+                    Performance.PERFORMANCE_COLUMN_ENUMERATION_DRAWS] + Performance.PERFORMANCE_COUNTER_COLUMNS:
             self.performance_dict[key].append(perf_dict[key])
 
+        # convert enumeration stop reason code to something readable
+        self.performance_dict[Performance.PERFORMANCE_COLUMN_ENUMERATION_STOP].append(
+            Performance.ENUMERATION_STOP_REASONS[perf_dict[Performance.PERFORMANCE_COLUMN_ENUMERATION_STOP]])
+
         # convert milliseconds time to timedeltas
         self.performance_dict[Performance.PERFORMANCE_COLUMN_TIME_LABELING   ].append(datetime.timedelta(milliseconds=perf_dict[Performance.PERFORMANCE_COLUMN_TIME_LABELING_MS   ]))
         self.performance_dict[Performance.PERFORMANCE_COLUMN_TIME_ENUMERATING].append(datetime.timedelta(milliseconds=perf_dict[Performance.PERFORMANCE_COLUMN_TIME_ENUMERATING_MS]))
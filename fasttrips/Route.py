@@ -15,9 +15,10 @@ __license__   = """
 import datetime, os
 import pandas
 
-from .Error  import NetworkInputError
-from .Logger import FastTripsLogger
-from .Util   import Util
+from .Error      import NetworkInputError
+from .IdRegistry import IdRegistry
+from .Logger     import FastTripsLogger
+from .Util       import Util
 
 class Route(object):
     """
@@ -179,6 +180,8 @@ class Route(object):
                                                    numeric_newcolname=Route.ROUTES_COLUMN_ROUTE_ID_NUM)
         FastTripsLogger.debug("Route ID to number correspondence\n" + str(self.route_id_df.head()))
         FastTripsLogger.debug(str(self.route_id_df.dtypes))
+        IdRegistry.register(IdRegistry.NAMESPACE_ROUTE, self.route_id_df,
+                            Route.ROUTES_COLUMN_ROUTE_ID, Route.ROUTES_COLUMN_ROUTE_ID_NUM)
         # write intermediate files
         self.route_id_df.to_csv(os.path.join(output_dir, Route.OUTPUT_ROUTE_ID_NUM_FILE),
                                 columns=[Route.ROUTES_COLUMN_ROUTE_ID_NUM, Route.ROUTES_COLUMN_ROUTE_ID],
@@ -314,10 +317,9 @@ class Route(object):
         Passing a :py:class:`pandas.DataFrame` with a route ID column called *id_colname*,
         adds the numeric route id as a column named *numeric_newcolname* and returns it.
         """
-        return Util.add_new_id(input_df, id_colname, numeric_newcolname,
-                               mapping_df=self.route_id_df,
-                               mapping_id_colname=Route.ROUTES_COLUMN_ROUTE_ID,
-                               mapping_newid_colname=Route.ROUTES_COLUMN_ROUTE_ID_NUM)
+        return IdRegistry.add_numeric_id(IdRegistry.NAMESPACE_ROUTE, self.route_id_df,
+                                         Route.ROUTES_COLUMN_ROUTE_ID, Route.ROUTES_COLUMN_ROUTE_ID_NUM,
+                                         input_df, id_colname, numeric_newcolname)
 
     def add_access_egress_modes(self, access_modes_df, egress_modes_df):
         """
@@ -335,6 +337,8 @@ class Route(object):
                                       access_modes_df,
                                       egress_modes_df], axis=0)
         self.modes_df.reset_index(inplace=True)
+        IdRegistry.register(IdRegistry.NAMESPACE_MODE, self.modes_df,
+                            Route.ROUTES_COLUMN_MODE, Route.ROUTES_COLUMN_MODE_NUM)
 
         # write intermediate files
         self.modes_df.to_csv(os.path.join(self.output_dir, Route.OUTPUT_MODE_NUM_FILE),
@@ -347,8 +351,6 @@ class Route(object):
         Passing a :py:class:`pandas.DataFrame` with a mode ID column called *id_colname*,
         adds the numeric mode id as a column named *numeric_newcolname* and returns it.
         """
-        return Util.add_new_id(input_df, id_colname, numeric_newcolname,
-                               mapping_df=self.modes_df[[Route.ROUTES_COLUMN_MODE_NUM, Route.ROUTES_COLUMN_MODE]],
-                               mapping_id_colname=Route.ROUTES_COLUMN_MODE,
-                               mapping_newid_colname=Route.ROUTES_COLUMN_MODE_NUM,
-                               warn=warn)
\ No newline at end of file
+        return IdRegistry.add_numeric_id(IdRegistry.NAMESPACE_MODE, self.modes_df,
+                                         Route.ROUTES_COLUMN_MODE, Route.ROUTES_COLUMN_MODE_NUM,
+                                         input_df, id_colname, numeric_newcolname, warn=warn)
\ No newline at end of file
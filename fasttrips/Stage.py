@@ -0,0 +1,201 @@
+__copyright__ = "Copyright 2016 Contributing Entities"
+__license__   = """
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import functools, os, time
+import pandas
+
+from .Logger import FastTripsLogger
+from .Util   import Util
+
+class Stage:
+    """
+    Stage class.  Keeps track of the wall clock time, CPU time, memory use and number of rows processed
+    for each stage of a fast-trips run (reading inputs, pathfinding, each simulation step, writing output, etc.)
+    by iteration and simulation iteration, so it's clear where the time goes and runs can be compared with
+    each other; see ``scripts/runBenchmarks.py``.
+
+    A :py:class:`Stage` instance is a context manager that measures the code it wraps::
+
+        with Stage(Stage.STAGE_CALCULATE_COST, iteration, simulation_iteration) as stage:
+            (pathset_paths_df, pathset_links_df) = PathSet.calculate_cost(...)
+            stage.rows = len(pathset_links_df)
+
+    and :py:meth:`Stage.timed` decorates a function that is a stage by itself.
+
+    Like :py:class:`IdRegistry`, the records are kept at the class level so any module can time a stage
+    without a :py:class:`FastTrips` instance.  Each process keeps its own records and only the main
+    process writes them, so work done in pathfinding or simulation worker processes shows up in
+    the wall clock time of the stage that waits for them but not in the CPU time or memory.
+
+    A stage may be timed more than once per (iteration, simulation iteration), e.g. putting passengers
+    on vehicles for each bump iteration, and stages may be nested (the intermediate files are written
+    while reading inputs), so the rows shouldn't simply be summed into a run time.
+    """
+    #: Stage column: Iteration.  0 for the stages before the first iteration.
+    STAGE_COLUMN_ITERATION                  = "iteration"
+    #: Stage column: Simulation iteration, or -1 for stages outside the simulation
+    STAGE_COLUMN_SIMULATION_ITERATION       = "simulation iteration"
+    #: Stage column: Stage name
+    STAGE_COLUMN_STAGE                      = "stage"
+    #: Stage column: Number of rows processed by the stage (e.g. pathset links), if it's set
+    STAGE_COLUMN_ROWS                       = "rows"
+    #: Stage column: Wall clock time spent in the stage, in seconds
+    STAGE_COLUMN_WALL_SECONDS               = "wall seconds"
+    #: Stage column: CPU time (user and system) spent in the stage by this process, in seconds
+    STAGE_COLUMN_CPU_SECONDS                = "cpu seconds"
+    #: Stage column: Resident memory of the process at the end of the stage, in bytes.  See :py:meth:`Util.get_process_mem_use`.
+    STAGE_COLUMN_RSS_BYTES                  = "rss bytes"
+    #: Stage column: Change in resident memory of the process over the stage, in bytes
+    STAGE_COLUMN_RSS_DELTA_BYTES            = "rss delta bytes"
+    #: Stage column: Peak resident memory of the process at the end of the stage, in bytes.  See :py:meth:`Util.get_process_peak_mem_use`.
+    #: This is at least :py:attr:`Stage.STAGE_COLUMN_RSS_BYTES`.
+    STAGE_COLUMN_PEAK_RSS_BYTES             = "peak rss bytes"
+
+    #: Stage columns, in output order
+    STAGE_COLUMNS                           = [STAGE_COLUMN_ITERATION,
+                                               STAGE_COLUMN_SIMULATION_ITERATION,
+                                               STAGE_COLUMN_STAGE,
+                                               STAGE_COLUMN_ROWS,
+                                               STAGE_COLUMN_WALL_SECONDS,
+                                               STAGE_COLUMN_CPU_SECONDS,
+                                               STAGE_COLUMN_RSS_BYTES,
+                                               STAGE_COLUMN_RSS_DELTA_BYTES,
+                                               STAGE_COLUMN_PEAK_RSS_BYTES]
+
+    #: Stage: read the network and demand (includes :py:attr:`Stage.STAGE_WRITE_INTERMEDIATES` done while reading)
+    STAGE_READ_INPUTS                       = "read inputs"
+    #: Stage: write the intermediate files for the C++ extension, the configuration and the simulation partitions
+    STAGE_WRITE_INTERMEDIATES               = "write intermediates"
+    #: Stage: pathfinding (or reading the paths from file).  Includes :py:attr:`Stage.STAGE_SETUP_PATHSETS` and
+    #: :py:attr:`Stage.STAGE_WRITE_PATHS` if the pathsets are streamed.
+    STAGE_PATHFINDING                       = "pathfinding"
+    #: Stage: convert the pathfinding results to pathset dataframes.  See :py:meth:`Passenger.setup_passenger_pathsets`.
+    STAGE_SETUP_PATHSETS                    = "setup_passenger_pathsets"
+    #: Simulation step 1: :py:meth:`Assignment.find_passenger_vehicle_times`
+    STAGE_FIND_PASSENGER_VEHICLE_TIMES      = "find_passenger_vehicle_times"
+    #: Simulation step 2: :py:meth:`Assignment.flag_missed_transfers`
+    STAGE_FLAG_MISSED_TRANSFERS             = "flag_missed_transfers"
+    #: Simulation step 3: :py:meth:`PathSet.calculate_cost`
+    STAGE_CALCULATE_COST                    = "calculate_cost"
+    #: Simulation step 4: :py:meth:`Passenger.choose_paths`
+    STAGE_CHOOSE_PATHS                      = "choose_paths"
+    #: Simulation step 5: :py:meth:`Assignment.put_passengers_on_vehicles`
+    STAGE_PUT_PASSENGERS_ON_VEHICLES        = "put_passengers_on_vehicles"
+    #: Simulation step 6: :py:meth:`Assignment.flag_bump_overcap_passengers`
+    STAGE_FLAG_BUMP_OVERCAP_PASSENGERS      = "flag_bump_overcap_passengers"
+    #: Simulation step 7: :py:meth:`Trip.update_trip_times`
+    STAGE_UPDATE_TRIP_TIMES                 = "update_trip_times"
+    #: Partitioned simulation steps 1-4a, for all partitions.  See :py:meth:`Assignment.simulate_partitioned`.
+    STAGE_SIMULATE_PARTITION_COSTS          = "simulate partition costs"
+    #: Partitioned simulation steps 4b-5a, for all partitions.  See :py:meth:`Assignment.simulate_partitioned`.
+    STAGE_SIMULATE_PARTITION_CHOICES        = "simulate partition choices"
+    #: Stage: write the pathsets.  See :py:meth:`Passenger.write_paths`.
+    STAGE_WRITE_PATHS                       = "write_paths"
+    #: Stage: write the other output (chosen paths, vehicle trips, checkpoints)
+    STAGE_WRITE_OUTPUT                      = "write output"
+
+    #: File to write stage performance results
+    OUTPUT_STAGE_PERFORMANCE_FILE           = "ft_output_stage_performance.csv"
+
+    #: The stage records not yet written, a list of dicts keyed by :py:attr:`Stage.STAGE_COLUMNS`
+    records                                 = []
+
+    #: Has :py:attr:`Stage.OUTPUT_STAGE_PERFORMANCE_FILE` been started?  Later writes append.
+    written                                 = False
+
+    def __init__(self, stage, iteration=0, simulation_iteration=-1):
+        """
+        Constructor.  The stage is measured from entering the ``with`` block to leaving it.
+
+        :param stage:                The stage name, e.g. :py:attr:`Stage.STAGE_CALCULATE_COST`
+        :type stage:                 string
+        :param iteration:            The iteration, or 0 for stages before the first iteration
+        :type iteration:             int
+        :param simulation_iteration: The simulation iteration, or -1 for stages outside the simulation
+        :type simulation_iteration:  int
+        """
+        #: Stage name
+        self.stage                = stage
+        #: Iteration
+        self.iteration            = iteration
+        #: Simulation iteration
+        self.simulation_iteration = simulation_iteration
+        #: Number of rows processed.  Set this in the ``with`` block if it's meaningful for the stage.
+        self.rows                 = None
+
+    @staticmethod
+    def get_cpu_seconds():
+        """
+        Returns the user and system CPU time used by this process so far, in seconds.
+        """
+        times = os.times()
+        return times[0] + times[1]
+
+    def __enter__(self):
+        self.start_wall_seconds = time.time()
+        self.start_cpu_seconds  = Stage.get_cpu_seconds()
+        self.start_rss_bytes    = Util.get_process_mem_use()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        # if the stage failed, there's nothing to record; let the exception through
+        if exc_type is not None: return False
+
+        wall_seconds = time.time() - self.start_wall_seconds
+        rss_bytes    = Util.get_process_mem_use()
+        # the peak and current memory come from different sources (and ru_maxrss is rounded to kilobytes)
+        # so make sure the peak is never below the current
+        peak_bytes   = Util.get_process_peak_mem_use()
+        if rss_bytes is not None and (peak_bytes is None or peak_bytes < rss_bytes): peak_bytes = rss_bytes
+        Stage.records.append({
+            Stage.STAGE_COLUMN_ITERATION            :self.iteration,
+            Stage.STAGE_COLUMN_SIMULATION_ITERATION :self.simulation_iteration,
+            Stage.STAGE_COLUMN_STAGE                :self.stage,
+            Stage.STAGE_COLUMN_ROWS                 :self.rows,
+            Stage.STAGE_COLUMN_WALL_SECONDS         :wall_seconds,
+            Stage.STAGE_COLUMN_CPU_SECONDS          :Stage.get_cpu_seconds() - self.start_cpu_seconds,
+            Stage.STAGE_COLUMN_RSS_BYTES            :rss_bytes,
+            Stage.STAGE_COLUMN_RSS_DELTA_BYTES      :rss_bytes - self.start_rss_bytes if rss_bytes is not None else None,
+            Stage.STAGE_COLUMN_PEAK_RSS_BYTES       :peak_bytes
+        })
+        FastTripsLogger.debug("Stage %s iteration %d simulation iteration %d took %.3f seconds" %
+                              (self.stage, self.iteration, self.simulation_iteration, wall_seconds))
+        return False
+
+    @staticmethod
+    def timed(stage):
+        """
+        Decorator for a function that is a stage by itself, outside of the iterations.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with Stage(stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def write(output_dir):
+        """
+        Writes the stage records so far to :py:attr:`Stage.OUTPUT_STAGE_PERFORMANCE_FILE`, appending if it's
+        been written already this run, and clears them.
+        """
+        if len(Stage.records) == 0: return
+
+        stage_df = pandas.DataFrame(Stage.records, columns=Stage.STAGE_COLUMNS)
+        stage_df.to_csv(os.path.join(output_dir, Stage.OUTPUT_STAGE_PERFORMANCE_FILE), index=False,
+                        mode="a" if Stage.written else "w", header=not Stage.written)
+        Stage.written = True
+        Stage.records = []
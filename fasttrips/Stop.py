@@ -16,6 +16,7 @@ import collections,datetime,os,sys
 import pandas
 
 from .Error import NetworkInputError
+from .IdRegistry import IdRegistry
 from .Logger import FastTripsLogger
 from .Trip import Trip
 from .Util import Util
@@ -107,6 +108,8 @@ class Stop:
                                                   numeric_newcolname=Stop.STOPS_COLUMN_STOP_ID_NUM)
         FastTripsLogger.debug("Stop ID to number correspondence\n" + str(self.stop_id_df.head()))
         FastTripsLogger.debug(str(self.stop_id_df.dtypes))
+        IdRegistry.register(IdRegistry.NAMESPACE_STOP, self.stop_id_df,
+                            Stop.STOPS_COLUMN_STOP_ID, Stop.STOPS_COLUMN_STOP_ID_NUM)
 
         #: Note the max stop ID num in :py:attr:`Stop.max_stop_id_num`.
         self.max_stop_id_num = self.stop_id_df[Stop.STOPS_COLUMN_STOP_ID_NUM].max()
@@ -182,6 +185,14 @@ class Stop:
         self.stop_id_df = pandas.concat([self.stop_id_df, tazs_unique_df], axis=0)
         ##############################################################################################
 
+        # register the full numbering, and the TAZ subset
+        IdRegistry.register(IdRegistry.NAMESPACE_STOP, self.stop_id_df,
+                            Stop.STOPS_COLUMN_STOP_ID, Stop.STOPS_COLUMN_STOP_ID_NUM)
+        IdRegistry.register(IdRegistry.NAMESPACE_TAZ, tazs_unique_df,
+                            Stop.STOPS_COLUMN_STOP_ID, Stop.STOPS_COLUMN_STOP_ID_NUM)
+        IdRegistry.set_extension_table(IdRegistry.NAMESPACE_STOP, self.stop_id_df,
+                                       Stop.STOPS_COLUMN_STOP_ID, Stop.STOPS_COLUMN_STOP_ID_NUM)
+
         # write the stop id numbering file
         self.stop_id_df.to_csv(os.path.join(self.output_dir, Stop.OUTPUT_STOP_ID_NUM_FILE),
                                columns=[Stop.STOPS_COLUMN_STOP_ID_NUM, Stop.STOPS_COLUMN_STOP_ID],
@@ -194,11 +205,10 @@ class Stop:
         Passing a :py:class:`pandas.DataFrame` with a stop ID column called *id_colname*,
         adds the numeric stop id as a column named *numeric_newcolname* and returns it.
         """
-        return Util.add_new_id(input_df, id_colname, numeric_newcolname,
-                                   mapping_df=self.stop_id_df,
-                                   mapping_id_colname=Stop.STOPS_COLUMN_STOP_ID,
-                                   mapping_newid_colname=Stop.STOPS_COLUMN_STOP_ID_NUM,
-                                   warn=warn, warn_msg=warn_msg)
+        return IdRegistry.add_numeric_id(IdRegistry.NAMESPACE_STOP, self.stop_id_df,
+                                         Stop.STOPS_COLUMN_STOP_ID, Stop.STOPS_COLUMN_STOP_ID_NUM,
+                                         input_df, id_colname, numeric_newcolname,
+                                         warn=warn, warn_msg=warn_msg)
 
     def add_stop_lat_lon(self, input_df, id_colname, new_lat_colname, new_lon_colname, new_stop_name_colname=None):
         """
@@ -13,13 +13,15 @@ __license__   = """
     limitations under the License.
 """
 import collections,datetime,os,sys
-import pandas
+import numpy,pandas
 
 from .Error    import NetworkInputError
 from .Logger   import FastTripsLogger
 from .Route    import Route
+from .Stage    import Stage
 from .Stop     import Stop
 from .Transfer import Transfer
+from .Trip     import Trip
 from .Util     import Util
 
 class TAZ:
@@ -209,9 +211,17 @@ class TAZ:
     #: initialize_fasttrips_extension() because of the strings involved, I think.
     OUTPUT_ACCESS_EGRESS_FILE               = "ft_intermediate_access_egress.txt"
 
-    def __init__(self, input_dir, output_dir, today, stops, transfers, routes):
+    #: File listing the drive access/egress links removed by :py:meth:`TAZ.prune_dominated_drive_links`,
+    #: each with a stop whose link dominates it.
+    OUTPUT_DOMINATED_LINKS_FILE             = "ft_output_dominated_drive_links.csv"
+
+    def __init__(self, input_dir, output_dir, today, stops, transfers, routes, trips,
+                 prune_dominated_links=False, dominance_time_margin=0.0, dominance_dist_margin=0.0):
         """
         Constructor.  Reads the TAZ data from the input files in *input_dir*.
+
+        If *prune_dominated_links*, drive access and egress links that are dominated by another link
+        for the same TAZ and supply mode are removed; see :py:meth:`TAZ.prune_dominated_drive_links`.
         """
         self.access_modes_df = pandas.DataFrame(data={TAZ.MODE_COLUMN_MODE    :TAZ.ACCESS_EGRESS_MODES,
                                                       TAZ.MODE_COLUMN_MODE_NUM:TAZ.ACCESS_MODE_NUMS })
@@ -444,12 +454,166 @@ class TAZ:
             self.drive_access_df = routes.add_numeric_mode_id(self.drive_access_df,
                                                               id_colname=TAZ.DRIVE_ACCESS_COLUMN_SUPPLY_MODE,
                                                               numeric_newcolname=TAZ.DRIVE_ACCESS_COLUMN_SUPPLY_MODE_NUM)
+            if prune_dominated_links:
+                self.prune_dominated_drive_links(trips, output_dir, dominance_time_margin, dominance_dist_margin)
 
         # warn on stops that have no walk access
         self.warn_on_stops_without_walk_access(stops)
 
         # write this to communicate to extension
-        self.write_access_egress_for_extension(output_dir)
+        with Stage(Stage.STAGE_WRITE_INTERMEDIATES):
+            self.write_access_egress_for_extension(output_dir)
+
+    def prune_dominated_drive_links(self, trips, output_dir, time_margin, dist_margin):
+        """
+        Removes the drive access and egress links that are dominated by another link for the same TAZ
+        and supply mode, so pathfinding doesn't start (or end) at those stops.  Drive access TAZs can have
+        links to many park-and-ride lot stops and each one is a starting point for the search.
+
+        Link A dominates link B if:
+
+        * A's drive time and walk time are each no more than B's, and A's total time is at least
+          *time_margin* minutes less than B's,
+        * A's drive distance and walk distance are each no more than B's, and A's total distance is at
+          least *dist_margin* less than B's,
+        * A is strictly faster or strictly shorter than B,
+        * A's drive cost (and its lot's hourly and maximum cost, if specified) is no more than B's,
+        * A's lot is open whenever B's lot is open,
+        * every trip stopping at B's stop also stops at A's stop -- before B for access links, after B
+          for egress links, and
+        * on each of those trips, the vehicle's run time between the two stops is no more than the time A saves
+          (B's total time minus A's).
+
+        So a passenger using link B to board a trip at B's stop could instead use link A, leave no earlier,
+        and board the same vehicle upstream at A's stop -- riding through B's stop, so every later stop is still
+        reachable the same way.  For egress, they could stay on the vehicle to A's stop downstream and still
+        arrive no later.  The paths found may differ (in-vehicle time replaces drive and walk time) but no
+        path arrives later or leaves earlier.
+
+        Writes the removed links to :py:attr:`TAZ.OUTPUT_DOMINATED_LINKS_FILE`.
+        """
+        dom_suffix = "_dom"
+        self.drive_access_df.reset_index(drop=True, inplace=True)
+
+        # the attributes to compare; missing lot costs don't count against either link
+        compare_cols = [TAZ.DRIVE_ACCESS_COLUMN_DRIVE_TRAVEL_TIME_MIN,
+                        TAZ.DRIVE_ACCESS_COLUMN_WALK_TIME_MIN,
+                        TAZ.DRIVE_ACCESS_COLUMN_DRIVE_DISTANCE,
+                        TAZ.DRIVE_ACCESS_COLUMN_WALK_DISTANCE,
+                        TAZ.DRIVE_ACCESS_COLUMN_COST]
+        for lot_cost_col in [TAZ.DAP_COLUMN_HOURLY_COST, TAZ.DAP_COLUMN_MAXIMUM_COST]:
+            if lot_cost_col in list(self.drive_access_df.columns.values):
+                compare_cols.append(lot_cost_col)
+
+        links_df = self.drive_access_df[[TAZ.DRIVE_ACCESS_COLUMN_TAZ_NUM,
+                                         TAZ.DRIVE_ACCESS_COLUMN_SUPPLY_MODE_NUM,
+                                         TAZ.DRIVE_ACCESS_COLUMN_DIRECTION,
+                                         TAZ.DRIVE_ACCESS_COLUMN_STOP_NUM,
+                                         TAZ.DRIVE_ACCESS_COLUMN_START_TIME_MIN,
+                                         TAZ.DRIVE_ACCESS_COLUMN_END_TIME_MIN] + compare_cols].copy()
+        links_df[compare_cols] = links_df[compare_cols].fillna(0)
+        links_df["total_time_min"] = links_df[TAZ.DRIVE_ACCESS_COLUMN_DRIVE_TRAVEL_TIME_MIN] + links_df[TAZ.DRIVE_ACCESS_COLUMN_WALK_TIME_MIN]
+        links_df["total_dist"]     = links_df[TAZ.DRIVE_ACCESS_COLUMN_DRIVE_DISTANCE] + links_df[TAZ.DRIVE_ACCESS_COLUMN_WALK_DISTANCE]
+        links_df["link_index"]     = links_df.index
+
+        # 1) candidate pairs: (dominated link, dominating link) for the same TAZ, supply mode and direction
+        #    done a TAZ at a time so the pairs don't get too big
+        candidates_list = []
+        for taz_num, taz_links_df in links_df.groupby(TAZ.DRIVE_ACCESS_COLUMN_TAZ_NUM):
+            if len(taz_links_df) < 2: continue
+
+            pairs_df = pandas.merge(left    =taz_links_df,
+                                    right   =taz_links_df,
+                                    on      =[TAZ.DRIVE_ACCESS_COLUMN_TAZ_NUM,
+                                              TAZ.DRIVE_ACCESS_COLUMN_SUPPLY_MODE_NUM,
+                                              TAZ.DRIVE_ACCESS_COLUMN_DIRECTION],
+                                    suffixes=("", dom_suffix),
+                                    how     ="inner")
+            dominated = (pairs_df["link_index"] != pairs_df["link_index%s" % dom_suffix]) & \
+                        (pairs_df[TAZ.DRIVE_ACCESS_COLUMN_STOP_NUM] != pairs_df["%s%s" % (TAZ.DRIVE_ACCESS_COLUMN_STOP_NUM, dom_suffix)]) & \
+                        (pairs_df["total_time_min%s" % dom_suffix] + time_margin <= pairs_df["total_time_min"]) & \
+                        (pairs_df["total_dist%s"     % dom_suffix] + dist_margin <= pairs_df["total_dist"]) & \
+                        ((pairs_df["total_time_min%s" % dom_suffix] < pairs_df["total_time_min"]) |
+                         (pairs_df["total_dist%s"     % dom_suffix] < pairs_df["total_dist"])) & \
+                        (pairs_df["%s%s" % (TAZ.DRIVE_ACCESS_COLUMN_START_TIME_MIN, dom_suffix)] <= pairs_df[TAZ.DRIVE_ACCESS_COLUMN_START_TIME_MIN]) & \
+                        (pairs_df["%s%s" % (TAZ.DRIVE_ACCESS_COLUMN_END_TIME_MIN,   dom_suffix)] >= pairs_df[TAZ.DRIVE_ACCESS_COLUMN_END_TIME_MIN])
+            for compare_col in compare_cols:
+                dominated = dominated & (pairs_df["%s%s" % (compare_col, dom_suffix)] <= pairs_df[compare_col])
+
+            candidates_list.append(pairs_df.loc[dominated, ["link_index", "link_index%s" % dom_suffix,
+                                                            "total_time_min", "total_time_min%s" % dom_suffix,
+                                                            TAZ.DRIVE_ACCESS_COLUMN_DIRECTION,
+                                                            TAZ.DRIVE_ACCESS_COLUMN_STOP_NUM,
+                                                            "%s%s" % (TAZ.DRIVE_ACCESS_COLUMN_STOP_NUM, dom_suffix)]])
+
+        if len(candidates_list) == 0:
+            FastTripsLogger.info("No dominated drive links found")
+            return
+        candidates_df = pandas.concat(candidates_list, axis=0)
+
+        # 2) for the unique stop pairs, check that every trip stopping at the dominated stop also stops at the
+        #    dominating stop, upstream for access and downstream for egress, and find the longest run time between them
+        stop_pairs_df = candidates_df[[TAZ.DRIVE_ACCESS_COLUMN_DIRECTION,
+                                       TAZ.DRIVE_ACCESS_COLUMN_STOP_NUM,
+                                       "%s%s" % (TAZ.DRIVE_ACCESS_COLUMN_STOP_NUM, dom_suffix)]].drop_duplicates()
+
+        stop_times_df = trips.stop_times_df[[Trip.STOPTIMES_COLUMN_TRIP_ID_NUM,
+                                             Trip.STOPTIMES_COLUMN_STOP_ID_NUM,
+                                             Trip.STOPTIMES_COLUMN_STOP_SEQUENCE,
+                                             Trip.STOPTIMES_COLUMN_ARRIVAL_TIME_MIN,
+                                             Trip.STOPTIMES_COLUMN_DEPARTURE_TIME_MIN]]
+        stop_times_df = stop_times_df.rename(columns={Trip.STOPTIMES_COLUMN_STOP_ID_NUM:TAZ.DRIVE_ACCESS_COLUMN_STOP_NUM})
+        dom_stop_times_df = stop_times_df.rename(columns=dict([(col, "%s%s" % (col, dom_suffix)) for col in stop_times_df.columns.values
+                                                               if col != Trip.STOPTIMES_COLUMN_TRIP_ID_NUM]))
+
+        # every visit of a trip to the dominated stop
+        visits_df = pandas.merge(left=stop_pairs_df, right=stop_times_df, on=TAZ.DRIVE_ACCESS_COLUMN_STOP_NUM, how="inner")
+        # with the same trip's visits to the dominating stop, if any
+        visits_df = pandas.merge(left=visits_df, right=dom_stop_times_df,
+                                 on=[Trip.STOPTIMES_COLUMN_TRIP_ID_NUM, "%s%s" % (TAZ.DRIVE_ACCESS_COLUMN_STOP_NUM, dom_suffix)],
+                                 how="left")
+        # access: board upstream at the dominating stop; egress: alight downstream at the dominating stop
+        is_access = (visits_df[TAZ.DRIVE_ACCESS_COLUMN_DIRECTION] == "access")
+        dom_seq   = visits_df["%s%s" % (Trip.STOPTIMES_COLUMN_STOP_SEQUENCE, dom_suffix)]
+        served    = ( is_access & (dom_seq < visits_df[Trip.STOPTIMES_COLUMN_STOP_SEQUENCE])) | \
+                    (~is_access & (dom_seq > visits_df[Trip.STOPTIMES_COLUMN_STOP_SEQUENCE]))
+        visits_df["run_time_min"] = numpy.where(is_access,
+            visits_df[Trip.STOPTIMES_COLUMN_DEPARTURE_TIME_MIN] - visits_df["%s%s" % (Trip.STOPTIMES_COLUMN_DEPARTURE_TIME_MIN, dom_suffix)],
+            visits_df["%s%s" % (Trip.STOPTIMES_COLUMN_ARRIVAL_TIME_MIN, dom_suffix)] - visits_df[Trip.STOPTIMES_COLUMN_ARRIVAL_TIME_MIN])
+        visits_df.loc[~served, "run_time_min"] = numpy.nan
+
+        # for each visit, the closest dominating stop visit (NaN if there isn't one); for each stop pair, the longest of those
+        stop_pair_cols = list(stop_pairs_df.columns.values)
+        visits_df = visits_df.groupby(stop_pair_cols + [Trip.STOPTIMES_COLUMN_TRIP_ID_NUM, Trip.STOPTIMES_COLUMN_STOP_SEQUENCE])["run_time_min"].min().reset_index()
+        visits_df["served"] = pandas.notnull(visits_df["run_time_min"])
+        stop_pairs_df = visits_df.groupby(stop_pair_cols).agg({"served":"min", "run_time_min":"max"}).reset_index()
+        stop_pairs_df = stop_pairs_df.loc[stop_pairs_df["served"] == True, stop_pair_cols + ["run_time_min"]]
+
+        # 3) remove the links with a dominating link that saves at least the run time
+        candidates_df = pandas.merge(left=candidates_df, right=stop_pairs_df, on=stop_pair_cols, how="inner")
+        candidates_df = candidates_df.loc[candidates_df["total_time_min%s" % dom_suffix] + candidates_df["run_time_min"] <= candidates_df["total_time_min"]]
+        candidates_df.drop_duplicates(subset=["link_index"], inplace=True)
+
+        removed_df = self.drive_access_df.loc[candidates_df["link_index"].values,
+                                              [TAZ.DRIVE_ACCESS_COLUMN_TAZ,
+                                               TAZ.DRIVE_ACCESS_COLUMN_SUPPLY_MODE,
+                                               TAZ.DRIVE_ACCESS_COLUMN_LOT_ID,
+                                               TAZ.DRIVE_ACCESS_COLUMN_STOP]].reset_index(drop=True)
+        removed_df["dominated_by_%s" % TAZ.DRIVE_ACCESS_COLUMN_LOT_ID] = \
+            self.drive_access_df.loc[candidates_df["link_index%s" % dom_suffix].values, TAZ.DRIVE_ACCESS_COLUMN_LOT_ID].values
+        removed_df["dominated_by_%s" % TAZ.DRIVE_ACCESS_COLUMN_STOP] = \
+            self.drive_access_df.loc[candidates_df["link_index%s" % dom_suffix].values, TAZ.DRIVE_ACCESS_COLUMN_STOP].values
+        removed_df.to_csv(os.path.join(output_dir, TAZ.OUTPUT_DOMINATED_LINKS_FILE), index=False)
+
+        num_links = len(self.drive_access_df)
+        links_by_mode   = self.drive_access_df.groupby(TAZ.DRIVE_ACCESS_COLUMN_SUPPLY_MODE).size()
+        removed_by_mode = removed_df.groupby(TAZ.DRIVE_ACCESS_COLUMN_SUPPLY_MODE).size()
+        self.drive_access_df = self.drive_access_df.drop(candidates_df["link_index"].values)
+
+        FastTripsLogger.info("Removed %d of %d drive links as dominated (time margin %.2f min, distance margin %.2f); wrote %s" %
+                             (len(removed_df), num_links, time_margin, dist_margin, TAZ.OUTPUT_DOMINATED_LINKS_FILE))
+        for supply_mode, mode_links in links_by_mode.iteritems():
+            FastTripsLogger.info("  %-20s removed %7d of %7d links" % (supply_mode, removed_by_mode.get(supply_mode, 0), mode_links))
 
     def add_distance(self, links_df, dist_col):
         """
@@ -17,6 +17,7 @@ import pandas
 
 from .Error  import NetworkInputError
 from .Logger import FastTripsLogger
+from .Stage  import Stage
 from .Stop   import Stop
 
 class Transfer:
@@ -208,7 +209,9 @@ class Transfer:
                                                          warn=True,
                                                          warn_msg="Numeric stop id not found for transfer to_stop_id")
             # We're ready to write it
-            self.write_transfers_for_extension()
+            with Stage(Stage.STAGE_WRITE_INTERMEDIATES) as stage:
+                self.write_transfers_for_extension()
+                stage.rows = len(self.transfers_df)
 
     def add_distance(self, links_df, dist_col):
         """
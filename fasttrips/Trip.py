@@ -15,9 +15,11 @@ __license__   = """
 import collections,datetime,os,sys
 import numpy,pandas
 
-from .Logger import FastTripsLogger
-from .Route  import Route
-from .Util   import Util
+from .IdRegistry import IdRegistry
+from .Logger     import FastTripsLogger
+from .Route      import Route
+from .Stage      import Stage
+from .Util       import Util
 
 class Trip:
     """
@@ -171,6 +173,16 @@ class Trip:
     #: Default headway if no previous matching route/trip
     DEFAULT_HEADWAY             = 60
 
+    #: Columns of the vehicle trips that :py:meth:`Trip.linkify_vehicle_trips` depends on; if these
+    #: are unchanged, the cached vehicle links in :py:attr:`Trip.vehicle_links_cache` are still valid.
+    VEHICLE_LINKS_CACHE_KEY_COLUMNS             = [STOPTIMES_COLUMN_TRIP_ID_NUM,
+                                                   STOPTIMES_COLUMN_STOP_SEQUENCE,
+                                                   STOPTIMES_COLUMN_STOP_ID_NUM,
+                                                   STOPTIMES_COLUMN_ARRIVAL_TIME,
+                                                   STOPTIMES_COLUMN_DEPARTURE_TIME]
+    #: Cached result of :py:meth:`Trip.linkify_vehicle_trips`: (list of key column arrays, vehicle links dataframe)
+    vehicle_links_cache                         = None
+
     # ========== Simulation column names =======================================================
     #: Result column name: Boards. Int.
     SIM_COL_VEH_BOARDS                          = 'boards'
@@ -198,6 +210,30 @@ class Trip:
     #: Result column name: Number of MSA onboard passengers minus capacity. Float.
     SIM_COL_VEH_MSA_OVERCAP                     = 'msa_overcap'
 
+    #: Simulation string columns to keep as categoricals when :py:attr:`Assignment.COMPACT_DATAFRAMES` is set.
+    #: Trip ID is not included since it's used as a groupby key during simulation.
+    SIM_COMPACT_CATEGORY_COLUMNS                = [TRIPS_COLUMN_ROUTE_ID,
+                                                   TRIPS_COLUMN_SERVICE_ID,
+                                                   TRIPS_COLUMN_SHAPE_ID,
+                                                   TRIPS_COLUMN_VEHICLE_NAME,
+                                                   STOPTIMES_COLUMN_STOP_ID,
+                                                   STOPTIMES_COLUMN_HEADSIGN,
+                                                   Route.ROUTES_COLUMN_MODE]
+    #: Simulation integer columns to downcast when :py:attr:`Assignment.COMPACT_DATAFRAMES` is set, with
+    #: the smallest safe integer type for each.  Counters stay large enough for anything they'll be set to.
+    SIM_COMPACT_INTEGER_COLUMNS                 = {TRIPS_COLUMN_TRIP_ID_NUM      :numpy.int8,
+                                                   TRIPS_COLUMN_ROUTE_ID_NUM     :numpy.int8,
+                                                   TRIPS_COLUMN_MODE_NUM         :numpy.int8,
+                                                   STOPTIMES_COLUMN_STOP_ID_NUM  :numpy.int8,
+                                                   STOPTIMES_COLUMN_STOP_SEQUENCE:numpy.int8,
+                                                   TRIPS_COLUMN_DIRECTION_ID     :numpy.int8,
+                                                   SIM_COL_VEH_BOARDS            :numpy.int32,
+                                                   SIM_COL_VEH_ALIGHTS           :numpy.int32,
+                                                   SIM_COL_VEH_ONBOARD           :numpy.int32,
+                                                   SIM_COL_VEH_STANDEES          :numpy.int32,
+                                                   SIM_COL_VEH_FRICTION          :numpy.int32,
+                                                   SIM_COL_VEH_OVERCAP           :numpy.int32}
+
     def __init__(self, input_dir, output_dir, gtfs_schedule, today, stops, routes, prepend_route_id_to_trip_id):
         """
         Constructor. Read the gtfs data from the transitfeed schedule, and the additional
@@ -296,6 +332,8 @@ class Trip:
                                                   id_colname=Trip.TRIPS_COLUMN_TRIP_ID,
                                                   numeric_newcolname=Trip.TRIPS_COLUMN_TRIP_ID_NUM)
         FastTripsLogger.debug("Trip ID to number correspondence\n" + str(self.trip_id_df.head()))
+        IdRegistry.register(IdRegistry.NAMESPACE_TRIP, self.trip_id_df,
+                            Trip.TRIPS_COLUMN_TRIP_ID, Trip.TRIPS_COLUMN_TRIP_ID_NUM)
 
         # prepend_route_id_to_trip_id
         if prepend_route_id_to_trip_id:
@@ -311,6 +349,8 @@ class Trip:
                                columns=[Trip.TRIPS_COLUMN_TRIP_ID_NUM, Trip.TRIPS_COLUMN_TRIP_ID],
                                sep=" ", index=False)
         FastTripsLogger.debug("Wrote %s" % os.path.join(output_dir, Trip.OUTPUT_TRIP_ID_NUM_FILE))
+        IdRegistry.set_extension_table(IdRegistry.NAMESPACE_TRIP, trip_id_df,
+                                       Trip.TRIPS_COLUMN_TRIP_ID, Trip.TRIPS_COLUMN_TRIP_ID_NUM)
 
         self.trips_df = pandas.merge(left=self.trips_df, right=self.trip_id_df, how='left')
 
@@ -416,7 +456,9 @@ class Trip:
         FastTripsLogger.info("Read %7d %15s from %25s, %25s" %
                              (len(self.stop_times_df), "stop times", "stop_times.txt", Trip.INPUT_STOPTIMES_FILE))
 
-        self.write_trips_for_extension()
+        with Stage(Stage.STAGE_WRITE_INTERMEDIATES) as stage:
+            self.write_trips_for_extension()
+            stage.rows = len(self.trips_df)
 
     def has_capacity_configured(self):
         """
@@ -429,10 +471,9 @@ class Trip:
         Passing a :py:class:`pandas.DataFrame` with a trip ID column called *id_colname*,
         adds the numeric trip id as a column named *numeric_newcolname* and returns it.
         """
-        return Util.add_new_id(input_df, id_colname, numeric_newcolname,
-                                   mapping_df=self.trip_id_df,
-                                   mapping_id_colname=Trip.TRIPS_COLUMN_TRIP_ID,
-                                   mapping_newid_colname=Trip.TRIPS_COLUMN_TRIP_ID_NUM)
+        return IdRegistry.add_numeric_id(IdRegistry.NAMESPACE_TRIP, self.trip_id_df,
+                                         Trip.TRIPS_COLUMN_TRIP_ID, Trip.TRIPS_COLUMN_TRIP_ID_NUM,
+                                         input_df, id_colname, numeric_newcolname)
 
     def get_stop_times(self, trip_id):
         """
@@ -468,25 +509,18 @@ class Trip:
         Also adds dwell time columns named :py:attr:`Trip.STOPTIMES_COLUMN_DWELL_TIME`
         and :py:attr:`Trip.STOPTIMES_COLUMN_DWELL_TIME_SEC`
         """
-        stop_times_len_df = len(self.stop_times_df)
-        # first, find the original travel time following each stop
-        # need to join the next stop and it's arrival time
-        next_stop_df = self.stop_times_df[[Trip.STOPTIMES_COLUMN_TRIP_ID_NUM,
-                                           Trip.STOPTIMES_COLUMN_STOP_SEQUENCE,
-                                           Trip.STOPTIMES_COLUMN_ARRIVAL_TIME]].copy()
-        next_stop_df.loc[:,Trip.STOPTIMES_COLUMN_STOP_SEQUENCE] = next_stop_df[Trip.STOPTIMES_COLUMN_STOP_SEQUENCE]-1
-        next_stop_df.rename(columns={Trip.STOPTIMES_COLUMN_ARRIVAL_TIME:"next_stop_arrival"}, inplace=True)
-
-        FastTripsLogger.debug("next stop arrival:\n%s\n" % next_stop_df.head().to_string())
+        # keep the stop times sorted by trip and sequence so the next stop is the next row
+        self.stop_times_df = self.stop_times_df.sort_values(by=[Trip.STOPTIMES_COLUMN_TRIP_ID_NUM,
+                                                                Trip.STOPTIMES_COLUMN_STOP_SEQUENCE]).reset_index(drop=True)
 
-        self.stop_times_df = pandas.merge(left=self.stop_times_df, right=next_stop_df, how='left')
-        assert(stop_times_len_df == len(self.stop_times_df))
+        # first, find the original travel time following each stop
+        # need the next stop's arrival time, which will be NaT for last stops
+        next_index = Trip.get_next_stop_index(self.stop_times_df)
+        next_stop_arrival = self.stop_times_df[Trip.STOPTIMES_COLUMN_ARRIVAL_TIME].values.take(next_index)
+        next_stop_arrival[next_index < 0] = numpy.datetime64('NaT')
 
-        # this will be NaT for last stops
         self.stop_times_df[Trip.STOPTIMES_COLUMN_ORIGINAL_TRAVEL_TIME] = \
-            self.stop_times_df["next_stop_arrival"] - self.stop_times_df[Trip.STOPTIMES_COLUMN_DEPARTURE_TIME]
-        # drop the extra column
-        self.stop_times_df.drop(["next_stop_arrival"], axis=1, inplace=True)
+            pandas.Series(next_stop_arrival, index=self.stop_times_df.index) - self.stop_times_df[Trip.STOPTIMES_COLUMN_DEPARTURE_TIME]
 
         # copy
         self.stop_times_df[Trip.STOPTIMES_COLUMN_TRAVEL_TIME    ] = self.stop_times_df[Trip.STOPTIMES_COLUMN_ORIGINAL_TRAVEL_TIME]
@@ -739,8 +773,9 @@ class Trip:
             trips_df.loc[(trips_df["next_does_stop"]) & (trips_df["next_is_last_stop"]==False), "decel_secs"] = \
                             trips_df[Trip.VEHICLES_COLUMN_MAXIMUM_SPEED_FPS]/trips_df[Trip.VEHICLES_COLUMN_DECELERATION]
 
-        # update the travel time
-        trips_df[Trip.STOPTIMES_COLUMN_TRAVEL_TIME_SEC] = (trips_df[Trip.STOPTIMES_COLUMN_ORIGINAL_TRAVEL_TIME]/numpy.timedelta64(1, 's')) + trips_df["accel_secs"] + trips_df["decel_secs"]
+        # update the travel time; the original travel time is NaT for last stops since there's no next stop
+        trips_df[Trip.STOPTIMES_COLUMN_TRAVEL_TIME_SEC] = (trips_df[Trip.STOPTIMES_COLUMN_ORIGINAL_TRAVEL_TIME]/numpy.timedelta64(1, 's')).fillna(0.0) + \
+                                                          trips_df["accel_secs"] + trips_df["decel_secs"]
         trips_df[Trip.STOPTIMES_COLUMN_TRAVEL_TIME    ] = trips_df[Trip.STOPTIMES_COLUMN_TRAVEL_TIME_SEC].map(lambda x: datetime.timedelta(seconds=x))
 
         # put travel time + dwell together because that's the full time for a link (stop arrival time to next stop arrival time)
@@ -817,6 +852,36 @@ class Trip:
 
         return trips_df
 
+    @staticmethod
+    def get_next_stop_index(stop_times_df):
+        """
+        Given a :py:class:`pandas.DataFrame` of stop times with columns :py:attr:`Trip.STOPTIMES_COLUMN_TRIP_ID_NUM`
+        and :py:attr:`Trip.STOPTIMES_COLUMN_STOP_SEQUENCE`, returns a :py:class:`numpy.ndarray` with the position
+        of the row for the next stop (the next stop sequence on the same trip) for each row, or -1 if there isn't one.
+
+        If the stop times are sorted by trip and stop sequence (as :py:attr:`Trip.stop_times_df` is), this is just a shift.
+        Otherwise, they're sorted first.
+        """
+        trip_nums  = stop_times_df[Trip.STOPTIMES_COLUMN_TRIP_ID_NUM   ].values
+        stop_seqs  = stop_times_df[Trip.STOPTIMES_COLUMN_STOP_SEQUENCE].values
+        num_rows   = len(stop_times_df)
+        next_index = numpy.empty(num_rows, dtype=numpy.int64)
+        next_index.fill(-1)
+        if num_rows < 2: return next_index
+
+        is_sorted  = ((trip_nums[1:] > trip_nums[:-1]) | ((trip_nums[1:] == trip_nums[:-1]) & (stop_seqs[1:] > stop_seqs[:-1]))).all()
+        if is_sorted:
+            order  = numpy.arange(num_rows)
+        else:
+            order  = numpy.lexsort((stop_seqs, trip_nums))
+            trip_nums = trip_nums.take(order)
+            stop_seqs = stop_seqs.take(order)
+
+        # the row following each sorted row is the next stop if it's on the same trip with the next sequence number
+        has_next   = (trip_nums[1:] == trip_nums[:-1]) & (stop_seqs[1:] == stop_seqs[:-1] + 1)
+        next_index[order[:-1][has_next]] = order[1:][has_next]
+        return next_index
+
     @staticmethod
     def linkify_vehicle_trips(veh_trips_df, stops):
         """
@@ -830,61 +895,56 @@ class Trip:
         * A_lat, A_lon
         * B_lat, B_lon
         * A_arrival_time, A_departure_time, B_arrival_time, B_departure_time
+
+        The result is cached in :py:attr:`Trip.vehicle_links_cache` and returned again as long as the
+        :py:attr:`Trip.VEHICLE_LINKS_CACHE_KEY_COLUMNS` are unchanged, so callers shouldn't modify it
+        beyond adding columns.
         """
         # FastTripsLogger.debug("linkify_vehicle_trips: veh_trips_df (%d)\n%s\n%s" % (len(veh_trips_df), veh_trips_df.head(), str(veh_trips_df.dtypes)))
 
-        veh_temp_df = veh_trips_df[[Route.ROUTES_COLUMN_MODE,
-                                    Trip.TRIPS_COLUMN_MODE_NUM,
-                                    Trip.TRIPS_COLUMN_ROUTE_ID,
-                                    Trip.TRIPS_COLUMN_ROUTE_ID_NUM,
-                                    Trip.TRIPS_COLUMN_TRIP_ID,
-                                    Trip.TRIPS_COLUMN_TRIP_ID_NUM,
-                                    Trip.STOPTIMES_COLUMN_STOP_ID,
-                                    "stop_id_num",
-                                    Trip.STOPTIMES_COLUMN_STOP_SEQUENCE,
-                                    Trip.STOPTIMES_COLUMN_ARRIVAL_TIME,
-                                    Trip.STOPTIMES_COLUMN_DEPARTURE_TIME]].copy()
+        # copy since the vehicle trips get updated in place
+        cache_key = [veh_trips_df[colname].values.copy() for colname in Trip.VEHICLE_LINKS_CACHE_KEY_COLUMNS]
+        if Trip.vehicle_links_cache:
+            (cached_key, cached_links_df) = Trip.vehicle_links_cache
+            if all([numpy.array_equal(cached_col, key_col) for (cached_col, key_col) in zip(cached_key, cache_key)]):
+                FastTripsLogger.debug("linkify_vehicle_trips: vehicle trips unchanged; using cached vehicle links")
+                return cached_links_df
+
+        link_cols   = [Route.ROUTES_COLUMN_MODE,
+                       Trip.TRIPS_COLUMN_MODE_NUM,
+                       Trip.TRIPS_COLUMN_ROUTE_ID,
+                       Trip.TRIPS_COLUMN_ROUTE_ID_NUM,
+                       Trip.TRIPS_COLUMN_TRIP_ID,
+                       Trip.TRIPS_COLUMN_TRIP_ID_NUM]
+        veh_temp_df = veh_trips_df[link_cols + [Trip.STOPTIMES_COLUMN_STOP_ID,
+                                                Trip.STOPTIMES_COLUMN_STOP_ID_NUM,
+                                                Trip.STOPTIMES_COLUMN_STOP_SEQUENCE,
+                                                Trip.STOPTIMES_COLUMN_ARRIVAL_TIME,
+                                                Trip.STOPTIMES_COLUMN_DEPARTURE_TIME]]
         veh_temp_df = stops.add_stop_lat_lon(veh_temp_df, id_colname=Trip.STOPTIMES_COLUMN_STOP_ID, new_lat_colname="lat", new_lon_colname="lon")
-        veh_temp_df["next_stop_seq"] = veh_temp_df[Trip.STOPTIMES_COLUMN_STOP_SEQUENCE] + 1
-
-        # merge with next stop
-        veh_temp_df = pandas.merge(left     = veh_temp_df,
-                                   left_on  = [Route.ROUTES_COLUMN_MODE, Trip.TRIPS_COLUMN_MODE_NUM,
-                                               Trip.TRIPS_COLUMN_ROUTE_ID, Trip.TRIPS_COLUMN_ROUTE_ID_NUM,
-                                               Trip.TRIPS_COLUMN_TRIP_ID,Trip.TRIPS_COLUMN_TRIP_ID_NUM, "next_stop_seq"],
-                                   right    = veh_temp_df,
-                                   right_on = [Route.ROUTES_COLUMN_MODE, Trip.TRIPS_COLUMN_MODE_NUM,
-                                               Trip.TRIPS_COLUMN_ROUTE_ID, Trip.TRIPS_COLUMN_ROUTE_ID_NUM,
-                                               Trip.TRIPS_COLUMN_TRIP_ID,Trip.TRIPS_COLUMN_TRIP_ID_NUM, Trip.STOPTIMES_COLUMN_STOP_SEQUENCE],
-                                   how      = "left",
-                                   suffixes = ["_A","_B"])
-        # drop the ones that have NA - those are last links
-        veh_temp_df = veh_temp_df.loc[ pandas.notnull(veh_temp_df["stop_id_B"])]
-
-        # rename -- maybe our convention should have put A and B as suffixes, eh?
-        rename_cols = {"%s_A" % Trip.STOPTIMES_COLUMN_STOP_SEQUENCE:"A_seq",
-                       "%s_B" % Trip.STOPTIMES_COLUMN_STOP_SEQUENCE:"B_seq",
-                       "%s_A" % Trip.STOPTIMES_COLUMN_STOP_ID:"A_id",
-                       "%s_B" % Trip.STOPTIMES_COLUMN_STOP_ID:"B_id",
-                       "stop_id_num_A":"A_id_num",
-                       "stop_id_num_B":"B_id_num"}
-        for colname in ["lat", "lon",
-                        Trip.STOPTIMES_COLUMN_ARRIVAL_TIME,
-                        Trip.STOPTIMES_COLUMN_DEPARTURE_TIME]:
-            rename_cols["%s_A" % colname] = "A_%s" % colname
-            rename_cols["%s_B" % colname] = "B_%s" % colname
-        veh_temp_df.rename(columns=rename_cols, inplace=True)
-
-        # drop the next_stop_seq
-        veh_temp_df.drop(["next_stop_seq_A", "next_stop_seq_B"], axis=1, inplace=True)
-
-        # B_seq, B_id_num are ints.  they shouldn't be null
-        veh_temp_df["B_seq"]    = veh_temp_df["B_seq"].astype(int)
-        veh_temp_df["B_id_num"] = veh_temp_df["B_id_num"].astype(int)
-
-        # FastTripsLogger.debug("linkify_vehicle_trips: veh_temp_df (%d)\n%s\n%s" % (len(veh_temp_df), veh_temp_df.head(30), str(veh_temp_df.dtypes)))
-
-        return veh_temp_df
+
+        # each row with a next stop is the A end of a link; the next stop is the B end.  Last stops aren't A ends.
+        next_index  = Trip.get_next_stop_index(veh_temp_df)
+        a_index     = numpy.flatnonzero(next_index >= 0)
+        b_index     = next_index.take(a_index)
+
+        veh_links_df = veh_temp_df[link_cols].iloc[a_index].reset_index(drop=True)
+        # maybe our convention should have put A and B as suffixes, eh?
+        end_cols     = [(Trip.STOPTIMES_COLUMN_STOP_ID,        "id"            ),
+                        (Trip.STOPTIMES_COLUMN_STOP_ID_NUM,    "id_num"        ),
+                        (Trip.STOPTIMES_COLUMN_STOP_SEQUENCE,  "seq"           ),
+                        (Trip.STOPTIMES_COLUMN_ARRIVAL_TIME,   "arrival_time"  ),
+                        (Trip.STOPTIMES_COLUMN_DEPARTURE_TIME, "departure_time"),
+                        ("lat",                                "lat"           ),
+                        ("lon",                                "lon"           )]
+        for (end_prefix, end_index) in [("A", a_index), ("B", b_index)]:
+            for (colname, end_colname) in end_cols:
+                veh_links_df["%s_%s" % (end_prefix, end_colname)] = veh_temp_df[colname].values.take(end_index)
+
+        # FastTripsLogger.debug("linkify_vehicle_trips: veh_links_df (%d)\n%s\n%s" % (len(veh_links_df), veh_links_df.head(30), str(veh_links_df.dtypes)))
+
+        Trip.vehicle_links_cache = (cache_key, veh_links_df)
+        return veh_links_df
 
     @staticmethod
     def calculate_headways(trips_df):
@@ -892,51 +952,40 @@ class Trip:
         Calculates headways and sets them into the given
         trips_df :py:class:`pandas.DataFrame`.
 
+        The headway for a stop time is the time since the previous departure from the same stop on the same route (and
+        direction, if specified), in minutes, or :py:attr:`Trip.DEFAULT_HEADWAY` for the first.  These are found with
+        a single sort of all the stop times rather than sorting each group.
+
         Returns :py:class:`pandas.DataFrame` with `headway` column added.
         """
         # what if direction_id isn't specified
         has_direction_id = Trip.TRIPS_COLUMN_DIRECTION_ID in trips_df.columns.values
 
-        if has_direction_id:
-            stop_group = trips_df[[Trip.STOPTIMES_COLUMN_STOP_ID,
-                                   Trip.TRIPS_COLUMN_ROUTE_ID,
-                                   Trip.TRIPS_COLUMN_DIRECTION_ID,
-                                   Trip.STOPTIMES_COLUMN_DEPARTURE_TIME,
-                                   Trip.STOPTIMES_COLUMN_TRIP_ID,
-                                   Trip.STOPTIMES_COLUMN_STOP_SEQUENCE]].groupby([Trip.STOPTIMES_COLUMN_STOP_ID,
-                                                                                 Trip.TRIPS_COLUMN_ROUTE_ID,
-                                                                                 Trip.TRIPS_COLUMN_DIRECTION_ID])
-        else:
-            stop_group = trips_df[[Trip.STOPTIMES_COLUMN_STOP_ID,
-                                   Trip.TRIPS_COLUMN_ROUTE_ID,
-                                   Trip.STOPTIMES_COLUMN_DEPARTURE_TIME,
-                                   Trip.STOPTIMES_COLUMN_TRIP_ID,
-                                   Trip.STOPTIMES_COLUMN_STOP_SEQUENCE]].groupby([Trip.STOPTIMES_COLUMN_STOP_ID,
-                                                                                 Trip.TRIPS_COLUMN_ROUTE_ID])
-
-        stop_group_df = stop_group.apply(lambda x: x.sort_values(Trip.STOPTIMES_COLUMN_DEPARTURE_TIME))
-        # set headway, in minutes
-        stop_group_shift_df = stop_group_df.shift()
-        stop_group_df['headway'] = (stop_group_df[Trip.STOPTIMES_COLUMN_DEPARTURE_TIME] - stop_group_shift_df[Trip.STOPTIMES_COLUMN_DEPARTURE_TIME])/numpy.timedelta64(1,'m')
-        # zero out the first in each group
-        if has_direction_id:
-            stop_group_df.loc[(stop_group_df.stop_id     !=stop_group_shift_df.stop_id     )|
-                              (stop_group_df.route_id    !=stop_group_shift_df.route_id    )|
-                              (stop_group_df.direction_id!=stop_group_shift_df.direction_id), 'headway'] = Trip.DEFAULT_HEADWAY
-        else:
-            stop_group_df.loc[(stop_group_df.stop_id     !=stop_group_shift_df.stop_id     )|
-                              (stop_group_df.route_id    !=stop_group_shift_df.route_id    ), 'headway'] = Trip.DEFAULT_HEADWAY
-        # print stop_group_df
+        group_cols = [Trip.STOPTIMES_COLUMN_STOP_ID, Trip.TRIPS_COLUMN_ROUTE_ID]
+        if has_direction_id: group_cols.append(Trip.TRIPS_COLUMN_DIRECTION_ID)
 
-        trips_df_len = len(trips_df)
-        trips_df = pandas.merge(left  = trips_df,
-                                right = stop_group_df[[Trip.STOPTIMES_COLUMN_TRIP_ID,
-                                                       Trip.STOPTIMES_COLUMN_STOP_ID,
-                                                       Trip.STOPTIMES_COLUMN_STOP_SEQUENCE,
-                                                       'headway']],
-                                on    = [Trip.STOPTIMES_COLUMN_TRIP_ID,
-                                         Trip.STOPTIMES_COLUMN_STOP_ID,
-                                         Trip.STOPTIMES_COLUMN_STOP_SEQUENCE])
-        assert(len(trips_df)==trips_df_len)
+        trips_df = trips_df.reset_index(drop=True)
+
+        # sort by group then departure time; numpy.lexsort takes the primary key last
+        group_codes  = [pandas.factorize(trips_df[colname])[0] for colname in group_cols]
+        depart_times = trips_df[Trip.STOPTIMES_COLUMN_DEPARTURE_TIME].values
+        order        = numpy.lexsort([depart_times.view('int64')] + group_codes[::-1])
+
+        # set headway, in minutes
+        sorted_departs = depart_times.take(order)
+        sorted_headway = numpy.empty(len(order), dtype=numpy.float64)
+        sorted_headway.fill(Trip.DEFAULT_HEADWAY)
+        if len(order) > 1:
+            # the first in each group keeps the default
+            same_group = numpy.ones(len(order)-1, dtype=bool)
+            for codes in group_codes:
+                sorted_codes = codes.take(order)
+                same_group  &= (sorted_codes[1:] == sorted_codes[:-1])
+            sorted_headway[1:][same_group] = (sorted_departs[1:] - sorted_departs[:-1])[same_group]/numpy.timedelta64(1,'m')
+
+        # write back by position
+        headway = numpy.empty(len(order), dtype=numpy.float64)
+        headway[order] = sorted_headway
+        trips_df['headway'] = headway
         return trips_df
 
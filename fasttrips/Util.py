@@ -18,6 +18,7 @@ import csv, datetime, logging, os
 import numpy
 import pandas
 
+from .Error  import UnexpectedError
 from .Logger import FastTripsLogger
 
 class Util:
@@ -41,6 +42,16 @@ class Util:
         'new_waittime'      : 'min'
     }
 
+    #: Random stream type for drawing paths from a hyperpath (done in the fasttrips extension)
+    RANDOM_STREAM_ENUMERATION       = 0
+    #: Random stream type for path choice; the simulation iteration is added to this
+    RANDOM_STREAM_PATH_CHOICE       = 1
+
+    #: Philox4x32-10 multipliers
+    PHILOX_M                        = [numpy.uint64(0xD2511F53), numpy.uint64(0xCD9E8D57)]
+    #: Philox4x32-10 key schedule (Weyl sequence) constants
+    PHILOX_W                        = [numpy.uint64(0x9E3779B9), numpy.uint64(0xBB67AE85)]
+
     @staticmethod
     def add_numeric_column(input_df, id_colname, numeric_newcolname):
         """
@@ -74,8 +85,21 @@ class Util:
         to a numeric ID (*mapping_newid_colname*).
 
         If *warn* is True, then don't worry if some fail.  Just log and move on.  Otherwise, raise an exception.
+
+        When the mapping is one-to-one and has no other columns, this is done with a vectorized index
+        lookup via :py:meth:`Util.add_mapped_column` rather than a merge.
         """
         input_cols = list(input_df.columns.values)
+
+        mapping_cols = list(mapping_df.columns.values)
+        if len(mapping_cols) == 2 and mapping_id_colname in mapping_cols and mapping_newid_colname in mapping_cols and \
+           newid_colname not in input_cols:
+            mapping_index = pandas.Index(mapping_df[mapping_id_colname].values)
+            if mapping_index.is_unique:
+                return Util.add_mapped_column(input_df, id_colname, newid_colname,
+                                              mapping_index, mapping_df[mapping_newid_colname].values,
+                                              warn=warn, warn_msg=warn_msg)
+
         # add the new id column
         return_df = pandas.merge(left=input_df, right=mapping_df,
                                  how='left',
@@ -129,6 +153,66 @@ class Util:
 
         return return_df
 
+    @staticmethod
+    def add_mapped_column(input_df, id_colname, newid_colname, mapping_index, mapping_newids,
+                          warn=False, warn_msg=None):
+        """
+        Passing a :py:class:`pandas.DataFrame` *input_df* with an ID column called *id_colname*,
+        adds the new id as a column named *newid_colname* and returns it, like :py:meth:`Util.add_new_id`.
+
+        The mapping is given by the unique :py:class:`pandas.Index` *mapping_index* of IDs and the
+        array *mapping_newids* of new IDs in the same order, so the lookup is a single
+        :py:meth:`pandas.Index.get_indexer` call.  The returned dataframe has a fresh index, as
+        it would after a merge.
+
+        If *warn* is True, then don't worry if some fail.  Just log and move on.  Otherwise, raise an exception.
+        """
+        indexer   = mapping_index.get_indexer(input_df[id_colname].values)
+        mapped    = indexer >= 0
+        return_df = input_df.reset_index(drop=True)
+
+        if mapped.all():
+            return_df[newid_colname] = mapping_newids.take(indexer)
+            return return_df
+
+        # leave unmapped ids null
+        return_df[newid_colname] = pandas.Series(mapping_newids.take(indexer)).where(mapped)
+
+        # Make sure all ids were mapped.  Null ids are allowed to stay null.  If not warn or error
+        failed = (~mapped)&(pandas.notnull(return_df[id_colname]).values)
+        if failed.any():
+
+            msg_level = logging.CRITICAL
+            if warn: msg_level = logging.WARN
+
+            if warn_msg: FastTripsLogger.log(msg_level, warn_msg)
+            FastTripsLogger.log(msg_level,"Util.add_mapped_column failed to map all ids")
+            FastTripsLogger.log(msg_level,"\n%s\n" % str(return_df.loc[failed,[id_colname,newid_colname]].drop_duplicates()))
+
+            if warn:
+                # remove them
+                return_df = return_df.loc[~failed]
+                # restore the mapping type
+                return_df[newid_colname] = return_df[newid_colname].astype(mapping_newids.dtype)
+            else:
+                raise UnexpectedError("Util.add_mapped_column failed to map all %s values to %s" % (id_colname, newid_colname))
+
+        return return_df
+
+    @staticmethod
+    def get_group_ids(input_df, colnames):
+        """
+        Returns a :py:class:`numpy.ndarray` of integer group IDs, numbered from 0, for the rows of *input_df*
+        such that rows have the same ID if and only if they have the same values for *colnames*.
+        This is like a groupby, but without building the groups.
+        """
+        group_ids = numpy.zeros(len(input_df), dtype=numpy.int64)
+        for colname in colnames:
+            (codes, uniques) = pandas.factorize(input_df[colname])
+            # null is -1, so shift up
+            group_ids = pandas.factorize(group_ids*(len(uniques)+1) + (codes+1))[0]
+        return group_ids
+
     @staticmethod
     def remove_null_columns(input_df, inplace=True):
         """
@@ -286,18 +370,76 @@ class Util:
         dataframe.drop(["dist_lat","dist_lon","dist_hava","dist_havc"], axis=1, inplace=True)
 
     @staticmethod
-    def get_process_mem_use_str():
+    def compact_dataframe(input_df, category_columns, integer_columns):
         """
-        Returns a string representing the process memory use.
+        Reduces the memory used by *input_df* in place and returns it.
+
+        String (object) columns named in *category_columns* are converted to categoricals.  Columns which
+        are used as groupby keys should not be included, since grouping on a categorical includes every category.
+
+        *integer_columns* maps column names to the smallest numpy integer type that is safe for that column
+        (e.g. counters which may grow after this call); each is converted to the smallest type of at least that
+        size which holds the current values.  Columns which aren't integers (e.g. because they have nulls) are left alone.
+
+        Columns which aren't in *input_df* are ignored.
         """
-        try:
-            import psutil
+        for colname in category_columns:
+            if colname not in input_df.columns.values: continue
+            if input_df[colname].dtype != object: continue
+            input_df[colname] = input_df[colname].astype("category")
+
+        for colname, min_dtype in integer_columns.iteritems():
+            if colname not in input_df.columns.values: continue
+            if input_df[colname].dtype.kind != "i": continue
+            if len(input_df) == 0: continue
+
+            col_min = input_df[colname].min()
+            col_max = input_df[colname].max()
+            for dtype in [numpy.int8, numpy.int16, numpy.int32, numpy.int64]:
+                if numpy.dtype(dtype).itemsize < numpy.dtype(min_dtype).itemsize: continue
+                if col_min >= numpy.iinfo(dtype).min and col_max <= numpy.iinfo(dtype).max:
+                    break
+            if input_df[colname].dtype != dtype:
+                input_df[colname] = input_df[colname].astype(dtype)
+
+        return input_df
+
+    @staticmethod
+    def get_dataframe_mem_use(input_df):
+        """
+        Returns the number of bytes used by the given dataframe, including the contents of string columns.
+        """
+        return input_df.memory_usage(index=True, deep=True).sum()
 
+    @staticmethod
+    def get_process_peak_mem_use():
+        """
+        Returns the peak resident memory use of the process, in bytes, or None if it's unknown.
+        """
+        try:
+            import resource
         except ImportError:
-            return "Uknown; please install python package psutil"
+            # e.g. windows
+            try:
+                import psutil
+            except ImportError:
+                return None
+            return psutil.Process().memory_info().peak_wset
+
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # this is in kilobytes on linux, bytes on mac
+        if sys.platform == "darwin":
+            return max_rss
+        return max_rss*1024
 
-        p = psutil.Process()
-        bytes = p.memory_info().rss
+    @staticmethod
+    def get_mem_use_str(bytes):
+        """
+        Returns a human-readable string for the given number of bytes.
+        """
+        if bytes is None:
+            return "Unknown"
         if bytes < 1024:
             return "%d bytes" % bytes
         if bytes < 1024*1024:
@@ -305,3 +447,69 @@ class Util:
         if bytes < 1024*1024*1024:
             return "%.1f MB" % (bytes/(1024.0*1024.0))
         return "%.1f GB" % (bytes/(1024.0*1024.0*1024.0))
+
+    @staticmethod
+    def get_process_mem_use():
+        """
+        Returns the current resident memory use of the process, in bytes, or None if it's unknown.
+        Uses psutil if it's installed, otherwise ``/proc/self/statm`` (linux).
+        """
+        try:
+            import psutil
+        except ImportError:
+            try:
+                with open("/proc/self/statm") as statm:
+                    return int(statm.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+            except (IOError, OSError, AttributeError, ValueError):
+                return None
+
+        return psutil.Process().memory_info().rss
+
+    @staticmethod
+    def get_process_mem_use_str():
+        """
+        Returns a string representing the process memory use.
+        """
+        mem_use = Util.get_process_mem_use()
+        if mem_use is None:
+            return "Uknown; please install python package psutil"
+
+        return Util.get_mem_use_str(mem_use)
+
+    @staticmethod
+    def philox_block(counter, key):
+        """
+        Philox4x32-10 counter-based random number generator (Salmon et al., "Parallel Random Numbers: As Easy as 1, 2, 3", 2011),
+        vectorized over numpy arrays.  *counter* is a list of four arrays (or scalars) of 32-bit values and *key* is a list of two.
+
+        Returns the random block as a list of four numpy.uint64 arrays of 32-bit values.  This is the same generator as
+        fasttrips::RandomStream in the fasttrips extension; keep them in sync.
+        """
+        mask  = numpy.uint64(0xFFFFFFFF)
+        shift = numpy.uint64(32)
+        ctr   = [numpy.asarray(c, dtype=numpy.uint64) & mask for c in counter]
+        key   = [numpy.uint64(k) & mask for k in key]
+        for round_num in range(10):
+            prod0  = Util.PHILOX_M[0]*ctr[0]
+            prod1  = Util.PHILOX_M[1]*ctr[2]
+            ctr    = [(prod1 >> shift) ^ ctr[1] ^ key[0],
+                      prod1 & mask,
+                      (prod0 >> shift) ^ ctr[3] ^ key[1],
+                      prod0 & mask]
+            key    = [(key[0] + Util.PHILOX_W[0]) & mask,
+                      (key[1] + Util.PHILOX_W[1]) & mask]
+        return ctr
+
+    @staticmethod
+    def philox_uniform(seed, iteration, stream_ids, stream_type, draw_index=0):
+        """
+        Returns a numpy array of random numbers uniform in [0,1), one for each of the *stream_ids* (e.g. trip list ID nums).
+
+        Each number depends only on (*seed*, *iteration*, stream ID, *stream_type*, *draw_index*), so it's the same
+        however the stream IDs are partitioned, ordered or split across processes.  The key is (*seed*, *iteration*) and
+        the counter is (*draw_index*, 0, stream ID, *stream_type*); the first 32-bit word of the block is used.
+        """
+        stream_ids = numpy.asarray(stream_ids, dtype=numpy.int64).astype(numpy.uint64)
+        block      = Util.philox_block([draw_index, 0, stream_ids, stream_type],
+                                       [seed & 0xFFFFFFFF, iteration & 0xFFFFFFFF])
+        return block[0].astype(numpy.float64)/4294967296.0
@@ -15,11 +15,13 @@ __license__   = """
 
 from .Assignment import Assignment
 from .FastTrips import FastTrips
+from .IdRegistry import IdRegistry
 from .Logger import FastTripsLogger, setupLogging
 from .Passenger import Passenger
 from .PathSet import PathSet
 from .Performance import Performance
 from .Route import Route
+from .Stage import Stage
 from .Stop import Stop
 from .TAZ import TAZ
 from .Transfer import Transfer
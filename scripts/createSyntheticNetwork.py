@@ -0,0 +1,498 @@
+import argparse, math, os, sys
+import numpy
+import pandas
+
+USAGE = r"""
+
+  python createSyntheticNetwork.py [--size test|small|medium|regional] [--seed #] [options] output_network_dir output_demand_dir
+
+  Writes a synthetic fast-trips input network (GTFS-PLUS) and demand for measuring how fast-trips scales.
+  The network is a grid of bus stops with bus routes along every few rows and columns, rail lines with park-and-ride
+  lots at the stations, and a grid of TAZs with walk and drive access.  The demand is a trip list with random origins,
+  destinations and preferred times.  Everything random is drawn from the given seed, so the same options always
+  write the same files.
+
+  --size picks defaults for the grid, TAZs, rail lines and number of trips, from a test-sized network to a regional
+  one with a million person trips; any option given overrides the size default.  Network and demand are written to
+  separate directories, so several demand sizes can be generated for one network (use --demand_only).
+
+  e.g.
+
+  python scripts\createSyntheticNetwork.py --size small Examples\synthetic_small\input Examples\synthetic_small\demand
+  python scripts\runTest.py stochastic 1 Examples\synthetic_small\input Examples\synthetic_small\demand Examples\synthetic_small\output
+
+"""
+
+#: Defaults for each --size.  Options given on the command line override these.
+SIZE_DEFAULTS = {
+    # size          stops per side  TAZs per side     rail lines          person trips
+    "test"     : {"grid":10,       "taz_grid":5,     "num_rail_lines":1, "num_trips":1000   },
+    "small"    : {"grid":24,       "taz_grid":12,    "num_rail_lines":2, "num_trips":20000  },
+    "medium"   : {"grid":48,       "taz_grid":30,    "num_rail_lines":4, "num_trips":200000 },
+    "regional" : {"grid":96,       "taz_grid":64,    "num_rail_lines":8, "num_trips":1000000},
+}
+
+#: Origin of the grid (the southwest corner)
+ORIGIN_LAT          = 37.70
+ORIGIN_LON          = -122.50
+#: Miles per degree of latitude
+MILES_PER_DEGREE    = 69.0
+
+#: Service ID for every trip
+SERVICE_ID          = "SYN"
+#: Walk distance in miles for transfers between co-located stops and between lots and stations
+TRANSFER_DIST       = 0.05
+#: Drive access links are open all day
+LOT_OPEN            = "00:00:00"
+LOT_CLOSE           = "23:59:59"
+
+#: Purposes in the trip list and their shares
+PURPOSES            = ["work", "other"]
+PURPOSE_SHARES      = [0.4, 0.6]
+
+#: Path weights for every purpose, as (demand_mode_type, demand_mode, supply_mode, weight_name, weight_value)
+PATH_WEIGHTS        = [
+    ("transfer", "transfer", "transfer",    "walk_time_min",         3.93 ),
+    ("transfer", "transfer", "transfer",    "transfer_penalty",      47.73),
+    ("access",   "walk",     "walk_access", "time_min",              3.93 ),
+    ("access",   "PNR",      "PNR_access",  "walk_time_min",         3.93 ),
+    ("access",   "PNR",      "PNR_access",  "drive_time_min",        1.5  ),
+    ("egress",   "walk",     "walk_egress", "time_min",              3.93 ),
+    ("egress",   "PNR",      "PNR_egress",  "walk_time_min",         3.93 ),
+    ("egress",   "PNR",      "PNR_egress",  "drive_time_min",        1.5  ),
+    ("transit",  "transit",  "local_bus",   "in_vehicle_time_min",   1.0  ),
+    ("transit",  "transit",  "local_bus",   "wait_time_min",         1.77 ),
+    ("transit",  "transit",  "heavy_rail",  "in_vehicle_time_min",   1.0  ),
+    ("transit",  "transit",  "heavy_rail",  "wait_time_min",         1.77 ),
+]
+
+NETWORK_CONFIG = """# configuration for fasttrips: synthetic network
+[fasttrips]
+iterations                    = 1
+simulation                    = True
+output_passenger_trajectories = True
+capacity_constraint           = False
+trace_person_ids              = []
+number_of_processes           = 0
+
+[pathfinding]
+pathfinding_type                  = stochastic
+stochastic_dispersion             = 0.5
+stochastic_max_stop_process_count = 1
+stochastic_pathset_size           = 1000
+time_window                       = 30
+"""
+
+DEMAND_CONFIG = """[pathfinding]
+user_class_function           = generic_user_class
+"""
+
+def read_seconds(time_str):
+    """
+    Returns the seconds after midnight for the given HH:MM or HH:MM:SS string.
+    """
+    parts = [int(x) for x in time_str.split(":")]
+    while len(parts) < 3: parts.append(0)
+    return parts[0]*3600 + parts[1]*60 + parts[2]
+
+def format_times(seconds):
+    """
+    Returns a list of HH:MM:SS strings for the given seconds after midnight.
+    """
+    return ["%02d:%02d:%02d" % (s // 3600, (s // 60) % 60, s % 60) for s in seconds]
+
+def to_lat_lon(x_miles, y_miles):
+    """
+    Returns (latitude, longitude) arrays for the given grid coordinates in miles east and north of the origin.
+    """
+    lat = ORIGIN_LAT + numpy.asarray(y_miles)/MILES_PER_DEGREE
+    lon = ORIGIN_LON + numpy.asarray(x_miles)/(MILES_PER_DEGREE*math.cos(math.radians(ORIGIN_LAT)))
+    return (lat.round(6), lon.round(6))
+
+def evenly_spaced(count, num_positions):
+    """
+    Returns *count* distinct indices spread evenly over range(num_positions), away from the edges.
+    """
+    return sorted(set(int(round((idx + 1.0)*num_positions/(count + 1.0))) for idx in range(count)))
+
+def create_route_schedule(route_id, stop_ids, hop_seconds, dwell_seconds, headway_seconds, service_start, service_end, random_state):
+    """
+    Creates trips in both directions along the given stops, dispatched every *headway_seconds* (with a random offset
+    for each direction) so that every trip finishes by *service_end*.
+
+    Returns (trips dataframe, stop times dataframe)
+    """
+    trips_list      = []
+    stop_times_list = []
+    num_stops       = len(stop_ids)
+    # departure from each stop, relative to the first
+    stop_offsets    = numpy.arange(num_stops)*(hop_seconds + dwell_seconds)
+    run_seconds     = stop_offsets[-1]
+
+    for direction_id in [0, 1]:
+        direction_stops = numpy.array(stop_ids if direction_id == 0 else stop_ids[::-1])
+        first_departure = service_start + random_state.randint(0, max(1, headway_seconds // 60))*60
+        departures      = numpy.arange(first_departure, service_end - run_seconds + 1, headway_seconds)
+        if len(departures) == 0: continue
+
+        trip_ids = ["%s_%d_%d" % (route_id, direction_id, trip_num+1) for trip_num in range(len(departures))]
+        trips_list.append(pandas.DataFrame({"trip_id"     :trip_ids,
+                                            "route_id"    :route_id,
+                                            "service_id"  :SERVICE_ID,
+                                            "direction_id":direction_id}))
+
+        # trips x stops
+        depart_times = departures[:, numpy.newaxis] + stop_offsets[numpy.newaxis, :]
+        arrive_times = depart_times - dwell_seconds
+        arrive_times[:, 0] = depart_times[:, 0]
+        stop_times_list.append(pandas.DataFrame({"trip_id"       :numpy.repeat(trip_ids, num_stops),
+                                                 "arrival_seconds":arrive_times.ravel(),
+                                                 "departure_seconds":depart_times.ravel(),
+                                                 "stop_id"       :numpy.tile(direction_stops, len(departures)),
+                                                 "stop_sequence" :numpy.tile(numpy.arange(1, num_stops+1), len(departures))}))
+
+    if len(trips_list) == 0:
+        return (None, None)
+    return (pandas.concat(trips_list, ignore_index=True), pandas.concat(stop_times_list, ignore_index=True))
+
+def manhattan_links(from_df, to_df, max_dist, max_links):
+    """
+    For each row of *from_df*, finds the rows of *to_df* within *max_dist* (Manhattan distance, in miles), up to the
+    closest *max_links*.  If none are within *max_dist*, the closest is used.  Both dataframes have columns id, x and y.
+
+    Returns a dataframe with columns from_id, to_id, dist.
+    """
+    to_x   = to_df["x"].values
+    to_y   = to_df["y"].values
+    to_ids = to_df["id"].values
+    links  = []
+    # in chunks so the distance matrix stays small
+    chunk_size = max(1, 2000000 // len(to_df))
+    for chunk_start in range(0, len(from_df), chunk_size):
+        chunk = from_df.iloc[chunk_start:chunk_start+chunk_size]
+        dist  = numpy.abs(chunk["x"].values[:, numpy.newaxis] - to_x[numpy.newaxis, :]) + \
+                numpy.abs(chunk["y"].values[:, numpy.newaxis] - to_y[numpy.newaxis, :])
+        # closest first
+        order       = numpy.argsort(dist, axis=1, kind="mergesort")[:, :max_links]
+        sorted_dist = dist[numpy.arange(len(chunk))[:, numpy.newaxis], order]
+        keep        = sorted_dist <= max_dist
+        keep[:, 0]  = True
+        (row_nums, col_nums) = numpy.nonzero(keep)
+        links.append(pandas.DataFrame({"from_id":chunk["id"].values[row_nums],
+                                       "to_id"  :to_ids[order[row_nums, col_nums]],
+                                       "dist"   :sorted_dist[row_nums, col_nums].round(3)}))
+    return pandas.concat(links, ignore_index=True)
+
+def create_tazs(args):
+    """
+    Returns a dataframe of TAZs with columns id, x and y (miles), on an evenly spaced grid over the stop grid.
+    """
+    side   = (args.grid - 1)*args.stop_spacing
+    taz_xy = (numpy.arange(args.taz_grid) + 0.5)*side/args.taz_grid
+    taz_df = pandas.DataFrame({"x":numpy.tile(taz_xy, args.taz_grid), "y":numpy.repeat(taz_xy, args.taz_grid)})
+    taz_df["id"] = ["Z%d" % (taz_num+1) for taz_num in range(len(taz_df))]
+    return taz_df
+
+def create_network(args, random_state):
+    """
+    Writes the network files to args.output_network_dir.
+
+    Returns (TAZ dataframe with columns id, x, y; True if there are park-and-ride lots)
+    """
+    out_dir = args.output_network_dir
+    grid    = args.grid
+    spacing = args.stop_spacing
+    service_start = read_seconds(args.service_start)
+    service_end   = read_seconds(args.service_end)
+
+    # ========== bus stops and routes: along every bus_route_spacing-th row and column ==========
+    route_lines = range(0, grid, args.bus_route_spacing)
+    bus_stops   = {}   # (row, col) -> stop id
+    routes      = []   # (route id, mode, stop ids, hop seconds, dwell seconds, headway seconds)
+    bus_hop     = int(round(spacing/args.bus_speed*3600))
+    for line in route_lines:
+        for (prefix, points) in [("H", [(line, col) for col in range(grid)]),
+                                 ("V", [(row, line) for row in range(grid)])]:
+            stop_ids = []
+            for point in points:
+                bus_stops.setdefault(point, "B%d_%d" % point)
+                stop_ids.append(bus_stops[point])
+            routes.append(("%s%d" % (prefix, line), "local_bus", stop_ids, bus_hop, args.bus_dwell, args.bus_headway*60))
+
+    # ========== rail lines: alternating rows and columns, with a station every rail_stop_spacing grid points ==========
+    rail_stops   = {}  # station id -> (row, col)
+    num_rail_rows = (args.num_rail_lines + 1) // 2
+    num_rail_cols = args.num_rail_lines // 2
+    rail_hop     = int(round(args.rail_stop_spacing*spacing/args.rail_speed*3600))
+    station_points = range(0, grid, args.rail_stop_spacing)
+    for (prefix, lines) in [("RH", evenly_spaced(num_rail_rows, grid)), ("RV", evenly_spaced(num_rail_cols, grid))]:
+        for line in lines:
+            route_id = "%s%d" % (prefix, line)
+            stop_ids = []
+            for position in station_points:
+                point = (line, position) if prefix == "RH" else (position, line)
+                stop_id = "%s_%d" % (route_id, position)
+                rail_stops[stop_id] = point
+                stop_ids.append(stop_id)
+            routes.append((route_id, "heavy_rail", stop_ids, rail_hop, args.rail_dwell, args.rail_headway*60))
+
+    stops_df = pandas.DataFrame(
+        [(stop_id, "Bus %d-%d" % point, point[0], point[1]) for (point, stop_id) in bus_stops.iteritems()] +
+        [(stop_id, "Station %s" % stop_id, point[0], point[1]) for (stop_id, point) in rail_stops.iteritems()],
+        columns=["stop_id", "stop_name", "row", "col"]).sort_values(by="stop_id").reset_index(drop=True)
+    stops_df["x"] = stops_df["col"]*spacing
+    stops_df["y"] = stops_df["row"]*spacing
+    (stops_df["stop_lat"], stops_df["stop_lon"]) = to_lat_lon(stops_df["x"], stops_df["y"])
+
+    # ========== schedules ==========
+    trips_list      = []
+    stop_times_list = []
+    for (route_id, mode, stop_ids, hop_seconds, dwell_seconds, headway_seconds) in routes:
+        (trips_df, stop_times_df) = create_route_schedule(route_id, stop_ids, hop_seconds, dwell_seconds, headway_seconds,
+                                                          service_start, service_end, random_state)
+        if trips_df is None: continue
+        trips_df["vehicle_name"] = "bus" if mode == "local_bus" else "train"
+        trips_list.append(trips_df)
+        stop_times_list.append(stop_times_df)
+    trips_df      = pandas.concat(trips_list, ignore_index=True)
+    stop_times_df = pandas.concat(stop_times_list, ignore_index=True)
+    stop_times_df["arrival_time"  ] = format_times(stop_times_df["arrival_seconds"  ].values)
+    stop_times_df["departure_time"] = format_times(stop_times_df["departure_seconds"].values)
+
+    routes_df = pandas.DataFrame([(route_id, mode) for (route_id, mode, stop_ids, hop, dwell, headway) in routes],
+                                 columns=["route_id", "mode"])
+    routes_df["agency_id"       ] = SERVICE_ID
+    routes_df["route_short_name"] = routes_df["route_id"]
+    routes_df["route_long_name" ] = routes_df["mode"].map({"local_bus":"Local Bus ", "heavy_rail":"Rail "}) + routes_df["route_id"]
+    routes_df["route_type"      ] = routes_df["mode"].map({"local_bus":3, "heavy_rail":1})
+    routes_df["fare_class"      ] = routes_df["mode"].map({"local_bus":"bus_fare_class", "heavy_rail":"rail_fare_class"})
+    routes_df["fare_id"         ] = routes_df["mode"].map({"local_bus":"bus_fare_id", "heavy_rail":"rail_fare_id"})
+    routes_df["proof_of_payment"] = routes_df["mode"].map({"local_bus":"FALSE", "heavy_rail":"TRUE"})
+    # only routes with trips
+    routes_df = routes_df.loc[routes_df["route_id"].isin(trips_df["route_id"].unique())]
+
+    # ========== TAZs, with walk access to the stops within walking distance ==========
+    taz_df  = create_tazs(args)
+    walk_df = manhattan_links(taz_df, stops_df.rename(columns={"stop_id":"id"}), args.walk_radius, len(stops_df))
+    walk_df.rename(columns={"from_id":"taz", "to_id":"stop_id"}, inplace=True)
+
+    # ========== park-and-ride lots at the stations, with drive access from the TAZs nearby ==========
+    lots_df = pandas.DataFrame({"station_id":sorted(rail_stops.keys())})
+    lots_df["lot_id"] = "L_" + lots_df["station_id"]
+    lots_df = pandas.merge(left=lots_df, right=stops_df[["stop_id","x","y","stop_lat","stop_lon"]],
+                           left_on="station_id", right_on="stop_id", how="left")
+    lots_df["lot_lat" ] = lots_df["stop_lat"]
+    lots_df["lot_lon" ] = lots_df["stop_lon"]
+    lots_df["drop_off"] = "False"
+    lots_df["capacity"] = args.lot_capacity
+
+    if len(lots_df) > 0:
+        drive_df = manhattan_links(taz_df, lots_df.rename(columns={"lot_id":"id"})[["id","x","y"]],
+                                   args.drive_radius, args.max_drive_links)
+        drive_df.rename(columns={"from_id":"taz", "to_id":"lot_id"}, inplace=True)
+        drive_df["travel_time"] = (drive_df["dist"]/args.drive_speed*60.0).round(1).clip(lower=0.1)
+        drive_df["start_time" ] = LOT_OPEN
+        drive_df["end_time"   ] = LOT_CLOSE
+        access_df  = drive_df.copy()
+        access_df["direction"] = "access"
+        access_df["cost"     ] = args.pnr_cost
+        egress_df  = drive_df.copy()
+        egress_df["direction"] = "egress"
+        egress_df["cost"     ] = 0
+        drive_df   = pandas.concat([access_df, egress_df], ignore_index=True).sort_values(by=["taz","lot_id","direction"])
+
+    # ========== transfers: between co-located stops, and between the lots and their stations ==========
+    colocated_df = pandas.merge(left =stops_df[["stop_id","row","col"]],
+                                right=stops_df[["stop_id","row","col"]], on=["row","col"], suffixes=["_from","_to"])
+    colocated_df = colocated_df.loc[colocated_df["stop_id_from"] != colocated_df["stop_id_to"]]
+    stop_transfers_df = pandas.DataFrame({"from_stop_id":colocated_df["stop_id_from"].values,
+                                          "to_stop_id"  :colocated_df["stop_id_to"  ].values,
+                                          "schedule_precedence":""})
+    # GTFS transfers between stops: a recommended transfer point, with no minimum time
+    stop_transfers_df["transfer_type"    ] = 0
+    stop_transfers_df["min_transfer_time"] = ""
+    lot_transfers = [pandas.DataFrame({"from_stop_id":lots_df["lot_id"    ].values,
+                                       "to_stop_id"  :lots_df["station_id"].values,
+                                       "schedule_precedence":"to"}),
+                     pandas.DataFrame({"from_stop_id":lots_df["station_id"].values,
+                                       "to_stop_id"  :lots_df["lot_id"    ].values,
+                                       "schedule_precedence":"from"})]
+    transfers_df = pandas.concat([stop_transfers_df] + lot_transfers, ignore_index=True)
+    transfers_df["dist"         ] = TRANSFER_DIST
+    transfers_df["from_route_id"] = ""
+    transfers_df["to_route_id"  ] = ""
+
+    # ========== write ==========
+    def write(df, filename, columns):
+        df.to_csv(os.path.join(out_dir, filename), columns=columns, index=False)
+        print "Wrote %9d rows to %s" % (len(df), os.path.join(out_dir, filename))
+
+    with open(os.path.join(out_dir, "agency.txt"), "w") as agency_file:
+        agency_file.write("agency_id,agency_name,agency_url,agency_timezone\n")
+        agency_file.write("%s,SyntheticTransit,http://www.example.com,US/Pacific\n" % SERVICE_ID)
+    with open(os.path.join(out_dir, "calendar.txt"), "w") as calendar_file:
+        calendar_file.write("service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date\n")
+        calendar_file.write("%s,1,1,1,1,1,1,1,20150101,20301231\n" % SERVICE_ID)
+    with open(os.path.join(out_dir, "fare_attributes.txt"), "w") as fare_file:
+        fare_file.write("fare_id,price,currency_type,payment_method,transfers\n")
+        fare_file.write("bus_fare_id,2,USD,0,0\nrail_fare_id,4,USD,1,0\n")
+    with open(os.path.join(out_dir, "fare_attributes_ft.txt"), "w") as fare_file:
+        fare_file.write("fare_class,price,currency_type,payment_method,transfers\n")
+        fare_file.write("bus_fare_class,2,USD,0,0\nrail_fare_class,4,USD,1,0\n")
+    with open(os.path.join(out_dir, "fare_rules_ft.txt"), "w") as fare_file:
+        fare_file.write("fare_id,fare_class,start_time,end_time\n")
+        fare_file.write("bus_fare_id,bus_fare_class,00:00:00,23:59:59\nrail_fare_id,rail_fare_class,00:00:00,23:59:59\n")
+    with open(os.path.join(out_dir, "vehicles_ft.txt"), "w") as vehicles_file:
+        vehicles_file.write("vehicle_name,seated_capacity,standing_capacity,max_speed,acceleration,deceleration,dwell_formula\n")
+        # as in the test network
+        vehicles_file.write("bus,%d,%d,25,3.4,4.0,\"3.323 + 2.343*[boards] + 1.619*[alights] + 0.093*[friction]\"\n" %
+                            (args.bus_seated_capacity, args.bus_standing_capacity))
+        vehicles_file.write("train,%d,%d,45,3.5,3.9,4\n" %
+                            (args.train_seated_capacity, args.train_standing_capacity))
+    with open(os.path.join(out_dir, "config_ft.txt"), "w") as config_file:
+        config_file.write(NETWORK_CONFIG)
+
+    write(routes_df,     "routes.txt",        ["route_id","agency_id","route_short_name","route_long_name","route_type"])
+    write(routes_df,     "routes_ft.txt",     ["route_id","mode","fare_class","proof_of_payment"])
+    write(routes_df,     "fare_rules.txt",    ["fare_id","route_id"])
+    write(stops_df,      "stops.txt",         ["stop_id","stop_name","stop_lat","stop_lon"])
+    write(stops_df,      "stops_ft.txt",      ["stop_id"])
+    write(trips_df,      "trips.txt",         ["trip_id","route_id","service_id","direction_id"])
+    write(trips_df,      "trips_ft.txt",      ["trip_id","vehicle_name"])
+    write(stop_times_df, "stop_times.txt",    ["trip_id","arrival_time","departure_time","stop_id","stop_sequence"])
+    write(stop_times_df, "stop_times_ft.txt", ["trip_id","stop_id"])
+    # the lots aren't GTFS stops, so their transfers are only in transfers_ft.txt
+    write(stop_transfers_df, "transfers.txt", ["from_stop_id","to_stop_id","transfer_type","min_transfer_time"])
+    write(transfers_df,  "transfers_ft.txt",  ["from_stop_id","to_stop_id","dist","from_route_id","to_route_id","schedule_precedence"])
+    write(walk_df,       "walk_access_ft.txt",["taz","stop_id","dist"])
+    if len(lots_df) > 0:
+        write(lots_df,   "drive_access_points_ft.txt", ["lot_id","lot_lat","lot_lon","drop_off","capacity"])
+        write(drive_df,  "drive_access_ft.txt",        ["taz","lot_id","direction","dist","cost","travel_time","start_time","end_time"])
+
+    print "Network: %d stops (%d stations), %d routes, %d trips, %d stop times, %d TAZs, %d lots" % \
+        (len(stops_df), len(rail_stops), len(routes_df), len(trips_df), len(stop_times_df), len(taz_df), len(lots_df))
+    return (taz_df, len(lots_df) > 0)
+
+def create_demand(args, random_state, taz_df, has_lots):
+    """
+    Writes the demand files to args.output_demand_dir.
+    """
+    out_dir      = args.output_demand_dir
+    num_trips    = args.num_trips
+    num_tazs     = len(taz_df)
+    demand_start = read_seconds(args.demand_start)
+    demand_end   = read_seconds(args.demand_end)
+
+    # origin and a different destination
+    o_taz_num = random_state.randint(0, num_tazs, size=num_trips)
+    d_taz_num = (o_taz_num + random_state.randint(1, num_tazs, size=num_trips)) % num_tazs
+
+    # the other preferred time is set from a rough transit travel time
+    departure = random_state.randint(demand_start, demand_end, size=num_trips)
+    trip_dist = numpy.abs(taz_df["x"].values[o_taz_num] - taz_df["x"].values[d_taz_num]) + \
+                numpy.abs(taz_df["y"].values[o_taz_num] - taz_df["y"].values[d_taz_num])
+    arrival   = departure + 600 + (trip_dist/args.bus_speed*3600).astype(int)
+
+    mode = numpy.array(["walk-transit-walk"]*num_trips, dtype=object)
+    if has_lots:
+        pnr_draw = random_state.rand(num_trips)
+        mode[pnr_draw < args.pnr_share  ] = "PNR-transit-walk"
+        mode[pnr_draw < args.pnr_share/2] = "walk-transit-PNR"
+
+    trip_list_df = pandas.DataFrame({
+        "person_id"     :["p%d" % (trip_num // 2 + 1) for trip_num in range(num_trips)],
+        "person_trip_id":numpy.arange(num_trips) % 2 + 1,
+        "o_taz"         :taz_df["id"].values[o_taz_num],
+        "d_taz"         :taz_df["id"].values[d_taz_num],
+        "mode"          :mode,
+        "purpose"       :numpy.array(PURPOSES)[random_state.choice(len(PURPOSES), size=num_trips, p=PURPOSE_SHARES)],
+        "departure_time":format_times(departure),
+        "arrival_time"  :format_times(arrival),
+        "time_target"   :numpy.where(random_state.rand(num_trips) < 0.5, "arrival", "departure"),
+        "vot"           :random_state.uniform(1.0, 30.0, size=num_trips).round(2),
+        "pnr_ids"       :""})
+    trip_list_df.to_csv(os.path.join(out_dir, "trip_list.txt"), index=False,
+                        columns=["person_id","person_trip_id","o_taz","d_taz","mode","purpose",
+                                 "departure_time","arrival_time","time_target","vot","pnr_ids"])
+    print "Wrote %9d rows to %s" % (len(trip_list_df), os.path.join(out_dir, "trip_list.txt"))
+
+    # path weights: space delimited, aligned for pandas.read_fwf
+    weights = [("user_class","purpose","demand_mode_type","demand_mode","supply_mode","weight_name","weight_value")]
+    for purpose in PURPOSES:
+        for weight in PATH_WEIGHTS:
+            weights.append(("all", purpose) + weight[:4] + ("%g" % weight[4],))
+    widths = [max(len(row[col]) for row in weights) + 1 for col in range(len(weights[0]))]
+    with open(os.path.join(out_dir, "pathweight_ft.txt"), "w") as weights_file:
+        for row in weights:
+            weights_file.write("".join(value.ljust(width) for (value, width) in zip(row, widths)).rstrip() + "\n")
+
+    with open(os.path.join(out_dir, "config_ft.txt"), "w") as config_file:
+        config_file.write(DEMAND_CONFIG)
+
+    print "Demand: %d person trips (%d PNR) between %d TAZs" % (num_trips, (mode != "walk-transit-walk").sum(), num_tazs)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument("--size",                  choices=sorted(SIZE_DEFAULTS.keys()), default="test",
+                        help="Picks the defaults for --grid, --taz_grid, --num_rail_lines and --num_trips")
+    parser.add_argument("--seed",                  type=int,   default=0,       help="Random seed")
+    parser.add_argument("--demand_only",           action="store_true",         help="Only write the demand (for an existing network written with the same network options)")
+    # network
+    parser.add_argument("--grid",                  type=int,                    help="Number of stop positions along each side of the grid")
+    parser.add_argument("--stop_spacing",          type=float, default=0.25,    help="Miles between adjacent grid positions")
+    parser.add_argument("--bus_route_spacing",     type=int,   default=2,       help="A bus route runs along every this many rows and columns")
+    parser.add_argument("--bus_headway",           type=int,   default=10,      help="Bus headway, in minutes")
+    parser.add_argument("--bus_speed",             type=float, default=12.0,    help="Bus speed between stops, in mph")
+    parser.add_argument("--bus_dwell",             type=int,   default=20,      help="Bus dwell time at each stop, in seconds")
+    parser.add_argument("--bus_seated_capacity",   type=int,   default=40,      help="Bus seated capacity")
+    parser.add_argument("--bus_standing_capacity", type=int,   default=30,      help="Bus standing capacity")
+    parser.add_argument("--num_rail_lines",        type=int,                    help="Number of rail lines, alternating between rows and columns")
+    parser.add_argument("--rail_stop_spacing",     type=int,   default=4,       help="A rail line has a station every this many grid positions")
+    parser.add_argument("--rail_headway",          type=int,   default=6,       help="Rail headway, in minutes")
+    parser.add_argument("--rail_speed",            type=float, default=30.0,    help="Rail speed between stations, in mph")
+    parser.add_argument("--rail_dwell",            type=int,   default=30,      help="Rail dwell time at each station, in seconds")
+    parser.add_argument("--train_seated_capacity", type=int,   default=400,     help="Train seated capacity")
+    parser.add_argument("--train_standing_capacity",type=int,  default=400,     help="Train standing capacity")
+    parser.add_argument("--service_start",         type=str,   default="05:00", help="Time of the first departures")
+    parser.add_argument("--service_end",           type=str,   default="23:00", help="Every trip finishes by this time")
+    parser.add_argument("--taz_grid",              type=int,                    help="Number of TAZs along each side of the grid")
+    parser.add_argument("--walk_radius",           type=float, default=0.5,     help="Walk access links go to stops within this many miles of the TAZ")
+    parser.add_argument("--drive_radius",          type=float, default=4.0,     help="Drive access links go to lots within this many miles of the TAZ")
+    parser.add_argument("--max_drive_links",       type=int,   default=3,       help="Drive access links go to at most this many of the closest lots")
+    parser.add_argument("--drive_speed",           type=float, default=25.0,    help="Drive access speed, in mph")
+    parser.add_argument("--lot_capacity",          type=int,   default=500,     help="Park-and-ride lot capacity")
+    parser.add_argument("--pnr_cost",              type=float, default=400,     help="Drive access cost")
+    # demand
+    parser.add_argument("--num_trips",             type=int,                    help="Number of person trips")
+    parser.add_argument("--demand_start",          type=str,   default="06:00", help="Earliest preferred departure time")
+    parser.add_argument("--demand_end",            type=str,   default="20:00", help="Latest preferred departure time")
+    parser.add_argument("--pnr_share",             type=float, default=0.1,     help="Share of person trips that park and ride, half at each end")
+    parser.add_argument("output_network_dir",      type=str,                    help="Location to write the network")
+    parser.add_argument("output_demand_dir",       type=str,                    help="Location to write the demand")
+
+    args = parser.parse_args(sys.argv[1:])
+    for (option, value) in SIZE_DEFAULTS[args.size].iteritems():
+        if getattr(args, option) is None:
+            setattr(args, option, value)
+
+    if args.grid < 2 or args.taz_grid < 2 or args.bus_route_spacing < 1 or args.rail_stop_spacing < 1:
+        print "grid and taz_grid must be at least 2; bus_route_spacing and rail_stop_spacing must be positive"
+        sys.exit(2)
+
+    for out_dir in [args.output_network_dir, args.output_demand_dir]:
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+
+    # the network and demand draw from separate streams, so the demand doesn't change with the network options
+    # that don't affect the TAZs
+    network_random_state = numpy.random.RandomState([args.seed, 1])
+    demand_random_state  = numpy.random.RandomState([args.seed, 2])
+
+    if args.demand_only:
+        taz_df   = create_tazs(args)
+        has_lots = os.path.exists(os.path.join(args.output_network_dir, "drive_access_points_ft.txt"))
+    else:
+        (taz_df, has_lots) = create_network(args, network_random_state)
+
+    create_demand(args, demand_random_state, taz_df, has_lots)
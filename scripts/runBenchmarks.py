@@ -0,0 +1,348 @@
+import fasttrips
+import argparse, collections, datetime, os, subprocess, sys, time
+import pandas
+
+USAGE = r"""
+
+  python runBenchmarks.py run [--scenarios s1,s2,...] [--num_trips|-n #trips] [--label label] [--history history.csv]
+                              [--baseline baseline.csv] [--save_baseline baseline.csv] [--threshold frac] [--min_seconds secs]
+                              input_network_dir input_demand_dir output_loc
+
+  python runBenchmarks.py compare [--threshold frac] [--min_seconds secs] history.csv baseline.csv
+
+  python runBenchmarks.py compare_paths output_loc base_scenario scenario
+
+  run: Runs each of the named benchmark scenarios (all of them by default; see SCENARIOS) with runTest.py, each in
+  its own process and output directory (output_loc\benchmark_[scenario]).  For each scenario, the wall clock time,
+  CPU time and peak memory (resident set size) for each stage are read from fasttrips.Stage.OUTPUT_STAGE_PERFORMANCE_FILE
+  and summed (or maximized) over the iterations.  The whole run is recorded as the stage "total", with the CPU time
+  and peak memory of the runTest.py process where the platform reports them.
+
+  These are appended to the history file (output_loc\ft_benchmark_history.csv by default), one row per
+  (run, scenario, stage), along with the git revision and an optional label.  If --save_baseline is given, this
+  run's rows are also written to that file to compare future runs against.
+
+  If --baseline is given, this run is compared with the last run in the baseline file (see compare).
+
+  compare: Compares the last run in the history file with the last run in the baseline file.  A stage regressed if
+  its wall clock time or peak memory grew by more than the threshold fraction (default 0.10), ignoring wall clock
+  changes smaller than min_seconds (default 0.5) since short stages are noisy.  Exits with status 1 if anything regressed.
+
+  compare_paths: Compares the pathfinding results of two scenarios already run into output_loc, e.g. deterministic_raptor
+  or deterministic_pruned_access with deterministic_nocap:
+    * the path cost (pf_cost) of the first path for each trip list ID
+    * the time spent labeling and enumerating, from fasttrips.Performance.OUTPUT_PERFORMANCE_FILE
+    * the number of drive access/egress links removed as dominated, from fasttrips.TAZ.OUTPUT_DOMINATED_LINKS_FILE
+  The per-trip comparison is written to output_loc\ft_benchmark_paths_[base_scenario]_[scenario].csv
+
+  e.g.
+
+  python scripts\runBenchmarks.py run --save_baseline Examples\test_network\output\ft_benchmark_baseline.csv Examples\test_network\input Examples\test_network\demand_reg Examples\test_network\output
+  python scripts\runBenchmarks.py run --baseline Examples\test_network\output\ft_benchmark_baseline.csv Examples\test_network\input Examples\test_network\demand_reg Examples\test_network\output
+  python scripts\runBenchmarks.py compare_paths Examples\test_network\output deterministic_nocap deterministic_raptor
+
+"""
+
+#: Benchmark scenarios: name -> runTest.py arguments (before the input and output locations)
+SCENARIOS = collections.OrderedDict([
+    ("deterministic_nocap",    ["deterministic", "1"]),
+    ("deterministic_cap",      ["--capacity", "deterministic", "2"]),
+    ("deterministic_raptor",   ["--deterministic_engine", "raptor", "deterministic", "1"]),
+    ("deterministic_pruned_access", ["--prune_dominated_access_links", "True", "deterministic", "1"]),
+    ("stochastic_nocap",       ["stochastic", "1"]),
+    ("stochastic_cap",         ["--capacity", "stochastic", "2"]),
+    ("stochastic_overlap",     ["--overlap_variable", "count", "--overlap_split_transit", "stochastic", "1"]),
+    ("stochastic_processes4",  ["--num_processes", "4", "stochastic", "1"]),
+])
+
+#: History file name, in output_loc
+HISTORY_FILE          = "ft_benchmark_history.csv"
+
+#: Path comparison file name, in output_loc, by base scenario and scenario
+COMPARE_PATHS_FILE    = "ft_benchmark_paths_%s_%s.csv"
+
+#: Path costs within this are considered the same
+COST_TOLERANCE        = 0.01
+
+#: Stage name for the whole runTest.py process
+STAGE_TOTAL           = "total"
+
+HISTORY_COLUMN_RUN          = "run"
+HISTORY_COLUMN_REVISION     = "revision"
+HISTORY_COLUMN_LABEL        = "label"
+HISTORY_COLUMN_SCENARIO     = "scenario"
+HISTORY_COLUMN_STAGE        = fasttrips.Stage.STAGE_COLUMN_STAGE
+HISTORY_COLUMN_COUNT        = "count"
+HISTORY_COLUMN_WALL_SECONDS = fasttrips.Stage.STAGE_COLUMN_WALL_SECONDS
+HISTORY_COLUMN_CPU_SECONDS  = fasttrips.Stage.STAGE_COLUMN_CPU_SECONDS
+HISTORY_COLUMN_PEAK_RSS     = fasttrips.Stage.STAGE_COLUMN_PEAK_RSS_BYTES
+HISTORY_COLUMNS             = [HISTORY_COLUMN_RUN, HISTORY_COLUMN_REVISION, HISTORY_COLUMN_LABEL, HISTORY_COLUMN_SCENARIO,
+                               HISTORY_COLUMN_STAGE, HISTORY_COLUMN_COUNT, HISTORY_COLUMN_WALL_SECONDS, HISTORY_COLUMN_CPU_SECONDS,
+                               HISTORY_COLUMN_PEAK_RSS]
+
+def get_revision():
+    """
+    Returns the git revision of this fast-trips, or "unknown".
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_command(cmd):
+    """
+    Runs the given command and waits for it.
+
+    Returns (return code, wall clock seconds, CPU seconds or None if unknown, peak resident memory in bytes or None if unknown)
+    """
+    print "Running [%s]" % " ".join(cmd)
+    start_time = time.time()
+    proc       = subprocess.Popen(cmd)
+
+    if not hasattr(os, "wait4"):
+        # e.g. windows
+        return (proc.wait(), time.time() - start_time, None, None)
+
+    (pid, status, rusage) = os.wait4(proc.pid, 0)
+    wall_seconds = time.time() - start_time
+    returncode   = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    cpu_seconds  = rusage.ru_utime + rusage.ru_stime
+    # this is in kilobytes on linux, bytes on mac
+    peak_rss     = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss*1024
+    return (returncode, wall_seconds, cpu_seconds, peak_rss)
+
+def scenario_output_dir(scenario):
+    """
+    Returns the output directory for the given scenario, within output_loc.
+    """
+    return "benchmark_%s" % scenario
+
+def run_scenario(scenario, args):
+    """
+    Runs the given benchmark scenario and returns a dataframe of stage results with the
+    columns HISTORY_COLUMN_SCENARIO, HISTORY_COLUMN_STAGE, HISTORY_COLUMN_COUNT, HISTORY_COLUMN_WALL_SECONDS,
+    HISTORY_COLUMN_CPU_SECONDS and HISTORY_COLUMN_PEAK_RSS.
+    """
+    output_dir = scenario_output_dir(scenario)
+    cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "runTest.py"), "--output_dir", output_dir]
+    if args.num_trips:
+        cmd.extend(["--num_trips", str(args.num_trips)])
+    cmd.extend(SCENARIOS[scenario])
+    cmd.extend([args.input_network_dir, args.input_demand_dir, args.output_loc])
+
+    (returncode, wall_seconds, cpu_seconds, peak_rss) = run_command(cmd)
+    if returncode != 0:
+        print "Scenario %s failed with return code %d" % (scenario, returncode)
+        sys.exit(2)
+
+    stage_file = os.path.join(args.output_loc, output_dir, fasttrips.Stage.OUTPUT_STAGE_PERFORMANCE_FILE)
+    stage_df   = pandas.read_csv(stage_file)
+
+    # stages can be repeated over iterations, simulation iterations and bump iterations
+    stage_groups = stage_df.groupby(fasttrips.Stage.STAGE_COLUMN_STAGE, sort=False)
+    scenario_df  = pandas.DataFrame({HISTORY_COLUMN_COUNT        :stage_groups.size(),
+                                     HISTORY_COLUMN_WALL_SECONDS :stage_groups[fasttrips.Stage.STAGE_COLUMN_WALL_SECONDS].sum(),
+                                     HISTORY_COLUMN_CPU_SECONDS  :stage_groups[fasttrips.Stage.STAGE_COLUMN_CPU_SECONDS].sum(),
+                                     HISTORY_COLUMN_PEAK_RSS     :stage_groups[fasttrips.Stage.STAGE_COLUMN_PEAK_RSS_BYTES].max()})
+    scenario_df.index.name = HISTORY_COLUMN_STAGE
+    scenario_df.reset_index(inplace=True)
+
+    total_df = pandas.DataFrame([{HISTORY_COLUMN_STAGE        :STAGE_TOTAL,
+                                  HISTORY_COLUMN_COUNT        :1,
+                                  HISTORY_COLUMN_WALL_SECONDS :wall_seconds,
+                                  HISTORY_COLUMN_CPU_SECONDS  :cpu_seconds,
+                                  HISTORY_COLUMN_PEAK_RSS     :peak_rss}])
+    scenario_df = pandas.concat([scenario_df, total_df], ignore_index=True)
+    scenario_df[HISTORY_COLUMN_SCENARIO] = scenario
+    return scenario_df
+
+def last_run(history_df):
+    """
+    Returns the rows of the last run in the given history dataframe.
+    """
+    return history_df.loc[history_df[HISTORY_COLUMN_RUN] == history_df[HISTORY_COLUMN_RUN].iloc[-1]]
+
+def compare_runs(current_df, baseline_df, threshold, min_seconds):
+    """
+    Compares the *current_df* run's stages with the *baseline_df* run's stages and prints the comparison.
+
+    Returns the number of regressions.
+    """
+    compare_df = pandas.merge(left =baseline_df[[HISTORY_COLUMN_SCENARIO, HISTORY_COLUMN_STAGE, HISTORY_COLUMN_WALL_SECONDS, HISTORY_COLUMN_PEAK_RSS]],
+                              right=current_df [[HISTORY_COLUMN_SCENARIO, HISTORY_COLUMN_STAGE, HISTORY_COLUMN_WALL_SECONDS, HISTORY_COLUMN_PEAK_RSS]],
+                              how="outer", on=[HISTORY_COLUMN_SCENARIO, HISTORY_COLUMN_STAGE], suffixes=[" baseline"," current"])
+
+    wall_base = compare_df["%s baseline" % HISTORY_COLUMN_WALL_SECONDS]
+    wall_cur  = compare_df["%s current"  % HISTORY_COLUMN_WALL_SECONDS]
+    rss_base  = compare_df["%s baseline" % HISTORY_COLUMN_PEAK_RSS]
+    rss_cur   = compare_df["%s current"  % HISTORY_COLUMN_PEAK_RSS]
+
+    compare_df["wall ratio"] = wall_cur/wall_base
+    compare_df["rss ratio"]  = rss_cur/rss_base
+
+    # comparisons with NaN are false, so stages missing from either run aren't flagged
+    compare_df["wall regressed"] = (wall_cur > wall_base*(1.0+threshold)) & (wall_cur - wall_base >= min_seconds)
+    compare_df["rss regressed"]  = (rss_cur  > rss_base *(1.0+threshold))
+
+    print
+    print "Comparison with baseline run %s (threshold %.0f%%, minimum %.2f seconds)" % \
+        (baseline_df[HISTORY_COLUMN_RUN].iloc[0], 100.0*threshold, min_seconds)
+    print compare_df.to_string(index=False)
+
+    regressed_df = compare_df.loc[compare_df["wall regressed"] | compare_df["rss regressed"]]
+    print
+    if len(regressed_df) == 0:
+        print "No regressions"
+    else:
+        print "%d regressions:" % len(regressed_df)
+        for idx, row in regressed_df.iterrows():
+            print "  %-25s %-30s wall %s  peak rss %s" % (row[HISTORY_COLUMN_SCENARIO], row[HISTORY_COLUMN_STAGE],
+                  "%.2fx" % row["wall ratio"] if row["wall regressed"] else "ok",
+                  "%.2fx" % row["rss ratio"]  if row["rss regressed"]  else "ok")
+    return len(regressed_df)
+
+def read_scenario_paths(output_loc, scenario):
+    """
+    Reads the pathfinding results for the given scenario run into *output_loc*.
+
+    Returns (dataframe with a row per trip list ID and columns cost_[scenario] and ms_[scenario], number of dominated links removed)
+    """
+    trip_list_id_num = fasttrips.Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM
+    time_cols        = [fasttrips.Performance.PERFORMANCE_COLUMN_TIME_LABELING_MS,
+                        fasttrips.Performance.PERFORMANCE_COLUMN_TIME_ENUMERATING_MS]
+
+    full_output_dir = os.path.join(output_loc, scenario_output_dir(scenario))
+    paths_df = pandas.read_csv(os.path.join(full_output_dir, fasttrips.Passenger.PF_PATHS_CSV))
+    perf_df  = pandas.read_csv(os.path.join(full_output_dir, fasttrips.Performance.OUTPUT_PERFORMANCE_FILE))
+
+    # the paths found are overwritten each iteration, so compare the last iteration's; and the first path for each trip
+    iteration_col = fasttrips.Performance.PERFORMANCE_COLUMN_ITERATION
+    perf_df  = perf_df.loc[perf_df[iteration_col] == perf_df[iteration_col].max()]
+    cost_df  = paths_df[[trip_list_id_num, fasttrips.PathSet.PATH_KEY_COST]].drop_duplicates(subset=[trip_list_id_num])
+    cost_df.rename(columns={fasttrips.PathSet.PATH_KEY_COST:"cost_%s" % scenario}, inplace=True)
+
+    perf_df["ms_%s" % scenario] = perf_df[time_cols].sum(axis=1)
+    scenario_df = pandas.merge(left=perf_df[[trip_list_id_num, "ms_%s" % scenario]], right=cost_df, how="left", on=trip_list_id_num)
+
+    removed_file = os.path.join(full_output_dir, fasttrips.TAZ.OUTPUT_DOMINATED_LINKS_FILE)
+    num_removed  = len(pandas.read_csv(removed_file)) if os.path.exists(removed_file) else 0
+    return (scenario_df, num_removed)
+
+def compare_paths(output_loc, base, scenario):
+    """
+    Compares the pathfinding results of the *scenario* run with those of the *base* run, prints the comparison
+    and writes the per-trip comparison to COMPARE_PATHS_FILE.
+    """
+    summary    = []
+    compare_df = None
+    for name in [base, scenario]:
+        (scenario_df, num_removed) = read_scenario_paths(output_loc, name)
+        compare_df = scenario_df if compare_df is None else \
+                     pandas.merge(left=compare_df, right=scenario_df, how="outer", on=fasttrips.Passenger.TRIP_LIST_COLUMN_TRIP_LIST_ID_NUM)
+        summary.append({"scenario"        :name,
+                        "links removed"   :num_removed,
+                        "paths found"     :scenario_df["cost_%s" % name].notnull().sum(),
+                        "total ms"        :scenario_df["ms_%s" % name].sum(),
+                        "mean ms"         :scenario_df["ms_%s" % name].mean(),
+                        "p95 ms"          :scenario_df["ms_%s" % name].quantile(0.95)})
+
+    summary_df = pandas.DataFrame(summary, columns=["scenario","links removed","paths found","total ms","mean ms","p95 ms"])
+    summary_df["speedup"] = summary_df["total ms"].iloc[0] / summary_df["total ms"]
+    print
+    print "Pathfinding times (from %s)" % fasttrips.Performance.OUTPUT_PERFORMANCE_FILE
+    print summary_df.to_string(index=False)
+
+    both      = compare_df["cost_%s" % base].notnull() & compare_df["cost_%s" % scenario].notnull()
+    cost_diff = compare_df["cost_%s" % scenario] - compare_df["cost_%s" % base]
+    compare_df["cost_diff"] = cost_diff
+
+    print
+    print "Path costs: %s compared to %s" % (scenario, base)
+    print "  trips with paths from both      : %d" % both.sum()
+    print "  trips with paths only from base : %d" % (compare_df["cost_%s" % base    ].notnull() & ~both).sum()
+    print "  trips with paths only from other: %d" % (compare_df["cost_%s" % scenario].notnull() & ~both).sum()
+    print "  same cost (within %.2f)        : %d" % (COST_TOLERANCE, (both & (cost_diff.abs() <= COST_TOLERANCE)).sum())
+    print "  lower cost                      : %d" % (both & (cost_diff < -COST_TOLERANCE)).sum()
+    print "  higher cost                     : %d" % (both & (cost_diff >  COST_TOLERANCE)).sum()
+    if both.sum() > 0:
+        print "  mean / max absolute difference  : %.4f / %.4f" % (cost_diff[both].abs().mean(), cost_diff[both].abs().max())
+
+    output_file = os.path.join(output_loc, COMPARE_PATHS_FILE % (base, scenario))
+    compare_df.to_csv(output_file, index=False)
+    print
+    print "Wrote %s" % output_file
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(usage=USAGE)
+    subparsers = parser.add_subparsers(dest="mode")
+
+    compare_args = argparse.ArgumentParser(add_help=False)
+    compare_args.add_argument('--threshold',   type=float, default=0.10, help="Fractional increase in wall clock time or peak memory that counts as a regression")
+    compare_args.add_argument('--min_seconds', type=float, default=0.5,  help="Ignore wall clock time increases smaller than this")
+
+    run_parser = subparsers.add_parser("run", parents=[compare_args], usage=USAGE)
+    run_parser.add_argument('--scenarios',      type=str,  help="Comma-delimited scenarios to run.  Default: all of %s" % ",".join(SCENARIOS.keys()))
+    run_parser.add_argument('-n','--num_trips', type=int,  help="Number of person trips to run, if you don't want to run the whole demand.")
+    run_parser.add_argument('--label',          type=str,  default="", help="Label to record with this run in the history")
+    run_parser.add_argument('--history',        type=str,  help="History file to append to.  Default: output_loc\\%s" % HISTORY_FILE)
+    run_parser.add_argument('--baseline',       type=str,  help="Compare this run with the last run in this history file")
+    run_parser.add_argument('--save_baseline',  type=str,  help="Write this run to this file as a baseline")
+    run_parser.add_argument("input_network_dir", type=str, help="Location of the input network")
+    run_parser.add_argument("input_demand_dir",  type=str, help="Location of the input demand")
+    run_parser.add_argument("output_loc",        type=str, help="Location to write fasttrips output")
+
+    compare_parser = subparsers.add_parser("compare", parents=[compare_args], usage=USAGE)
+    compare_parser.add_argument("history",  type=str, help="History file with the run to check")
+    compare_parser.add_argument("baseline", type=str, help="History file with the baseline run")
+
+    compare_paths_parser = subparsers.add_parser("compare_paths", usage=USAGE)
+    compare_paths_parser.add_argument("output_loc",    type=str, help="Location the scenarios were run into")
+    compare_paths_parser.add_argument("base_scenario", type=str, help="Scenario to compare with")
+    compare_paths_parser.add_argument("scenario",      type=str, help="Scenario to compare")
+
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.mode == "compare_paths":
+        compare_paths(args.output_loc, args.base_scenario, args.scenario)
+        sys.exit(0)
+
+    if args.mode == "compare":
+        num_regressions = compare_runs(last_run(pandas.read_csv(args.history)),
+                                       last_run(pandas.read_csv(args.baseline)),
+                                       args.threshold, args.min_seconds)
+        sys.exit(1 if num_regressions > 0 else 0)
+
+    scenarios = args.scenarios.split(",") if args.scenarios else SCENARIOS.keys()
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            print "Unknown scenario [%s]; choose from %s" % (scenario, ",".join(SCENARIOS.keys()))
+            sys.exit(2)
+
+    if not os.path.exists(args.output_loc):
+        os.mkdir(args.output_loc)
+
+    run_df = pandas.concat([run_scenario(scenario, args) for scenario in scenarios], ignore_index=True)
+    run_df[HISTORY_COLUMN_RUN]      = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    run_df[HISTORY_COLUMN_REVISION] = get_revision()
+    run_df[HISTORY_COLUMN_LABEL]    = args.label
+    run_df = run_df[HISTORY_COLUMNS]
+
+    print
+    print "Benchmark results"
+    print run_df.to_string(index=False)
+
+    history_file = args.history if args.history else os.path.join(args.output_loc, HISTORY_FILE)
+    run_df.to_csv(history_file, index=False, mode="a" if os.path.exists(history_file) else "w",
+                  header=not os.path.exists(history_file))
+    print
+    print "Appended to %s" % history_file
+
+    if args.save_baseline:
+        run_df.to_csv(args.save_baseline, index=False)
+        print "Wrote baseline %s" % args.save_baseline
+
+    if args.baseline:
+        num_regressions = compare_runs(run_df, last_run(pandas.read_csv(args.baseline)), args.threshold, args.min_seconds)
+        sys.exit(1 if num_regressions > 0 else 0)
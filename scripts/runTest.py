@@ -3,7 +3,7 @@ import argparse, os, pandas, re, sys
 
 USAGE = r"""
 
-  python runTest.py [--trace_only|-t] [--num_trips|-n #trips] [-c|--capacity] [-o|--output_dir dir] pathfinding_type iters input_network_dir input_demand_dir output_loc
+  python runTest.py [--trace_only|-t] [--num_trips|-n #trips] [-c|--capacity] [-o|--output_dir dir] [--deterministic_engine engine] [--prune_dominated_access_links bool] [--num_processes #processes] [--pathset_stream_chunk_size #trips] [--simulation_partition_size #trips] [--num_simulation_processes #processes] [--compact_dataframes] [--write_checkpoints] [--resume_iteration iter] [--warm_start_dir dir [--warm_start_pathsets]] pathfinding_type iters input_network_dir input_demand_dir output_loc
 
   Where pathfinding_type is one of 'deterministic','stochastic' or 'file'
 
@@ -29,6 +29,17 @@ if __name__ == "__main__":
     parser.add_argument('-o','--output_dir', type=str,  help="Directory within output_loc to write fasttrips outtput.  If none specified, will construct one.")
     parser.add_argument('--overlap_variable',      choices=['None','count','distance','time'], help="Variable to use for overlap penalty calculation")
     parser.add_argument('--overlap_split_transit', action='store_true', help="Split transit for path overlap penalty calculation")
+    parser.add_argument('--deterministic_engine',  choices=['labeling','raptor'], help="Search to use for deterministic pathfinding")
+    parser.add_argument('--prune_dominated_access_links', type='bool', help="Remove dominated drive access/egress links before pathfinding")
+    parser.add_argument('--num_processes',         type=int,  help="Number of processes to use for pathfinding")
+    parser.add_argument('--pathset_stream_chunk_size', type=int, help="Stream pathfinding results to output in chunks of this many person trips")
+    parser.add_argument('--simulation_partition_size', type=int, help="Simulate out-of-core in partitions of this many person trips")
+    parser.add_argument('--num_simulation_processes', type=int, help="Number of processes to use for the per-passenger simulation steps")
+    parser.add_argument('--compact_dataframes',    action='store_true', help="Use memory-compact dtypes for the simulation dataframes")
+    parser.add_argument('--write_checkpoints',     action='store_true', help="Write a checkpoint at the end of each iteration")
+    parser.add_argument('--resume_iteration',      type=int,  help="Resume from the checkpoint in the output directory at the end of this iteration")
+    parser.add_argument('--warm_start_dir',        type=str,  help="Warm-start from the last checkpoint in this previous run's output directory")
+    parser.add_argument('--warm_start_pathsets',   action='store_true', help="Also warm-start with the previous run's pathsets")
     parser.add_argument("pathfinding_type",  choices=['deterministic','stochastic','file'], help="Type of pathfinding")
     parser.add_argument("iters",             type=int,  help="Number of iterations to run")
     parser.add_argument("input_network_dir", type=str,  help="Location of the input network")
@@ -73,9 +84,37 @@ if __name__ == "__main__":
     if args.overlap_split_transit:
         fasttrips.PathSet.OVERLAP_SPLIT_TRANSIT  = args.overlap_split_transit
 
+    if args.deterministic_engine:
+        fasttrips.Assignment.DETERMINISTIC_ENGINE = args.deterministic_engine
+
+    if args.prune_dominated_access_links is not None:
+        fasttrips.Assignment.PRUNE_DOMINATED_ACCESS_LINKS = args.prune_dominated_access_links
+
     if args.dispersion:
         fasttrips.Assignment.STOCH_DISPERSION    = args.dispersion
 
+    if args.num_processes:
+        fasttrips.Assignment.NUMBER_OF_PROCESSES = args.num_processes
+
+    if args.pathset_stream_chunk_size:
+        fasttrips.Assignment.PATHSET_STREAM_CHUNK_SIZE = args.pathset_stream_chunk_size
+
+    if args.simulation_partition_size:
+        fasttrips.Assignment.SIMULATION_PARTITION_SIZE = args.simulation_partition_size
+
+    if args.num_simulation_processes:
+        fasttrips.Assignment.NUMBER_OF_SIMULATION_PROCESSES = args.num_simulation_processes
+
+    if args.compact_dataframes:
+        fasttrips.Assignment.COMPACT_DATAFRAMES  = True
+    if args.write_checkpoints:
+        fasttrips.Assignment.WRITE_CHECKPOINTS   = True
+    if args.resume_iteration:
+        fasttrips.Assignment.RESUME_ITERATION    = args.resume_iteration
+    if args.warm_start_dir:
+        fasttrips.Assignment.WARM_START_DIR      = args.warm_start_dir
+        fasttrips.Assignment.WARM_START_PATHSETS = args.warm_start_pathsets
+
     if args.num_trips:
         fasttrips.Assignment.DEBUG_NUM_TRIPS     = args.num_trips
 
@@ -13,6 +13,8 @@ setup(name          = 'fasttrips',
                                           'src/hyperlink.cpp',
                                           'src/path.cpp',
                                           'src/pathfinder.cpp',
+                                          'src/raptor.cpp',
+                                          'src/lowerbound.cpp',
                                           ],
                                  include_dirs=[numpy.get_include()],
                                  libraries=['psapi'] if sys.platform=='win32' else []
@@ -2,6 +2,8 @@
 #include <exception>
 #include <stdexcept>
 
+#include "poolallocator.h"
+
 namespace fasttrips {
 
     /**
@@ -49,7 +51,12 @@ namespace fasttrips {
 
     private:
         // underlying priority queue, contains (label, stop id, is trip bool)
-        std::priority_queue<LabelStop, std::vector<LabelStop>, struct LabelStopCompare> labelstop_priority_queue_;
+        /// std::priority_queue doesn't have clear() but the underlying container does; this keeps its capacity
+        class LabelStopPriorityQueue : public std::priority_queue<LabelStop, std::vector<LabelStop>, struct LabelStopCompare> {
+        public:
+            void clear() { this->c.clear(); }
+        };
+        LabelStopPriorityQueue labelstop_priority_queue_;
 
         typedef struct {
             double label_;  ///< lowest label for this stop in the labelstop_priority_queue_ (e.g. the only valid one)
@@ -58,7 +65,9 @@ namespace fasttrips {
         } LabelCount;
 
         /** Keep track of the lowest label and the count for each (stop, is_trip bool) */
-        std::map< std::pair<int, bool>, LabelCount> labelstop_map_;
+        typedef std::map< std::pair<int, bool>, LabelCount, std::less< std::pair<int, bool> >,
+                          PoolAllocator<std::pair<const std::pair<int, bool>, LabelCount> > > LabelCountMap;
+        LabelCountMap labelstop_map_;
 
         int valid_count_;
 
@@ -111,7 +120,7 @@ namespace fasttrips {
                 const LabelStop& ls = labelstop_priority_queue_.top();
                 std::pair<int, bool> full_stop_id = std::make_pair(ls.stop_id_, ls.is_trip_);
 
-                std::map< std::pair<int, bool>, LabelCount>::iterator ls_iter = labelstop_map_.find(full_stop_id);
+                LabelCountMap::iterator ls_iter = labelstop_map_.find(full_stop_id);
 
                 // assert we have the count info
                 if (ls_iter == labelstop_map_.end()) {
@@ -176,6 +185,13 @@ namespace fasttrips {
             }
         }
 
+        /** Empty the queue so it can be reused for another search */
+        void clear() {
+            labelstop_priority_queue_.clear();
+            labelstop_map_.clear();
+            valid_count_ = 0;
+        }
+
         size_t size() const {
             return valid_count_;
         }
@@ -22,12 +22,21 @@ _fasttrips_initialize_parameters(PyObject *self, PyObject *args)
     int        stoch_max_stop_process_count;
     int        max_num_paths;
     double     min_path_probability;
-    if (!PyArg_ParseTuple(args, "ddidiid", &time_window, &bump_buffer, &stoch_pathset_size, &stoch_dispersion, &stoch_max_stop_process_count,
-                                           &max_num_paths, &min_path_probability)) {
+    int        stoch_pathset_stop_no_new;
+    double     stoch_pathset_unseen_tolerance;
+    int        deterministic_engine;
+    int        lower_bound_pruning;
+    int        random_seed;
+    if (!PyArg_ParseTuple(args, "ddidiididiii", &time_window, &bump_buffer, &stoch_pathset_size, &stoch_dispersion, &stoch_max_stop_process_count,
+                                               &max_num_paths, &min_path_probability,
+                                               &stoch_pathset_stop_no_new, &stoch_pathset_unseen_tolerance,
+                                               &deterministic_engine, &lower_bound_pruning, &random_seed)) {
         return NULL;
     }
     pathfinder.initializeParameters(time_window, bump_buffer, stoch_pathset_size, stoch_dispersion, stoch_max_stop_process_count,
-                                    max_num_paths, min_path_probability);
+                                    max_num_paths, min_path_probability,
+                                    stoch_pathset_stop_no_new, stoch_pathset_unseen_tolerance,
+                                    deterministic_engine, lower_bound_pruning != 0, random_seed);
     Py_RETURN_NONE;
 
 }
@@ -65,12 +74,71 @@ _fasttrips_initialize_supply(PyObject *self, PyObject *args)
     pathfinder.initializeSupply(output_dir, proc_num,
                                 stop_indexes, stop_times, num_stop_ind);
 
-    if (proc_num <= 1) {
-        std::cout << "RAND_MAX = " << RAND_MAX << std::endl;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+_fasttrips_initialize_ids(PyObject *self, PyObject *args)
+{
+    PyArrayObject *pyo;
+    const char* id_namespace;
+    PyObject *input2, *input3;
+    if (!PyArg_ParseTuple(args, "sOO", &id_namespace, &input2, &input3)) {
+        return NULL;
+    }
+
+    // id numbers
+    pyo                 = (PyArrayObject*)PyArray_ContiguousFromObject(input2, NPY_INT32, 1, 1);
+    if (pyo == NULL) return NULL;
+    int* id_nums        = (int*)PyArray_DATA(pyo);
+    int num_ids         = PyArray_DIMS(pyo)[0];
+
+    // id strings: a sequence of strings.  These are only borrowed until initializeIds() copies them.
+    PyObject* id_seq    = PySequence_Fast(input3, "id strings must be a sequence");
+    if (id_seq == NULL) return NULL;
+    assert(num_ids == PySequence_Fast_GET_SIZE(id_seq));
+
+    std::vector<const char*> id_strs(num_ids);
+    for (int i=0; i<num_ids; ++i) {
+        id_strs[i] = PyString_AsString(PySequence_Fast_GET_ITEM(id_seq, i));
+        if (id_strs[i] == NULL) { Py_DECREF(id_seq); return NULL; }
     }
+
+    pathfinder.initializeIds(id_namespace, id_nums, num_ids > 0 ? &id_strs[0] : NULL, num_ids);
+    Py_DECREF(id_seq);
     Py_RETURN_NONE;
 }
 
+static PyObject *
+_fasttrips_update_stop_times(PyObject *self, PyObject *args)
+{
+    PyArrayObject *pyo;
+    PyObject *input1, *input2;
+    if (!PyArg_ParseTuple(args, "OO", &input1, &input2)) {
+        return NULL;
+    }
+
+    // trip stop times index: trip id, sequence, stop id
+    pyo                 = (PyArrayObject*)PyArray_ContiguousFromObject(input1, NPY_INT32, 2, 2);
+    if (pyo == NULL) return NULL;
+    int* stop_indexes   = (int*)PyArray_DATA(pyo);
+    int num_stop_ind    = PyArray_DIMS(pyo)[0];
+    assert(3 == PyArray_DIMS(pyo)[1]);
+
+    // trip stop times data: arrival time, departure time, overcap
+    pyo                 = (PyArrayObject*)PyArray_ContiguousFromObject(input2, NPY_DOUBLE, 2, 2);
+    if (pyo == NULL) return NULL;
+    double* stop_times  = (double*)PyArray_DATA(pyo);
+    int num_stop_times  = PyArray_DIMS(pyo)[0];
+    assert(3 == PyArray_DIMS(pyo)[1]);
+
+    // these better be the same length
+    assert(num_stop_ind == num_stop_times);
+
+    int num_updated = pathfinder.updateStopTimes(stop_indexes, stop_times, num_stop_ind);
+    return Py_BuildValue("i", num_updated);
+}
+
 static PyObject *
 _fasttrips_set_bump_wait(PyObject* self, PyObject *args)
 {
@@ -121,7 +189,7 @@ _fasttrips_find_pathset(PyObject *self, PyObject *args)
     path_spec.egress_mode_ = egress_mode;
 
     fasttrips::PathSet pathset;
-    fasttrips::PerformanceInfo perf_info = { 0, 0, 0, 0, 0, 0};
+    fasttrips::PerformanceInfo perf_info = { 0 };
     pathfinder.findPathSet(path_spec, pathset, perf_info);
 
     // count links
@@ -175,16 +243,43 @@ _fasttrips_find_pathset(PyObject *self, PyObject *args)
         path_num += 1;
     }
 
-    PyObject *returnobj = Py_BuildValue("(OOOiiiillll)",ret_int,ret_double,ret_paths, pathfinder.processNumber(),
+    // phase timers and search counters, keyed by performance column name
+    PyObject *perf_counters = PyDict_New();
+    PyObject *value;
+    for (int phase = 0; phase < fasttrips::NUM_SEARCH_PHASES; ++phase) {
+        std::string phase_name(fasttrips::SEARCH_PHASE_NAMES[phase]);
+        value = PyLong_FromLongLong(perf_info.phase_calls_[phase]);
+        PyDict_SetItemString(perf_counters, (phase_name + " calls").c_str(), value);
+        Py_DECREF(value);
+        value = PyLong_FromLongLong(perf_info.phase_nanoseconds_[phase]);
+        PyDict_SetItemString(perf_counters, (phase_name + " nanoseconds").c_str(), value);
+        Py_DECREF(value);
+    }
+    value = PyLong_FromLongLong(perf_info.trips_scanned_);
+    PyDict_SetItemString(perf_counters, "trips scanned", value);  Py_DECREF(value);
+    value = PyLong_FromLongLong(perf_info.links_added_);
+    PyDict_SetItemString(perf_counters, "links added", value);    Py_DECREF(value);
+    value = PyLong_FromLongLong(perf_info.links_pruned_);
+    PyDict_SetItemString(perf_counters, "links pruned", value);   Py_DECREF(value);
+    value = PyLong_FromLongLong(perf_info.queue_pushes_);
+    PyDict_SetItemString(perf_counters, "queue pushes", value);   Py_DECREF(value);
+    value = PyLong_FromLongLong(perf_info.queue_pops_);
+    PyDict_SetItemString(perf_counters, "queue pops", value);     Py_DECREF(value);
+
+    PyObject *returnobj = Py_BuildValue("(OOOiiiiddlliiN)",ret_int,ret_double,ret_paths, pathfinder.processNumber(),
                                         perf_info.label_iterations_, perf_info.num_labeled_stops_, perf_info.max_process_count_,
                                         perf_info.milliseconds_labeling_, perf_info.milliseconds_enumerating_,
-                                        perf_info.workingset_bytes_, perf_info.privateusage_bytes_);
+                                        perf_info.workingset_bytes_, perf_info.privateusage_bytes_,
+                                        perf_info.enumeration_draws_, perf_info.enumeration_stop_reason_,
+                                        perf_counters);
     return returnobj;
 }
 
 static PyMethodDef fasttripsMethods[] = {
     {"initialize_parameters",   _fasttrips_initialize_parameters, METH_VARARGS, "Initialize path finding parameters" },
+    {"initialize_ids",          _fasttrips_initialize_ids,        METH_VARARGS, "Initialize id strings"     },
     {"initialize_supply",       _fasttrips_initialize_supply,     METH_VARARGS, "Initialize network supply" },
+    {"update_stop_times",       _fasttrips_update_stop_times,     METH_VARARGS, "Update network supply stop times" },
     {"set_bump_wait",           _fasttrips_set_bump_wait,         METH_VARARGS, "Update bump wait"          },
     {"find_pathset",            _fasttrips_find_pathset,          METH_VARARGS, "Find trip-based path set"  },
     {NULL, NULL, 0, NULL}        /* Sentinel */
@@ -414,6 +414,19 @@ namespace fasttrips {
         // don't reset process counts
     }
 
+    void Hyperlink::reset(int stop_id)
+    {
+        clear(true);
+        clear(false);
+        stop_id_ = stop_id;
+
+        // like new
+        linkset_trip_.hyperpath_cost_       = MAX_COST;
+        linkset_trip_.process_count_        = 0;
+        linkset_nontrip_.hyperpath_cost_    = MAX_COST;
+        linkset_nontrip_.process_count_     = 0;
+    }
+
     const StopState& Hyperlink::lowestCostStopState(bool of_trip_links) const
     {
         const LinkSet& linkset = (of_trip_links ? linkset_trip_ : linkset_nontrip_);
@@ -711,7 +724,7 @@ namespace fasttrips {
                 // we have no additional information so we trust the hyperpath cost and can go ahead
                 pss.probability_ = exp(-1.0*STOCH_DISPERSION_*ss.cost_) /
                                    exp(-1.0*STOCH_DISPERSION_*linkset.hyperpath_cost_);
-                pss.prob_i_      = static_cast<int>(RAND_MAX*pss.probability_);
+                pss.prob_i_      = static_cast<int>(RandomStream::MAX*pss.probability_);
 
                 // too small to consider
                 if (pss.prob_i_ < COST_CUTOFF) { continue; }
@@ -744,7 +757,7 @@ namespace fasttrips {
         {
             const StopState& ss = linkset.stop_state_map_.find(probabilities[idx].ssk_)->second;
             probabilities[idx].probability_ = exp(-1.0*STOCH_DISPERSION_*ss.cost_) / sum_exp;
-            probabilities[idx].prob_i_      = static_cast<int>(RAND_MAX*probabilities[idx].probability_);
+            probabilities[idx].prob_i_      = static_cast<int>(RandomStream::MAX*probabilities[idx].probability_);
 
             // make it cumulative
             if (idx > 0) { probabilities[idx].prob_i_ += probabilities[idx-1].prob_i_; }
@@ -762,12 +775,13 @@ namespace fasttrips {
     const StopState& Hyperlink::chooseState(
         const PathSpecification& path_spec,
         std::ostream& trace_file,
+        RandomStream& random_stream,
         const std::vector<ProbabilityStopState>& prob_stops,
         const StopState* prev_link) const
     {
         const LinkSet& linkset = (prev_link && !isTrip(prev_link->deparr_mode_) ? linkset_trip_ : linkset_nontrip_);
 
-        int random_num = rand();
+        int random_num = random_stream.next();
         if (path_spec.trace_) { trace_file << "random_num " << random_num << " -> "; }
 
         // mod it by max prob
@@ -10,6 +10,8 @@
 
 #include "pathspec.h"
 #include "path.h"
+#include "poolallocator.h"
+#include "randomstream.h"
 
 #ifndef HYPERLINK_H
 #define HYPERLINK_H
@@ -35,13 +37,16 @@ namespace fasttrips {
     /// Structure used in PathFinder::hyperpathChoosePath
     typedef struct {
         double         probability_;   ///< Probability of this stop
-        int            prob_i_;        ///< Cumulative probability * 1000
+        int            prob_i_;        ///< Cumulative probability * RandomStream::MAX
         StopStateKey   ssk_;           ///< Pointer to relevant stop state
     } ProbabilityStopState;
 
-    typedef std::map<StopStateKey, StopState> StopStateMap;
+    // The nodes for these are recycled across searches via fasttrips::PoolAllocator, which isn't thread-safe
+    typedef std::map<StopStateKey, StopState, std::less<StopStateKey>,
+                     PoolAllocator<std::pair<const StopStateKey, StopState> > > StopStateMap;
     // cost to stop state key
-    typedef std::multimap< double, StopStateKey> CostToStopState;
+    typedef std::multimap< double, StopStateKey, std::less<double>,
+                           PoolAllocator<std::pair<const double, StopStateKey> > > CostToStopState;
 
     struct LinkSet {
         double          latest_dep_earliest_arr_;  ///< latest departure time from this stop for outbound trips, earliest arrival time to this stop for inbound trips
@@ -126,6 +131,9 @@ namespace fasttrips {
         /// Clears data
         void clear(bool of_trip_links);
 
+        /// Clears all data, including process counts, so this is like a newly constructed Hyperlink for the given stop.
+        void reset(int stop_id);
+
         /// Returns the lowest cost stop state (link) in this hyperlink
         /// If for_trip_link, lowest trip link. Otherwise, lowest non-trip link.
         const StopState& lowestCostStopState(bool of_trip_links) const;
@@ -173,12 +181,13 @@ namespace fasttrips {
         /**
          * Given a vector of fasttrips::ProbabilityStopState instances,
          * randomly selects one based on the cumulative probability
-         * (fasttrips::ProbabilityStopState.prob_i_)
+         * (fasttrips::ProbabilityStopState.prob_i_), using the next number from *random_stream*.
          *
          * @return a const reference to the chosen StopState.
          */
         const StopState& chooseState(const PathSpecification& path_spec,
                                      std::ostream& trace_file,
+                                     RandomStream& random_stream,
                                      const std::vector<ProbabilityStopState>& prob_stops,
                                      const StopState* prev_link = NULL) const;
     };
@@ -187,8 +196,77 @@ namespace fasttrips {
      * The path finding algorithm stores StopState data in this structure.
      * For the stochastic algorithm, a stop ID maps to a vector of StopState instances.
      * For the deterministic algorithm, the vector only has a single instance of StopState.
+     *
+     * This is used like a std::map<int, Hyperlink>, but the Hyperlinks are stored densely by stop ID
+     * and kept across searches.  StopStates::clear only resets the stops touched by the last search,
+     * so one instance can be reused for every search in a process without reallocating.
      */
-    typedef std::map<int, Hyperlink> StopStates;
+    class StopStates {
+    public:
+        typedef std::pair<int, Hyperlink>  value_type;
+        /// Iterators are just pointers; StopStates::end is NULL.  There is no iteration.
+        typedef value_type*                iterator;
+        typedef const value_type*          const_iterator;
+
+    private:
+        /// stop id -> (stop id, hyperlink), allocated the first time the stop is used
+        std::vector<value_type*>   states_;
+        /// stop id -> is it part of the current search?
+        std::vector<bool>          in_use_;
+        /// stop ids that are part of the current search
+        std::vector<int>           touched_;
+
+        // no copying
+        StopStates(const StopStates&);
+        StopStates& operator=(const StopStates&);
+
+    public:
+        StopStates() {}
+        ~StopStates() {
+            clear();
+            for (size_t ind = 0; ind < states_.size(); ++ind) { delete states_[ind]; }
+        }
+
+        /// Returns the (stop id, hyperlink) for the given stop, or StopStates::end if it's not part of this search
+        iterator find(int stop_id) {
+            if ((stop_id < 0) || (stop_id >= (int)in_use_.size()) || !in_use_[stop_id]) { return end(); }
+            return states_[stop_id];
+        }
+        const_iterator find(int stop_id) const {
+            if ((stop_id < 0) || (stop_id >= (int)in_use_.size()) || !in_use_[stop_id]) { return end(); }
+            return states_[stop_id];
+        }
+        iterator       end()       { return NULL; }
+        const_iterator end() const { return NULL; }
+
+        /// Returns the hyperlink for the given stop, adding a new one if it's not part of this search yet
+        Hyperlink& operator[](int stop_id) {
+            if (stop_id >= (int)states_.size()) {
+                states_.resize(stop_id+1, NULL);
+                in_use_.resize(stop_id+1, false);
+            }
+            if (!in_use_[stop_id]) {
+                if (states_[stop_id] == NULL) {
+                    states_[stop_id] = new value_type(stop_id, Hyperlink(stop_id, false));
+                }
+                in_use_[stop_id] = true;
+                touched_.push_back(stop_id);
+            }
+            return states_[stop_id]->second;
+        }
+
+        /// How many stops are part of this search?
+        size_t size() const { return touched_.size(); }
+
+        /// Reset the stops that are part of this search, keeping the storage for the next one
+        void clear() {
+            for (size_t ind = 0; ind < touched_.size(); ++ind) {
+                states_[touched_[ind]]->second.reset(touched_[ind]);
+                in_use_[touched_[ind]] = false;
+            }
+            touched_.clear();
+        }
+    };
 
 }
 
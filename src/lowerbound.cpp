@@ -0,0 +1,173 @@
+/**
+ * \file lowerbound.cpp
+ *
+ * Lower bounds on the time between stops and TAZs, from a time-independent graph of the supply.
+ * PathFinder::labelStops uses these to skip stops that can't lead to a useful path
+ * when PathFinder::LOWER_BOUND_PRUNING_ is set.
+ */
+#include "pathfinder.h"
+
+#include <algorithm>
+#include <functional>
+#include <iostream>
+#include <limits>
+
+namespace fasttrips {
+
+    /**
+     * Returns the smallest of the time weights (in-vehicle, walk, drive or total time) in the given weights,
+     * or -1 if there are none.
+     */
+    static double minTimeWeight(const NamedWeights& weights)
+    {
+        static const char* TIME_WEIGHT_NAMES[] = { "in_vehicle_time_min", "walk_time_min", "drive_time_min", "time_min" };
+        double min_weight = -1;
+        for (int name_index = 0; name_index < 4; ++name_index) {
+            NamedWeights::const_iterator weight_iter = weights.find(TIME_WEIGHT_NAMES[name_index]);
+            if (weight_iter == weights.end()) { continue; }
+            if ((min_weight < 0) || (weight_iter->second < min_weight)) {
+                min_weight = std::max(0.0, weight_iter->second);
+            }
+        }
+        return min_weight;
+    }
+
+    void PathFinder::buildLowerBoundGraph() const
+    {
+        int num_stops = maxStopId() + 1;
+
+        // (stop id, next stop id) -> minimum time
+        std::map< std::pair<int,int>, float > min_times;
+        for (std::map<int, std::vector<TripStopTime> >::const_iterator it = trip_stop_times_.begin(); it != trip_stop_times_.end(); ++it) {
+            for (size_t seq_index = 1; seq_index < it->second.size(); ++seq_index) {
+                const TripStopTime& from_stt = it->second[seq_index-1];
+                const TripStopTime& to_stt   = it->second[seq_index];
+                // the schedule may cross midnight; a lower bound of zero is still a lower bound
+                float hop_time = static_cast<float>(std::max(0.0, to_stt.arrive_time_ - from_stt.depart_time_));
+
+                std::pair<int,int> key(from_stt.stop_id_, to_stt.stop_id_);
+                std::map< std::pair<int,int>, float >::iterator min_iter = min_times.find(key);
+                if (min_iter == min_times.end()) { min_times[key]  = hop_time; }
+                else if (hop_time < min_iter->second) { min_iter->second = hop_time; }
+            }
+        }
+        for (StopStopToAttr::const_iterator it = transfer_links_o_d_.begin(); it != transfer_links_o_d_.end(); ++it) {
+            for (StopToAttr::const_iterator xfer_iter = it->second.begin(); xfer_iter != it->second.end(); ++xfer_iter) {
+                float transfer_time = static_cast<float>(xfer_iter->second.find("time_min")->second);
+
+                std::pair<int,int> key(it->first, xfer_iter->first);
+                std::map< std::pair<int,int>, float >::iterator min_iter = min_times.find(key);
+                if (min_iter == min_times.end()) { min_times[key]  = transfer_time; }
+                else if (transfer_time < min_iter->second) { min_iter->second = transfer_time; }
+            }
+        }
+
+        lower_bound_links_o_d_.assign(num_stops, std::vector<std::pair<int,float> >());
+        lower_bound_links_d_o_.assign(num_stops, std::vector<std::pair<int,float> >());
+        for (std::map< std::pair<int,int>, float >::const_iterator it = min_times.begin(); it != min_times.end(); ++it) {
+            lower_bound_links_o_d_[it->first.first ].push_back(std::make_pair(it->first.second, it->second));
+            lower_bound_links_d_o_[it->first.second].push_back(std::make_pair(it->first.first,  it->second));
+        }
+
+        lower_bound_times_.clear();
+        lower_bound_graph_valid_ = true;
+
+        if (process_num_ <= 1) {
+            std::cout << "buildLowerBoundGraph: " << min_times.size() << " links between " << num_stops << " stop ids" << std::endl;
+        }
+    }
+
+    const std::vector<float>& PathFinder::lowerBoundTimes(const PathSpecification& path_spec) const
+    {
+        if (!lower_bound_graph_valid_) { buildLowerBoundGraph(); }
+
+        int end_taz_id = path_spec.outbound_ ? path_spec.origin_taz_id_ : path_spec.destination_taz_id_;
+        std::pair<int,bool> key(end_taz_id, path_spec.outbound_);
+
+        std::map< std::pair<int,bool>, std::vector<float> >::const_iterator cache_iter = lower_bound_times_.find(key);
+        if (cache_iter != lower_bound_times_.end()) { return cache_iter->second; }
+
+        if (lower_bound_times_.size() >= LOWER_BOUND_CACHE_SIZE) { lower_bound_times_.clear(); }
+        std::vector<float>& lower_bounds = lower_bound_times_[key];
+        lower_bounds.assign(lower_bound_links_o_d_.size(), std::numeric_limits<float>::max());
+
+        // shortest paths from the end TAZ's links, with any supply mode
+        typedef std::pair<float,int> TimeStop;
+        std::priority_queue<TimeStop, std::vector<TimeStop>, std::greater<TimeStop> > time_stop_queue;
+
+        TAZSupplyStopToAttr::const_iterator iter_tss2a = taz_access_links_.find(end_taz_id);
+        if (iter_tss2a != taz_access_links_.end()) {
+            for (SupplyStopToAttr::const_iterator iter_ss2a = iter_tss2a->second.begin(); iter_ss2a != iter_tss2a->second.end(); ++iter_ss2a) {
+                for (StopToAttr::const_iterator link_iter = iter_ss2a->second.begin(); link_iter != iter_ss2a->second.end(); ++link_iter) {
+                    float link_time = static_cast<float>(link_iter->second.find("time_min")->second);
+                    if (link_time < lower_bounds[link_iter->first]) {
+                        lower_bounds[link_iter->first] = link_time;
+                        time_stop_queue.push(std::make_pair(link_time, link_iter->first));
+                    }
+                }
+            }
+        }
+
+        // inbound: the end TAZ is the destination, so follow links backwards from it
+        // outbound: the end TAZ is the origin, so follow links forwards from it
+        const std::vector< std::vector<std::pair<int,float> > >& links = (path_spec.outbound_ ? lower_bound_links_o_d_ : lower_bound_links_d_o_);
+        while (!time_stop_queue.empty()) {
+            TimeStop time_stop = time_stop_queue.top();
+            time_stop_queue.pop();
+            if (time_stop.first > lower_bounds[time_stop.second]) { continue; }
+
+            const std::vector<std::pair<int,float> >& stop_links = links[time_stop.second];
+            for (std::vector<std::pair<int,float> >::const_iterator link_iter = stop_links.begin(); link_iter != stop_links.end(); ++link_iter) {
+                float link_time = time_stop.first + link_iter->second;
+                if (link_time < lower_bounds[link_iter->first]) {
+                    lower_bounds[link_iter->first] = link_time;
+                    time_stop_queue.push(std::make_pair(link_time, link_iter->first));
+                }
+            }
+        }
+        return lower_bounds;
+    }
+
+    double PathFinder::lowerBoundCostPerMinute(const PathSpecification& path_spec) const
+    {
+        // deterministic: cost = time
+        if (!path_spec.hyperpath_) { return 1.0; }
+
+        double min_weight = MAX_COST;
+
+        // transit, for the allowed supply modes
+        UserClassPurposeMode transit_ucpm = { path_spec.user_class_, path_spec.purpose_, MODE_TRANSIT, path_spec.transit_mode_ };
+        WeightLookup::const_iterator iter_weights = weight_lookup_.find(transit_ucpm);
+        if (iter_weights == weight_lookup_.end()) { return 0; }
+        for (SupplyModeToNamedWeights::const_iterator iter_s2w = iter_weights->second.begin(); iter_s2w != iter_weights->second.end(); ++iter_s2w) {
+            double weight = minTimeWeight(iter_s2w->second);
+            if (weight < 0) { return 0; }
+            min_weight = std::min(min_weight, weight);
+        }
+
+        // transfers
+        const NamedWeights* transfer_weights = getNamedWeights(path_spec.user_class_, path_spec.purpose_, MODE_TRANSFER, "transfer", transfer_supply_mode_);
+        if (transfer_weights != NULL) {
+            double weight = minTimeWeight(*transfer_weights);
+            if (weight < 0) { return 0; }
+            min_weight = std::min(min_weight, weight);
+        }
+
+        // final links to the end TAZ
+        UserClassPurposeMode final_ucpm = {
+            path_spec.user_class_,
+            path_spec.purpose_,
+            path_spec.outbound_ ? MODE_ACCESS : MODE_EGRESS,
+            path_spec.outbound_ ? path_spec.access_mode_ : path_spec.egress_mode_
+        };
+        iter_weights = weight_lookup_.find(final_ucpm);
+        if (iter_weights == weight_lookup_.end()) { return 0; }
+        for (SupplyModeToNamedWeights::const_iterator iter_s2w = iter_weights->second.begin(); iter_s2w != iter_weights->second.end(); ++iter_s2w) {
+            double weight = minTimeWeight(iter_s2w->second);
+            if (weight < 0) { return 0; }
+            min_weight = std::min(min_weight, weight);
+        }
+
+        return (min_weight == MAX_COST) ? 0 : min_weight;
+    }
+}
@@ -84,6 +84,31 @@ namespace fasttrips {
         return false;
     }
 
+    // Hash of the links, combined in order
+    size_t Path::hash() const
+    {
+        size_t seed = links_.size();
+        for (size_t ind=0; ind<links_.size(); ++ind) {
+            // same combine as boost::hash_combine
+            seed ^= static_cast<size_t>(links_[ind].first)              + 0x9e3779b9 + (seed << 6) + (seed >> 2);
+            seed ^= static_cast<size_t>(links_[ind].second.deparr_mode_) + 0x9e3779b9 + (seed << 6) + (seed >> 2);
+            seed ^= static_cast<size_t>(links_[ind].second.trip_id_)     + 0x9e3779b9 + (seed << 6) + (seed >> 2);
+        }
+        return seed;
+    }
+
+    // Same links as another path?
+    bool Path::sameLinks(const Path& path2) const
+    {
+        if (size() != path2.size()) { return false; }
+        for (size_t ind=0; ind<size(); ++ind) {
+            if (links_[ind].first               != path2[ind].first              ) { return false; }
+            if (links_[ind].second.deparr_mode_ != path2[ind].second.deparr_mode_) { return false; }
+            if (links_[ind].second.trip_id_     != path2[ind].second.trip_id_    ) { return false; }
+        }
+        return true;
+    }
+
     // Add link to the path, modifying if necessary
     // Return feasibility (infeasible if two out of order trips)
     bool Path::addLink(int stop_id,
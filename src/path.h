@@ -7,6 +7,14 @@
 #include <map>
 #include <vector>
 
+#if __APPLE__
+#include <tr1/unordered_map>
+#elif __linux__
+#include <tr1/unordered_map>
+#else
+#include <unordered_map>
+#endif
+
 #include "pathspec.h"
 
 #ifndef PATH_H
@@ -19,7 +27,7 @@ namespace fasttrips {
     typedef struct {
         int     count_;             ///< Number of times this path was generated (for stochastic)
         double  probability_;       ///< Probability of this stop          (for stochastic)
-        int     prob_i_;            ///< Cumulative probability * RAND_MAX (for stochastic)
+        int     prob_i_;            ///< Cumulative probability * RandomStream::MAX (for stochastic)
     } PathInfo;
 
     // Forward declarations
@@ -64,6 +72,12 @@ namespace fasttrips {
         /// Comparison operator; determines ordering in PathSet
         bool operator<(const Path& other) const;
 
+        /// Hash of the links (stop id, departure/arrival mode, trip id), combined in order.
+        /// Paths for which Path::sameLinks is true have the same hash.
+        size_t hash() const;
+        /// Do these paths consist of the same links?  This is equality as defined by Path::operator<, without the cost.
+        bool sameLinks(const Path& other) const;
+
         /// Add link to the path, modifying if necessary
         /// Return feasibility (infeasible if two out of order trips)
         bool addLink(int stop_id,
@@ -94,6 +108,21 @@ namespace fasttrips {
      */
     typedef std::map<Path, PathInfo> PathSet;
 
+    /// Hash functor for fasttrips::EnumeratedPaths
+    struct PathHash {
+        size_t operator()(const Path& path) const { return path.hash(); }
+    };
+
+    /// Equality functor for fasttrips::EnumeratedPaths
+    struct PathLinksEqual {
+        bool operator()(const Path& path1, const Path& path2) const { return path1.sameLinks(path2); }
+    };
+
+    /** Path -> count of times it was generated, hashed by links rather than ordered by cost.
+     *  Used while enumerating so that duplicate draws can be found before the cost is calculated.
+     */
+    typedef std::tr1::unordered_map<Path, PathInfo, struct PathHash, struct PathLinksEqual> EnumeratedPaths;
+
 }
 
 #endif
\ No newline at end of file
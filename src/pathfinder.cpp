@@ -4,8 +4,12 @@
 #define NOMINMAX
 #include <windows.h>
 #include <psapi.h>
+#elif __APPLE__
+#include <mach/mach_time.h>
 #else
-#include <sys/time.h>
+#include <time.h>
+#include <stdio.h>
+#include <unistd.h>
 #endif
 
 #include <assert.h>
@@ -17,6 +21,7 @@
 #include <string>
 #include <math.h>
 #include <algorithm>
+#include <limits>
 
 const char kPathSeparator =
 #ifdef _WIN32
@@ -32,13 +37,97 @@ static std::ofstream stopids_file;
 
 namespace fasttrips {
 
+    const char* SEARCH_PHASE_NAMES[NUM_SEARCH_PHASES] = {
+        "initializeStopStates",
+        "updateStopStatesForTransfers",
+        "updateStopStatesForTrips",
+        "updateStopStatesForFinalLinks",
+        "finalizeTazState",
+        "hyperpathGeneratePath",
+        "calculateCost"
+    };
+
+    /**
+     * Returns a monotonic time in nanoseconds.  Only differences are meaningful.
+     */
+    static long long nowNanoseconds()
+    {
+#ifdef _WIN32
+        // QueryPerformanceFrequency reference: https://msdn.microsoft.com/en-us/library/windows/desktop/dn553408(v=vs.85).aspx
+        static LARGE_INTEGER frequency = { 0 };
+        if (frequency.QuadPart == 0) { QueryPerformanceFrequency(&frequency); }
+        LARGE_INTEGER now;
+        QueryPerformanceCounter(&now);
+        // split to avoid overflow and loss of precision
+        long long seconds = now.QuadPart / frequency.QuadPart;
+        long long ticks   = now.QuadPart % frequency.QuadPart;
+        return seconds*1000000000LL + (ticks*1000000000LL)/frequency.QuadPart;
+#elif __APPLE__
+        static mach_timebase_info_data_t timebase = { 0, 0 };
+        if (timebase.denom == 0) { mach_timebase_info(&timebase); }
+        return static_cast<long long>(mach_absolute_time() * timebase.numer / timebase.denom);
+#else
+        // std::chrono is only c++11
+        struct timespec now;
+        clock_gettime(CLOCK_MONOTONIC, &now);
+        return static_cast<long long>(now.tv_sec)*1000000000LL + now.tv_nsec;
+#endif
+    }
+
+    /**
+     * Fills in the memory usage in the given performance information, where supported.
+     */
+    static void setMemoryUsage(PerformanceInfo& performance_info)
+    {
+#ifdef _WIN32
+        PROCESS_MEMORY_COUNTERS_EX pmc;
+        if ( GetProcessMemoryInfo(GetCurrentProcess(), (PROCESS_MEMORY_COUNTERS*)&pmc, sizeof(pmc)) )
+        {
+            performance_info.workingset_bytes_   = pmc.WorkingSetSize;
+            performance_info.privateusage_bytes_ = pmc.PrivateUsage;
+        }
+#elif __linux__
+        // pages: total program size, resident set size, resident shared
+        FILE* statm = fopen("/proc/self/statm", "r");
+        if (statm == NULL) { return; }
+        long size_pages, resident_pages, shared_pages;
+        if (fscanf(statm, "%ld %ld %ld", &size_pages, &resident_pages, &shared_pages) == 3) {
+            long page_bytes = sysconf(_SC_PAGESIZE);
+            performance_info.workingset_bytes_   = resident_pages*page_bytes;
+            performance_info.privateusage_bytes_ = (resident_pages - shared_pages)*page_bytes;
+        }
+        fclose(statm);
+#endif
+    }
+
+    /**
+     * Times a fasttrips::SearchPhase from construction to destruction, adding the time and a call
+     * to the given performance information (if not NULL).
+     */
+    class PhaseTimer {
+    private:
+        PerformanceInfo*    performance_info_;
+        SearchPhase         phase_;
+        long long           start_;
+    public:
+        PhaseTimer(PerformanceInfo* performance_info, SearchPhase phase) :
+            performance_info_(performance_info), phase_(phase), start_(performance_info ? nowNanoseconds() : 0) {}
+        ~PhaseTimer() {
+            if (performance_info_ == NULL) { return; }
+            performance_info_->phase_calls_[phase_]       += 1;
+            performance_info_->phase_nanoseconds_[phase_] += nowNanoseconds() - start_;
+        }
+    };
+
     // access this through getTransferAttributes()
     Attributes* PathFinder::ZERO_WALK_TRANSFER_ATTRIBUTES_ = NULL;
 
     /**
      * This doesn't really do anything.
      */
-    PathFinder::PathFinder() : process_num_(-1), BUMP_BUFFER_(-1), STOCH_PATHSET_SIZE_(-1)
+    PathFinder::PathFinder() : process_num_(-1), BUMP_BUFFER_(-1), STOCH_PATHSET_SIZE_(-1),
+        STOCH_PATHSET_STOP_NO_NEW_(-1), STOCH_PATHSET_UNSEEN_TOLERANCE_(0), DETERMINISTIC_ENGINE_(DETERMINISTIC_ENGINE_LABELING),
+        LOWER_BOUND_PRUNING_(false), RANDOM_SEED_(0), performance_info_(NULL), route_patterns_valid_(false), lower_bound_graph_valid_(false)
     {
     }
 
@@ -49,22 +138,53 @@ namespace fasttrips {
         double     stoch_dispersion,
         int        stoch_max_stop_process_count,
         int        max_num_paths,
-        double     min_path_probability)
+        double     min_path_probability,
+        int        stoch_pathset_stop_no_new,
+        double     stoch_pathset_unseen_tolerance,
+        int        deterministic_engine,
+        bool       lower_bound_pruning,
+        int        random_seed)
     {
         BUMP_BUFFER_                    = bump_buffer;
         STOCH_PATHSET_SIZE_             = stoch_pathset_size;
         STOCH_MAX_STOP_PROCESS_COUNT_   = stoch_max_stop_process_count;
         MAX_NUM_PATHS_                  = max_num_paths;
         MIN_PATH_PROBABILITY_           = min_path_probability;
+        STOCH_PATHSET_STOP_NO_NEW_      = stoch_pathset_stop_no_new;
+        STOCH_PATHSET_UNSEEN_TOLERANCE_ = stoch_pathset_unseen_tolerance;
+        DETERMINISTIC_ENGINE_           = deterministic_engine;
+        LOWER_BOUND_PRUNING_            = lower_bound_pruning;
+        RANDOM_SEED_                    = static_cast<unsigned int>(random_seed);
 
         Hyperlink::TIME_WINDOW_         = time_window;
         Hyperlink::STOCH_DISPERSION_    = stoch_dispersion;
     }
 
+    void PathFinder::initializeIds(
+        const std::string&  id_namespace,
+        const int*          id_nums,
+        const char* const*  id_strs,
+        int                 num_ids)
+    {
+        std::map<int, std::string>* num_to_str = NULL;
+        if      (id_namespace == "trip") { num_to_str = &trip_num_to_str_; }
+        else if (id_namespace == "stop") { num_to_str = &stop_num_to_str_; }
+        else {
+            std::cerr << "initializeIds: Don't understand id namespace [" << id_namespace << "]" << std::endl;
+            return;
+        }
+
+        num_to_str->clear();
+        for (int i=0; i<num_ids; ++i) {
+            (*num_to_str)[id_nums[i]] = id_strs[i];
+        }
+    }
+
     void PathFinder::readIntermediateFiles()
     {
-        readTripIds();
-        readStopIds();
+        // these may have been passed via initializeIds()
+        if (trip_num_to_str_.size() == 0) { readTripIds(); }
+        if (stop_num_to_str_.size() == 0) { readStopIds(); }
         readRouteIds();
         readModeIds();
         readAccessLinks();
@@ -385,6 +505,42 @@ namespace fasttrips {
         return &(sa_iter->second);
     }
 
+    const std::vector<TransferLinkCost>* PathFinder::transferCosts(
+        const NamedWeights& transfer_weights,
+        bool outbound,
+        int stop_id) const
+    {
+        // if outbound, going backwards, so transfer TO this stop
+        // if inbound, going forwards, so transfer FROM this stop
+        const StopStopToAttr& transfer_links = (outbound ? transfer_links_d_o_ : transfer_links_o_d_);
+        if (transfer_links.size() == 0) { return NULL; }
+
+        // the costs depend only on the weights and the link attributes, so they're tallied without a path:
+        // tracing them would trace to whichever path came first
+        std::pair<const NamedWeights*, bool> key(&transfer_weights, outbound);
+        std::map< std::pair<const NamedWeights*, bool>, std::vector< std::vector<TransferLinkCost> > >::iterator costs_iter = transfer_costs_.find(key);
+        if (costs_iter == transfer_costs_.end()) {
+            PathSpecification untraced_spec;
+            untraced_spec.trace_ = false;
+
+            std::vector< std::vector<TransferLinkCost> >& costs = transfer_costs_[key];
+            costs.resize(transfer_links.rbegin()->first + 1);
+            for (StopStopToAttr::const_iterator ssa_iter = transfer_links.begin(); ssa_iter != transfer_links.end(); ++ssa_iter) {
+                for (StopToAttr::const_iterator sa_iter = ssa_iter->second.begin(); sa_iter != ssa_iter->second.end(); ++sa_iter) {
+                    Attributes link_attr            = sa_iter->second;
+                    link_attr["transfer_penalty"]   = 1.0;
+                    TransferLinkCost transfer_cost = { sa_iter->first, sa_iter->second.find("time_min")->second,
+                                                       tallyLinkCost(transfer_supply_mode_, untraced_spec, std::cerr, transfer_weights, link_attr, true) };
+                    costs[ssa_iter->first].push_back(transfer_cost);
+                }
+            }
+            costs_iter = transfer_costs_.find(key);
+        }
+
+        if ((stop_id >= (int)costs_iter->second.size()) || (costs_iter->second[stop_id].size() == 0)) { return NULL; }
+        return &(costs_iter->second[stop_id]);
+    }
+
     const TripInfo* PathFinder::getTripInfo(int trip_id_num) const
     {
         std::map<int, TripInfo>::const_iterator it = trip_info_.find(trip_id_num);
@@ -412,6 +568,9 @@ namespace fasttrips {
     {
         output_dir_  = output_dir;
         process_num_ = process_num;
+        // the route patterns and lower bounds are rebuilt from the new supply when needed
+        route_patterns_valid_    = false;
+        lower_bound_graph_valid_ = false;
         if (trip_stop_times_.size() == 0)
         {
             readIntermediateFiles();
@@ -420,6 +579,7 @@ namespace fasttrips {
             // reset these
             trip_stop_times_.clear();
             stop_trip_times_.clear();
+            stop_trip_times_index_.clear();
         }
 
         for (int i=0; i<num_stoptimes; ++i) {
@@ -435,6 +595,7 @@ namespace fasttrips {
             assert(stt.sequence_ == trip_stop_times_[stt.trip_id_].size()+1);
 
             trip_stop_times_[stt.trip_id_].push_back(stt);
+            stop_trip_times_index_[stt.trip_id_].push_back(stop_trip_times_[stt.stop_id_].size());
             stop_trip_times_[stt.stop_id_].push_back(stt);
             // if (false && (process_num <= 1) && ((i<5) || (i>num_stoptimes-5))) {
             if (stt.overcap_ > 0) {
@@ -448,6 +609,49 @@ namespace fasttrips {
         }
     }
 
+    int PathFinder::updateStopTimes(
+        int*        stoptime_index,
+        double*     stoptime_times,
+        int         num_stoptimes)
+    {
+        int num_updated = 0;
+        for (int i=0; i<num_stoptimes; ++i) {
+            int trip_id = stoptime_index[3*i];
+            int seq     = stoptime_index[3*i+1];
+            int stop_id = stoptime_index[3*i+2];
+
+            std::map<int, std::vector<TripStopTime> >::iterator tsti = trip_stop_times_.find(trip_id);
+            if ((tsti == trip_stop_times_.end()) || (seq < 1) || (seq > (int)tsti->second.size())) {
+                std::cerr << "updateStopTimes: trip " << trip_id << " seq " << seq << " not in supply; skipping" << std::endl;
+                continue;
+            }
+            // stop sequences start at 1
+            TripStopTime& trip_stt = tsti->second[seq-1];
+            assert(trip_stt.stop_id_ == stop_id);
+            trip_stt.arrive_time_ = stoptime_times[3*i];
+            trip_stt.depart_time_ = stoptime_times[3*i+1];
+            trip_stt.overcap_     = stoptime_times[3*i+2];
+
+            // and the copy for the stop
+            TripStopTime& stop_stt = stop_trip_times_[stop_id][ stop_trip_times_index_[trip_id][seq-1] ];
+            assert((stop_stt.trip_id_ == trip_id) && (stop_stt.seq_ == seq));
+            stop_stt.arrive_time_ = trip_stt.arrive_time_;
+            stop_stt.depart_time_ = trip_stt.depart_time_;
+            stop_stt.overcap_     = trip_stt.overcap_;
+
+            num_updated += 1;
+        }
+        // new times may change which trips overtake each other, and the minimum times between stops
+        if (num_updated > 0) {
+            route_patterns_valid_    = false;
+            lower_bound_graph_valid_ = false;
+        }
+        if (process_num_ <= 1) {
+            std::cout << "updateStopTimes: updated " << num_updated << " of " << num_stoptimes << " stop times" << std::endl;
+        }
+        return num_updated;
+    }
+
     void PathFinder::setBumpWait(int*       bw_index,
                                  double*    bw_data,
                                  int        num_bw)
@@ -515,81 +719,58 @@ namespace fasttrips {
             stopids_file << "stop_id,stop_id_label_iter,is_trip,label_stop_cost" << std::endl;
         }
 
-        StopStates           stop_states;
-        LabelStopQueue       label_stop_queue;
-
-#ifdef _WIN32
-        // QueryPerformanceFrequency reference: https://msdn.microsoft.com/en-us/library/windows/desktop/dn553408(v=vs.85).aspx
-        LARGE_INTEGER        frequency;
-        LARGE_INTEGER        labeling_start_time, labeling_end_time, pathfind_end_time;
-        LARGE_INTEGER        label_elapsed, pathfind_elapsed;
-        QueryPerformanceFrequency(&frequency);
-        QueryPerformanceCounter(&labeling_start_time);
-#else
-        // using gettimeofday() since std::chrono is only c++11
-        struct timeval       labeling_start_time, labeling_end_time, pathfind_end_time;
-        gettimeofday(&labeling_start_time, NULL);
-#endif
-
-        // todo: handle failure
-        bool success = initializeStopStates(path_spec, trace_file, stop_states, label_stop_queue);
-
-        // These are the stops that are reachable from the final TAZ
-        std::map<int, int> reachable_final_stops;
-        success = setReachableFinalStops(path_spec, trace_file, reachable_final_stops);
-
-        performance_info.label_iterations_ = labelStops(path_spec, trace_file, reachable_final_stops,
-                                                        stop_states, label_stop_queue, performance_info.max_process_count_);
-        performance_info.num_labeled_stops_ = stop_states.size();
+        // reuse the search state storage
+        StopStates&          stop_states      = stop_states_;
+        LabelStopQueue&      label_stop_queue = label_stop_queue_;
+        stop_states.clear();
+        label_stop_queue.clear();
 
-#ifdef _WIN32
-        QueryPerformanceCounter(&labeling_end_time);
-#else
-        gettimeofday(&labeling_end_time, NULL);
-#endif
+        // count things during the search
+        performance_info_ = &performance_info;
+        long long labeling_start_time = nowNanoseconds();
 
-        getPathSet(path_spec, trace_file, stop_states, pathset);
+        // deterministic path-finding can use the round-based search instead
+        bool use_rounds     = (!path_spec.hyperpath_ && (DETERMINISTIC_ENGINE_ == DETERMINISTIC_ENGINE_RAPTOR));
+        int  best_taz_label = -1;
 
-#ifdef _WIN32
-        QueryPerformanceCounter(&pathfind_end_time);
+        if (use_rounds) {
+            performance_info.label_iterations_  = raptorLabelStops(path_spec, trace_file, best_taz_label);
+            performance_info.num_labeled_stops_ = round_labels_.size();
+        } else {
+            // todo: handle failure
+            bool success;
+            {
+                PhaseTimer timer(performance_info_, PHASE_INITIALIZE_STOP_STATES);
+                success = initializeStopStates(path_spec, trace_file, stop_states, label_stop_queue);
+            }
 
-        label_elapsed.QuadPart                = labeling_end_time.QuadPart - labeling_start_time.QuadPart;
-        pathfind_elapsed.QuadPart             = pathfind_end_time.QuadPart - labeling_end_time.QuadPart;
+            // These are the stops that are reachable from the final TAZ
+            std::map<int, int> reachable_final_stops;
+            success = setReachableFinalStops(path_spec, trace_file, reachable_final_stops);
 
-        // We now have the elapsed number of ticks, along with the
-        // number of ticks-per-second. We use these values
-        // to convert to the number of elapsed milliseconds.
-        // To guard against loss-of-precision, we convert
-        // to microseconds *before* dividing by ticks-per-second.
-        label_elapsed.QuadPart    *= 1000;
-        label_elapsed.QuadPart    /= frequency.QuadPart;
-        pathfind_elapsed.QuadPart *= 1000;
-        pathfind_elapsed.QuadPart /= frequency.QuadPart;
+            performance_info.label_iterations_ = labelStops(path_spec, trace_file, reachable_final_stops,
+                                                            stop_states, label_stop_queue, performance_info.max_process_count_);
+            performance_info.num_labeled_stops_ = stop_states.size();
+        }
 
-        performance_info.milliseconds_labeling_    = (long)label_elapsed.QuadPart;
-        performance_info.milliseconds_enumerating_ = (long)pathfind_elapsed.QuadPart;
+        long long labeling_end_time = nowNanoseconds();
 
-        PROCESS_MEMORY_COUNTERS_EX pmc;
-        if ( GetProcessMemoryInfo(GetCurrentProcess(), (PROCESS_MEMORY_COUNTERS*)&pmc, sizeof(pmc)) )
-        {
-            performance_info.workingset_bytes_   = pmc.WorkingSetSize;
-            performance_info.privateusage_bytes_ = pmc.PrivateUsage;
+        if (use_rounds) {
+            raptorGetPathSet(path_spec, trace_file, best_taz_label, pathset, performance_info);
+        } else {
+            getPathSet(path_spec, trace_file, stop_states, pathset, performance_info);
         }
-#else
-        gettimeofday(&pathfind_end_time, NULL);
 
-        // microseconds
-        long int diff = (labeling_end_time.tv_usec   + 1000000*labeling_end_time.tv_sec) -
-                        (labeling_start_time.tv_usec + 1000000*labeling_start_time.tv_sec);
-        performance_info.milliseconds_labeling_ = 0.001*diff;
+        long long pathfind_end_time = nowNanoseconds();
 
-        diff = (pathfind_end_time.tv_usec   + 1000000*pathfind_end_time.tv_sec) -
-               (labeling_end_time.tv_usec   + 1000000*labeling_end_time.tv_sec);
-        performance_info.milliseconds_enumerating_ = 0.001*diff;
-#endif
+        performance_info.milliseconds_labeling_    = 0.000001*(labeling_end_time - labeling_start_time);
+        performance_info.milliseconds_enumerating_ = 0.000001*(pathfind_end_time - labeling_end_time);
+        setMemoryUsage(performance_info);
+        performance_info_ = NULL;
 
-        // clear stop states since they have path pointers
+        // clear stop states since they have path pointers.  This keeps the storage for the next search.
         stop_states.clear();
+        label_stop_queue.clear();
 
         if (path_spec.trace_) {
 
@@ -597,6 +778,18 @@ namespace fasttrips {
             trace_file << "       max process count: " << performance_info.max_process_count_   << std::endl;
             trace_file << "   milliseconds labeling: " << performance_info.milliseconds_labeling_    << std::endl;
             trace_file << "milliseconds enumerating: " << performance_info.milliseconds_enumerating_ << std::endl;
+            trace_file << "       enumeration draws: " << performance_info.enumeration_draws_        << std::endl;
+            trace_file << " enumeration stop reason: " << performance_info.enumeration_stop_reason_  << std::endl;
+            for (int phase = 0; phase < NUM_SEARCH_PHASES; ++phase) {
+                trace_file << std::setw(30) << std::setfill(' ') << SEARCH_PHASE_NAMES[phase] << ": ";
+                trace_file << performance_info.phase_calls_[phase] << " calls, ";
+                trace_file << performance_info.phase_nanoseconds_[phase] << " nanoseconds" << std::endl;
+            }
+            trace_file << "           trips scanned: " << performance_info.trips_scanned_ << std::endl;
+            trace_file << "             links added: " << performance_info.links_added_   << std::endl;
+            trace_file << "            links pruned: " << performance_info.links_pruned_  << std::endl;
+            trace_file << "            queue pushes: " << performance_info.queue_pushes_  << std::endl;
+            trace_file << "              queue pops: " << performance_info.queue_pops_    << std::endl;
             trace_file.close();
             label_file.close();
             stopids_file.close();
@@ -659,23 +852,24 @@ namespace fasttrips {
         // do we even want to incorporate this link to our stop state?
         bool rejected = false;
 
-        // initialize the hyperlink if we need to
-        if (stop_states.find(stop_id) == stop_states.end()) {
-            Hyperlink h(stop_id, path_spec.outbound_);
-            stop_states[stop_id] = h;
-        }
-
+        // this initializes the hyperlink if we need to
         Hyperlink& hyperlink = stop_states[stop_id];
 
         // keep track if the state changed (label or time window)
         // if so, we'll want to trigger dealing with the effects by adding it to the queue
         bool update_state = hyperlink.addLink(ss, prev_link, rejected, trace_file, path_spec, *this);
 
+        if (performance_info_) {
+            if (rejected) { performance_info_->links_pruned_ += 1; }
+            else          { performance_info_->links_added_  += 1; }
+        }
+
         if (update_state) {
             LabelStop ls = { hyperlink.hyperpathCost(isTrip(ss.deparr_mode_)), stop_id, isTrip(ss.deparr_mode_) };
 
             // push this stop and it's departure time / arrival time for processing
             label_stop_queue.push( ls );
+            if (performance_info_) { performance_info_->queue_pushes_ += 1; }
         }
 
         // the rest is for debugging
@@ -887,17 +1081,38 @@ namespace fasttrips {
         // are there other relevant transfers?
         // if outbound, going backwards, so transfer TO this current stop
         // if inbound, going forwards, so transfer FROM this current stop
-        const StopStopToAttr&          transfer_links  = (path_spec.outbound_ ? transfer_links_d_o_ : transfer_links_o_d_);
-        StopStopToAttr::const_iterator transfer_map_it = transfer_links.find(current_label_stop.stop_id_);
-        bool                           found_transfers = (transfer_map_it != transfer_links.end());
+        const std::vector<TransferLinkCost>* transfer_costs = transferCosts(*transfer_weights, path_spec.outbound_, current_label_stop.stop_id_);
+        if (transfer_costs == NULL) { return; }
+
+        // deterministic: these depend only on the current trip, not the transfer
+        int     current_trip = -1;
+        bool    bump_wait    = false;
+        double  latest_time  = 0;
+        if (!path_spec.hyperpath_)
+        {
+            current_trip = current_stop_state.lowestCostStopState(true).trip_id_;
 
-        if (!found_transfers) { return; }
+            // check (departure mode, stop) if someone's waiting already
+            // curious... this only applies to OUTBOUND
+            // TODO: capacity stuff
+            if (path_spec.outbound_)
+            {
+                TripStop ts = { current_trip, current_stop_state.lowestCostStopState(true).seq_, current_label_stop.stop_id_ };
+                std::map<TripStop, double, struct TripStopCompare>::const_iterator bwi = bump_wait_.find(ts);
+                if (bwi != bump_wait_.end())
+                {
+                    // time a bumped passenger started waiting
+                    bump_wait   = true;
+                    latest_time = bwi->second;
+                }
+            }
+        }
 
-        for (StopToAttr::const_iterator transfer_it = transfer_map_it->second.begin();
-             transfer_it != transfer_map_it->second.end(); ++transfer_it)
+        for (std::vector<TransferLinkCost>::const_iterator transfer_it = transfer_costs->begin();
+             transfer_it != transfer_costs->end(); ++transfer_it)
         {
-            xfer_stop_id    = transfer_it->first;
-            transfer_time   = transfer_it->second.find("time_min")->second;
+            xfer_stop_id    = transfer_it->stop_id_;
+            transfer_time   = transfer_it->time_;
             // outbound: departure time = latest departure - transfer
             //  inbound: arrival time   = earliest arrival + transfer
             deparr_time     = current_deparr_time - (transfer_time*dir_factor);
@@ -905,9 +1120,13 @@ namespace fasttrips {
             // stochastic/hyperpath: cost update
             if (path_spec.hyperpath_)
             {
-                Attributes link_attr            = transfer_it->second;
-                link_attr["transfer_penalty"]   = 1.0;
-                link_cost                       = tallyLinkCost(transfer_supply_mode_, path_spec, trace_file, *transfer_weights, link_attr);
+                if (path_spec.trace_) {
+                    Attributes link_attr            = *getTransferAttributes(path_spec.outbound_ ? xfer_stop_id : current_label_stop.stop_id_,
+                                                                             path_spec.outbound_ ? current_label_stop.stop_id_ : xfer_stop_id);
+                    link_attr["transfer_penalty"]   = 1.0;
+                    tallyLinkCost(transfer_supply_mode_, path_spec, trace_file, *transfer_weights, link_attr);
+                }
+                link_cost                       = transfer_it->cost_;
                 cost                            = nonwalk_label + link_cost;
             }
             // deterministic: label = cost = total time, just additive
@@ -916,25 +1135,14 @@ namespace fasttrips {
                 link_cost           = transfer_time;
                 cost                = current_label_stop.label_ + link_cost;
 
-                // check (departure mode, stop) if someone's waiting already
-                // curious... this only applies to OUTBOUND
-                // TODO: capacity stuff
-                if (path_spec.outbound_)
+                if (bump_wait)
                 {
-                    int current_trip = current_stop_state.lowestCostStopState(true).trip_id_;
-                    TripStop ts = { current_trip, current_stop_state.lowestCostStopState(true).seq_, current_label_stop.stop_id_ };
-                    std::map<TripStop, double, struct TripStopCompare>::const_iterator bwi = bump_wait_.find(ts);
-                    if (bwi != bump_wait_.end())
-                    {
-                        // time a bumped passenger started waiting
-                        double latest_time = bwi->second;
-                        // we can't come in time
-                        if (deparr_time - Hyperlink::TIME_WINDOW_ > latest_time) { continue; }
-                        // leave earlier -- to get in line 5 minutes before bump wait time
-                        // (confused... We don't resimulate previous bumping passenger so why does this make sense?)
-                        cost            = cost + (current_stop_state.lowestCostStopState(true).deparr_time_ - latest_time) + BUMP_BUFFER_;
-                        deparr_time     = latest_time - transfer_time - BUMP_BUFFER_;
-                    }
+                    // we can't come in time
+                    if (deparr_time - Hyperlink::TIME_WINDOW_ > latest_time) { continue; }
+                    // leave earlier -- to get in line 5 minutes before bump wait time
+                    // (confused... We don't resimulate previous bumping passenger so why does this make sense?)
+                    cost            = cost + (current_stop_state.lowestCostStopState(true).deparr_time_ - latest_time) + BUMP_BUFFER_;
+                    deparr_time     = latest_time - transfer_time - BUMP_BUFFER_;
                 }
             }
 
@@ -1105,8 +1313,7 @@ namespace fasttrips {
         StopStates& stop_states,
         LabelStopQueue& label_stop_queue,
         int label_iteration,
-        const LabelStop& current_label_stop,
-        std::tr1::unordered_set<int>& trips_done) const
+        const LabelStop& current_label_stop) const
     {
         double dir_factor = path_spec.outbound_ ? 1.0 : -1.0;
 
@@ -1122,219 +1329,223 @@ namespace fasttrips {
         // this is the latest departure/earliest arriving walk link
         double     latest_dep_earliest_arr  = current_stop_state.latestDepartureEarliestArrival(false);
 
-        // Update by trips
-        std::vector<TripStopTime> relevant_trips;
-        getTripsWithinTime(current_label_stop.stop_id_, path_spec.outbound_, latest_dep_earliest_arr, relevant_trips);
-        for (std::vector<TripStopTime>::const_iterator it=relevant_trips.begin(); it != relevant_trips.end(); ++it) {
+        // Update by trips, a route pattern at a time
+        if (!route_patterns_valid_) { buildRoutePatterns(); }
+        if (current_label_stop.stop_id_ >= (int)stop_route_patterns_.size()) { return; }
+        const std::vector<std::pair<int,int> >& stop_patterns = stop_route_patterns_[current_label_stop.stop_id_];
+        for (std::vector<std::pair<int,int> >::const_iterator sp_iter = stop_patterns.begin(); sp_iter != stop_patterns.end(); ++sp_iter) {
+            const RoutePattern& pattern     = route_patterns_[sp_iter->first];
+            int                 pattern_pos = sp_iter->second;
 
-            // the trip info for this trip
-            const TripInfo& trip_info = trip_info_.find(it->trip_id_)->second;
-            // the trip stop time for this trip
-            const TripStopTime& tst = getTripStopTime(it->trip_id_, it->seq_);
-
-            // get the weights applicable for this trip
-            SupplyModeToNamedWeights::const_iterator iter_sm2nw = iter_weights->second.find(trip_info.supply_mode_num_);
+            // get the weights applicable for this pattern's trips
+            SupplyModeToNamedWeights::const_iterator iter_sm2nw = iter_weights->second.find(pattern.supply_mode_num_);
             if (iter_sm2nw == iter_weights->second.end()) {
                 // this supply mode isn't allowed for the userclass/demand mode
                 continue;
             }
             const NamedWeights& named_weights = iter_sm2nw->second;
 
-            if (true && path_spec.trace_) {
-                trace_file << "valid trips: " << trip_num_to_str_.find(it->trip_id_)->second << " " << it->seq_ << " ";
-                printTime(trace_file, path_spec.outbound_ ? it->arrive_time_ : it->depart_time_);
-                trace_file << std::endl;
-            }
+            int first_trip, last_trip;
+            getPatternTripsWithinTime(pattern, pattern_pos, path_spec.outbound_, latest_dep_earliest_arr, first_trip, last_trip);
+            if (performance_info_) { performance_info_->trips_scanned_ += (last_trip - first_trip); }
+            for (int trip_index = first_trip; trip_index < last_trip; ++trip_index) {
 
-            // trip arrival time (outbound) / trip departure time (inbound)
-            double arrdep_time                = path_spec.outbound_ ? it->arrive_time_ : it->depart_time_;
-            // this is our best guess link in the current_stop_state hyperlink that's relevant
-            const  StopState& best_guess_link = current_stop_state.bestGuessLink(path_spec.outbound_, arrdep_time);
-            double wait_time                  = (best_guess_link.deparr_time_ - arrdep_time)*dir_factor;
-            if (wait_time < 0) {
-                std::cerr << "wait_time < 0 -- this shouldn't happen!" << std::endl;
-                if (path_spec.trace_) { trace_file << "wait_time < 0 -- this shouldn't happen!" << std::endl; }
-            }
+                // the TripStopTimes for this trip, and the one for this stop
+                const std::vector<TripStopTime>& possible_stops = *(pattern.trip_stop_times_[trip_index]);
+                const TripStopTime& tst = possible_stops[pattern_pos];
+                // the trip info for this trip
+                const TripInfo& trip_info = trip_info_.find(tst.trip_id_)->second;
 
-            // deterministic path-finding: check capacities
-            if (!path_spec.hyperpath_) {
-                TripStop check_for_bump_wait;
-                double arrive_time;
-                if (path_spec.outbound_) {
-                    // if outbound, this trip loop is possible trips *before* the current trip
-                    // checking that we get here in time for the current trip
-                    check_for_bump_wait.trip_id_ = current_stop_state.lowestCostStopState(false).trip_id_;
-                    check_for_bump_wait.seq_     = current_stop_state.lowestCostStopState(false).seq_;
-                    check_for_bump_wait.stop_id_ = current_label_stop.stop_id_;
-                    //  arrive from the loop trip
-                    arrive_time = arrdep_time;
-                } else {
-                    // if inbound, the trip is the next trip
-                    // checking that we can get here in time for that trip
-                    check_for_bump_wait.trip_id_ = it->trip_id_;
-                    check_for_bump_wait.seq_     = it->seq_;
-                    check_for_bump_wait.stop_id_ = current_label_stop.stop_id_;
-                    // arrive for this trip
-                    arrive_time = current_stop_state.lowestCostStopState(false).deparr_time_;
+                if (true && path_spec.trace_) {
+                    trace_file << "valid trips: " << trip_num_to_str_.find(tst.trip_id_)->second << " " << tst.seq_ << " ";
+                    printTime(trace_file, path_spec.outbound_ ? tst.arrive_time_ : tst.depart_time_);
+                    trace_file << std::endl;
                 }
-                std::map<TripStop, double, struct TripStopCompare>::const_iterator bwi = bump_wait_.find(check_for_bump_wait);
-                if (bwi != bump_wait_.end()) {
-                    // time a bumped passenger started waiting
-                    double latest_time = bwi->second;
-                    if (path_spec.trace_) {
-                        trace_file << "checking latest_time ";
-                        printTime(trace_file, latest_time);
-                        trace_file << " vs arrive_time ";
-                        printTime(trace_file, arrive_time);
-                        trace_file << " for potential trip " << it->trip_id_ << std::endl;
+
+                // trip arrival time (outbound) / trip departure time (inbound)
+                double arrdep_time                = path_spec.outbound_ ? tst.arrive_time_ : tst.depart_time_;
+                // this is our best guess link in the current_stop_state hyperlink that's relevant
+                const  StopState& best_guess_link = current_stop_state.bestGuessLink(path_spec.outbound_, arrdep_time);
+                double wait_time                  = (best_guess_link.deparr_time_ - arrdep_time)*dir_factor;
+                if (wait_time < 0) {
+                    std::cerr << "wait_time < 0 -- this shouldn't happen!" << std::endl;
+                    if (path_spec.trace_) { trace_file << "wait_time < 0 -- this shouldn't happen!" << std::endl; }
+                }
+
+                // deterministic path-finding: check capacities
+                if (!path_spec.hyperpath_) {
+                    TripStop check_for_bump_wait;
+                    double arrive_time;
+                    if (path_spec.outbound_) {
+                        // if outbound, this trip loop is possible trips *before* the current trip
+                        // checking that we get here in time for the current trip
+                        check_for_bump_wait.trip_id_ = current_stop_state.lowestCostStopState(false).trip_id_;
+                        check_for_bump_wait.seq_     = current_stop_state.lowestCostStopState(false).seq_;
+                        check_for_bump_wait.stop_id_ = current_label_stop.stop_id_;
+                        //  arrive from the loop trip
+                        arrive_time = arrdep_time;
+                    } else {
+                        // if inbound, the trip is the next trip
+                        // checking that we can get here in time for that trip
+                        check_for_bump_wait.trip_id_ = tst.trip_id_;
+                        check_for_bump_wait.seq_     = tst.seq_;
+                        check_for_bump_wait.stop_id_ = current_label_stop.stop_id_;
+                        // arrive for this trip
+                        arrive_time = current_stop_state.lowestCostStopState(false).deparr_time_;
                     }
-                    if ((arrive_time + 0.01 >= latest_time) &&
-                        (current_stop_state.lowestCostStopState(false).trip_id_ != it->trip_id_)) {
-                        if (path_spec.trace_) { trace_file << "Continuing" << std::endl; }
-                        continue;
+                    std::map<TripStop, double, struct TripStopCompare>::const_iterator bwi = bump_wait_.find(check_for_bump_wait);
+                    if (bwi != bump_wait_.end()) {
+                        // time a bumped passenger started waiting
+                        double latest_time = bwi->second;
+                        if (path_spec.trace_) {
+                            trace_file << "checking latest_time ";
+                            printTime(trace_file, latest_time);
+                            trace_file << " vs arrive_time ";
+                            printTime(trace_file, arrive_time);
+                            trace_file << " for potential trip " << tst.trip_id_ << std::endl;
+                        }
+                        if ((arrive_time + 0.01 >= latest_time) &&
+                            (current_stop_state.lowestCostStopState(false).trip_id_ != tst.trip_id_)) {
+                            if (path_spec.trace_) { trace_file << "Continuing" << std::endl; }
+                            continue;
+                        }
                     }
                 }
-            }
 
-            // get the TripStopTimes for this trip
-            std::map<int, std::vector<TripStopTime> >::const_iterator tstiter = trip_stop_times_.find(it->trip_id_);
-            assert(tstiter != trip_stop_times_.end());
-            const std::vector<TripStopTime>& possible_stops = tstiter->second;
-
-            // these are the relevant potential trips/stops; iterate through them
-            unsigned int start_seq = path_spec.outbound_ ? 1 : it->seq_+1;
-            unsigned int end_seq   = path_spec.outbound_ ? it->seq_-1 : possible_stops.size();
-            for (unsigned int seq_num = start_seq; seq_num <= end_seq; ++seq_num) {
-                // possible board for outbound / alight for inbound
-                const TripStopTime& possible_board_alight = possible_stops.at(seq_num-1);
-
-                // new label = length of trip so far if the passenger boards/alights at this stop
-                int board_alight_stop = possible_board_alight.stop_id_;
-                StopStates::const_iterator possible_stop_state_iter = stop_states.find(board_alight_stop);
-
-                // hyperpath: potential successor/predessor can't be access or egress
-                /*
-                if (path_spec.hyperpath_) {
-                    if (possible_stop_state_iter != stop_states.end() && possible_stop_state_iter->second.size()>0) {
-                        int possible_mode = possible_stop_state_iter->second.lowestCostStopState().deparr_mode_; // first mode; why 0 index?
-                        if ((possible_mode == MODE_ACCESS) || (possible_mode == MODE_EGRESS)) { continue; }
+                // these are the relevant potential trips/stops; iterate through them
+                unsigned int start_seq = path_spec.outbound_ ? 1 : tst.seq_+1;
+                unsigned int end_seq   = path_spec.outbound_ ? tst.seq_-1 : possible_stops.size();
+                for (unsigned int seq_num = start_seq; seq_num <= end_seq; ++seq_num) {
+                    // possible board for outbound / alight for inbound
+                    const TripStopTime& possible_board_alight = possible_stops.at(seq_num-1);
+
+                    // new label = length of trip so far if the passenger boards/alights at this stop
+                    int board_alight_stop = possible_board_alight.stop_id_;
+                    StopStates::const_iterator possible_stop_state_iter = stop_states.find(board_alight_stop);
+
+                    // hyperpath: potential successor/predessor can't be access or egress
+                    /*
+                    if (path_spec.hyperpath_) {
+                        if (possible_stop_state_iter != stop_states.end() && possible_stop_state_iter->second.size()>0) {
+                            int possible_mode = possible_stop_state_iter->second.lowestCostStopState().deparr_mode_; // first mode; why 0 index?
+                            if ((possible_mode == MODE_ACCESS) || (possible_mode == MODE_EGRESS)) { continue; }
+                        }
                     }
-                }
-                */
-
-                double  deparr_time     = path_spec.outbound_ ? possible_board_alight.depart_time_ : possible_board_alight.arrive_time_;
-                // the schedule crossed midnight
-                if (path_spec.outbound_ && arrdep_time < deparr_time) {
-                    deparr_time -= 24*60;
-                    if (path_spec.trace_) { trace_file << "trip crossed midnight; adjusting deparr_time" << std::endl; }
-                } else if (!path_spec.outbound_ && deparr_time < arrdep_time) {
-                    deparr_time += 24*60;
-                    if (path_spec.trace_) { trace_file << "trip crossed midnight; adjusting deparr_time" << std::endl; }
-                }
-                double  in_vehicle_time = (arrdep_time - deparr_time)*dir_factor;
-                double  cost      = 0;
-                double  link_cost = 0;
+                    */
+
+                    double  deparr_time     = path_spec.outbound_ ? possible_board_alight.depart_time_ : possible_board_alight.arrive_time_;
+                    // the schedule crossed midnight
+                    if (path_spec.outbound_ && arrdep_time < deparr_time) {
+                        deparr_time -= 24*60;
+                        if (path_spec.trace_) { trace_file << "trip crossed midnight; adjusting deparr_time" << std::endl; }
+                    } else if (!path_spec.outbound_ && deparr_time < arrdep_time) {
+                        deparr_time += 24*60;
+                        if (path_spec.trace_) { trace_file << "trip crossed midnight; adjusting deparr_time" << std::endl; }
+                    }
+                    double  in_vehicle_time = (arrdep_time - deparr_time)*dir_factor;
+                    double  cost      = 0;
+                    double  link_cost = 0;
 
-                if (in_vehicle_time < 0) {
-                    printf("in_vehicle_time < 0 -- this shouldn't happen\n");
-                    if (path_spec.trace_) { trace_file << "in_vehicle_time < 0 -- this shouldn't happen!" << std::endl; }
-                }
+                    if (in_vehicle_time < 0) {
+                        printf("in_vehicle_time < 0 -- this shouldn't happen\n");
+                        if (path_spec.trace_) { trace_file << "in_vehicle_time < 0 -- this shouldn't happen!" << std::endl; }
+                    }
 
-                // stochastic/hyperpath: cost update
-                if (path_spec.hyperpath_) {
+                    // stochastic/hyperpath: cost update
+                    if (path_spec.hyperpath_) {
 
-                    double overcap     = path_spec.outbound_ ? possible_board_alight.overcap_ : tst.overcap_;
-                    double at_capacity = (overcap >= 0 ? 1.0 : 0.0);  // binary, 0 means at capacity
-                    if (overcap < 0) { overcap = 0; } // make it non-negative
+                        double overcap     = path_spec.outbound_ ? possible_board_alight.overcap_ : tst.overcap_;
+                        double at_capacity = (overcap >= 0 ? 1.0 : 0.0);  // binary, 0 means at capacity
+                        if (overcap < 0) { overcap = 0; } // make it non-negative
 
-                    if (path_spec.trace_) {
-                        if (path_spec.outbound_) {
-                            trace_file << "trip " << tripStringForId(possible_board_alight.trip_id_)
-                                       << ", stop " << stopStringForId(possible_board_alight.stop_id_)
-                                       << ", seq " << possible_board_alight.seq_
-                                       << ", overcap " << possible_board_alight.overcap_ << std::endl;
-                        }
-                        else {
-                            trace_file << "trip " << tripStringForId(it->trip_id_)
-                                       << ", stop " << stopStringForId(it->stop_id_)
-                                       << ", seq " << it->seq_
-                                       << ", overcap " << tst.overcap_ << std::endl;
+                        if (path_spec.trace_) {
+                            if (path_spec.outbound_) {
+                                trace_file << "trip " << tripStringForId(possible_board_alight.trip_id_)
+                                           << ", stop " << stopStringForId(possible_board_alight.stop_id_)
+                                           << ", seq " << possible_board_alight.seq_
+                                           << ", overcap " << possible_board_alight.overcap_ << std::endl;
+                            }
+                            else {
+                                trace_file << "trip " << tripStringForId(tst.trip_id_)
+                                           << ", stop " << stopStringForId(tst.stop_id_)
+                                           << ", seq " << tst.seq_
+                                           << ", overcap " << tst.overcap_ << std::endl;
+                            }
                         }
-                    }
 
-                    // start with trip info attributes
-                    Attributes link_attr = trip_info.trip_attr_;
-                    link_attr["in_vehicle_time_min"] = in_vehicle_time;
-                    link_attr["wait_time_min"      ] = wait_time;
-                    link_attr["overcap"            ] = overcap;
-                    link_attr["at_capacity"        ] = at_capacity;
-
-                    link_cost = 0;
-                    // If outbound, and the current link is egress, then it's as late as possible and the wait time isn't accurate.
-                    // It should be a preferred delay time instead
-                    // ditto for inbound and access
-                    if (( path_spec.outbound_ && best_guess_link.deparr_mode_ == MODE_EGRESS) ||
-                        (!path_spec.outbound_ && best_guess_link.deparr_mode_ == MODE_ACCESS)) {
-                        link_attr["wait_time_min"      ] = 0;
-
-
-                        // TODO: this is awkward... setting this all up again.  Plus we don't have all the attributes set.  Cache something?
-                        Attributes delay_attr;
-                        delay_attr["time_min"             ] = 0;
-                        delay_attr["drive_time_min"       ] = 0;
-                        delay_attr["walk_time_min"        ] = 0;
-                        delay_attr["elevation_gain"       ] = 0;
-                        delay_attr["preferred_delay_min"  ] = wait_time;
-                        UserClassPurposeMode delay_ucpm = {
-                            path_spec.user_class_, path_spec.purpose_,
-                            path_spec.outbound_ ? MODE_EGRESS: MODE_ACCESS,
-                            path_spec.outbound_ ? path_spec.egress_mode_ : path_spec.access_mode_
-                        };
-                        WeightLookup::const_iterator delay_iter_weights = weight_lookup_.find(delay_ucpm);
-                        if (delay_iter_weights != weight_lookup_.end()) {
-                            SupplyModeToNamedWeights::const_iterator delay_iter_s2w = delay_iter_weights->second.find(best_guess_link.trip_id_);
-                            if (delay_iter_s2w != delay_iter_weights->second.end()) {
-                                link_cost = tallyLinkCost(best_guess_link.trip_id_, path_spec, trace_file, delay_iter_s2w->second, delay_attr);
+                        // start with trip info attributes
+                        Attributes link_attr = trip_info.trip_attr_;
+                        link_attr["in_vehicle_time_min"] = in_vehicle_time;
+                        link_attr["wait_time_min"      ] = wait_time;
+                        link_attr["overcap"            ] = overcap;
+                        link_attr["at_capacity"        ] = at_capacity;
+
+                        link_cost = 0;
+                        // If outbound, and the current link is egress, then it's as late as possible and the wait time isn't accurate.
+                        // It should be a preferred delay time instead
+                        // ditto for inbound and access
+                        if (( path_spec.outbound_ && best_guess_link.deparr_mode_ == MODE_EGRESS) ||
+                            (!path_spec.outbound_ && best_guess_link.deparr_mode_ == MODE_ACCESS)) {
+                            link_attr["wait_time_min"      ] = 0;
+
+
+                            // TODO: this is awkward... setting this all up again.  Plus we don't have all the attributes set.  Cache something?
+                            Attributes delay_attr;
+                            delay_attr["time_min"             ] = 0;
+                            delay_attr["drive_time_min"       ] = 0;
+                            delay_attr["walk_time_min"        ] = 0;
+                            delay_attr["elevation_gain"       ] = 0;
+                            delay_attr["preferred_delay_min"  ] = wait_time;
+                            UserClassPurposeMode delay_ucpm = {
+                                path_spec.user_class_, path_spec.purpose_,
+                                path_spec.outbound_ ? MODE_EGRESS: MODE_ACCESS,
+                                path_spec.outbound_ ? path_spec.egress_mode_ : path_spec.access_mode_
+                            };
+                            WeightLookup::const_iterator delay_iter_weights = weight_lookup_.find(delay_ucpm);
+                            if (delay_iter_weights != weight_lookup_.end()) {
+                                SupplyModeToNamedWeights::const_iterator delay_iter_s2w = delay_iter_weights->second.find(best_guess_link.trip_id_);
+                                if (delay_iter_s2w != delay_iter_weights->second.end()) {
+                                    link_cost = tallyLinkCost(best_guess_link.trip_id_, path_spec, trace_file, delay_iter_s2w->second, delay_attr);
+                                }
                             }
                         }
-                    }
 
-                    // This is for if we calculate the transfer penalty on the transit links.
-                    // I think we can't do this as it's problematic
-                    // TODO: devise test to demonstrate
-                    if ((best_guess_link.deparr_mode_ == MODE_ACCESS) || (best_guess_link.deparr_mode_ == MODE_EGRESS)) {
-                        link_attr["transfer_penalty"] = 0.0;
-                    } else {
-                        link_attr["transfer_penalty"] = 1.0;
-                    }
+                        // This is for if we calculate the transfer penalty on the transit links.
+                        // I think we can't do this as it's problematic
+                        // TODO: devise test to demonstrate
+                        if ((best_guess_link.deparr_mode_ == MODE_ACCESS) || (best_guess_link.deparr_mode_ == MODE_EGRESS)) {
+                            link_attr["transfer_penalty"] = 0.0;
+                        } else {
+                            link_attr["transfer_penalty"] = 1.0;
+                        }
 
-                    link_cost = link_cost + tallyLinkCost(trip_info.supply_mode_num_, path_spec, trace_file, named_weights, link_attr);
-                    cost      = current_stop_state.hyperpathCost(false) + link_cost;
+                        link_cost = link_cost + tallyLinkCost(trip_info.supply_mode_num_, path_spec, trace_file, named_weights, link_attr);
+                        cost      = current_stop_state.hyperpathCost(false) + link_cost;
 
-                }
-                // deterministic: label = cost = total time, just additive
-                else {
-                    link_cost   = in_vehicle_time + wait_time;
-                    cost        = current_stop_state.lowestCostStopState(false).cost_ + link_cost;
-                }
+                    }
+                    // deterministic: label = cost = total time, just additive
+                    else {
+                        link_cost   = in_vehicle_time + wait_time;
+                        cost        = current_stop_state.lowestCostStopState(false).cost_ + link_cost;
+                    }
 
-                StopState ss(
-                    deparr_time,                    // departure/arrival time
-                    MODE_TRANSIT,                   // departure/arrival mode
-                    possible_board_alight.trip_id_, // trip id
-                    current_label_stop.stop_id_,    // successor/predecessor
-                    possible_board_alight.seq_,     // sequence
-                    it->seq_,                       // sequence succ/pred
-                    in_vehicle_time+wait_time,      // link time
-                    link_cost,                      // link cost
-                    cost,                           // cost
-                    label_iteration,                // label iteration
-                    arrdep_time                     // arrival/departure time
-                );
-                addStopState(path_spec, trace_file, board_alight_stop, ss, &current_stop_state, stop_states, label_stop_queue);
+                    StopState ss(
+                        deparr_time,                    // departure/arrival time
+                        MODE_TRANSIT,                   // departure/arrival mode
+                        possible_board_alight.trip_id_, // trip id
+                        current_label_stop.stop_id_,    // successor/predecessor
+                        possible_board_alight.seq_,     // sequence
+                        tst.seq_,                       // sequence succ/pred
+                        in_vehicle_time+wait_time,      // link time
+                        link_cost,                      // link cost
+                        cost,                           // cost
+                        label_iteration,                // label iteration
+                        arrdep_time                     // arrival/departure time
+                    );
+                    addStopState(path_spec, trace_file, board_alight_stop, ss, &current_stop_state, stop_states, label_stop_queue);
 
+                }
             }
-            trips_done.insert(it->trip_id_);
         }
     }
 
@@ -1347,14 +1558,24 @@ namespace fasttrips {
         int& max_process_count) const
     {
         int label_iterations = 1;
-        std::tr1::unordered_set<int> stop_done;
-        std::tr1::unordered_set<int> trips_done;
+        // reuse these; clearing keeps the buckets
+        std::tr1::unordered_set<int>& stop_done  = stop_done_;
+        stop_done.clear();
         double dir_factor = path_spec.outbound_ ? 1.0 : -1.0;
         LabelStop last_label_stop;
 
         // we'll use this to stop labeling when we're past useful paths
         double est_max_path_cost = MAX_COST;
 
+        // and, if configured, to skip stops that can't lead to useful paths
+        const std::vector<float>* lower_bound_times        = NULL;
+        double                    lower_bound_cost_per_min = 0;
+        int                       end_taz_id               = path_spec.outbound_ ? path_spec.origin_taz_id_ : path_spec.destination_taz_id_;
+        if (LOWER_BOUND_PRUNING_) {
+            lower_bound_times        = &lowerBoundTimes(path_spec);
+            lower_bound_cost_per_min = lowerBoundCostPerMinute(path_spec);
+        }
+
         while (!label_stop_queue.empty()) {
             /***************************************************************************************
             * for outbound: we can depart from *stop_id*
@@ -1369,10 +1590,26 @@ namespace fasttrips {
             *                     and the total cost from the origin TAZ to the *stop_id* is *label*
             **************************************************************************************/
             LabelStop current_label_stop = label_stop_queue.pop_top(stop_num_to_str_, path_spec.trace_, trace_file);
+            if (performance_info_) { performance_info_->queue_pops_ += 1; }
 
             // if we just processed this one, then skip since it'll be a no-op
             if ((current_label_stop.stop_id_ == last_label_stop.stop_id_) && (current_label_stop.is_trip_ == last_label_stop.is_trip_)) { continue; }
 
+            // skip it if it can't reach the end TAZ, or can't do so within the cutoff used to end labeling below
+            if (lower_bound_times && (current_label_stop.stop_id_ != end_taz_id) &&
+                (current_label_stop.stop_id_ < (int)lower_bound_times->size())) {
+                float lower_bound_time = (*lower_bound_times)[current_label_stop.stop_id_];
+                if ((lower_bound_time == std::numeric_limits<float>::max()) ||
+                    (current_label_stop.label_ + lower_bound_time*lower_bound_cost_per_min > 2*est_max_path_cost)) {
+                    if (path_spec.trace_) {
+                        trace_file << "Pulling from label_stop_queue but stop " << stop_num_to_str_.find(current_label_stop.stop_id_)->second;
+                        trace_file << " is_trip " << current_label_stop.is_trip_ << " has lower bound time " << lower_bound_time;
+                        trace_file << " to the end TAZ so skipping." << std::endl;
+                    }
+                    continue;
+                }
+            }
+
             // hyperpath only
             if (path_spec.hyperpath_) {
                 // have we hit the configured limit?
@@ -1414,32 +1651,37 @@ namespace fasttrips {
             // if the low cost is trip ids, process transfers
             if (current_label_stop.is_trip_)
             {
-                updateStopStatesForTransfers(path_spec,
-                                             trace_file,
-                                             stop_states,
-                                             label_stop_queue,
-                                             label_iterations,
-                                             current_label_stop);
-
-                updateStopStatesForFinalLinks(path_spec,
-                                              trace_file,
-                                              reachable_final_stops,
-                                              stop_states,
-                                              label_stop_queue,
-                                              label_iterations,
-                                              current_label_stop,
-                                              est_max_path_cost);
+                {
+                    PhaseTimer timer(performance_info_, PHASE_UPDATE_TRANSFERS);
+                    updateStopStatesForTransfers(path_spec,
+                                                 trace_file,
+                                                 stop_states,
+                                                 label_stop_queue,
+                                                 label_iterations,
+                                                 current_label_stop);
+                }
+                {
+                    PhaseTimer timer(performance_info_, PHASE_UPDATE_FINAL_LINKS);
+                    updateStopStatesForFinalLinks(path_spec,
+                                                  trace_file,
+                                                  reachable_final_stops,
+                                                  stop_states,
+                                                  label_stop_queue,
+                                                  label_iterations,
+                                                  current_label_stop,
+                                                  est_max_path_cost);
+                }
             }
             // else the low cost is walk links, so process trips
             else
             {
+                PhaseTimer timer(performance_info_, PHASE_UPDATE_TRIPS);
                 updateStopStatesForTrips(path_spec,
                                          trace_file,
                                          stop_states,
                                          label_stop_queue,
                                          label_iterations,
-                                         current_label_stop,
-                                         trips_done);
+                                         current_label_stop);
             }
 
             //  Done with this label iteration!
@@ -1538,6 +1780,7 @@ namespace fasttrips {
         LabelStopQueue& label_stop_queue,
         int label_iteration) const
     {
+        PhaseTimer timer(performance_info_, PHASE_FINALIZE_TAZ_STATE);
         int end_taz_id = path_spec.outbound_ ? path_spec.origin_taz_id_ : path_spec.destination_taz_id_;
         double dir_factor = path_spec.outbound_ ? 1.0 : -1.0;
 
@@ -1679,6 +1922,7 @@ namespace fasttrips {
     bool PathFinder::hyperpathGeneratePath(
         const PathSpecification& path_spec,
         std::ofstream& trace_file,
+        RandomStream& random_stream,
         const StopStates& stop_states,
         Path& path) const
     {
@@ -1696,7 +1940,7 @@ namespace fasttrips {
         // choose the state and store it
         if (path_spec.trace_) { trace_file << " -> Chose access/egress " << std::endl; }
         path.addLink(start_state_id,
-                     taz_state.chooseState(path_spec, trace_file, access_cum_prob),
+                     taz_state.chooseState(path_spec, trace_file, random_stream, access_cum_prob),
                      trace_file, path_spec, *this);
 
         // trip_id shouldn't repeat
@@ -1730,7 +1974,7 @@ namespace fasttrips {
             // choose next link and add it to the path
             if (path_spec.trace_) { trace_file << " -> Chose stop link " << std::endl; }
             path.addLink(current_stop_id,
-                         current_hyperlink.chooseState(path_spec, trace_file, stop_cum_prob, &ss),
+                         current_hyperlink.chooseState(path_spec, trace_file, random_stream, stop_cum_prob, &ss),
                          trace_file, path_spec, *this);
 
             // are we done?
@@ -1749,10 +1993,11 @@ namespace fasttrips {
 
     Path PathFinder::choosePath(const PathSpecification& path_spec,
         std::ofstream& trace_file,
+        RandomStream& random_stream,
         PathSet& paths,
         int max_prob_i) const
     {
-        int random_num = rand();
+        int random_num = random_stream.next();
         if (path_spec.trace_) { trace_file << "random_num " << random_num << " -> "; }
 
         // mod it by max prob
@@ -1773,8 +2018,12 @@ namespace fasttrips {
         const PathSpecification&    path_spec,
         std::ofstream&              trace_file,
         const StopStates&           stop_states,
-        PathSet&                    pathset) const
+        PathSet&                    pathset,
+        PerformanceInfo&            performance_info) const
     {
+        performance_info.enumeration_draws_       = 0;
+        performance_info.enumeration_stop_reason_ = ENUMERATION_STOP_PATHSET_SIZE;
+
         int end_taz_id = path_spec.outbound_ ? path_spec.origin_taz_id_ : path_spec.destination_taz_id_;
 
         // no taz states -> no path found
@@ -1798,41 +2047,87 @@ namespace fasttrips {
         if (path_spec.hyperpath_)
         {
             double logsum = 0;
-            // random seed
-            srand(path_spec.path_id_);
+            // distinct paths drawn so far; hashed so duplicates are found before calculating the cost
+            EnumeratedPaths enumerated_paths;
+            // for adaptive stopping: draws in a row without a new path, and paths drawn only once
+            int draws_since_new = 0;
+            int num_singletons  = 0;
+            // random numbers for this pathset: a function of the seed, iteration and trip list ID num only,
+            // so they don't depend on which process finds it or what it found before
+            RandomStream random_stream(RANDOM_SEED_, static_cast<unsigned int>(path_spec.iteration_),
+                                       static_cast<unsigned int>(path_spec.path_id_));
             // find a *set of Paths*
             for (int attempts = 1; attempts <= STOCH_PATHSET_SIZE_; ++attempts)
             {
+                performance_info.enumeration_draws_ = attempts;
+                draws_since_new += 1;
+
                 Path new_path(path_spec.outbound_, true);
-                bool path_found = hyperpathGeneratePath(path_spec, trace_file, stop_states, new_path);
+                bool path_found;
+                {
+                    PhaseTimer timer(performance_info_, PHASE_GENERATE_PATH);
+                    path_found = hyperpathGeneratePath(path_spec, trace_file, random_stream, stop_states, new_path);
+                }
 
                 if (path_found) {
-                    // we have to calculate the cost in order to find it, since it's ordered by cost also
-                    new_path.calculateCost(trace_file, path_spec, *this);
-
-                    if (path_spec.trace_) {
-                        trace_file << "----> Found path " << attempts << " ";
-                        new_path.printCompat(trace_file, path_spec, *this);
-                        trace_file << std::endl;
-                        new_path.print(trace_file, path_spec, *this);
-                        trace_file << std::endl;
-                    }
-                    // do we already have this?  if so, increment
-                    PathSet::iterator paths_iter = pathset.find(new_path);
-                    if (paths_iter != pathset.end()) {
+                    // do we already have this?  if so, increment -- no need to calculate the cost again
+                    EnumeratedPaths::iterator paths_iter = enumerated_paths.find(new_path);
+                    bool is_new = (paths_iter == enumerated_paths.end());
+                    if (!is_new) {
+                        if (paths_iter->second.count_ == 1) { num_singletons -= 1; }
                         paths_iter->second.count_ += 1;
                     } else {
+                        {
+                            PhaseTimer timer(performance_info_, PHASE_CALCULATE_COST);
+                            new_path.calculateCost(trace_file, path_spec, *this);
+                        }
+
                         PathInfo pi = { 1, 0, 0 };  // count is 1
-                        pathset[new_path] = pi;
+                        paths_iter = enumerated_paths.insert(std::make_pair(new_path, pi)).first;
 
                         logsum += exp(-1.0*Hyperlink::STOCH_DISPERSION_*new_path.cost());
+                        draws_since_new = 0;
+                        num_singletons += 1;
+                    }
+
+                    if (path_spec.trace_) {
+                        trace_file << "----> Found path " << attempts << " ";
+                        paths_iter->first.printCompat(trace_file, path_spec, *this);
+                        trace_file << std::endl;
+                        if (is_new) {
+                            paths_iter->first.print(trace_file, path_spec, *this);
+                            trace_file << std::endl;
+                        }
+                        trace_file << "pathsset size = " << enumerated_paths.size() << " new? " << is_new << std::endl;
                     }
-                    if (path_spec.trace_) { trace_file << "pathsset size = " << pathset.size() << " new? " << (paths_iter == pathset.end()) << std::endl; }
                 } else {
                     if (path_spec.trace_) {
                         trace_file << "----> No path found" << std::endl;
                     }
                 }
+
+                // adaptive stopping: nothing new for a while?
+                if ((STOCH_PATHSET_STOP_NO_NEW_ > 0) && (draws_since_new >= STOCH_PATHSET_STOP_NO_NEW_)) {
+                    performance_info.enumeration_stop_reason_ = ENUMERATION_STOP_NO_NEW_PATHS;
+                    break;
+                }
+                // adaptive stopping: Good-Turing estimate of the probability of drawing an unseen path is
+                // the fraction of draws that were paths seen once.  It can't resolve anything below 1/draws.
+                if ((STOCH_PATHSET_UNSEEN_TOLERANCE_ > 0) &&
+                    (attempts*STOCH_PATHSET_UNSEEN_TOLERANCE_ >= 1.0) &&
+                    (static_cast<double>(num_singletons)/attempts < STOCH_PATHSET_UNSEEN_TOLERANCE_)) {
+                    performance_info.enumeration_stop_reason_ = ENUMERATION_STOP_UNSEEN_MASS;
+                    break;
+                }
+            }
+            if (path_spec.trace_) {
+                trace_file << "Enumeration stopped after " << performance_info.enumeration_draws_ << " draws; reason ";
+                trace_file << performance_info.enumeration_stop_reason_ << std::endl;
+            }
+
+            // the pathset is ordered by cost
+            for (EnumeratedPaths::const_iterator ep_iter = enumerated_paths.begin(); ep_iter != enumerated_paths.end(); ++ep_iter) {
+                pathset[ep_iter->first] = ep_iter->second;
             }
 
             if (logsum == 0) { return false; } // fail
@@ -1862,7 +2157,7 @@ namespace fasttrips {
                 }
 
                 // why?  :p
-                int prob_i = static_cast<int>(RAND_MAX*paths_iter->second.probability_);
+                int prob_i = static_cast<int>(RandomStream::MAX*paths_iter->second.probability_);
 
                 cum_prob += prob_i;
                 paths_iter->second.prob_i_ = cum_prob;
@@ -1913,7 +2208,7 @@ namespace fasttrips {
             }
 
             // choose path
-            // path = choosePath(path_spec, trace_file, pathsset, cum_prob);
+            // path = choosePath(path_spec, trace_file, random_stream, pathsset, cum_prob);
             // path_info = paths[path];
             return true;
         }
@@ -1938,7 +2233,10 @@ namespace fasttrips {
 
             }
             PathInfo pi = { 1, 1, 0 };  // count is 1
-            path.calculateCost(trace_file, path_spec, *this);
+            {
+                PhaseTimer timer(performance_info_, PHASE_CALCULATE_COST);
+                path.calculateCost(trace_file, path_spec, *this);
+            }
             pathset[path] = pi;
             if (path_spec.trace_)
             {
@@ -1969,24 +2267,39 @@ namespace fasttrips {
         return -1;
     }
 
+    /**
+     * Returns the largest stop ID (including TAZs) in the transit stop times, transfer links and access links.
+     */
+    int PathFinder::maxStopId() const
+    {
+        int max_stop_id = 0;
+        if (stop_trip_times_.size() > 0) { max_stop_id = std::max(max_stop_id, stop_trip_times_.rbegin()->first); }
+        for (StopStopToAttr::const_iterator it = transfer_links_o_d_.begin(); it != transfer_links_o_d_.end(); ++it) {
+            max_stop_id = std::max(max_stop_id, it->first);
+            if (it->second.size() > 0) { max_stop_id = std::max(max_stop_id, it->second.rbegin()->first); }
+        }
+        for (TAZSupplyStopToAttr::const_iterator it = taz_access_links_.begin(); it != taz_access_links_.end(); ++it) {
+            max_stop_id = std::max(max_stop_id, it->first);
+            for (SupplyStopToAttr::const_iterator ss_it = it->second.begin(); ss_it != it->second.end(); ++ss_it) {
+                if (ss_it->second.size() > 0) { max_stop_id = std::max(max_stop_id, ss_it->second.rbegin()->first); }
+            }
+        }
+        return max_stop_id;
+    }
+
     /**
      * If outbound, then we're searching backwards, so this returns trips that arrive at the stop in time to depart at timepoint (timepoint-TIME_WINDOW_, timepoint]
      * If inbound,  then we're searching forwards,  so this returns trips that depart at the stop time after timepoint           [timepoint, timepoint+TIME_WINDOW_)
      */
-    void PathFinder::getTripsWithinTime(int stop_id, bool outbound, double timepoint, std::vector<TripStopTime>& return_trips) const
+    void PathFinder::getPatternTripsWithinTime(const RoutePattern& pattern, int pos, bool outbound, double timepoint,
+                                               int& first_trip, int& last_trip) const
     {
-        // are there any trips for this stop?
-        std::map<int, std::vector<TripStopTime> >::const_iterator mapiter = stop_trip_times_.find(stop_id);
-        if (mapiter == stop_trip_times_.end()) {
-            return;
-        }
-        for (std::vector<TripStopTime>::const_iterator it  = mapiter->second.begin();
-                                                       it != mapiter->second.end();   ++it) {
-            if (outbound && (it->arrive_time_ <= timepoint) && (it->arrive_time_ > timepoint-Hyperlink::TIME_WINDOW_)) {
-                return_trips.push_back(*it);
-            } else if (!outbound && (it->depart_time_ >= timepoint) && (it->depart_time_ < timepoint+Hyperlink::TIME_WINDOW_)) {
-                return_trips.push_back(*it);
-            }
+        if (outbound) {
+            first_trip = firstPatternTripAfter(pattern, pos, true,  timepoint-Hyperlink::TIME_WINDOW_, false);
+            last_trip  = firstPatternTripAfter(pattern, pos, true,  timepoint,                         false);
+        } else {
+            first_trip = firstPatternTripAfter(pattern, pos, false, timepoint,                         true);
+            last_trip  = firstPatternTripAfter(pattern, pos, false, timepoint+Hyperlink::TIME_WINDOW_, true);
         }
     }
 
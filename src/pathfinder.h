@@ -4,6 +4,7 @@
  * Defines the class that does the transit pathfinding for fast-trips.
  */
 
+#include <algorithm>
 #include <ctime>
 #include <map>
 #include <vector>
@@ -115,15 +116,101 @@ namespace fasttrips {
         }
     };
 
+    /// Why path enumeration stopped; see PerformanceInfo::enumeration_stop_reason_
+    enum EnumerationStopReason {
+        ENUMERATION_STOP_PATHSET_SIZE   = 0,    ///< Drew PathFinder::STOCH_PATHSET_SIZE_ paths
+        ENUMERATION_STOP_NO_NEW_PATHS   = 1,    ///< Drew PathFinder::STOCH_PATHSET_STOP_NO_NEW_ paths in a row with no new path
+        ENUMERATION_STOP_UNSEEN_MASS    = 2     ///< Estimated unseen probability mass fell below PathFinder::STOCH_PATHSET_UNSEEN_TOLERANCE_
+    };
+
+    /// Parts of the search that are timed and counted; see PerformanceInfo::phase_calls_ and PerformanceInfo::phase_nanoseconds_
+    enum SearchPhase {
+        PHASE_INITIALIZE_STOP_STATES    = 0,    ///< PathFinder::initializeStopStates
+        PHASE_UPDATE_TRANSFERS          = 1,    ///< PathFinder::updateStopStatesForTransfers
+        PHASE_UPDATE_TRIPS              = 2,    ///< PathFinder::updateStopStatesForTrips
+        PHASE_UPDATE_FINAL_LINKS        = 3,    ///< PathFinder::updateStopStatesForFinalLinks
+        PHASE_FINALIZE_TAZ_STATE        = 4,    ///< PathFinder::finalizeTazState
+        PHASE_GENERATE_PATH             = 5,    ///< PathFinder::hyperpathGeneratePath
+        PHASE_CALCULATE_COST            = 6,    ///< Path::calculateCost during enumeration
+        NUM_SEARCH_PHASES               = 7
+    };
+
+    /// Names of the fasttrips::SearchPhase values, for reporting
+    extern const char* SEARCH_PHASE_NAMES[NUM_SEARCH_PHASES];
+
+    /// Search used for deterministic path-finding; see PathFinder::DETERMINISTIC_ENGINE_
+    enum DeterministicEngine {
+        DETERMINISTIC_ENGINE_LABELING   = 0,    ///< Trip-based label-setting search, PathFinder::labelStops
+        DETERMINISTIC_ENGINE_RAPTOR     = 1     ///< Round-based search over route patterns, PathFinder::raptorLabelStops
+    };
+
+    /**
+     * The trips serving exactly the same stop sequence with the same supply mode, none of which
+     * overtakes another, so they're in departure order at every stop.  Both the labeling search and
+     * the round-based deterministic search scan trips by route pattern.
+     */
+    typedef struct {
+        int                                             supply_mode_num_;
+        std::vector<int>                                stop_ids_;          ///< Stop IDs in sequence order
+        std::vector<int>                                trip_ids_;          ///< Trip IDs in departure order
+        std::vector<const std::vector<TripStopTime>*>   trip_stop_times_;   ///< The PathFinder::trip_stop_times_ for each of trip_ids_
+        /// Arrival times by position then trip: the times at each stop are contiguous and sorted, for searching by time
+        std::vector<double>                             arrive_times_;
+        /// Departure times by position then trip, like RoutePattern::arrive_times_
+        std::vector<double>                             depart_times_;
+    } RoutePattern;
+
+    /**
+     * Returns the index of the first of the route pattern's trips that arrives at (or departs from) position *pos*
+     * after *timepoint* -- or at or after it, if *inclusive*.
+     */
+    inline int firstPatternTripAfter(const RoutePattern& pattern, int pos, bool arrival, double timepoint, bool inclusive)
+    {
+        const std::vector<double>&          times = arrival ? pattern.arrive_times_ : pattern.depart_times_;
+        std::vector<double>::const_iterator first = times.begin() + pos*pattern.trip_ids_.size();
+        std::vector<double>::const_iterator last  = first + pattern.trip_ids_.size();
+        return (inclusive ? std::lower_bound(first, last, timepoint) : std::upper_bound(first, last, timepoint)) - first;
+    }
+
+    /**
+     * A transfer link with its cost for one set of transfer weights.  Transfer costs don't depend
+     * on time, so these are computed once per set of weights; see PathFinder::transferCosts.
+     */
+    typedef struct {
+        int                                             stop_id_;           ///< The stop at the other end of the link
+        double                                          time_;              ///< Transfer time, the link's time_min
+        double                                          cost_;              ///< Transfer cost, including the transfer penalty
+    } TransferLinkCost;
+
+    /**
+     * For the round-based deterministic search: a stop state as the labeling search would make it,
+     * plus the label it extends so the path can be traced back.
+     */
+    typedef struct {
+        int         stop_id_;
+        double      label_time_;    ///< Departure time (outbound) or arrival time (inbound) used for comparing and extending this label
+        StopState   stop_state_;
+        int         parent_;        ///< Index of the label this one extends (towards the start TAZ), or -1 for the first link
+    } RoundLabel;
+
     /** Performance information to return. */
     typedef struct {
         int     label_iterations_;              ///< Number of label iterations performed
         int     num_labeled_stops_;             ///< Number of stops labeled
         int     max_process_count_;             ///< Maximum number of times a stop was processed
-        long    milliseconds_labeling_;         ///< Number of seconds spent in labeling
-        long    milliseconds_enumerating_;      ///< Number of seconds spent in enumerating
-        long    workingset_bytes_;              ///< Working set size, in bytes
-        long    privateusage_bytes_;            ///< Private memory usage, in bytes
+        double  milliseconds_labeling_;         ///< Number of milliseconds spent in labeling
+        double  milliseconds_enumerating_;      ///< Number of milliseconds spent in enumerating
+        long    workingset_bytes_;              ///< Working set size (resident set size on linux), in bytes
+        long    privateusage_bytes_;            ///< Private memory usage (resident less shared on linux), in bytes
+        int     enumeration_draws_;             ///< Number of paths drawn during enumeration
+        int     enumeration_stop_reason_;       ///< Why enumeration stopped, a fasttrips::EnumerationStopReason
+        long long phase_calls_[NUM_SEARCH_PHASES];       ///< Number of calls for each fasttrips::SearchPhase
+        long long phase_nanoseconds_[NUM_SEARCH_PHASES]; ///< Nanoseconds spent in each fasttrips::SearchPhase
+        long long trips_scanned_;               ///< Number of transit trips considered from labeled stops
+        long long links_added_;                 ///< Number of links (stop states) accepted into a hyperlink
+        long long links_pruned_;                ///< Number of links (stop states) rejected by a hyperlink
+        long long queue_pushes_;                ///< Number of pushes onto the label stop queue
+        long long queue_pops_;                  ///< Number of pops from the label stop queue
     } PerformanceInfo;
 
     /**
@@ -141,6 +228,12 @@ namespace fasttrips {
         /// See <a href="_generated/fasttrips.Assignment.html#fasttrips.Assignment.STOCH_PATHSET_SIZE">fasttrips.Assignment.STOCH_PATHSET_SIZE</a>
         int STOCH_PATHSET_SIZE_; // er....
 
+        /// See <a href="_generated/fasttrips.Assignment.html#fasttrips.Assignment.STOCH_PATHSET_STOP_NO_NEW">fasttrips.Assignment.STOCH_PATHSET_STOP_NO_NEW</a>
+        int STOCH_PATHSET_STOP_NO_NEW_;
+
+        /// See <a href="_generated/fasttrips.Assignment.html#fasttrips.Assignment.STOCH_PATHSET_UNSEEN_TOLERANCE">fasttrips.Assignment.STOCH_PATHSET_UNSEEN_TOLERANCE</a>
+        double STOCH_PATHSET_UNSEEN_TOLERANCE_;
+
         /// See <a href="_generated/fasttrips.Assignment.html#fasttrips.Assignment.STOCH_MAX_STOP_PROCESS_COUNT">fasttrips.Assignment.STOCH_MAX_STOP_PROCESS_COUNT</a>
         int STOCH_MAX_STOP_PROCESS_COUNT_;
 
@@ -149,8 +242,22 @@ namespace fasttrips {
 
         /// See <a href="_generated/fasttrips.Assignment.html#fasttrips.Assignment.MIN_PATH_PROBABILITY">fasttrips.Assignment.MIN_PATH_PROBABILITY</a>
         double MIN_PATH_PROBABILITY_;
+
+        /// See <a href="_generated/fasttrips.Assignment.html#fasttrips.Assignment.DETERMINISTIC_ENGINE">fasttrips.Assignment.DETERMINISTIC_ENGINE</a>.
+        /// A fasttrips::DeterministicEngine.
+        int DETERMINISTIC_ENGINE_;
+
+        /// See <a href="_generated/fasttrips.Assignment.html#fasttrips.Assignment.LOWER_BOUND_PRUNING">fasttrips.Assignment.LOWER_BOUND_PRUNING</a>
+        bool LOWER_BOUND_PRUNING_;
+
+        /// See <a href="_generated/fasttrips.Assignment.html#fasttrips.Assignment.RANDOM_SEED">fasttrips.Assignment.RANDOM_SEED</a>.
+        /// Keys the fasttrips::RandomStream for each pathset with the iteration.
+        unsigned int RANDOM_SEED_;
         ///@}
 
+        /// The most end TAZs to keep lower bounds for in PathFinder::lower_bound_times_; the cache is cleared when it's full
+        const static size_t LOWER_BOUND_CACHE_SIZE = 256;
+
         /// Access this through getTransferAttributes()
         static Attributes* ZERO_WALK_TRANSFER_ATTRIBUTES_;
 
@@ -176,6 +283,8 @@ namespace fasttrips {
         std::map<int, std::vector<TripStopTime> > trip_stop_times_;
         /// Stop information: stop id -> vector of [trip id, sequence, stop id, arrival time, departure time, overcap]
         std::map<int, std::vector<TripStopTime> > stop_trip_times_;
+        /// Trip information: trip id -> vector of indices into PathFinder::stop_trip_times_ for each sequence
+        std::map<int, std::vector<int> > stop_trip_times_index_;
 
         // ================ ID numbers to ID strings ===============
         std::map<int, std::string> trip_num_to_str_;
@@ -194,6 +303,64 @@ namespace fasttrips {
          */
         std::map<TripStop, double, struct TripStopCompare> bump_wait_;
 
+        /** @name Search state
+         * This is scratch space for PathFinder::findPathSet.  It's kept here so that the storage
+         * can be reused across searches rather than reallocated; it's reset at the start of each search.
+         * So even though PathFinder::findPathSet is const, a PathFinder can only run one search at a time,
+         * and with fasttrips::PoolAllocator, so can the process.
+         */
+        ///@{
+        mutable StopStates                   stop_states_;
+        mutable LabelStopQueue               label_stop_queue_;
+        mutable std::tr1::unordered_set<int> stop_done_;
+        /// The performance information for the current search, for counting.  NULL outside of PathFinder::findPathSet.
+        mutable PerformanceInfo*             performance_info_;
+        ///@}
+
+        /** @name Route patterns and round-based search state
+         * The route patterns are built from the supply on the first search after the supply
+         * changes.  The rest is scratch space for PathFinder::raptorLabelStops, indexed by stop ID.
+         */
+        ///@{
+        mutable bool                                        route_patterns_valid_;
+        mutable std::vector<RoutePattern>                   route_patterns_;
+        /// stop id -> (index into PathFinder::route_patterns_, position in the pattern)
+        mutable std::vector< std::vector<std::pair<int,int> > > stop_route_patterns_;
+        mutable std::vector<RoundLabel>                     round_labels_;
+        /// stop id -> index into PathFinder::round_labels_ of the best label arriving by/departing on a trip, or -1
+        mutable std::vector<int>                            best_trip_label_;
+        /// stop id -> index into PathFinder::round_labels_ of the best access/egress/transfer label, or -1
+        mutable std::vector<int>                            best_nontrip_label_;
+        /// 2*stop id + is trip -> the last round in which the label was marked for the next phase
+        mutable std::vector<int>                            stop_marked_round_;
+        ///@}
+
+        /** @name Lower bounds
+         * For PathFinder::LOWER_BOUND_PRUNING_: a time-independent graph of the supply, with the minimum
+         * time over the trips serving each pair of consecutive stops and the walk transfer times, and the
+         * lower bounds on the time between each stop and an end TAZ derived from it.  These are built
+         * on the first search that needs them after the supply changes.
+         */
+        ///@{
+        mutable bool                                                lower_bound_graph_valid_;
+        /// stop id -> (next stop id, minimum time)
+        mutable std::vector< std::vector<std::pair<int,float> > >   lower_bound_links_o_d_;
+        /// stop id -> (previous stop id, minimum time)
+        mutable std::vector< std::vector<std::pair<int,float> > >   lower_bound_links_d_o_;
+        /// (end TAZ id, outbound) -> stop id -> lower bound on the time to (inbound) or from (outbound) the end TAZ
+        mutable std::map< std::pair<int,bool>, std::vector<float> > lower_bound_times_;
+        ///@}
+
+        /** @name Transfer costs
+         * The transfer links from (inbound) or to (outbound) each stop with their costs, for each set of
+         * transfer weights that's been used.  The weights and transfer links are read once, so these
+         * are built on first use and kept.
+         */
+        ///@{
+        /// (transfer weights, outbound) -> stop id -> transfer links
+        mutable std::map< std::pair<const NamedWeights*,bool>, std::vector< std::vector<TransferLinkCost> > > transfer_costs_;
+        ///@}
+
         /**
          * Read the intermediate files mapping integer IDs to strings
          * for modes, stops, trips, and routes.
@@ -259,14 +426,16 @@ namespace fasttrips {
          * to(outbound)/from(inbound) the *current_label_stop* and update the *stop_states*
          * with information about how accessible those stops are as a transit trip to/from
          * the *current_label_stop*.
+         *
+         * The trips are found by route pattern: patterns with a supply mode that isn't allowed
+         * are skipped entirely, and the trips within the time window are found by binary search.
          */
         void updateStopStatesForTrips(const PathSpecification& path_spec,
                                   std::ofstream& trace_file,
                                   StopStates& stop_states,
                                   LabelStopQueue& label_stop_queue,
                                   int label_iteration,
-                                  const LabelStop& current_label_stop,
-                                  std::tr1::unordered_set<int>& trips_done) const;
+                                  const LabelStop& current_label_stop) const;
 
         /**
          * Label stops by:
@@ -311,36 +480,116 @@ namespace fasttrips {
         /**
          * Given all the labeled stops and taz, traces back and generates a
          * specific path.  We do this by setting up probabilities for each
-         * option and then choosing via PathFinder::chooseState.
+         * option and then choosing via Hyperlink::chooseState, with random numbers from *random_stream*.
          *
          * @return success
          */
         bool hyperpathGeneratePath(const PathSpecification& path_spec,
                                   std::ofstream& trace_file,
+                                  RandomStream& random_stream,
                                   const StopStates& stop_states,
                                   Path& path) const;
 
         /**
          * Given a set of paths, randomly selects one based on the cumulative
-         * probability (fasttrips::PathInfo.prob_i_)
+         * probability (fasttrips::PathInfo.prob_i_), using the next number from *random_stream*.
          *
          * Returns a reference to that path, which is stored in paths.
          */
         Path choosePath(const PathSpecification& path_spec,
                         std::ofstream& trace_file,
+                        RandomStream& random_stream,
                         PathSet& paths,
                         int max_prob_i) const;
 
+        /**
+         * Generates the pathset from the labeled stop states.  For hyperpaths, this draws up to
+         * PathFinder::STOCH_PATHSET_SIZE_ paths, stopping early if PathFinder::STOCH_PATHSET_STOP_NO_NEW_
+         * or PathFinder::STOCH_PATHSET_UNSEEN_TOLERANCE_ are configured and met.
+         *
+         * The number of draws and the reason for stopping are recorded in *performance_info*.
+         */
         bool getPathSet(const PathSpecification&      path_spec,
                         std::ofstream&                trace_file,
                         const StopStates&             stop_states,
-                        PathSet&                      pathset) const;
+                        PathSet&                      pathset,
+                        PerformanceInfo&              performance_info) const;
 
         /**
-         * If outbound, then we're searching backwards, so this returns trips that arrive at the given stop in time to depart at timepoint.
-         * If inbound,  then we're searching forwards,  so this returns trips that depart at the given stop time after timepoint
+         * Sets [*first_trip*, *last_trip*) to the range of the given route pattern's trips within the time window at position *pos*.
+         * If outbound, then we're searching backwards, so these are trips that arrive at the stop in time to depart at timepoint.
+         * If inbound,  then we're searching forwards,  so these are trips that depart from the stop after timepoint.
          */
-        void getTripsWithinTime(int stop_id, bool outbound, double timepoint, std::vector<TripStopTime>& return_trips) const;
+        void getPatternTripsWithinTime(const RoutePattern& pattern, int pos, bool outbound, double timepoint,
+                                       int& first_trip, int& last_trip) const;
+
+        /// Returns the largest stop ID (including TAZs) in the supply
+        int maxStopId() const;
+
+        /// Builds PathFinder::lower_bound_links_o_d_ and PathFinder::lower_bound_links_d_o_ from the supply
+        void buildLowerBoundGraph() const;
+
+        /**
+         * Returns the lower bounds on the time between each stop and the end TAZ for the given path specification:
+         * from the stop to the destination for inbound, from the origin to the stop for outbound.
+         * Stops that can't reach the end TAZ have std::numeric_limits<float>::max().
+         */
+        const std::vector<float>& lowerBoundTimes(const PathSpecification& path_spec) const;
+
+        /**
+         * Returns the factor to convert a lower bound time to a lower bound cost for the given path specification.
+         * This is 1 for deterministic path-finding.  For hyperpaths it's the smallest time weight for the
+         * allowed transit, transfer and final links, or 0 if some of those have no time weights.
+         */
+        double lowerBoundCostPerMinute(const PathSpecification& path_spec) const;
+
+        /**
+         * Groups the trips in PathFinder::trip_stop_times_ into PathFinder::route_patterns_ and
+         * sizes the round-based search state.
+         */
+        void buildRoutePatterns() const;
+
+        /**
+         * Adds the given label for the round-based search if it's better than the best label at the stop
+         * (trip or non-trip, as given) and than the best label at the end TAZ, and marks the stop in *marked_stops*.
+         *
+         * @return True if the label was added
+         */
+        bool addRoundLabel(const PathSpecification& path_spec,
+                           std::ofstream& trace_file,
+                           int stop_id,
+                           double label_time,
+                           const StopState& ss,
+                           int parent,
+                           bool is_trip,
+                           int round,
+                           int best_taz_label,
+                           std::vector<int>& marked_stops) const;
+
+        /**
+         * The round-based alternative to PathFinder::labelStops for deterministic path-finding.
+         * Each round scans the route patterns serving the stops labeled in the previous round, so round *k*
+         * finds the best arrival (inbound) or departure (outbound) with *k* trips.  Transfers and the final
+         * links to the end TAZ are then added from the stops reached by trip.
+         *
+         * @param best_taz_label    Returns the index into PathFinder::round_labels_ of the best end TAZ label, or -1 if none
+         * @return the number of rounds
+         */
+        int raptorLabelStops(const PathSpecification& path_spec,
+                             std::ofstream& trace_file,
+                             int& best_taz_label) const;
+
+        /**
+         * The round-based alternative to PathFinder::getPathSet: traces back from the given end TAZ label to
+         * make the path, in the same format as for the labeling search.
+         *
+         * @return success
+         */
+        bool raptorGetPathSet(const PathSpecification&  path_spec,
+                              std::ofstream&            trace_file,
+                              int                       best_taz_label,
+                              PathSet&                  pathset,
+                              PerformanceInfo&          performance_info) const;
 
     public:
         const static int MAX_DATETIME   = 48*60; // 48 hours in minutes
@@ -355,6 +604,13 @@ namespace fasttrips {
         const Attributes* getAccessAttributes(int taz_id, int supply_mode_num, int stop_id) const;
         /// Accessor for transfer link attributes
         const Attributes* getTransferAttributes(int origin_stop_id, int destination_stop_id) const;
+        /**
+         * Returns the transfer links from (inbound) or to (outbound) the given stop, with their costs
+         * for the given transfer weights, or NULL if there are none.
+         */
+        const std::vector<TransferLinkCost>* transferCosts(const NamedWeights& transfer_weights,
+                                                       bool outbound,
+                                                       int stop_id) const;
         /// Accessor for trip info
         const TripInfo* getTripInfo(int trip_id_num) const;
         /// Accessor for TripStopTime for given trip id, stop sequence
@@ -388,7 +644,27 @@ namespace fasttrips {
                                   double     stoch_dispersion,
                                   int        stoch_max_stop_process_count,
                                   int        max_num_paths,
-                                  double     min_path_probability);
+                                  double     min_path_probability,
+                                  int        stoch_pathset_stop_no_new,
+                                  double     stoch_pathset_unseen_tolerance,
+                                  int        deterministic_engine,
+                                  bool       lower_bound_pruning,
+                                  int        random_seed);
+
+        /**
+         * Setup the ID number to ID string correspondence for the given namespace, "trip" or "stop".
+         * If this is called before PathFinder::initializeSupply, the correspondence won't be read from
+         * the intermediate files.
+         *
+         * @param id_namespace      The ID namespace, "trip" or "stop"
+         * @param id_nums           The ID numbers
+         * @param id_strs           The ID strings, corresponding to the ID numbers
+         * @param num_ids           The number of IDs described in the previous two arrays.
+         */
+        void initializeIds(const std::string&   id_namespace,
+                           const int*           id_nums,
+                           const char* const*   id_strs,
+                           int                  num_ids);
 
         /**
          * Setup the network supply.  This should happen once, before any pathfinding.
@@ -407,6 +683,23 @@ namespace fasttrips {
                               double*       stoptime_times,
                               int           num_stoptimes);
 
+        /**
+         * Update the network supply in place for the given stop times, which must already be part
+         * of the supply set up by PathFinder::initializeSupply.  Only the times and overcap are
+         * updated; this is intended for sending the changes between iterations.
+         *
+         * @param stoptime_index    For updating PathFinder::trip_stop_times_ and PathFinder::stop_trip_times_,
+         *                          this array contains trip IDs, sequence numbers, stop IDs
+         * @param stoptime_times    For updating PathFinder::trip_stop_times_ and PathFinder::stop_trip_times_,
+         *                          this array contains transit vehicle arrival times, departure times, and overcap pax at a stop.
+         * @param num_stoptimes     The number of stop times described in the previous two arrays.
+         *
+         * @return the number of stop times updated.
+         */
+        int updateStopTimes(int*          stoptime_index,
+                            double*       stoptime_times,
+                            int           num_stoptimes);
+
         /**
          * Setup the information for bumped passengers.
          *
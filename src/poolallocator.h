@@ -0,0 +1,97 @@
+/**
+ * \file poolallocator.h
+ *
+ * Defines a simple free-list allocator for the node-based containers used
+ * for search state during labeling.
+ */
+#include <cstddef>
+#include <new>
+
+#ifndef POOLALLOCATOR_H
+#define POOLALLOCATOR_H
+
+namespace fasttrips {
+
+    /**
+     * Allocator that keeps freed single-object allocations on a free list (one per type) and hands them
+     * back out rather than returning them to the system.  This is intended for the std::map and std::multimap
+     * nodes in the search state (e.g. fasttrips::LinkSet), which are allocated and freed for every stop in
+     * every search; with this allocator, after the first few searches in a process, no further memory
+     * allocations are needed for them.
+     *
+     * Memory on the free list is kept for the life of the process.  The free lists are static, so they're shared
+     * by every container of a type in the process, and they aren't locked: this is *not* thread-safe, and searches
+     * using it must not run concurrently.  fasttrips runs one search at a time in each process -- the extension
+     * doesn't release the GIL, and parallel path-finding uses worker processes.
+     */
+    template <typename T>
+    class PoolAllocator
+    {
+    private:
+        /// A freed block; the next pointer is stored in the block itself
+        struct FreeBlock { FreeBlock* next_; };
+
+        /// Head of the free list for this type
+        static FreeBlock* free_list_;
+
+    public:
+        typedef T               value_type;
+        typedef T*              pointer;
+        typedef const T*        const_pointer;
+        typedef T&              reference;
+        typedef const T&        const_reference;
+        typedef std::size_t     size_type;
+        typedef std::ptrdiff_t  difference_type;
+
+        template <typename U>
+        struct rebind { typedef PoolAllocator<U> other; };
+
+        PoolAllocator() throw() {}
+        PoolAllocator(const PoolAllocator&) throw() {}
+        template <typename U>
+        PoolAllocator(const PoolAllocator<U>&) throw() {}
+        ~PoolAllocator() throw() {}
+
+        pointer       address(reference x)       const { return &x; }
+        const_pointer address(const_reference x) const { return &x; }
+
+        size_type max_size() const throw() { return static_cast<size_type>(-1) / sizeof(T); }
+
+        pointer allocate(size_type n, const void* hint = 0) {
+            if ((n == 1) && (free_list_ != NULL)) {
+                FreeBlock* block = free_list_;
+                free_list_       = block->next_;
+                return reinterpret_cast<pointer>(block);
+            }
+            // blocks need to be big enough to hold the free list pointer
+            size_type bytes = n*sizeof(T);
+            if (bytes < sizeof(FreeBlock)) { bytes = sizeof(FreeBlock); }
+            return static_cast<pointer>(::operator new(bytes));
+        }
+
+        void deallocate(pointer p, size_type n) {
+            if (n == 1) {
+                FreeBlock* block = reinterpret_cast<FreeBlock*>(p);
+                block->next_     = free_list_;
+                free_list_       = block;
+                return;
+            }
+            ::operator delete(p);
+        }
+
+        void construct(pointer p, const T& val) { new(static_cast<void*>(p)) T(val); }
+        void destroy(pointer p) { p->~T(); }
+    };
+
+    template <typename T>
+    typename PoolAllocator<T>::FreeBlock* PoolAllocator<T>::free_list_ = NULL;
+
+    /// All PoolAllocators share their free lists, so they're interchangeable
+    template <typename T, typename U>
+    bool operator==(const PoolAllocator<T>&, const PoolAllocator<U>&) { return true;  }
+    template <typename T, typename U>
+    bool operator!=(const PoolAllocator<T>&, const PoolAllocator<U>&) { return false; }
+
+}
+
+#endif
@@ -0,0 +1,102 @@
+/**
+ * \file randomstream.h
+ *
+ * Defines a counter-based random number stream for the stochastic pathfinding.
+ */
+
+#ifndef RANDOMSTREAM_H
+#define RANDOMSTREAM_H
+
+namespace fasttrips {
+
+    /**
+     * Random numbers from the Philox4x32-10 counter-based generator (Salmon et al., "Parallel Random Numbers:
+     * As Easy as 1, 2, 3", 2011).  Each block of four 32-bit numbers is a function of just the key and the
+     * counter, so there's no global state: the numbers drawn for a path depend only on the run seed,
+     * the iteration, the stream ID (the trip list ID num) and how many numbers were drawn before, and not
+     * on the platform, the process or the order in which paths are found.
+     *
+     * The key is (run seed, iteration) and the counter is (draw index low word, draw index high word,
+     * stream ID, stream type).  fasttrips.Util.philox_uniform is the same generator in Python; keep them in sync.
+     */
+    class RandomStream
+    {
+    public:
+        /// The largest number returned by RandomStream::next.  This replaces RAND_MAX.
+        static const int MAX = 0x7FFFFFFF;
+
+        /// Stream type for drawing paths from a hyperpath
+        static const unsigned int STREAM_ENUMERATION = 0;
+
+        /// Constructor
+        RandomStream(unsigned int seed, unsigned int iteration, unsigned int stream_id,
+                     unsigned int stream_type = STREAM_ENUMERATION) :
+            draw_index_(0), buffer_index_(4)
+        {
+            key_[0]     = seed;
+            key_[1]     = iteration;
+            counter_[0] = 0;
+            counter_[1] = 0;
+            counter_[2] = stream_id;
+            counter_[3] = stream_type;
+        }
+
+        /// Returns the next random number, uniform in [0, RandomStream::MAX]
+        int next()
+        {
+            if (buffer_index_ == 4) {
+                counter_[0] = static_cast<unsigned int>(draw_index_ & 0xFFFFFFFFULL);
+                counter_[1] = static_cast<unsigned int>(draw_index_ >> 32);
+                block(counter_, key_, buffer_);
+                draw_index_  += 1;
+                buffer_index_ = 0;
+            }
+            return static_cast<int>(buffer_[buffer_index_++] >> 1);
+        }
+
+        /**
+         * Philox4x32-10: sets *output* to the random block for the given counter and key.
+         * Uses 32-bit unsigned ints; the products are done in 64 bits.
+         */
+        static void block(const unsigned int counter[4], const unsigned int key[2], unsigned int output[4])
+        {
+            unsigned int ctr[4] = { counter[0], counter[1], counter[2], counter[3] };
+            unsigned int k0 = key[0];
+            unsigned int k1 = key[1];
+            for (int round = 0; round < 10; ++round) {
+                unsigned long long prod0 = static_cast<unsigned long long>(PHILOX_M0) * ctr[0];
+                unsigned long long prod1 = static_cast<unsigned long long>(PHILOX_M1) * ctr[2];
+                unsigned int hi0 = static_cast<unsigned int>(prod0 >> 32);
+                unsigned int lo0 = static_cast<unsigned int>(prod0 & 0xFFFFFFFFULL);
+                unsigned int hi1 = static_cast<unsigned int>(prod1 >> 32);
+                unsigned int lo1 = static_cast<unsigned int>(prod1 & 0xFFFFFFFFULL);
+
+                ctr[0] = hi1 ^ ctr[1] ^ k0;
+                ctr[1] = lo1;
+                ctr[2] = hi0 ^ ctr[3] ^ k1;
+                ctr[3] = lo0;
+
+                // bump the key; unsigned arithmetic wraps mod 2^32
+                k0 += PHILOX_W0;
+                k1 += PHILOX_W1;
+            }
+            for (int idx = 0; idx < 4; ++idx) { output[idx] = ctr[idx]; }
+        }
+
+    private:
+        /// Philox multipliers
+        static const unsigned int PHILOX_M0 = 0xD2511F53;
+        static const unsigned int PHILOX_M1 = 0xCD9E8D57;
+        /// Philox key schedule (Weyl sequence) constants
+        static const unsigned int PHILOX_W0 = 0x9E3779B9;
+        static const unsigned int PHILOX_W1 = 0xBB67AE85;
+
+        unsigned int        key_[2];        ///< (run seed, iteration)
+        unsigned int        counter_[4];    ///< (draw index low, draw index high, stream ID, stream type)
+        unsigned long long  draw_index_;    ///< Index of the next block
+        unsigned int        buffer_[4];     ///< The current block
+        int                 buffer_index_;  ///< Next number to return from buffer_; 4 means a new block is needed
+    };
+}
+
+#endif
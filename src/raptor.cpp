@@ -0,0 +1,487 @@
+/**
+ * \file raptor.cpp
+ *
+ * Round-based deterministic path-finding over route patterns, an alternative to the
+ * trip-based label-setting search in PathFinder::labelStops.  See PathFinder::raptorLabelStops.
+ *
+ * The labels are fasttrips::StopState instances in the same format as the labeling search makes
+ * them, so the resulting fasttrips::Path is built and costed the same way.
+ *
+ * The route patterns built here are also used by the labeling search to find trips at a stop;
+ * see PathFinder::updateStopStatesForTrips.
+ */
+#include "pathfinder.h"
+
+#include <assert.h>
+#include <algorithm>
+#include <iomanip>
+#include <iostream>
+
+namespace fasttrips {
+
+    /**
+     * Is *time* a better label than *than*?  Searching backwards (outbound), later departures are better;
+     * searching forwards (inbound), earlier arrivals are better.
+     */
+    static inline bool isBetterTime(double time, double than, bool outbound)
+    {
+        return outbound ? (time > than) : (time < than);
+    }
+
+    void PathFinder::buildRoutePatterns() const
+    {
+        route_patterns_.clear();
+        stop_route_patterns_.clear();
+
+        // the stop ID range covers everything the search can label
+        int max_stop_id = maxStopId();
+        stop_route_patterns_.resize(max_stop_id+1);
+        best_trip_label_.assign(max_stop_id+1, -1);
+        best_nontrip_label_.assign(max_stop_id+1, -1);
+        stop_marked_round_.assign(2*(max_stop_id+1), -1);
+
+        // add the trips in order of departure so each pattern's trips are in departure order
+        std::vector< std::pair<double, int> > trips_by_departure;
+        for (std::map<int, std::vector<TripStopTime> >::const_iterator it = trip_stop_times_.begin(); it != trip_stop_times_.end(); ++it) {
+            if (it->second.size() < 2) { continue; }
+            trips_by_departure.push_back(std::make_pair(it->second.front().depart_time_, it->first));
+        }
+        std::sort(trips_by_departure.begin(), trips_by_departure.end());
+
+        // (supply mode, stop sequence) -> indices into route_patterns_
+        std::map< std::pair<int, std::vector<int> >, std::vector<int> > sequence_patterns;
+
+        for (size_t trip_index = 0; trip_index < trips_by_departure.size(); ++trip_index) {
+            int trip_id = trips_by_departure[trip_index].second;
+            const std::vector<TripStopTime>& stop_times = trip_stop_times_.find(trip_id)->second;
+
+            std::map<int, TripInfo>::const_iterator trip_info_iter = trip_info_.find(trip_id);
+            if (trip_info_iter == trip_info_.end()) { continue; }
+
+            std::pair<int, std::vector<int> > sequence_key;
+            sequence_key.first = trip_info_iter->second.supply_mode_num_;
+            for (size_t seq_index = 0; seq_index < stop_times.size(); ++seq_index) {
+                sequence_key.second.push_back(stop_times[seq_index].stop_id_);
+            }
+
+            // join the first pattern with this sequence that this trip doesn't overtake anywhere.
+            // since trips are added in departure order, checking against the last trip is enough.
+            std::vector<int>& candidates = sequence_patterns[sequence_key];
+            int pattern_index = -1;
+            for (size_t cand_index = 0; cand_index < candidates.size(); ++cand_index) {
+                const std::vector<TripStopTime>& last_times = *(route_patterns_[candidates[cand_index]].trip_stop_times_.back());
+                bool overtakes = false;
+                for (size_t seq_index = 0; seq_index < stop_times.size(); ++seq_index) {
+                    if ((stop_times[seq_index].arrive_time_ < last_times[seq_index].arrive_time_) ||
+                        (stop_times[seq_index].depart_time_ < last_times[seq_index].depart_time_)) {
+                        overtakes = true;
+                        break;
+                    }
+                }
+                if (!overtakes) {
+                    pattern_index = candidates[cand_index];
+                    break;
+                }
+            }
+
+            if (pattern_index < 0) {
+                pattern_index = route_patterns_.size();
+                RoutePattern pattern;
+                pattern.supply_mode_num_ = sequence_key.first;
+                pattern.stop_ids_        = sequence_key.second;
+                route_patterns_.push_back(pattern);
+                candidates.push_back(pattern_index);
+
+                for (size_t seq_index = 0; seq_index < pattern.stop_ids_.size(); ++seq_index) {
+                    stop_route_patterns_[pattern.stop_ids_[seq_index]].push_back(std::make_pair(pattern_index, (int)seq_index));
+                }
+            }
+            route_patterns_[pattern_index].trip_ids_.push_back(trip_id);
+            route_patterns_[pattern_index].trip_stop_times_.push_back(&stop_times);
+        }
+
+        // lay out each pattern's times by position so searching the trips at a stop reads contiguous memory
+        for (std::vector<RoutePattern>::iterator pattern = route_patterns_.begin(); pattern != route_patterns_.end(); ++pattern) {
+            size_t num_trips = pattern->trip_ids_.size();
+            pattern->arrive_times_.resize(pattern->stop_ids_.size()*num_trips);
+            pattern->depart_times_.resize(pattern->stop_ids_.size()*num_trips);
+            for (size_t pos = 0; pos < pattern->stop_ids_.size(); ++pos) {
+                for (size_t trip_index = 0; trip_index < num_trips; ++trip_index) {
+                    const TripStopTime& stt = (*pattern->trip_stop_times_[trip_index])[pos];
+                    pattern->arrive_times_[pos*num_trips + trip_index] = stt.arrive_time_;
+                    pattern->depart_times_[pos*num_trips + trip_index] = stt.depart_time_;
+                }
+            }
+        }
+
+        if (process_num_ <= 1) {
+            std::cout << "buildRoutePatterns: " << trips_by_departure.size() << " trips in " << route_patterns_.size() << " route patterns" << std::endl;
+        }
+        route_patterns_valid_ = true;
+    }
+
+    bool PathFinder::addRoundLabel(
+        const PathSpecification& path_spec,
+        std::ofstream& trace_file,
+        int stop_id,
+        double label_time,
+        const StopState& ss,
+        int parent,
+        bool is_trip,
+        int round,
+        int best_taz_label,
+        std::vector<int>& marked_stops) const
+    {
+        std::vector<int>& best_label = (is_trip ? best_trip_label_ : best_nontrip_label_);
+
+        // it has to improve on this stop, and on the end TAZ since the final links only take more time
+        if (((best_label[stop_id] >= 0) &&
+             !isBetterTime(label_time, round_labels_[best_label[stop_id]].label_time_, path_spec.outbound_)) ||
+            ((best_taz_label >= 0) &&
+             !isBetterTime(label_time, round_labels_[best_taz_label].label_time_, path_spec.outbound_))) {
+            if (performance_info_) { performance_info_->links_pruned_ += 1; }
+            return false;
+        }
+
+        RoundLabel round_label = { stop_id, label_time, ss, parent };
+        best_label[stop_id] = round_labels_.size();
+        round_labels_.push_back(round_label);
+        if (performance_info_) { performance_info_->links_added_ += 1; }
+
+        int mark_index = 2*stop_id + (is_trip ? 1 : 0);
+        if (stop_marked_round_[mark_index] != round) {
+            stop_marked_round_[mark_index] = round;
+            marked_stops.push_back(stop_id);
+        }
+
+        if (path_spec.trace_) {
+            trace_file << "round " << round << " " << (is_trip ? "trip    " : "nontrip ");
+            Hyperlink::printStopState(trace_file, stop_id, ss, path_spec, *this);
+            trace_file << std::endl;
+        }
+        return true;
+    }
+
+    int PathFinder::raptorLabelStops(
+        const PathSpecification& path_spec,
+        std::ofstream& trace_file,
+        int& best_taz_label) const
+    {
+        best_taz_label = -1;
+        if (!route_patterns_valid_) { buildRoutePatterns(); }
+
+        bool    outbound     = path_spec.outbound_;
+        int     start_taz_id = outbound ? path_spec.destination_taz_id_ : path_spec.origin_taz_id_;
+        int     end_taz_id   = outbound ? path_spec.origin_taz_id_      : path_spec.destination_taz_id_;
+        double  dir_factor   = outbound ? 1.0 : -1.0;
+
+        // reset the labels from the last search
+        for (std::vector<RoundLabel>::const_iterator it = round_labels_.begin(); it != round_labels_.end(); ++it) {
+            if (it->stop_id_ >= (int)best_trip_label_.size()) { continue; }
+            best_trip_label_   [it->stop_id_]         = -1;
+            best_nontrip_label_[it->stop_id_]         = -1;
+            stop_marked_round_ [2*it->stop_id_]       = -1;
+            stop_marked_round_ [2*it->stop_id_ + 1]   = -1;
+        }
+        round_labels_.clear();
+
+        // the supply modes allowed for transit; without them there's nothing to do
+        UserClassPurposeMode transit_ucpm = { path_spec.user_class_, path_spec.purpose_, MODE_TRANSIT, path_spec.transit_mode_ };
+        WeightLookup::const_iterator transit_weights = weight_lookup_.find(transit_ucpm);
+        if (transit_weights == weight_lookup_.end()) { return 0; }
+
+        // no transfer weights means no transfers, as for PathFinder::updateStopStatesForTransfers
+        const NamedWeights* transfer_weights = getNamedWeights(path_spec.user_class_, path_spec.purpose_, MODE_TRANSFER, "transfer", transfer_supply_mode_);
+
+        // final links: stop id -> (supply mode, link time) to the end TAZ
+        std::map<int, std::vector< std::pair<int, double> > > final_links;
+        TAZSupplyStopToAttr::const_iterator end_tss2a = taz_access_links_.find(end_taz_id);
+        UserClassPurposeMode end_ucpm = {
+            path_spec.user_class_,
+            path_spec.purpose_,
+            outbound ? MODE_ACCESS : MODE_EGRESS,
+            outbound ? path_spec.access_mode_ : path_spec.egress_mode_
+        };
+        WeightLookup::const_iterator end_weights = weight_lookup_.find(end_ucpm);
+        if ((end_tss2a == taz_access_links_.end()) || (end_weights == weight_lookup_.end())) { return 0; }
+        for (SupplyModeToNamedWeights::const_iterator iter_s2w = end_weights->second.begin(); iter_s2w != end_weights->second.end(); ++iter_s2w) {
+            SupplyStopToAttr::const_iterator iter_ss2a = end_tss2a->second.find(iter_s2w->first);
+            if (iter_ss2a == end_tss2a->second.end()) { continue; }
+            for (StopToAttr::const_iterator link_iter = iter_ss2a->second.begin(); link_iter != iter_ss2a->second.end(); ++link_iter) {
+                final_links[link_iter->first].push_back(std::make_pair(iter_s2w->first, link_iter->second.find("time_min")->second));
+            }
+        }
+
+        // round 0: access (inbound) or egress (outbound) links from the start TAZ
+        std::vector<int> marked_nontrip, marked_trip;
+        TAZSupplyStopToAttr::const_iterator start_tss2a = taz_access_links_.find(start_taz_id);
+        UserClassPurposeMode start_ucpm = {
+            path_spec.user_class_,
+            path_spec.purpose_,
+            outbound ? MODE_EGRESS : MODE_ACCESS,
+            outbound ? path_spec.egress_mode_ : path_spec.access_mode_
+        };
+        WeightLookup::const_iterator start_weights = weight_lookup_.find(start_ucpm);
+        if ((start_tss2a == taz_access_links_.end()) || (start_weights == weight_lookup_.end())) { return 0; }
+        for (SupplyModeToNamedWeights::const_iterator iter_s2w = start_weights->second.begin(); iter_s2w != start_weights->second.end(); ++iter_s2w) {
+            SupplyStopToAttr::const_iterator iter_ss2a = start_tss2a->second.find(iter_s2w->first);
+            if (iter_ss2a == start_tss2a->second.end()) { continue; }
+            for (StopToAttr::const_iterator link_iter = iter_ss2a->second.begin(); link_iter != iter_ss2a->second.end(); ++link_iter) {
+                double attr_time   = link_iter->second.find("time_min")->second;
+                // outbound: departure time = destination - access
+                // inbound:  arrival time   = origin      + access
+                double deparr_time = path_spec.preferred_time_ - (attr_time*dir_factor);
+                StopState ss(
+                    deparr_time,                                        // departure/arrival time
+                    outbound ? MODE_EGRESS : MODE_ACCESS,               // departure/arrival mode
+                    iter_s2w->first,                                    // trip id
+                    start_taz_id,                                       // successor/predecessor
+                    -1,                                                 // sequence
+                    -1,                                                 // sequence succ/pred
+                    attr_time,                                          // link time
+                    attr_time,                                          // link cost
+                    attr_time,                                          // cost
+                    0,                                                  // iteration
+                    path_spec.preferred_time_                           // arrival/departure time
+                );
+                addRoundLabel(path_spec, trace_file, link_iter->first, deparr_time, ss, -1, false, 0, best_taz_label, marked_nontrip);
+            }
+        }
+
+        int round = 0;
+        while (!marked_nontrip.empty()) {
+            round += 1;
+            marked_trip.clear();
+
+            // route pattern -> the first position to scan from: the earliest marked stop (inbound) or the latest (outbound)
+            std::map<int, int> patterns_to_scan;
+            for (std::vector<int>::const_iterator stop_iter = marked_nontrip.begin(); stop_iter != marked_nontrip.end(); ++stop_iter) {
+                if (*stop_iter >= (int)stop_route_patterns_.size()) { continue; }
+                const std::vector<std::pair<int,int> >& stop_patterns = stop_route_patterns_[*stop_iter];
+                for (std::vector<std::pair<int,int> >::const_iterator sp_iter = stop_patterns.begin(); sp_iter != stop_patterns.end(); ++sp_iter) {
+                    // this supply mode isn't allowed for the userclass/demand mode
+                    if (transit_weights->second.find(route_patterns_[sp_iter->first].supply_mode_num_) == transit_weights->second.end()) { continue; }
+
+                    std::map<int, int>::iterator scan_iter = patterns_to_scan.find(sp_iter->first);
+                    if (scan_iter == patterns_to_scan.end()) {
+                        patterns_to_scan[sp_iter->first] = sp_iter->second;
+                    } else if (outbound ? (sp_iter->second > scan_iter->second) : (sp_iter->second < scan_iter->second)) {
+                        scan_iter->second = sp_iter->second;
+                    }
+                }
+            }
+
+            // scan each route pattern in the search direction, riding the best trip caught so far
+            for (std::map<int, int>::const_iterator scan_iter = patterns_to_scan.begin(); scan_iter != patterns_to_scan.end(); ++scan_iter) {
+                const RoutePattern& pattern = route_patterns_[scan_iter->first];
+                int num_pattern_stops = pattern.stop_ids_.size();
+                int num_pattern_trips = pattern.trip_ids_.size();
+                int step              = outbound ? -1 : 1;
+
+                int current_trip      = -1;     // index into the pattern trips
+                int catch_pos         = -1;     // where we caught it: the boarding stop (inbound) or the alighting stop (outbound)
+                int catch_label       = -1;     // the non-trip label we caught it from
+
+                for (int pos = scan_iter->second; (pos >= 0) && (pos < num_pattern_stops); pos += step) {
+                    int stop_id = pattern.stop_ids_[pos];
+
+                    // label this stop from the trip we're on
+                    if (current_trip >= 0) {
+                        const TripStopTime& reach_stt = (*pattern.trip_stop_times_[current_trip])[pos];
+                        const TripStopTime& catch_stt = (*pattern.trip_stop_times_[current_trip])[catch_pos];
+                        const RoundLabel&   caught    = round_labels_[catch_label];
+
+                        // outbound: departure from the boarding stop, and arrival at the alighting stop
+                        // inbound:  arrival at the alighting stop, and departure from the boarding stop
+                        double deparr_time      = outbound ? reach_stt.depart_time_ : reach_stt.arrive_time_;
+                        double arrdep_time      = outbound ? catch_stt.arrive_time_ : catch_stt.depart_time_;
+                        double in_vehicle_time  = (arrdep_time - deparr_time)*dir_factor;
+                        double wait_time        = (caught.label_time_ - arrdep_time)*dir_factor;
+
+                        // outbound: we need to be in line for the trip ahead of any bumped passengers
+                        double label_time       = deparr_time;
+                        if (outbound) {
+                            TripStop ts = { reach_stt.trip_id_, reach_stt.seq_, stop_id };
+                            std::map<TripStop, double, struct TripStopCompare>::const_iterator bwi = bump_wait_.find(ts);
+                            if (bwi != bump_wait_.end()) { label_time = std::min(label_time, bwi->second - BUMP_BUFFER_); }
+                        }
+
+                        StopState ss(
+                            deparr_time,                            // departure/arrival time
+                            MODE_TRANSIT,                           // departure/arrival mode
+                            reach_stt.trip_id_,                     // trip id
+                            pattern.stop_ids_[catch_pos],           // successor/predecessor
+                            reach_stt.seq_,                         // sequence
+                            catch_stt.seq_,                         // sequence succ/pred
+                            in_vehicle_time+wait_time,              // link time
+                            in_vehicle_time+wait_time,              // link cost
+                            caught.stop_state_.cost_ + in_vehicle_time + wait_time, // cost
+                            round,                                  // label iteration
+                            arrdep_time                             // arrival/departure time
+                        );
+                        addRoundLabel(path_spec, trace_file, stop_id, label_time, ss, catch_label, true, round, best_taz_label, marked_trip);
+                    }
+
+                    // can we catch an earlier trip (inbound) or a later one (outbound) here?
+                    int nontrip_label = best_nontrip_label_[stop_id];
+                    if (nontrip_label < 0) { continue; }
+                    double ready_time = round_labels_[nontrip_label].label_time_;
+
+                    // the trips are in the same order at every stop of the pattern
+                    int trip_index;
+                    if (outbound) {
+                        // latest trip arriving by the ready time, within the time window
+                        trip_index = firstPatternTripAfter(pattern, pos, true, ready_time, false) - 1;
+                        if ((trip_index >= 0) && (pattern.arrive_times_[pos*num_pattern_trips + trip_index] <= ready_time - Hyperlink::TIME_WINDOW_)) { trip_index = -1; }
+                        if ((trip_index >= 0) && (current_trip >= 0) && (trip_index <= current_trip)) { trip_index = -1; }
+                    } else {
+                        // earliest trip departing at or after the ready time, within the time window,
+                        // that we reach before any bumped passengers started waiting for it
+                        int first_trip = firstPatternTripAfter(pattern, pos, false, ready_time, true);
+                        int last_trip  = (current_trip >= 0) ? current_trip : num_pattern_trips;
+                        trip_index = -1;
+                        for (int cand = first_trip; cand < last_trip; ++cand) {
+                            if (pattern.depart_times_[pos*num_pattern_trips + cand] >= ready_time + Hyperlink::TIME_WINDOW_) { break; }
+                            if (performance_info_) { performance_info_->trips_scanned_ += 1; }
+
+                            const TripStopTime& cand_stt = (*pattern.trip_stop_times_[cand])[pos];
+                            TripStop ts = { cand_stt.trip_id_, cand_stt.seq_, stop_id };
+                            std::map<TripStop, double, struct TripStopCompare>::const_iterator bwi = bump_wait_.find(ts);
+                            if ((bwi != bump_wait_.end()) && (ready_time + 0.01 >= bwi->second)) { continue; }
+                            trip_index = cand;
+                            break;
+                        }
+                    }
+                    if (outbound && (trip_index >= 0) && performance_info_) { performance_info_->trips_scanned_ += 1; }
+
+                    if (trip_index >= 0) {
+                        current_trip = trip_index;
+                        catch_pos    = pos;
+                        catch_label  = nontrip_label;
+                    }
+                }
+            }
+
+            // final links to the end TAZ from the stops reached by trip
+            for (std::vector<int>::const_iterator stop_iter = marked_trip.begin(); stop_iter != marked_trip.end(); ++stop_iter) {
+                std::map<int, std::vector< std::pair<int, double> > >::const_iterator final_iter = final_links.find(*stop_iter);
+                if (final_iter == final_links.end()) { continue; }
+
+                int    trip_label   = best_trip_label_[*stop_iter];
+                // copy; adding labels may reallocate round_labels_
+                double reached_time = round_labels_[trip_label].label_time_;
+                double reached_cost = round_labels_[trip_label].stop_state_.cost_;
+                double trip_deparr  = round_labels_[trip_label].stop_state_.deparr_time_;
+                for (std::vector< std::pair<int, double> >::const_iterator link_iter = final_iter->second.begin(); link_iter != final_iter->second.end(); ++link_iter) {
+                    double access_time = link_iter->second;
+                    double deparr_time = reached_time - (access_time*dir_factor);
+                    if ((best_taz_label >= 0) && !isBetterTime(deparr_time, round_labels_[best_taz_label].label_time_, outbound)) { continue; }
+
+                    StopState ss(
+                        deparr_time,                                    // departure/arrival time
+                        outbound ? MODE_ACCESS : MODE_EGRESS,           // departure/arrival mode
+                        link_iter->first,                               // trip id
+                        *stop_iter,                                     // successor/predecessor
+                        -1,                                             // sequence
+                        -1,                                             // sequence succ/pred
+                        access_time,                                    // link time
+                        access_time,                                    // link cost
+                        reached_cost + access_time,                     // cost
+                        round,                                          // label iteration
+                        trip_deparr                                     // arrival/departure time
+                    );
+                    RoundLabel taz_label = { end_taz_id, deparr_time, ss, trip_label };
+                    best_taz_label = round_labels_.size();
+                    round_labels_.push_back(taz_label);
+                    if (performance_info_) { performance_info_->links_added_ += 1; }
+                    if (path_spec.trace_) {
+                        trace_file << "round " << round << " taz     ";
+                        Hyperlink::printStopState(trace_file, end_taz_id, ss, path_spec, *this);
+                        trace_file << std::endl;
+                    }
+                }
+            }
+
+            // transfers from the stops reached by trip, including staying at the stop
+            marked_nontrip.clear();
+            if (transfer_weights == NULL) { break; }
+
+            // if outbound, going backwards, so transfer TO this stop
+            // if inbound, going forwards, so transfer FROM this stop
+            const StopStopToAttr& transfer_links = (outbound ? transfer_links_d_o_ : transfer_links_o_d_);
+            for (std::vector<int>::const_iterator stop_iter = marked_trip.begin(); stop_iter != marked_trip.end(); ++stop_iter) {
+                int trip_label = best_trip_label_[*stop_iter];
+                // copy; adding labels may reallocate round_labels_
+                double current_time = round_labels_[trip_label].label_time_;
+                double current_cost = round_labels_[trip_label].stop_state_.cost_;
+
+                std::vector< std::pair<int, double> > transfers;
+                const Attributes* zerowalk_xfer = getTransferAttributes(*stop_iter, *stop_iter);
+                transfers.push_back(std::make_pair(*stop_iter, zerowalk_xfer->find("walk_time_min")->second));
+                StopStopToAttr::const_iterator transfer_map_it = transfer_links.find(*stop_iter);
+                if (transfer_map_it != transfer_links.end()) {
+                    for (StopToAttr::const_iterator transfer_it = transfer_map_it->second.begin(); transfer_it != transfer_map_it->second.end(); ++transfer_it) {
+                        transfers.push_back(std::make_pair(transfer_it->first, transfer_it->second.find("time_min")->second));
+                    }
+                }
+
+                for (std::vector< std::pair<int, double> >::const_iterator xfer_iter = transfers.begin(); xfer_iter != transfers.end(); ++xfer_iter) {
+                    double transfer_time = xfer_iter->second;
+                    // outbound: departure time = latest departure - transfer
+                    //  inbound: arrival time   = earliest arrival + transfer
+                    double deparr_time   = current_time - (transfer_time*dir_factor);
+                    StopState ss(
+                        deparr_time,                    // departure/arrival time
+                        MODE_TRANSFER,                  // departure/arrival mode
+                        1,                              // trip id
+                        *stop_iter,                     // successor/predecessor
+                        -1,                             // sequence
+                        -1,                             // sequence succ/pred
+                        transfer_time,                  // link time
+                        transfer_time,                  // link cost
+                        current_cost + transfer_time,   // cost
+                        round,                          // label iteration
+                        current_time                    // arrival/departure time
+                    );
+                    addRoundLabel(path_spec, trace_file, xfer_iter->first, deparr_time, ss, trip_label, false, round, best_taz_label, marked_nontrip);
+                }
+            }
+        }
+
+        if (path_spec.trace_) {
+            trace_file << "Round-based search finished after " << round << " rounds with " << round_labels_.size() << " labels" << std::endl;
+        }
+        return round;
+    }
+
+    bool PathFinder::raptorGetPathSet(
+        const PathSpecification&    path_spec,
+        std::ofstream&              trace_file,
+        int                         best_taz_label,
+        PathSet&                    pathset,
+        PerformanceInfo&            performance_info) const
+    {
+        performance_info.enumeration_draws_       = 0;
+        performance_info.enumeration_stop_reason_ = ENUMERATION_STOP_PATHSET_SIZE;
+
+        // no taz label -> no path found
+        if (best_taz_label < 0) { return false; }
+
+        // outbound: origin to destination
+        // inbound:  destination to origin
+        Path path(path_spec.outbound_, true);
+        for (int label = best_taz_label; label >= 0; label = round_labels_[label].parent_) {
+            path.addLink(round_labels_[label].stop_id_, round_labels_[label].stop_state_, trace_file, path_spec, *this);
+        }
+
+        PathInfo pi = { 1, 1, 0 };  // count is 1
+        path.calculateCost(trace_file, path_spec, *this);
+        pathset[path] = pi;
+        if (path_spec.trace_)
+        {
+            trace_file << "Final path" << std::endl;
+            path.print(trace_file, path_spec, *this);
+        }
+        return true;
+    }
+}
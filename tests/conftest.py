@@ -0,0 +1,42 @@
+import os, subprocess, sys
+
+import pytest
+
+BASE_DIR         = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN_TEST         = os.path.join(BASE_DIR, "scripts", "runTest.py")
+CREATE_SYNTHETIC = os.path.join(BASE_DIR, "scripts", "createSyntheticNetwork.py")
+TEST_NETWORK_DIR = os.path.join(BASE_DIR, "Examples", "test_network")
+
+@pytest.fixture(scope="session")
+def test_network_dir():
+    """
+    The test network directory, with the network in ``input`` and the demand in ``demand_*``.
+    """
+    return TEST_NETWORK_DIR
+
+@pytest.fixture(scope="session")
+def run_fasttrips():
+    """
+    Returns a function that runs fast-trips via runTest.py and returns the full output directory.
+    The network and demand default to the test network and its regular demand.  Pathfinding runs
+    in *num_processes* processes, one by default.
+    """
+    def run(output_loc, output_dir, pathfinding_type, iterations, extra_args=[],
+            network_dir=os.path.join(TEST_NETWORK_DIR, "input"),
+            demand_dir =os.path.join(TEST_NETWORK_DIR, "demand_reg"),
+            num_processes=1):
+        cmd = [sys.executable, RUN_TEST, "--num_processes", str(num_processes), "--output_dir", output_dir] + \
+              extra_args + [pathfinding_type, str(iterations), network_dir, demand_dir, output_loc]
+        subprocess.check_call(cmd)
+        return os.path.join(output_loc, output_dir)
+    return run
+
+@pytest.fixture(scope="session")
+def create_synthetic_network():
+    """
+    Returns a function that writes a synthetic network and demand via createSyntheticNetwork.py.
+    """
+    def create(network_dir, demand_dir, size, seed, extra_args=[]):
+        cmd = [sys.executable, CREATE_SYNTHETIC, "--size", size, "--seed", str(seed)] + extra_args + [network_dir, demand_dir]
+        subprocess.check_call(cmd)
+    return create
@@ -0,0 +1,98 @@
+import os, shutil
+
+import pandas
+import pytest
+
+import fasttrips
+
+#: Path costs within this are considered the same
+COST_TOLERANCE = 0.01
+
+def write_network(test_network_dir, network_dir, one_way_rail):
+    """
+    Writes a copy of the test network with a second park-and-ride lot, P3, for TAZ Z2.  P3 is next to rail stop R2
+    and is farther from Z2 than P1, which is next to R1.  Rail runs R1-R2-R3 and R3-R2-R1; if *one_way_rail*,
+    only R1-R2-R3 trips are kept, so R1 is upstream of R2 on every trip and the Z2-P3 access link is dominated.
+    """
+    shutil.copytree(os.path.join(test_network_dir, "input"), network_dir)
+
+    if one_way_rail:
+        stop_times_df = pandas.read_csv(os.path.join(network_dir, "stop_times.txt"), dtype={"stop_sequence":int})
+        # the trips that leave from R3
+        drop_trips    = stop_times_df.loc[(stop_times_df["stop_id"]=="R3")&(stop_times_df["stop_sequence"]==1), "trip_id"]
+        for filename in ["trips.txt", "trips_ft.txt", "stop_times.txt", "stop_times_ft.txt"]:
+            df = pandas.read_csv(os.path.join(network_dir, filename), dtype=str)
+            df.loc[~df["trip_id"].isin(drop_trips)].to_csv(os.path.join(network_dir, filename), index=False)
+
+    with open(os.path.join(network_dir, "drive_access_points_ft.txt"), "a") as dap_file:
+        dap_file.write("P3,37.780689,-122.472314,False,10\n")
+    with open(os.path.join(network_dir, "transfers_ft.txt"), "a") as transfers_file:
+        transfers_file.write("P3,R2,0,,,0,to\n")
+        transfers_file.write("R2,P3,0,,,0,from\n")
+    # 3 minutes more than Z2-P1, and the train takes 2 minutes from R1 to R2
+    with open(os.path.join(network_dir, "drive_access_ft.txt"), "a") as drive_file:
+        drive_file.write("Z2,P3,access, 1.00 ,400,8,00:00:00,23:59:59\n")
+
+def write_demand(test_network_dir, demand_dir):
+    """
+    Writes a copy of the two paths demand with the park-and-ride trips from Z2 going to Z5, at R3, so that both
+    lots are useful.  The drive time weights are renamed to the drive access attribute so the paths can be costed.
+    """
+    shutil.copytree(os.path.join(test_network_dir, "demand_twopaths"), demand_dir)
+
+    weights_file = os.path.join(demand_dir, "pathweight_ft.txt")
+    with open(weights_file) as f: weights = f.read()
+    # the weights file is fixed width
+    with open(weights_file, "w") as f: f.write(weights.replace("drive_travel_time_min", fasttrips.TAZ.DRIVE_ACCESS_COLUMN_DRIVE_TRAVEL_TIME_MIN.ljust(len("drive_travel_time_min"))))
+
+    trip_list_df = pandas.read_csv(os.path.join(demand_dir, "trip_list.txt"), dtype=str)
+    trip_list_df.loc[trip_list_df["o_taz"]=="Z2", "d_taz"] = "Z5"
+    trip_list_df.to_csv(os.path.join(demand_dir, "trip_list.txt"), index=False)
+
+def run_pathfinding(run_fasttrips, network_dir, demand_dir, output_loc, prune):
+    """
+    Runs deterministic pathfinding.
+
+    Returns (paths found dataframe, dominated links dataframe)
+    """
+    full_output_dir = run_fasttrips(output_loc, "pruned" if prune else "all", "deterministic", 1,
+                                    ["--prune_dominated_access_links", str(prune)],
+                                    network_dir=network_dir, demand_dir=demand_dir)
+    paths_df        = pandas.read_csv(os.path.join(full_output_dir, fasttrips.Passenger.PF_PATHS_CSV))
+    dominated_file  = os.path.join(full_output_dir, fasttrips.TAZ.OUTPUT_DOMINATED_LINKS_FILE)
+    dominated_df    = pandas.read_csv(dominated_file) if os.path.exists(dominated_file) else pandas.DataFrame()
+    return (paths_df, dominated_df)
+
+@pytest.mark.parametrize("one_way_rail", [True, False])
+def test_access_dominance(tmpdir, test_network_dir, run_fasttrips, one_way_rail):
+    """
+    Checks that the Z2-P3 link is removed only if every train through R2 stops at R1 first, and that the
+    paths found are the same with and without pruning.
+    """
+    network_dir = os.path.join(str(tmpdir), "input")
+    demand_dir  = os.path.join(str(tmpdir), "demand")
+    write_network(test_network_dir, network_dir, one_way_rail)
+    write_demand(test_network_dir, demand_dir)
+
+    (all_paths_df,    all_dominated_df   ) = run_pathfinding(run_fasttrips, network_dir, demand_dir, str(tmpdir), False)
+    (pruned_paths_df, pruned_dominated_df) = run_pathfinding(run_fasttrips, network_dir, demand_dir, str(tmpdir), True)
+
+    assert len(all_dominated_df) == 0
+    if one_way_rail:
+        assert len(pruned_dominated_df) == 1
+        dominated = pruned_dominated_df.iloc[0]
+        assert (dominated["taz"], dominated["lot_id"], dominated["stop_id"]) == ("Z2", "P3", "R2")
+        assert (dominated["dominated_by_lot_id"], dominated["dominated_by_stop_id"]) == ("P1", "R1")
+    else:
+        assert len(pruned_dominated_df) == 0
+
+    path_cols  = [fasttrips.Passenger.TRIP_LIST_COLUMN_PERSON_ID, fasttrips.Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID,
+                  "pf_cost", fasttrips.Passenger.PF_COL_DESCRIPTION]
+    compare_df = pandas.merge(left    =all_paths_df[path_cols],
+                              right   =pruned_paths_df[path_cols],
+                              on      =path_cols[:2],
+                              how     ="outer",
+                              suffixes=("_all", "_pruned"))
+    assert len(compare_df) == len(all_paths_df)
+    assert ((compare_df["pf_cost_all"] - compare_df["pf_cost_pruned"]).abs() < COST_TOLERANCE).all()
+    assert (compare_df["%s_all" % fasttrips.Passenger.PF_COL_DESCRIPTION] == compare_df["%s_pruned" % fasttrips.Passenger.PF_COL_DESCRIPTION]).all()
@@ -0,0 +1,46 @@
+import os, shutil
+
+import pandas
+import pytest
+
+import fasttrips
+
+#: Number of iterations to run
+NUM_ITERATIONS = 3
+
+def assert_same_output(full_dir, resumed_dir, iteration):
+    """
+    Asserts the two runs have the same assignment state and vehicle trips at the end of the given iteration.
+    """
+    checkpoint_dir = fasttrips.Assignment.CHECKPOINT_DIR % iteration
+    for df_file in fasttrips.Assignment.CHECKPOINT_DATAFRAMES.values():
+        full_df    = pandas.read_pickle(os.path.join(full_dir,    checkpoint_dir, df_file))
+        resumed_df = pandas.read_pickle(os.path.join(resumed_dir, checkpoint_dir, df_file))
+        pandas.util.testing.assert_frame_equal(full_df, resumed_df)
+
+    full_veh_trips_df    = pandas.read_csv(os.path.join(full_dir,    "veh_trips.csv"))
+    resumed_veh_trips_df = pandas.read_csv(os.path.join(resumed_dir, "veh_trips.csv"))
+    pandas.util.testing.assert_frame_equal(full_veh_trips_df.loc[full_veh_trips_df["iteration"]==iteration].reset_index(drop=True),
+                                           resumed_veh_trips_df.loc[resumed_veh_trips_df["iteration"]==iteration].reset_index(drop=True))
+
+@pytest.fixture(scope="module")
+def full_run(tmpdir_factory, run_fasttrips):
+    """
+    Runs all the iterations of a stochastic assignment with capacity constraint once, writing checkpoints.
+    """
+    output_loc = str(tmpdir_factory.mktemp("checkpoint"))
+    return (output_loc, run_fasttrips(output_loc, "full", "stochastic", NUM_ITERATIONS, ["--capacity", "--write_checkpoints"]))
+
+@pytest.mark.parametrize("resume_iteration", range(1, NUM_ITERATIONS))
+def test_resume(full_run, run_fasttrips, resume_iteration):
+    """
+    Resumes from each checkpoint of the full run and checks the last iteration matches it.
+    """
+    (output_loc, full_dir) = full_run
+    resumed_dir    = os.path.join(output_loc, "resume_iter%d" % resume_iteration)
+    checkpoint_dir = fasttrips.Assignment.CHECKPOINT_DIR % resume_iteration
+    shutil.copytree(os.path.join(full_dir, checkpoint_dir), os.path.join(resumed_dir, checkpoint_dir))
+
+    run_fasttrips(output_loc, os.path.basename(resumed_dir), "stochastic", NUM_ITERATIONS,
+                  ["--capacity", "--write_checkpoints", "--resume_iteration", str(resume_iteration)])
+    assert_same_output(full_dir, resumed_dir, NUM_ITERATIONS)
@@ -0,0 +1,22 @@
+import os
+
+import pandas
+
+#: Number of iterations to run
+NUM_ITERATIONS = 2
+
+#: Output files to compare
+OUTPUT_FILES   = ["veh_trips.csv", "chosenpaths_paths.csv", "chosenpaths_links.csv"]
+
+def test_compact_dataframes(tmpdir, run_fasttrips):
+    """
+    Runs a stochastic assignment with capacity constraint with and without compact dataframes and checks
+    the results are the same.
+    """
+    output_loc  = str(tmpdir)
+    default_dir = run_fasttrips(output_loc, "default", "stochastic", NUM_ITERATIONS, ["--capacity"])
+    compact_dir = run_fasttrips(output_loc, "compact", "stochastic", NUM_ITERATIONS, ["--capacity", "--compact_dataframes"])
+
+    for output_file in OUTPUT_FILES:
+        pandas.util.testing.assert_frame_equal(pandas.read_csv(os.path.join(default_dir, output_file)),
+                                               pandas.read_csv(os.path.join(compact_dir, output_file)))
@@ -0,0 +1,68 @@
+import os, shutil, subprocess
+
+import pandas
+import pytest
+
+import fasttrips
+
+#: Number of iterations to run; the third merges new pathsets into the partitions
+NUM_ITERATIONS = 3
+
+#: Number of person trips in each simulation partition
+PARTITION_SIZE = 100
+
+#: Output files to compare
+OUTPUT_FILES   = ["veh_trips.csv", "chosenpaths_paths.csv", "chosenpaths_links.csv"]
+
+def read_output(output_dir, output_file):
+    """
+    Returns the given output file in a fixed row order.
+    """
+    output_df = pandas.read_csv(os.path.join(output_dir, output_file))
+    return output_df.sort_values(by=list(output_df.columns.values)).reset_index(drop=True)
+
+@pytest.fixture(scope="module")
+def nocap_network_dir(tmpdir_factory, test_network_dir):
+    """
+    A copy of the test network without vehicle capacities, since partitioned simulation doesn't support them.
+    """
+    network_dir = str(tmpdir_factory.mktemp("nocap").join("input"))
+    shutil.copytree(os.path.join(test_network_dir, "input"), network_dir)
+
+    vehicles_file = os.path.join(network_dir, fasttrips.Trip.INPUT_VEHICLES_FILE)
+    vehicles_df   = pandas.read_csv(vehicles_file)
+    vehicles_df.drop([fasttrips.Trip.VEHICLES_COLUMN_SEATED_CAPACITY, fasttrips.Trip.VEHICLES_COLUMN_STANDING_CAPACITY], axis=1, inplace=True)
+    vehicles_df.to_csv(vehicles_file, index=False)
+    return network_dir
+
+def test_partitioned_simulation(tmpdir, run_fasttrips, nocap_network_dir):
+    """
+    Runs a stochastic assignment simulating with and without partitions and checks the results are the same.
+    """
+    output_loc      = str(tmpdir)
+    serial_dir      = run_fasttrips(output_loc, "serial", "stochastic", NUM_ITERATIONS, network_dir=nocap_network_dir)
+    partitioned_dir = run_fasttrips(output_loc, "partitioned", "stochastic", NUM_ITERATIONS,
+                                    ["--simulation_partition_size", str(PARTITION_SIZE)], network_dir=nocap_network_dir)
+
+    for output_file in OUTPUT_FILES:
+        pandas.util.testing.assert_frame_equal(read_output(serial_dir, output_file), read_output(partitioned_dir, output_file))
+
+def test_simulation_processes(tmpdir, run_fasttrips, nocap_network_dir):
+    """
+    Runs a stochastic assignment simulating in this process and in worker processes and checks the results are the same.
+    """
+    output_loc  = str(tmpdir)
+    single_dir  = run_fasttrips(output_loc, "simprocesses1", "stochastic", NUM_ITERATIONS,
+                                ["--simulation_partition_size", str(PARTITION_SIZE), "--num_simulation_processes", "1"], network_dir=nocap_network_dir)
+    workers_dir = run_fasttrips(output_loc, "simprocesses3", "stochastic", NUM_ITERATIONS,
+                                ["--simulation_partition_size", str(PARTITION_SIZE), "--num_simulation_processes", "3"], network_dir=nocap_network_dir)
+
+    for output_file in OUTPUT_FILES:
+        pandas.util.testing.assert_frame_equal(read_output(single_dir, output_file), read_output(workers_dir, output_file))
+
+def test_partitioned_simulation_capacity(tmpdir, run_fasttrips):
+    """
+    Checks that simulating with partitions is a configuration error if the vehicles have capacities.
+    """
+    with pytest.raises(subprocess.CalledProcessError):
+        run_fasttrips(str(tmpdir), "partitioned", "stochastic", 1, ["--simulation_partition_size", str(PARTITION_SIZE)])
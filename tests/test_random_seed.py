@@ -0,0 +1,28 @@
+import os
+
+import pandas
+
+#: Number of iterations to run
+NUM_ITERATIONS = 2
+
+#: Output files to compare
+OUTPUT_FILES   = ["veh_trips.csv", "chosenpaths_paths.csv", "chosenpaths_links.csv"]
+
+def read_output(output_dir, output_file):
+    """
+    Returns the given output file in a fixed row order.
+    """
+    output_df = pandas.read_csv(os.path.join(output_dir, output_file))
+    return output_df.sort_values(by=list(output_df.columns.values)).reset_index(drop=True)
+
+def test_number_of_processes(tmpdir, run_fasttrips):
+    """
+    Runs a stochastic assignment with capacity constraint with pathfinding in this process and in worker
+    processes and checks the results are the same.
+    """
+    output_loc  = str(tmpdir)
+    single_dir  = run_fasttrips(output_loc, "processes1", "stochastic", NUM_ITERATIONS, ["--capacity"], num_processes=1)
+    workers_dir = run_fasttrips(output_loc, "processes3", "stochastic", NUM_ITERATIONS, ["--capacity"], num_processes=3)
+
+    for output_file in OUTPUT_FILES:
+        pandas.util.testing.assert_frame_equal(read_output(single_dir, output_file), read_output(workers_dir, output_file))
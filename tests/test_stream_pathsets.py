@@ -0,0 +1,31 @@
+import os
+
+import pandas
+
+import fasttrips
+
+#: Number of iterations to run
+NUM_ITERATIONS = 2
+
+#: Output files to compare
+OUTPUT_FILES   = [fasttrips.Passenger.PF_PATHS_CSV, fasttrips.Passenger.PF_LINKS_CSV,
+                  "veh_trips.csv", "chosenpaths_paths.csv", "chosenpaths_links.csv"]
+
+def read_output(output_dir, output_file):
+    """
+    Returns the given output file in a fixed row order.
+    """
+    output_df = pandas.read_csv(os.path.join(output_dir, output_file))
+    return output_df.sort_values(by=list(output_df.columns.values)).reset_index(drop=True)
+
+def test_stream_pathsets(tmpdir, run_fasttrips):
+    """
+    Runs a stochastic assignment with capacity constraint with and without streaming the pathsets one person trip
+    at a time and checks the results are the same.  Some person trips have no paths, so some chunks are empty.
+    """
+    output_loc   = str(tmpdir)
+    default_dir  = run_fasttrips(output_loc, "default",  "stochastic", NUM_ITERATIONS, ["--capacity"])
+    streamed_dir = run_fasttrips(output_loc, "streamed", "stochastic", NUM_ITERATIONS, ["--capacity", "--pathset_stream_chunk_size", "1"])
+
+    for output_file in OUTPUT_FILES:
+        pandas.util.testing.assert_frame_equal(read_output(default_dir, output_file), read_output(streamed_dir, output_file))
@@ -0,0 +1,23 @@
+import os
+
+import pandas
+
+import fasttrips
+
+def test_synthetic_network(tmpdir, create_synthetic_network, run_fasttrips):
+    """
+    Writes the test-sized synthetic network and demand and runs one iteration of a stochastic assignment with
+    capacity constraint on it, checking that paths are found for every person trip.
+    """
+    output_loc  = str(tmpdir)
+    network_dir = os.path.join(output_loc, "input")
+    demand_dir  = os.path.join(output_loc, "demand")
+    create_synthetic_network(network_dir, demand_dir, "test", 3)
+
+    output_dir = run_fasttrips(output_loc, "synthetic", "stochastic", 1, ["--capacity"],
+                               network_dir=network_dir, demand_dir=demand_dir)
+
+    trip_cols    = [fasttrips.Passenger.TRIP_LIST_COLUMN_PERSON_ID, fasttrips.Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID]
+    trip_list_df = pandas.read_csv(os.path.join(demand_dir, "trip_list.txt"))
+    paths_df     = pandas.read_csv(os.path.join(output_dir, fasttrips.Passenger.PF_PATHS_CSV))
+    assert len(paths_df[trip_cols].drop_duplicates()) == len(trip_list_df)
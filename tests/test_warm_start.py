@@ -0,0 +1,56 @@
+import os
+
+import pandas
+import pytest
+
+import fasttrips
+
+#: Number of iterations to run
+NUM_ITERATIONS = 2
+
+#: Vehicle trip columns set by the warm start
+VEH_TRIP_COLUMNS = ["trip_id", "stop_sequence", "stop_id", "boards", "alights", "onboard", "arrival_time", "departure_time"]
+
+#: Arguments for every run: a stochastic assignment with capacity constraint, writing checkpoints
+RUN_ARGS = ["--capacity", "--write_checkpoints"]
+
+def read_vehicle_trips(output_dir, iteration):
+    """
+    Returns the vehicle trips output at the end of the given iteration.
+    """
+    veh_trips_df = pandas.read_csv(os.path.join(output_dir, "veh_trips.csv"))
+    veh_trips_df = veh_trips_df.loc[veh_trips_df["iteration"]==iteration, VEH_TRIP_COLUMNS]
+    return veh_trips_df.sort_values(by=["trip_id","stop_sequence"]).reset_index(drop=True)
+
+@pytest.fixture(scope="module")
+def previous_run(tmpdir_factory, run_fasttrips):
+    """
+    Runs the assignment once, writing checkpoints to warm-start from.
+    """
+    output_loc = str(tmpdir_factory.mktemp("warm_start"))
+    return (output_loc, run_fasttrips(output_loc, "previous", "stochastic", NUM_ITERATIONS, RUN_ARGS))
+
+@pytest.mark.parametrize("warm_start_pathsets", [False, True])
+def test_warm_start(previous_run, run_fasttrips, warm_start_pathsets):
+    """
+    Warm-starts from the previous run's last checkpoint on the same network and checks that the run completes,
+    that it starts with the previous run's vehicle loads and times, and that the previous run's pathsets are all kept.
+    """
+    (output_loc, previous_dir) = previous_run
+    extra_args = RUN_ARGS + ["--warm_start_dir", previous_dir]
+    if warm_start_pathsets: extra_args.append("--warm_start_pathsets")
+    warm_dir = run_fasttrips(output_loc, "warm_pathsets" if warm_start_pathsets else "warm", "stochastic", NUM_ITERATIONS, extra_args)
+
+    pandas.util.testing.assert_frame_equal(read_vehicle_trips(previous_dir, NUM_ITERATIONS), read_vehicle_trips(warm_dir, 0))
+
+    (state, checkpoint_dfs) = fasttrips.Assignment.read_checkpoint_files(warm_dir, NUM_ITERATIONS)
+    assert state["iteration"] == NUM_ITERATIONS
+
+    if warm_start_pathsets:
+        # the network is the same so every previous pathset is still valid and kept
+        trip_cols = [fasttrips.Passenger.TRIP_LIST_COLUMN_PERSON_ID, fasttrips.Passenger.TRIP_LIST_COLUMN_PERSON_TRIP_ID]
+        (state, previous_dfs) = fasttrips.Assignment.read_checkpoint_files(previous_dir, NUM_ITERATIONS)
+        (state, warm_dfs    ) = fasttrips.Assignment.read_checkpoint_files(warm_dir, 1)
+        previous_trips_df = previous_dfs["pathset_paths_df"][trip_cols].drop_duplicates()
+        kept_trips_df     = pandas.merge(left=previous_trips_df, right=warm_dfs["pathset_paths_df"][trip_cols].drop_duplicates(), how="inner")
+        assert len(kept_trips_df) == len(previous_trips_df)